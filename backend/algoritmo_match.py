@@ -2,6 +2,41 @@
 """algoritmo_match_v2_6_2.py
 Algoritmo de Match Jurídico Inteligente — v2.6.2
 ======================================================================
+Novidades v2.8 ⚡
+-----------------
+1.  **Motor de Features em Lote**: `BatchFeatureCalculator` empacota todos os
+    candidatos em arrays NumPy e calcula A/S/T/G/Q/U/R/C com operações
+    matriciais (mesmos valores do `FeatureCalculator` por advogado).
+2.  **Vector Store de Advogados**: embeddings históricos e de pareceres
+    pré-normalizados (centróide ponderado por advogado) + índice IVF para
+    consultas top-k; invalidação incremental via Redis pub/sub.
+3.  **Cache Estático em Lote**: `mget_static_feats`/`mset_static_feats` (MGET +
+    pipeline) e LRU local com TTL (STATIC_FEATS_LOCAL_TTL) na frente do Redis.
+4.  **Digest de Reviews**: `ReviewDigest` pré-computado (contagens válidas,
+    hits positivos/negativos e C) com hash do conteúdo; keywords contadas por
+    uma única alternação compilada (`KEYWORD_RE`).
+5.  **Auditoria Assíncrona**: AUDIT_LOGGER enfileira os registros em um
+    `AuditSink` (backend/audit_sink.py) com thread escritora e segmentos
+    JSON-lines rotacionados/comprimidos (AUDIT_SINK=stream mantém o stderr).
+6.  **Scorer de Árvores**: `TreeScorer` avalia o booster LightGBM em um único
+    `predict` sobre a matriz de candidatos (LTR_SCORER=tree ou
+    `ltr_model_<versão>.txt` por model_version), mantendo o pós-processamento.
+7.  **Registro de Pesos**: `weights_registry` mantém produção e versões A/B em
+    memória, relê arquivos só quando o mtime muda e propaga mudanças a todos
+    os workers via Redis pub/sub (canal `ltr_weights:update`).
+8.  **Scores por Requisição**: `rank()` guarda features/scores em arrays da
+    própria chamada e devolve cópias dos top_n; os `Lawyer` de entrada (ex.:
+    do snapshot compartilhado em lawyer_snapshot) nunca são alterados.
+9.  **Matching em Lote**: `rank_many()` classifica vários casos contra um pool
+    compartilhado com um tensor casos × candidatos × 8 (`tensor()`, S em um
+    matmul e G via `haversine_matrix`); pesos e disponibilidade uma vez por lote.
+10. **Tempo por Etapa**: `stage_timer`/`timed` (backend/stage_timer.py) medem
+    pesos, disponibilidade, features, cache, scoring, fairness e auditoria no
+    histograma `match_stage_duration_seconds`; o breakdown vai para a auditoria.
+11. **Explicações sem Re-ranking**: `explain()` recalcula features e breakdown
+    sem efeitos colaterais; `weights_used`/`weights_version` acompanham os
+    scores de `rank()` e são persistidos em `case_matches`.
+
 Novidades v2.6.2 🚀
 -------------------
 1.  **Normalização de Acentos**: Matching robusto de keywords sem dependência de acentuação.
@@ -48,22 +83,26 @@ import json
 import logging
 import os
 import time
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
 from math import asin, cos, log1p, radians, sin, sqrt
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Literal, Set
 from datetime import datetime
 import re
+import threading
 
 # type: ignore - para ignorar erros de importação não resolvidos
 import numpy as np
 import redis.asyncio as aioredis
-try:
-    from backend.services.availability_service import get_lawyers_availability_status
-except ImportError:
-    # Fallback para testes - mock da função
-    async def get_lawyers_availability_status(lawyer_ids):
-        return {lid: True for lid in lawyer_ids}
+
+from backend.audit_sink import AuditSink, AuditSinkHandler
+from backend.stage_timer import current_timer, stage_timer, timed
+
+# Sem fallback silencioso: um ImportError aqui (ex.: ciclo com backend.services)
+# deixaria o rank() sem disponibilidade real e sem o vector store da feature S
+from backend.services.availability_service import get_lawyers_availability_status
+from backend.services.lawyer_vector_store import lawyer_vector_store
 
 # Métrica Prometheus declarada uma única vez no topo
 try:
@@ -94,6 +133,9 @@ except ImportError:  # Prometheus opcional
 # Caminho para os pesos dinâmicos do LTR, configurável via variável de ambiente
 default_path = Path(__file__).parent / "models/ltr_weights.json"
 WEIGHTS_FILE = Path(os.getenv("LTR_WEIGHTS_PATH", default_path))
+# (v2.8) Booster LightGBM salvo por ltr_train; LTR_SCORER=tree usa-o em produção
+MODEL_FILE = Path(os.getenv("LTR_MODEL_PATH", Path(__file__).parent / "models/ltr_model.txt"))
+LTR_SCORER = os.getenv("LTR_SCORER", "linear")
 
 # Pesos padrão (fallback) - agora incluem feature C
 DEFAULT_WEIGHTS = {
@@ -120,6 +162,10 @@ PRESET_WEIGHTS = {
 
 # Variável global para armazenar os pesos carregados
 _current_weights = {}
+# (v2.8) Registro de pesos: varredura por mtime + propagação via Redis pub/sub
+WEIGHTS_CHANNEL = "ltr_weights:update"
+WEIGHTS_POLL_INTERVAL = float(os.getenv("WEIGHTS_POLL_INTERVAL", "10"))
+WEIGHTS_LISTEN_BACKOFF_MAX = float(os.getenv("WEIGHTS_LISTEN_BACKOFF_MAX", "60"))
 
 # URL Redis reutilizada do ambiente (mesma usada no Celery)
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -146,54 +192,410 @@ _NEGATIVE_PATTERNS = list(set([
 POS_RE = [re.compile(p, re.I) for p in _POSITIVE_PATTERNS]
 NEG_RE = [re.compile(p, re.I) for p in _NEGATIVE_PATTERNS]
 
+# (v2.8) Uma única alternação compilada no lugar dos ~48 regex individuais.
+# "nao recomendo" também contém \brecomendo\b: no esquema por padrão contava
+# como negativo E positivo, então o grupo `mixed` incrementa os dois.
+_MIXED_PATTERN = r'\bnao\s+recomendo\b'
+_words = lambda patterns: "|".join(p[2:-2] for p in sorted(patterns, key=len, reverse=True))
+KEYWORD_RE = re.compile(
+    r'\b(?:(?P<mixed>' + _MIXED_PATTERN[2:-2] + r')'
+    r'|(?P<neg>' + _words([p for p in _NEGATIVE_PATTERNS if p != _MIXED_PATTERN]) + r')'
+    r'|(?P<pos>' + _words(_POSITIVE_PATTERNS) + r'))\b',
+    re.I,
+)
+del _words
+
+# Ordem canônica das features (colunas do motor em lote)
+FEATURE_KEYS: Tuple[str, ...] = ("A", "S", "T", "G", "Q", "U", "R", "C")
+
+
 def _count_kw(patterns, text):
     return sum(len(p.findall(text)) for p in patterns)
 
-def load_weights() -> Dict[str, float]:
-    """Carrega os pesos do LTR do arquivo JSON, com fallback para os padrões."""
-    global _current_weights
-    try:
-        if WEIGHTS_FILE.exists():
-            with open(WEIGHTS_FILE, 'r') as f:
+
+def _count_keywords(text: str) -> Tuple[int, int]:
+    """(positivos, negativos) em uma única varredura com KEYWORD_RE."""
+    pos = neg = 0
+    for m in KEYWORD_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "pos":
+            pos += 1
+        elif kind == "neg":
+            neg += 1
+        else:
+            pos += 1
+            neg += 1
+    return pos, neg
+
+
+def _normalize_text(text: str) -> str:
+    """Remove acentos e normaliza texto para matching robusto."""
+    import unicodedata
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+
+
+def _is_valid_review(text: str) -> bool:
+    """Valida se review é adequado para análise (≥10 chars, mobile-friendly)."""
+    if not text or len(text.strip()) < 10:
+        return False
+
+    tokens = text.split()
+    if len(tokens) < 2:
+        return False
+
+    # Variedade de tokens: ≥3 tokens OU tokens únicos para reviews curtos
+    if len(tokens) >= 3:
+        return True
+
+    # Para reviews curtos (2 tokens), aceitar se tokens são únicos
+    if len(tokens) == 2 and len(set(tokens)) < 2:
+        return False
+
+    # Para reviews curtos (2 tokens), aceitar se tokens são únicos
+    unique_ratio = len(set(tokens)) / len(tokens)
+    return unique_ratio >= 0.5  # 50% para reviews muito curtos
+
+
+def _replace_emojis(txt: str) -> str:
+    txt = (txt.replace('👍', ' positivo ')
+              .replace('👎', ' negativo ')
+              .replace(':+1:', ' positivo ')
+              .replace(':-1:', ' negativo '))
+    # Substituir somente -1 isolado
+    return re.sub(r'\b-1\b', ' negativo ', txt)
+
+
+@dataclass(slots=True)
+class ReviewDigest:
+    """Resumo pré-computado dos reviews de um advogado (features R e C).
+
+    Calculado uma vez quando os reviews mudam e guardado com o hash do
+    conteúdo, para que o texto nunca seja varrido no caminho da requisição.
+    """
+    n_reviews: int = 0
+    valid_count: int = 0        # reviews válidos no texto original (feature R)
+    soft_valid_count: int = 0   # reviews válidos após troca de emojis (feature C)
+    pos_hits: int = 0
+    neg_hits: int = 0
+    soft_skill: float = 0.5
+    content_hash: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["ReviewDigest"]:
+        if not data:
+            return None
+        return cls(**{k: data[k] for k in cls.__slots__ if k in data})
+
+
+def review_content_hash(reviews: List[str]) -> str:
+    import hashlib
+    return hashlib.sha1("\x1f".join(reviews).encode("utf-8")).hexdigest()
+
+
+def compute_review_digest(reviews: List[str]) -> ReviewDigest:
+    """
+    Analisa sentimento dos reviews para extrair soft-skills.
+    Usa heurísticas simples quando bibliotecas NLP não estão disponíveis.
+    Melhorias v2.6.3: normalização de acentos, reviews mobile-friendly e emojis 👍/👎.
+    """
+    reviews = [r for r in reviews if r is not None]
+    valid_count = sum(1 for r in reviews if _is_valid_review(r))
+    total_score = 0.0
+    n_valid = pos_total = neg_total = 0
+    for review in reviews:
+        review = _replace_emojis(review)
+        if not _is_valid_review(review):
+            continue
+
+        pos_count, neg_count = _count_keywords(_normalize_text(review))
+        pos_total += pos_count
+        neg_total += neg_count
+
+        if pos_count + neg_count > 0:
+            score = pos_count / (pos_count + neg_count)
+        else:
+            score = 0.5
+
+        total_score += score
+        n_valid += 1
+
+    soft = 0.5
+    if n_valid:
+        avg = total_score / n_valid
+        boost = 0.1 if avg > 0.7 and n_valid >= 3 else 0
+        soft = float(np.clip(avg + boost, 0, 1))
+
+    return ReviewDigest(
+        n_reviews=len(reviews), valid_count=valid_count, soft_valid_count=n_valid,
+        pos_hits=pos_total, neg_hits=neg_total, soft_skill=soft,
+        content_hash=review_content_hash(reviews),
+    )
+
+
+@lru_cache(maxsize=4096)
+def _digest_memo(reviews: Tuple[str, ...]) -> ReviewDigest:
+    return compute_review_digest(list(reviews))
+
+
+@lru_cache(maxsize=4096)
+def _content_hash_memo(reviews: Tuple[str, ...]) -> str:
+    return review_content_hash(list(reviews))
+
+
+_EMPTY_DIGEST = ReviewDigest()
+
+
+def review_digest_for(lawyer: "Lawyer") -> ReviewDigest:
+    """Digest persistido do advogado se ele cobre ``review_texts``; senão, o memo por conteúdo."""
+    reviews = tuple(r for r in lawyer.review_texts or [] if r is not None)
+    digest = lawyer.review_digest
+    if digest is not None and digest.content_hash == _content_hash_memo(reviews):
+        return digest
+    if reviews:
+        return _digest_memo(reviews)
+    return _EMPTY_DIGEST
+
+
+def _soft_skills_from_reviews(reviews: List[str]) -> float:
+    """Score de soft-skills a partir dos reviews (ver compute_review_digest)."""
+    return compute_review_digest(reviews).soft_skill
+
+
+def weights_fingerprint(weights: Dict[str, float]) -> str:
+    """Versão estável de um conjunto de pesos (muda quando qualquer peso muda)."""
+    import hashlib
+    canonical = ",".join(f"{k}={float(weights[k]):.6f}" for k in sorted(weights))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class WeightsRegistry:
+    """Registro em memória dos pesos LTR de produção e experimentais.
+
+    Os arquivos `ltr_weights.json` e `ltr_weights_<versão>.json` são relidos
+    apenas quando o mtime muda (varredura em background) e o conteúdo novo é
+    publicado no Redis, para que todos os workers (uvicorn/Celery) o apliquem
+    sem I/O. `rank()` só lê memória.
+    """
+
+    def __init__(self, production_file: Path):
+        self.production_file = production_file
+        self.origin = f"{os.getpid()}-{id(self)}"
+        self._versions: Dict[str, Dict[str, float]] = {}
+        self._mtimes: Dict[str, Optional[float]] = {}
+        # Reentrante: scan()/reload_production() seguram o lock até o apply()
+        self._lock = threading.RLock()
+
+    # ---------------- leitura de arquivos ----------------
+
+    def _version_files(self) -> Dict[str, Path]:
+        files = {"production": self.production_file}
+        for path in self.production_file.parent.glob("ltr_weights_*.json"):
+            files[path.stem[len("ltr_weights_"):]] = path
+        return files
+
+    @staticmethod
+    def _read(version: str, path: Path) -> Optional[Dict[str, float]]:
+        """Lê e valida um arquivo de pesos; None se ausente/inválido."""
+        try:
+            if not path.exists():
+                raise FileNotFoundError("Arquivo de pesos não encontrado.")
+            with open(path, 'r') as f:
                 loaded = json.load(f)
-                # Converte valores string para float (robustez)
-                # Filtra apenas chaves conhecidas para evitar pesos "fantasma"
-                loaded = {k: float(v) for k, v in loaded.items() if k in DEFAULT_WEIGHTS}
-                # Validação simples para garantir que os pesos não estão todos zerados
-                if any(v > 0 for v in loaded.values()):
-                    logging.info(f"Pesos do LTR carregados de '{WEIGHTS_FILE}'")
-                    _current_weights = loaded
+            # Converte valores string para float (robustez)
+            # Filtra apenas chaves conhecidas para evitar pesos "fantasma"
+            loaded = {k: float(v) for k, v in loaded.items() if k in DEFAULT_WEIGHTS}
+            # Validação simples para garantir que os pesos não estão todos zerados
+            if not any(v > 0 for v in loaded.values()):
+                raise ValueError("pesos todos zero")
+            logging.info(f"Pesos do LTR '{version}' carregados de '{path}'")
+            return loaded
+        except (OSError, ValueError, json.JSONDecodeError) as e:
+            logging.warning(f"Não foi possível carregar pesos do LTR '{version}' ({e}).")
+            return None
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[float]:
+        try:
+            return path.stat().st_mtime
+        except OSError:
+            return None
+
+    def scan(self, force: bool = False) -> Dict[str, Optional[Dict[str, float]]]:
+        """Relê só os arquivos novos/alterados/removidos; retorna as mudanças aplicadas.
+
+        O watch() e o /reload (via to_thread) podem rodar juntos: a comparação
+        de mtimes e a atualização ficam sob o mesmo lock.
+        """
+        with self._lock:
+            files = self._version_files()
+            changed: Dict[str, Optional[Dict[str, float]]] = {}
+            for version, path in files.items():
+                mtime = self._mtime(path)
+                if not force and version in self._mtimes and self._mtimes[version] == mtime:
+                    continue
+                self._mtimes[version] = mtime
+                changed[version] = self._read(version, path) if mtime is not None else None
+            for version in set(self._mtimes) - set(files):
+                del self._mtimes[version]
+                changed[version] = None
+            self.apply(changed)
+            return changed
+
+    def reload_production(self) -> Dict[str, float]:
+        """Releitura forçada do arquivo de produção (fallback: DEFAULT_WEIGHTS)."""
+        with self._lock:
+            self._mtimes["production"] = self._mtime(self.production_file)
+            weights = self._read("production", self.production_file)
+            self.apply({"production": weights})
+            return self.production()
+
+    # ---------------- memória ----------------
+
+    def apply(self, changes: Dict[str, Optional[Dict[str, float]]]) -> None:
+        global _current_weights
+        with self._lock:
+            for version, weights in changes.items():
+                if weights:
+                    self._versions[version] = dict(weights)
                 else:
-                    raise ValueError(
-                        "Pesos do LTR no arquivo são todos zero, usando fallback.")
-        else:
-            raise FileNotFoundError("Arquivo de pesos não encontrado.")
-    except (FileNotFoundError, ValueError, json.JSONDecodeError) as e:
-        logging.warning(
-            f"Não foi possível carregar pesos do LTR ({e}). Usando pesos padrão.")
-        _current_weights = DEFAULT_WEIGHTS
-    return _current_weights
+                    self._versions.pop(version, None)
+            _current_weights = self.production()
+
+    def production(self) -> Dict[str, float]:
+        """Cópia dos pesos de produção (alterar o retorno não afeta o registro)."""
+        return dict(self._versions.get("production") or DEFAULT_WEIGHTS)
+
+    def experimental(self, version: str) -> Optional[Dict[str, float]]:
+        weights = self._versions.get(version)
+        return dict(weights) if weights else None
+
+    def versions(self) -> Dict[str, Dict[str, float]]:
+        return {k: dict(v) for k, v in self._versions.items()}
+
+    # ---------------- propagação entre workers ----------------
+
+    def publish(self, changes: Dict[str, Optional[Dict[str, float]]], redis_url: str = REDIS_URL) -> None:
+        if not changes:
+            return
+        try:
+            import redis
+
+            client = redis.Redis.from_url(redis_url, socket_timeout=1)
+            client.publish(WEIGHTS_CHANNEL, json.dumps({"origin": self.origin, "changes": changes}))
+            client.close()
+        except Exception as e:
+            logging.warning(f"Não foi possível publicar atualização de pesos: {e}")
+
+    def _on_message(self, data: Any) -> None:
+        try:
+            payload = json.loads(data)
+            if payload.get("origin") != self.origin:
+                self.apply(payload.get("changes") or {})
+        except (TypeError, ValueError, AttributeError) as e:
+            logging.warning(f"Mensagem de pesos inválida: {e}")
+
+    async def watch(self, interval: float = WEIGHTS_POLL_INTERVAL) -> None:
+        """Varredura periódica por mtime; publica o que mudou (roda em background)."""
+        while True:
+            try:
+                changed = await asyncio.to_thread(self.scan)
+                if changed:
+                    await asyncio.to_thread(self.publish, changed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Falha ao verificar arquivos de pesos: {e}")
+            await asyncio.sleep(interval)
+
+    async def listen(self, redis_url: str = REDIS_URL,
+                     backoff_max: float = WEIGHTS_LISTEN_BACKOFF_MAX) -> None:
+        """Aplica atualizações publicadas por outros workers (roda em background).
+
+        Falhas de Redis (na partida ou com a inscrição ativa) não encerram o
+        listener: ele reconecta com backoff exponencial até ``backoff_max``.
+        """
+        delay = 1.0
+        while True:
+            client = aioredis.from_url(redis_url, decode_responses=True)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(WEIGHTS_CHANNEL)
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._on_message(message["data"])
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logging.warning(f"Atualização de pesos via pub/sub indisponível (Redis): {e}; "
+                                f"nova tentativa em {delay:.0f}s")
+            finally:
+                try:
+                    await pubsub.unsubscribe(WEIGHTS_CHANNEL)
+                    await client.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, backoff_max)
+
+    def listen_blocking(self, redis_url: str = REDIS_URL,
+                        backoff_max: float = WEIGHTS_LISTEN_BACKOFF_MAX) -> None:
+        """Versão síncrona do listen(), com o mesmo backoff (thread de start_background_threads)."""
+        import redis
+
+        delay = 1.0
+        while True:
+            pubsub = None
+            try:
+                pubsub = redis.Redis.from_url(redis_url).pubsub()
+                pubsub.subscribe(WEIGHTS_CHANNEL)
+                delay = 1.0
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._on_message(message["data"])
+            except Exception as e:
+                logging.warning(f"Atualização de pesos via pub/sub indisponível (Redis): {e}; "
+                                f"nova tentativa em {delay:.0f}s")
+            finally:
+                try:
+                    if pubsub is not None:
+                        pubsub.close()
+                except Exception:
+                    pass
+            time.sleep(delay)
+            delay = min(delay * 2, backoff_max)
+
+    def start_background_threads(self, interval: float = WEIGHTS_POLL_INTERVAL,
+                                 redis_url: str = REDIS_URL,
+                                 backoff_max: float = WEIGHTS_LISTEN_BACKOFF_MAX) -> None:
+        """Equivalente síncrono de watch()/listen() para processos sem event loop (Celery)."""
+        def _watch():
+            while True:
+                try:
+                    self.publish(self.scan(), redis_url)
+                except Exception as e:
+                    logging.warning(f"Falha ao verificar arquivos de pesos: {e}")
+                time.sleep(interval)
+
+        threading.Thread(target=_watch, name="weights-watch", daemon=True).start()
+        threading.Thread(target=self.listen_blocking, args=(redis_url, backoff_max),
+                         name="weights-listen", daemon=True).start()
+
+
+weights_registry = WeightsRegistry(WEIGHTS_FILE)
+
+
+def load_weights() -> Dict[str, float]:
+    """Carrega os pesos do LTR do arquivo JSON, com fallback para os padrões."""
+    return weights_registry.reload_production()
 
 
 def load_experimental_weights(version: str) -> Optional[Dict[str, float]]:
-    """Carrega um arquivo de pesos experimental, se existir."""
-    try:
-        exp_path = WEIGHTS_FILE.parent / f"ltr_weights_{version}.json"
-        if exp_path.exists():
-            with open(exp_path, 'r') as f:
-                loaded = json.load(f)
-                # Converte valores string para float (robustez)
-                # Filtra apenas chaves conhecidas para evitar pesos "fantasma"
-                loaded = {k: float(v) for k, v in loaded.items() if k in DEFAULT_WEIGHTS}
-                if any(v > 0 for v in loaded.values()):
-                    logging.info(
-                        f"Pesos EXPERIMENTAIS '{version}' carregados de '{exp_path}'")
-                    return loaded
-        return None
-    except (IOError, json.JSONDecodeError, ValueError) as e:
-        logging.warning(
-            f"Não foi possível carregar pesos experimentais '{version}': {e}")
-        return None
+    """Pesos experimentais da versão, do registro em memória (sem I/O)."""
+    return weights_registry.experimental(version)
 
 
 def load_preset(preset: str) -> Dict[str, float]:
@@ -201,8 +603,91 @@ def load_preset(preset: str) -> Dict[str, float]:
     return PRESET_WEIGHTS.get(preset, DEFAULT_WEIGHTS)
 
 
-# Carregamento inicial na inicialização do módulo
-load_weights()
+class TreeScorer:
+    """Avalia o booster LTR sobre a matriz de features inteira (um único predict).
+
+    As colunas de entrada seguem `feature_name()` do booster: f_A..f_C vêm da
+    matriz e as derivadas (f_quality, f_availability, f_match) são calculadas
+    como em ltr_feature_store. A saída bruta do lambdarank passa por uma
+    sigmoide para ficar em (0, 1), escala esperada pelo ε-cluster/equidade.
+    """
+
+    # Ordem das colunas em ltr_train.FEATURE_COLUMNS
+    COLUMNS = [f"f_{k}" for k in FEATURE_KEYS] + ["f_quality", "f_availability", "f_match"]
+
+    def __init__(self, booster: Any):
+        self.booster = booster
+        self.feature_names: List[str] = self._resolve(list(booster.feature_name()))
+
+    @classmethod
+    def _resolve(cls, names: List[str]) -> List[str]:
+        """Nomes das colunas do booster; ``Column_i`` (treino sem nomes) vale pela posição."""
+        resolved = []
+        for name in names:
+            if name.startswith("Column_") and name[7:].isdigit() and int(name[7:]) < len(cls.COLUMNS):
+                name = cls.COLUMNS[int(name[7:])]
+            if name not in cls.COLUMNS:
+                raise ValueError(f"feature desconhecida no modelo LTR: {name}")
+            resolved.append(name)
+        return resolved
+
+    def inputs(self, fm: np.ndarray) -> np.ndarray:
+        col = {f"f_{k}": fm[:, i] for i, k in enumerate(FEATURE_KEYS)}
+        col["f_quality"] = col["f_Q"] * 0.4 + col["f_T"] * 0.3 + col["f_R"] * 0.2 + col["f_C"] * 0.1
+        col["f_availability"] = (col["f_G"] + col["f_U"]) / 2
+        col["f_match"] = (col["f_A"] + col["f_S"]) / 2
+        return np.column_stack([col[name] for name in self.feature_names])
+
+    def score(self, feature_matrix: np.ndarray) -> np.ndarray:
+        X = self.inputs(feature_matrix)
+        raw = np.asarray(self.booster.predict(X), dtype=np.float64)
+        return 1.0 / (1.0 + np.exp(-raw))
+
+
+_tree_scorers: Dict[str, Tuple[float, Optional[TreeScorer]]] = {}
+_tree_scorers_lock = threading.Lock()
+
+
+def load_tree_scorer(model_version: Optional[str] = None) -> Optional[TreeScorer]:
+    """
+    Scorer de árvores para o `model_version`, ou None para usar pesos lineares.
+
+    Versões experimentais usam `ltr_model_<versão>.txt` se existir (teste A/B
+    linear × árvores); produção usa MODEL_FILE quando LTR_SCORER=tree. O booster
+    é carregado uma vez por processo e recarregado se o arquivo mudar.
+    """
+    if model_version and model_version != 'production':
+        path = MODEL_FILE.parent / f"ltr_model_{model_version}.txt"
+    elif LTR_SCORER == "tree":
+        path = MODEL_FILE
+    else:
+        return None
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+
+    key = str(path)
+    cached = _tree_scorers.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _tree_scorers_lock:
+        cached = _tree_scorers.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            import lightgbm as lgb  # type: ignore
+            scorer: Optional[TreeScorer] = TreeScorer(lgb.Booster(model_file=str(path)))
+            logging.info(f"Modelo LTR de árvores carregado de '{path}'")
+        except Exception as e:  # lightgbm ausente ou arquivo inválido → pesos lineares
+            logging.warning(f"Não foi possível carregar o modelo LTR '{path}': {e}")
+            scorer = None
+        _tree_scorers[key] = (mtime, scorer)
+        return scorer
+
+
+# Carregamento inicial na inicialização do módulo (produção + experimentais)
+weights_registry.scan(force=True)
 
 # --- Outras Configs ---
 EMBEDDING_DIM = 384              # Dimensão dos vetores pgvector
@@ -221,19 +706,35 @@ OVERLOAD_FLOOR = float(os.getenv("OVERLOAD_FLOOR", "0.01"))  # Reduzido de 0.05
 # =============================================================================
 
 
+_LOG_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:  # noqa: D401
+        context = record.args
+        if not context:
+            # Eventos logados com extra={...} (ex.: feedback em contract_service)
+            context = {k: v for k, v in vars(record).items() if k not in _LOG_RECORD_ATTRS}
+        if isinstance(context, dict):
+            # v2.8: serialização segura feita aqui, na thread do AuditSink
+            context = safe_json_dump(context)
         return json.dumps({
             "timestamp": self.formatTime(record, self.datefmt),
             "level": record.levelname,
             "message": record.getMessage(),
-            "context": record.args,
-        })
+            "context": context,
+        }, default=str)
 
 
-_handler = logging.StreamHandler()
-_handler.setFormatter(JsonFormatter())
 AUDIT_LOGGER = logging.getLogger("audit.match")
+AUDIT_SINK: Optional[AuditSink] = None
+if os.getenv("AUDIT_SINK", "file") == "stream":
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(JsonFormatter())
+else:
+    # (v2.8) Fila + thread escritora: rank() só enfileira o LogRecord
+    AUDIT_SINK = AuditSink(formatter=JsonFormatter().format)
+    _handler = AuditSinkHandler(AUDIT_SINK)
 AUDIT_LOGGER.addHandler(_handler)
 AUDIT_LOGGER.setLevel(logging.INFO)
 
@@ -250,6 +751,23 @@ def haversine(coord_a: Tuple[float, float], coord_b: Tuple[float, float]) -> flo
     return 2 * 6371 * asin(sqrt(hav))
 
 
+def haversine_many(origin: Tuple[float, float], lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distância Haversine (km) de ``origin`` até cada par (lat, lon), vetorizada."""
+    lat1, lon1 = radians(origin[0]), radians(origin[1])
+    lat2, lon2 = np.radians(lat), np.radians(lon)
+    hav = np.sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(hav))
+
+
+def haversine_matrix(origins: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distâncias Haversine (km) de cada origem (m × 2) até cada par (lat, lon): matriz m × n."""
+    origins = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2))
+    lat1, lon1 = origins[:, 0:1], origins[:, 1:2]
+    lat2, lon2 = np.radians(lat)[None, :], np.radians(lon)[None, :]
+    hav = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(hav))
+
+
 def cosine_similarity(vec_a: np.ndarray, vec_b: np.ndarray) -> float:
     denom = float(np.linalg.norm(vec_a) * np.linalg.norm(vec_b)) or 1e-9
     return float(np.dot(vec_a, vec_b) / denom)
@@ -371,6 +889,8 @@ class Lawyer:
     # v2.7 – autoridade doutrinária e reputação
     pareceres: List[Parecer] = field(default_factory=list)
     reconhecimentos: List[Reconhecimento] = field(default_factory=list)
+    # v2.8 – digest pré-computado dos reviews (features R e C)
+    review_digest: Optional[ReviewDigest] = None
     
     def __post_init__(self):
         # Inicializar campos mutáveis com valores padrão
@@ -395,7 +915,7 @@ class Parecer:
     resumo: str
     area: str
     subarea: str
-    embedding: np.ndarray = field(default_factory=lambda: np.zeros(EMBEDDING_DIM))
+    embedding: np.ndarray = field(default_factory=lambda: np.zeros(EMBEDDING_DIM, dtype=np.float32))
 
 
 @dataclass(slots=True)
@@ -412,8 +932,45 @@ class Reconhecimento:
 # =============================================================================
 
 
+class _TTLCache:
+    """LRU em memória com expiração (camada local na frente do Redis)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        from collections import OrderedDict
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
 class RedisCache:
-    """Cache baseado em Redis assíncrono para features quase estáticas."""
+    """Cache baseado em Redis assíncrono para features quase estáticas.
+
+    (v2.8) Leituras e escritas em lote (MGET / pipeline) e LRU local com TTL
+    na frente do Redis, para que advogados "quentes" não saiam do worker.
+    """
+
+    # TTL de 6h - reduzido para permitir atualizações mais frequentes de CV/endereço
+    REDIS_TTL = 21600
 
     def __init__(self, redis_url: str):
         try:
@@ -423,25 +980,64 @@ class RedisCache:
             class _FakeRedis(dict):
                 async def get(self, k): 
                     return super().get(k)
+                async def mget(self, keys):
+                    return [super(_FakeRedis, self).get(k) for k in keys]
                 async def set(self, k, v, ex=None): 
                     self[k] = v
                 async def close(self): 
                     pass
             self._redis = _FakeRedis()
         self._prefix = 'match:cache'
+        self._local = _TTLCache(
+            maxsize=int(os.getenv("STATIC_FEATS_LOCAL_SIZE", "10000")),
+            ttl=float(os.getenv("STATIC_FEATS_LOCAL_TTL", "300")),
+        )
+
+    def _key(self, lawyer_id: str) -> str:
+        return f"{self._prefix}:{lawyer_id}"
 
     async def get_static_feats(self, lawyer_id: str) -> Optional[Dict[str, float]]:
-        raw = await self._redis.get(f"{self._prefix}:{lawyer_id}")
-        if raw:
-            import json
-            return json.loads(raw)
-        return None
+        return (await self.mget_static_feats([lawyer_id])).get(lawyer_id)
 
     async def set_static_feats(self, lawyer_id: str, features: Dict[str, float]):
-        import json
-
-        # TTL de 6h - reduzido para permitir atualizações mais frequentes de CV/endereço
-        await self._redis.set(f"{self._prefix}:{lawyer_id}", json.dumps(features), ex=21600)
+        await self.mset_static_feats({lawyer_id: features})
+
+    async def mget_static_feats(self, lawyer_ids: List[str]) -> Dict[str, Optional[Dict[str, float]]]:
+        """Features estáticas de vários advogados: LRU local + um único MGET."""
+        result: Dict[str, Optional[Dict[str, float]]] = {}
+        missing: List[str] = []
+        for lid in lawyer_ids:
+            local = self._local.get(lid)
+            if local is not None:
+                result[lid] = local
+            else:
+                missing.append(lid)
+
+        if missing:
+            raw_values = await self._redis.mget([self._key(lid) for lid in missing])
+            for lid, raw in zip(missing, raw_values):
+                if raw:
+                    feats = json.loads(raw)
+                    self._local.set(lid, feats)
+                    result[lid] = feats
+                else:
+                    result[lid] = None
+        return result
+
+    async def mset_static_feats(self, features_by_id: Dict[str, Dict[str, float]]) -> None:
+        """Grava features de vários advogados em um round trip (pipeline SET EX)."""
+        if not features_by_id:
+            return
+        for lid, feats in features_by_id.items():
+            self._local.set(lid, feats)
+        if hasattr(self._redis, "pipeline"):
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for lid, feats in features_by_id.items():
+                    pipe.set(self._key(lid), json.dumps(feats), ex=self.REDIS_TTL)
+                await pipe.execute()
+        else:
+            for lid, feats in features_by_id.items():
+                await self._redis.set(self._key(lid), json.dumps(feats), ex=self.REDIS_TTL)
 
     async def close(self) -> None:
         """Fecha a conexão com o Redis."""
@@ -577,8 +1173,8 @@ class FeatureCalculator:
 
     def review_score(self) -> float:
         """Score de reviews com filtro anti-spam (alinhado com soft_skill validation)."""
-        good = [t for t in self.lawyer.review_texts if self._is_valid_review(t)]
-        trust = min(1.0, len(good) / 5)  # confiança cresce até 5 reviews boas
+        digest = review_digest_for(self.lawyer)
+        trust = min(1.0, digest.valid_count / 5)  # confiança cresce até 5 reviews boas
         return np.clip((self.lawyer.kpi.avaliacao_media / 5) * trust, 0, 1)
 
     def soft_skill(self) -> float:
@@ -587,75 +1183,24 @@ class FeatureCalculator:
         if self.lawyer.kpi_softskill > 0:
             return np.clip(self.lawyer.kpi_softskill, 0, 1)
         
-        # Senão, tenta calcular a partir dos reviews
-        if self.lawyer.review_texts:
-            return self._calculate_soft_skills_from_reviews(self.lawyer.review_texts)
+        # Senão, usa o digest dos reviews (calculado fora do caminho da requisição)
+        digest = review_digest_for(self.lawyer)
+        if digest.n_reviews:
+            return digest.soft_skill
         
         return 0.5  # Neutro quando não há dados
     
     def _normalize_text(self, text: str) -> str:
         """Remove acentos e normaliza texto para matching robusto."""
-        import unicodedata
-        return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+        return _normalize_text(text)
 
     def _is_valid_review(self, text: str) -> bool:
         """Valida se review é adequado para análise (≥10 chars, mobile-friendly)."""
-        if not text or len(text.strip()) < 10:
-            return False
-        
-        tokens = text.split()
-        if len(tokens) < 2:
-            return False
-            
-        # Variedade de tokens: ≥3 tokens OU tokens únicos para reviews curtos
-        if len(tokens) >= 3:
-            return True
-        
-        # Para reviews curtos (2 tokens), aceitar se tokens são únicos
-        if len(tokens) == 2 and len(set(tokens)) < 2:
-            return False
-        
-        # Para reviews curtos (2 tokens), aceitar se tokens são únicos
-        unique_ratio = len(set(tokens)) / len(tokens)
-        return unique_ratio >= 0.5  # 50% para reviews muito curtos
+        return _is_valid_review(text)
 
     def _calculate_soft_skills_from_reviews(self, reviews: List[str]) -> float:
-        """
-        Analisa sentimento dos reviews para extrair soft-skills.
-        Usa heurísticas simples quando bibliotecas NLP não estão disponíveis.
-        Melhorias v2.6.3: normalização de acentos, reviews mobile-friendly e emojis 👍/👎.
-        """
-        def _replace_emojis(txt: str) -> str:
-            txt = (txt.replace('👍', ' positivo ')
-                      .replace('👎', ' negativo ')
-                      .replace(':+1:', ' positivo ')
-                      .replace(':-1:', ' negativo '))
-            # Substituir somente -1 isolado
-            return re.sub(r'\b-1\b', ' negativo ', txt)
-        
-        total_score = n_valid = 0
-        for review in reviews:
-            review = _replace_emojis(review)
-            if not self._is_valid_review(review):
-                continue
-            
-            norm_review = self._normalize_text(review)
-            pos_count = _count_kw(POS_RE, norm_review)
-            neg_count = _count_kw(NEG_RE, norm_review)
-            
-            if pos_count + neg_count > 0:
-                score = pos_count / (pos_count + neg_count)
-            else:
-                score = 0.5
-            
-            total_score += score
-            n_valid += 1
-        
-        if n_valid:
-            avg = total_score / n_valid
-            boost = 0.1 if avg > 0.7 and n_valid >= 3 else 0
-            return np.clip(avg + boost, 0, 1)
-        return 0.5
+        """Analisa sentimento dos reviews para extrair soft-skills."""
+        return _soft_skills_from_reviews(reviews)
 
     # --------‑‑‑‑‑ Aggregate ‑‑‑‑‑---------
 
@@ -671,6 +1216,262 @@ class FeatureCalculator:
             "C": self.soft_skill(),  # Nova feature v2.2
         }
 
+
+class BatchFeatureCalculator:
+    """Calcula as oito features para todos os candidatos de uma vez (colunar).
+
+    Empacota os advogados em arrays NumPy (matriz de embeddings empilhada,
+    lat/lon e vetores de KPI) e computa cada feature com poucas operações
+    matriciais. Produz os mesmos valores que ``FeatureCalculator.all()``
+    aplicado advogado a advogado.
+    """
+
+    _STATUS_MULT = {"V": 1.0, "P": 0.4, "N": 0.0}
+    _PESOS_REC = {
+        "análise advocacia 500": 1.0,
+        "chambers and partners": 1.0,
+        "the legal 500": 0.9,
+        "leaders league": 0.9,
+    }
+
+    def __init__(self, case: Case, lawyers: List[Lawyer], vector_store: Any = None) -> None:
+        self.case = case
+        self.lawyers = lawyers
+        # (v2.8) Store de vetores pré-normalizados; quando ausente, empilha na hora
+        self.vector_store = vector_store
+        n = len(lawyers)
+        self.n = n
+
+        kpis = [lw.kpi for lw in lawyers]
+        self.lat = np.fromiter((lw.geo_latlon[0] for lw in lawyers), dtype=np.float64, count=n)
+        self.lon = np.fromiter((lw.geo_latlon[1] for lw in lawyers), dtype=np.float64, count=n)
+        self.success_rate_kpi = np.fromiter((k.success_rate for k in kpis), dtype=np.float64, count=n)
+        self.cases_30d = np.fromiter((k.cases_30d or 1 for k in kpis), dtype=np.float64, count=n)
+        self.avaliacao = np.fromiter((k.avaliacao_media for k in kpis), dtype=np.float64, count=n)
+        self.tempo_resposta = np.fromiter((k.tempo_resposta_h for k in kpis), dtype=np.float64, count=n)
+        self.cv_score = np.fromiter((k.cv_score for k in kpis), dtype=np.float64, count=n)
+        self.status_mult = np.fromiter(
+            (self._STATUS_MULT.get(k.success_status, 0.0) for k in kpis), dtype=np.float64, count=n)
+
+    # --------‑‑‑‑‑ Features vetorizadas ‑‑‑‑‑---------
+
+    def area_match(self) -> np.ndarray:
+        area = self.case.area
+        return np.fromiter(
+            (1.0 if area in lw.tags_expertise else 0.0 for lw in self.lawyers),
+            dtype=np.float64, count=self.n)
+
+    def case_similarity(self) -> np.ndarray:
+        """Similaridade com histórico (média ponderada) e pareceres (máximo) em lote."""
+        return self.case_similarity_many(np.asarray(self.case.summary_embedding)[None, :])[0]
+
+    def case_similarity_many(self, queries: np.ndarray) -> np.ndarray:
+        """Feature S (casos × candidatos) para uma matriz de embeddings de casos."""
+        if self.vector_store is not None:
+            sims = self.vector_store.case_similarity_many(queries, [lw.id for lw in self.lawyers])
+            if sims is not None:
+                return sims
+
+        q = np.asarray(queries, dtype=np.float64)
+        q_norm = np.linalg.norm(q, axis=1)
+        m, dim = q.shape
+
+        def comparable(vectors) -> List[np.ndarray]:
+            # Vetores de outro espaço (ex.: histórico MiniLM x caso OpenAI sem
+            # projeção) não são comparáveis: ficam de fora em vez de quebrar o vstack
+            return [v for v in vectors if np.size(v) == dim]
+
+        # ── Casos práticos: uma matriz empilhada para todos os candidatos ──
+        hist_vecs: List[np.ndarray] = []
+        hist_owner: List[int] = []
+        hist_start: List[int] = []
+        hist_w: List[float] = []
+        for i, lw in enumerate(self.lawyers):
+            embs = lw.casos_historicos_embeddings
+            if not embs:
+                continue
+            outcomes = lw.case_outcomes
+            weighted = bool(outcomes) and len(outcomes) == len(embs)
+            if weighted:
+                pairs = [(e, 1.0 if o else 0.8) for e, o in zip(embs, outcomes) if np.size(e) == dim]
+            else:
+                pairs = [(e, 1.0) for e in comparable(embs)]
+            if not pairs:
+                continue
+            hist_owner.append(i)
+            hist_start.append(len(hist_vecs))
+            hist_vecs.extend(e for e, _ in pairs)
+            hist_w.extend(w for _, w in pairs)
+
+        sim_hist = np.zeros((m, self.n), dtype=np.float64)
+        if hist_vecs:
+            # Vetores de cada advogado são contíguos: soma ponderada por segmento
+            w = np.asarray(hist_w, dtype=np.float64)
+            sims = self._cosine_rows(np.vstack(hist_vecs).astype(np.float64, copy=False), q, q_norm)
+            num = np.add.reduceat(sims * w, hist_start, axis=1)
+            den = np.add.reduceat(w, hist_start)
+            sim_hist[:, hist_owner] = num / den
+
+        # ── Pareceres: máximo por advogado ─────────────────────────────
+        par_vecs: List[np.ndarray] = []
+        par_owner: List[int] = []
+        par_start: List[int] = []
+        for i, lw in enumerate(self.lawyers):
+            embs = comparable(p.embedding for p in lw.pareceres or [])
+            if not embs:
+                continue
+            par_owner.append(i)
+            par_start.append(len(par_vecs))
+            par_vecs.extend(embs)
+
+        sim_par = np.zeros((m, self.n), dtype=np.float64)
+        if par_vecs:
+            sims = self._cosine_rows(np.vstack(par_vecs).astype(np.float64, copy=False), q, q_norm)
+            sim_par[:, par_owner] = np.maximum.reduceat(sims, par_start, axis=1)
+
+        return np.where(sim_par == 0, sim_hist, 0.6 * sim_hist + 0.4 * sim_par)
+
+    @staticmethod
+    def _cosine_rows(matrix: np.ndarray, q: np.ndarray, q_norm: np.ndarray) -> np.ndarray:
+        """Cosseno (casos × linhas de ``matrix``) com a mesma regra de 1e-9 de cosine_similarity."""
+        denom = np.outer(q_norm, np.linalg.norm(matrix, axis=1))
+        denom[denom == 0] = 1e-9
+        return (q @ matrix.T) / denom
+
+    def success_rate(self) -> np.ndarray:
+        key = f"{self.case.area}/{self.case.subarea}"
+        granular = np.fromiter(
+            (np.nan if (g := lw.kpi_subarea.get(key)) is None else g for lw in self.lawyers),
+            dtype=np.float64, count=self.n)
+        rate = np.where(np.isnan(granular), self.success_rate_kpi, granular)
+        wins = np.trunc(rate * self.cases_30d)
+        base = (wins + 1) / (self.cases_30d + 2)  # prior Beta(1,1)
+        return np.clip(base * self.status_mult, 0, 1)
+
+    def geo_score(self) -> np.ndarray:
+        return np.clip(1 - haversine_many(self.case.coords, self.lat, self.lon) / self.case.radius_km, 0, 1)
+
+    def qualification_score(self) -> np.ndarray:
+        area = self.case.area.lower()
+        exp = np.zeros(self.n)
+        titles = np.zeros((self.n, 3))
+        pubs = np.zeros(self.n)
+        n_par = np.zeros(self.n)
+        rec = np.zeros(self.n)
+        levels = {"lato": 0, "mestrado": 1, "doutorado": 2}
+        for i, lw in enumerate(self.lawyers):
+            cv = lw.curriculo_json
+            exp[i] = cv.get("anos_experiencia", 0)
+            pubs[i] = cv.get("num_publicacoes", 0)
+            for t in cv.get("pos_graduacoes", []):
+                col = levels.get(str(t.get("nivel", "")).lower())
+                if col is not None and area in str(t.get("area", "")).lower():
+                    titles[i, col] += 1
+            n_par[i] = sum(1 for p in lw.pareceres if area in p.area.lower())
+            rec[i] = sum(self._PESOS_REC.get(r.publicacao.lower(), 0.4)
+                         for r in lw.reconhecimentos if area in r.area.lower())
+
+        score_exp = np.minimum(1.0, exp / 25)
+        capped = np.minimum(titles, 2) / 2
+        score_titles = 0.1 * capped[:, 0] + 0.2 * capped[:, 1] + 0.3 * capped[:, 2]
+        score_pub = np.minimum(1.0, np.log1p(pubs) / log1p(10))
+        score_par = np.minimum(1.0, np.log1p(n_par) / log1p(5))
+        score_rec = np.clip(rec / 3.0, 0, 1)
+        base_score = (0.30 * score_exp + 0.25 * score_titles + 0.15 * score_pub
+                      + 0.15 * score_par + 0.15 * score_rec)
+        return 0.8 * base_score + 0.2 * self.cv_score
+
+    def urgency_capacity(self) -> np.ndarray:
+        if self.case.urgency_h <= 0:
+            return np.zeros(self.n)
+        return np.clip(1 - self.tempo_resposta / self.case.urgency_h, 0, 1)
+
+    def review_score(self) -> np.ndarray:
+        good = np.fromiter(
+            (review_digest_for(lw).valid_count for lw in self.lawyers),
+            dtype=np.float64, count=self.n)
+        trust = np.minimum(1.0, good / 5)
+        return np.clip((self.avaliacao / 5) * trust, 0, 1)
+
+    def soft_skill(self) -> np.ndarray:
+        out = np.full(self.n, 0.5)
+        for i, lw in enumerate(self.lawyers):
+            if lw.kpi_softskill > 0:
+                out[i] = min(max(lw.kpi_softskill, 0.0), 1.0)
+            else:
+                digest = review_digest_for(lw)
+                if digest.n_reviews:
+                    out[i] = digest.soft_skill
+        return out
+
+    # --------‑‑‑‑‑ Aggregate ‑‑‑‑‑---------
+
+    def matrix(self) -> np.ndarray:
+        """Matriz (n_candidatos × 8) com colunas na ordem de ``FEATURE_KEYS``."""
+        if not self.n:
+            return np.zeros((0, len(FEATURE_KEYS)))
+        return np.column_stack([
+            self.area_match(),
+            self.case_similarity(),
+            self.success_rate(),
+            self.geo_score(),
+            self.qualification_score(),
+            self.urgency_capacity(),
+            self.review_score(),
+            self.soft_skill(),
+        ])
+
+    def all(self) -> List[Dict[str, float]]:
+        """Uma linha ``{feature: valor}`` por advogado, na ordem de entrada."""
+        return [dict(zip(FEATURE_KEYS, row)) for row in self.matrix().tolist()]
+
+    def tensor(self, cases: List[Case], distances: Optional[np.ndarray] = None) -> np.ndarray:
+        """Tensor (casos × candidatos × 8) de vários casos sobre o mesmo pool.
+
+        A e Q são calculados uma vez por área, T uma vez por área/subárea,
+        R e C uma única vez; S sai de um matmul (casos × candidatos) e G de
+        uma matriz de distâncias (``distances`` pode ser reaproveitada).
+        """
+        col = {k: j for j, k in enumerate(FEATURE_KEYS)}
+        out = np.zeros((len(cases), self.n, len(FEATURE_KEYS)))
+        if not cases or not self.n:
+            return out
+
+        original = self.case
+        by_area: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        by_subarea: Dict[Tuple[str, str], np.ndarray] = {}
+        try:
+            for k, case in enumerate(cases):
+                self.case = case
+                if case.area not in by_area:
+                    by_area[case.area] = (self.area_match(), self.qualification_score())
+                if (case.area, case.subarea) not in by_subarea:
+                    by_subarea[(case.area, case.subarea)] = self.success_rate()
+                out[k, :, col["A"]], out[k, :, col["Q"]] = by_area[case.area]
+                out[k, :, col["T"]] = by_subarea[(case.area, case.subarea)]
+        finally:
+            self.case = original
+
+        queries = [np.asarray(c.summary_embedding) for c in cases]
+        if len({q.shape for q in queries}) == 1:
+            out[:, :, col["S"]] = self.case_similarity_many(np.vstack(queries))
+        else:
+            for k, q in enumerate(queries):
+                out[k, :, col["S"]] = self.case_similarity_many(q[None, :])[0]
+
+        if distances is None:
+            distances = haversine_matrix([c.coords for c in cases], self.lat, self.lon)
+        radius = np.array([c.radius_km for c in cases], dtype=np.float64)
+        out[:, :, col["G"]] = np.clip(1 - distances / radius[:, None], 0, 1)
+
+        urgency = np.array([c.urgency_h for c in cases], dtype=np.float64)
+        capacity = np.clip(1 - self.tempo_resposta[None, :] / np.where(urgency > 0, urgency, 1)[:, None], 0, 1)
+        out[:, :, col["U"]] = np.where(urgency[:, None] > 0, capacity, 0.0)
+
+        out[:, :, col["R"]] = self.review_score()
+        out[:, :, col["C"]] = self.soft_skill()
+        return out
+
 # =============================================================================
 # 7. Core algorithm expandido
 # =============================================================================
@@ -748,29 +1549,9 @@ class MatchmakingAlgorithm:
         return boosts
 
     # ------------------------------------------------------------------
-    async def rank(self, case: Case, lawyers: List[Lawyer], *, top_n: int = 5,
-                   preset: str = "balanced", model_version: Optional[str] = None,
-                   exclude_ids: Optional[Set[str]] = None) -> List[Lawyer]:
-        """Classifica advogados para um caso.
-
-        Passos:
-        1. Carrega pesos (preset + dinâmica).
-        2. Calcula features (cache Redis para estáticas).
-        3. Gera breakdown `delta` por feature.
-        4. Aplica ε-cluster e equidade, incluindo boost de diversidade (v2.3).
-        5. (v2.6) Permite carregar pesos de um modelo experimental para testes A/B.
-        6. Retorna top_n ordenados por `fair` e `last_offered_at`.
-        """
-        if not lawyers:
-            return []
-
-        # --- Filtro de exclusão opcional -------------------------------
-        if exclude_ids:
-            lawyers = [lw for lw in lawyers if lw.id not in exclude_ids]
-            if not lawyers:
-                return []
-
-        # 1. Carregar pesos base
+    @staticmethod
+    def _base_weights(preset: str, model_version: Optional[str]) -> Dict[str, float]:
+        """Pesos de produção (ou da versão experimental) com o preset sobreposto."""
         # (v2.6) Lógica para teste A/B de pesos
         experimental_weights = None
         if model_version and model_version != 'production':
@@ -779,14 +1560,15 @@ class MatchmakingAlgorithm:
         if experimental_weights:
             base_weights = experimental_weights
         else:
-            base_weights = (_current_weights or DEFAULT_WEIGHTS).copy()
+            base_weights = weights_registry.production().copy()
 
         # Sobrepor apenas chaves declaradas no preset (permite ajustes rápidos)
         base_weights.update(load_preset(preset))
+        return base_weights
 
-        # 2. Aplicar pesos dinâmicos baseados na complexidade
-        weights = self.apply_dynamic_weights(case, base_weights)
-
+    @staticmethod
+    async def _filter_available(lawyers: List[Lawyer], context_id: str) -> Tuple[List[Lawyer], bool]:
+        """Advogados disponíveis (consulta em batch) e se o serviço operou em modo degradado."""
         # CORREÇÃO PONTO 2 e 7: Filtro de disponibilidade em batch (otimizado)
         lawyer_ids = [lw.id for lw in lawyers]
         # Consulta de disponibilidade com timeout resiliente
@@ -812,7 +1594,7 @@ class MatchmakingAlgorithm:
                 AUDIT_LOGGER.warning(
                     "Availability service low coverage - operating in degraded mode",
                     {
-                        "case_id": case.id, 
+                        "case_id": context_id, 
                         "lawyer_count": len(lawyers), 
                         "response_coverage": round(coverage, 2),
                         "availability_rate": round(availability_rate, 2),
@@ -823,7 +1605,7 @@ class MatchmakingAlgorithm:
         except asyncio.TimeoutError:
             AUDIT_LOGGER.warning(
                 "Availability service timeout - operating in degraded mode",
-                {"case_id": case.id, "lawyer_count": len(lawyers), "timeout": timeout_sec}
+                {"case_id": context_id, "lawyer_count": len(lawyers), "timeout": timeout_sec}
             )
             availability_map = {}
             degraded_mode = True
@@ -841,7 +1623,7 @@ class MatchmakingAlgorithm:
             if not HAS_PROMETHEUS:
                 AUDIT_LOGGER.info(
                     "Degraded mode metric logged",
-                    {"metric": "availability_degraded", "value": 1, "case_id": case.id}
+                    {"metric": "availability_degraded", "value": 1, "case_id": context_id}
                 )
         
         available_lawyers = []
@@ -851,113 +1633,308 @@ class MatchmakingAlgorithm:
             if availability_map.get(lw.id, default_availability):
                 available_lawyers.append(lw)
 
-        # 3. Calcular features com cache
-        for lw in available_lawyers:
-            # Tentar recuperar features estáticas do cache
-            static_feats = await cache.get_static_feats(lw.id)
-
-            if static_feats:
-                feats = static_feats.copy()
-                calculator = FeatureCalculator(case, lw)
-                feats["A"] = calculator.area_match()
-                feats["S"] = calculator.case_similarity()
-                feats["T"] = calculator.success_rate()
-                feats["U"] = calculator.urgency_capacity()  # recálculo para urgência
-                feats["C"] = calculator.soft_skill()        # recálculo de soft-skills
-                feats["R"] = calculator.review_score()
-            else:
-                # Se não há cache, calcular tudo e salvar features estáticas
-                calculator = FeatureCalculator(case, lw)
-                feats = calculator.all()
-                # Somente Q permanece verdadeiramente estático;
-                # G depende de radius_km → não cachear.
-                static_to_cache = {"Q": feats["Q"]}
-                await cache.set_static_feats(lw.id, static_to_cache)
-
-            # Atribuição unificada de features
-            lw.scores["features"] = feats
-
-            # 4. Calcular score LTR e Delta
-            features = lw.scores["features"]
-            # Garantir que todas as features existem para não dar KeyError
-            score_ltr = sum(features.get(k, 0) * weights.get(k, 0) for k in weights)
-            lw.scores["ltr"] = score_ltr
-            lw.scores["delta"] = {
-                k: features.get(k, 0) * weights.get(k, 0) for k in weights
-            }
+        return available_lawyers, degraded_mode
 
-            # Guardar preset/complexidade e modo degradado para logs
-            lw.scores.update({
-                "preset": preset, 
-                "complexity": case.complexity,
-                "degraded_mode": degraded_mode
-            })
+    @staticmethod
+    async def _static_q(lawyers: List[Lawyer],
+                        computed_by_area: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Coluna Q por área do caso, com os valores do cache de estáticas; grava os ausentes."""
+        # Somente Q permanece verdadeiramente estático; G depende de radius_km → não cachear.
+        # Q depende da área do caso (títulos, pareceres e reconhecimentos), então a
+        # chave é "Q:<área>". Um único round trip para ler (MGET) e outro para gravar.
+        static_map = await cache.mget_static_feats([lw.id for lw in lawyers])
+        out: Dict[str, np.ndarray] = {}
+        to_cache: Dict[str, Dict[str, float]] = {}
+        for area, computed in computed_by_area.items():
+            key = f"Q:{area}"
+            q = np.array(computed, dtype=np.float64)
+            for i, lw in enumerate(lawyers):
+                static_feats = static_map.get(lw.id) or {}
+                if key in static_feats:
+                    q[i] = static_feats[key]
+                else:
+                    # Preserva as entradas das outras áreas
+                    to_cache.setdefault(lw.id, dict(static_feats))[key] = float(q[i])
+            out[area] = q
+        await cache.mset_static_feats(to_cache)
+        return out
+
+    def _finalize(self, case: Case, available_lawyers: List[Lawyer], feature_matrix: np.ndarray,
+                  ltr_scores: np.ndarray, delta_matrix: np.ndarray, weights: Dict[str, float], *,
+                  top_n: int, preset: str, model_version: Optional[str], degraded_mode: bool,
+                  scorer_name: str) -> List[Lawyer]:
+        """ε-cluster, equidade, diversidade, cópias dos top_n e auditoria de um caso."""
+        with timed("fairness"):
+            # 5. Aplicar ε-cluster e equidade
+            # (v2.8) Scores da requisição ficam em arrays alinhados a available_lawyers:
+            # os objetos Lawyer podem vir do snapshot compartilhado e não são alterados.
+            max_score = float(ltr_scores.max())
+            eps = max(MIN_EPSILON, 0.10 * max_score)  # proporcional ao max_score
+            min_score = max_score - eps
+            elite_idx = np.flatnonzero(ltr_scores >= min_score)
+            elite = [available_lawyers[i] for i in elite_idx.tolist()]
+
+            # 6. Re-ranking com equidade e diversidade
+            # CORREÇÃO PONTO 4 (uso): Passar `max_concurrent_cases`
+            equity = np.array([self.equity_weight(lw.kpi, lw.max_concurrent_cases) for lw in elite])
+            fair = (1 - BETA_EQUITY) * ltr_scores[elite_idx] + BETA_EQUITY * equity
+
+            # (v2.5) Fairness Sequencial Multi-Eixo
+            # O re-ranking acontece em múltiplos passos para cada dimensão
+            order = sorted(range(len(elite)), key=lambda j: fair[j], reverse=True)
+            for dimension in ["gender", "ethnicity", "pcd", "orientation"]:
+                boosts = self._calculate_dimension_boost([elite[j] for j in order], dimension)
+                for j in order:
+                    fair[j] += boosts.get(elite[j].id, 0.0)
+                # Re-ordena após cada boost para o próximo cálculo de representação
+                order.sort(key=lambda j: fair[j], reverse=True)
+
+            # 7. Ordenar por score final e, como desempate, pelo mais "descansado"
+            order.sort(key=lambda j: (-fair[j], elite[j].last_offered_at))
+
+            # Cópias dos top_n com o dict de scores desta requisição
+            now = time.time()
+            weights_used = {k: float(v) for k, v in weights.items()}
+            weights_version = weights_fingerprint(weights_used)
+            weight_keys = [k for k in weights if k in FEATURE_KEYS]
+            cols = [FEATURE_KEYS.index(k) for k in weight_keys]
+            top_n_lawyers = []
+            for j in order[:top_n]:
+                i = int(elite_idx[j])
+                lw = available_lawyers[i]
+                request_scores = {
+                    "features": dict(zip(FEATURE_KEYS, feature_matrix[i].tolist())),
+                    "ltr": float(ltr_scores[i]),
+                    "delta": {k: float(delta_matrix[i, c]) for k, c in zip(weight_keys, cols)},
+                    # Guardar preset/complexidade e modo degradado para logs
+                    "preset": preset,
+                    "complexity": case.complexity,
+                    "degraded_mode": degraded_mode,
+                    "scorer": scorer_name,
+                    "equity_raw": float(equity[j]),
+                    "fair_base": float(fair[j]),
+                    # Pesos do breakdown (persistidos em case_matches para as explicações)
+                    "weights_used": weights_used,
+                    "weights_version": weights_version,
+                }
+                top_n_lawyers.append(replace(lw, scores={**(lw.scores or {}), **request_scores},
+                                             last_offered_at=now))
+
+        with timed("audit"):
+            # Log de auditoria
+            # v2.8: só cópias rasas aqui; safe_json_dump e a escrita rodam na
+            # thread do AuditSink (ver JsonFormatter)
+            weights_log = weights_used
+            timer = current_timer()
+            timings_log = timer.breakdown() if timer is not None else None
+            for lw in top_n_lawyers:  # só loga os top_n selecionados
+                log_scores = lw.scores.copy()
+                # Remover embeddings verbosos do log
+                feats_log = dict(log_scores.get("features", {}))
+                feats_log.pop("casos_historicos_embeddings", None)
+                feats_log.pop("summary_embedding", None)
+                log_scores["features"] = feats_log
+
+                log_context = {
+                    "case_id": case.id,
+                    "lawyer_id": lw.id,
+                    "scores": log_scores,
+                    "model_version": model_version or "production",
+                    "preset": preset,
+                    "weights_used": weights_log,
+                    "degraded_mode": degraded_mode,
+                    "timings_ms": timings_log,
+                }
+                AUDIT_LOGGER.info(
+                    f"Lawyer {lw.id} ranked for case {case.id}", log_context)
 
-        if not available_lawyers:
+        return top_n_lawyers
+
+    async def rank(self, case: Case, lawyers: List[Lawyer], *, top_n: int = 5,
+                   preset: str = "balanced", model_version: Optional[str] = None,
+                   exclude_ids: Optional[Set[str]] = None) -> List[Lawyer]:
+        """Classifica advogados para um caso.
+
+        Passos:
+        1. Carrega pesos (preset + dinâmica).
+        2. Calcula features (cache Redis para estáticas).
+        3. Gera breakdown `delta` por feature.
+        4. Aplica ε-cluster e equidade, incluindo boost de diversidade (v2.3).
+        5. (v2.6) Permite carregar pesos de um modelo experimental para testes A/B.
+        6. Retorna top_n ordenados por `fair` e `last_offered_at`.
+        """
+        # (v2.8) Etapas cronometradas: histograma por etapa + breakdown na auditoria
+        with stage_timer(preset, model_version, label=case.id):
+            return await self._rank(case, lawyers, top_n=top_n, preset=preset,
+                                    model_version=model_version, exclude_ids=exclude_ids)
+
+    async def _rank(self, case: Case, lawyers: List[Lawyer], *, top_n: int, preset: str,
+                    model_version: Optional[str], exclude_ids: Optional[Set[str]]) -> List[Lawyer]:
+        if not lawyers:
             return []
 
-        # 5. Aplicar ε-cluster e equidade
-        max_score = max(lw.scores["ltr"] for lw in available_lawyers)
-        eps = max(MIN_EPSILON, 0.10 * max_score)  # proporcional ao max_score
-        min_score = max_score - eps
-        elite = [lw for lw in available_lawyers if lw.scores["ltr"] >= min_score]
+        # --- Filtro de exclusão opcional -------------------------------
+        if exclude_ids:
+            lawyers = [lw for lw in lawyers if lw.id not in exclude_ids]
+            if not lawyers:
+                return []
 
-        # 6. Re-ranking com equidade e diversidade
-        for lw in elite:
-            # CORREÇÃO PONTO 4 (uso): Passar `max_concurrent_cases`
-            equity = self.equity_weight(lw.kpi, lw.max_concurrent_cases)
-            
-            # (v2.5) O boost de diversidade será aplicado sequencialmente
-            lw.scores["equity_raw"] = equity
-            lw.scores["fair_base"] = (1 - BETA_EQUITY) * \
-                lw.scores["ltr"] + BETA_EQUITY * equity
-
-        # (v2.5) Fairness Sequencial Multi-Eixo
-        # O re-ranking acontece em múltiplos passos para cada dimensão
-        current_ranking = sorted(elite, key=lambda l: l.scores["fair_base"], reverse=True)
-        for dimension in ["gender", "ethnicity", "pcd", "orientation"]:
-            boosts = self._calculate_dimension_boost(current_ranking, dimension)
-            for lw in current_ranking:
-                lw.scores["fair_base"] += boosts.get(lw.id, 0.0)
-            # Re-ordena após cada boost para o próximo cálculo de representação
-            current_ranking.sort(key=lambda l: l.scores["fair_base"], reverse=True)
-        
-        # O ranking final é o resultado do último passo
-        final_ranking = current_ranking
-
-        # Log de auditoria
-        for lw in final_ranking[:top_n]:  # só loga os top_n selecionados
-            # CORREÇÃO PONTO 6: Garantir que o log é serializável
-            log_scores = lw.scores.copy()
-            # Remover embeddings verbosos do log
-            feats_log = log_scores.get("features", {})
-            if "casos_historicos_embeddings" in feats_log:
-                del feats_log["casos_historicos_embeddings"]
-            if "summary_embedding" in feats_log:
-                del feats_log["summary_embedding"]
-            
-            log_context = {
-                "case_id": case.id,
-                "lawyer_id": lw.id,
-                "scores": safe_json_dump(log_scores),
-                "model_version": model_version or "production",
-                "preset": preset,
-                "weights_used": safe_json_dump({k: float(v) for k, v in weights.items()}),
-                "degraded_mode": degraded_mode,
-            }
-            AUDIT_LOGGER.info(
-                f"Lawyer {lw.id} ranked for case {case.id}", log_context)
+        with timed("weights"):
+            # 1. Carregar pesos base
+            base_weights = self._base_weights(preset, model_version)
 
-        # 7. Ordenar por score final e, como desempate, pelo mais "descansado"
-        final_ranking.sort(key=lambda l: (-l.scores["fair_base"], l.last_offered_at))
+            # 2. Aplicar pesos dinâmicos baseados na complexidade
+            weights = self.apply_dynamic_weights(case, base_weights)
 
-        # Atualizar timestamp para os advogados selecionados e retornar
-        now = time.time()
-        top_n_lawyers = final_ranking[:top_n]
-        for lw in top_n_lawyers:
-            lw.last_offered_at = now
+        with timed("availability"):
+            available_lawyers, degraded_mode = await self._filter_available(lawyers, case.id)
+        if not available_lawyers:
+            return []
 
-        return top_n_lawyers
+        # 3. Calcular features em lote (motor colunar) com cache de estáticas
+        with timed("features"):
+            if lawyer_vector_store is not None:
+                lawyer_vector_store.ensure(available_lawyers)
+            feature_matrix = BatchFeatureCalculator(
+                case, available_lawyers, vector_store=lawyer_vector_store).matrix()
+        q_col = FEATURE_KEYS.index("Q")
+        with timed("static_cache"):
+            feature_matrix[:, q_col] = (await self._static_q(
+                available_lawyers, {case.area: feature_matrix[:, q_col]}))[case.area]
+
+        # 4. Calcular score LTR e Delta para todos os candidatos de uma vez
+        with timed("scoring"):
+            weight_vec = np.array([weights.get(k, 0) for k in FEATURE_KEYS], dtype=np.float64)
+            delta_matrix = feature_matrix * weight_vec
+            # (v2.8) Scorer por model_version: booster LightGBM ou pesos lineares.
+            # O delta continua sendo o breakdown linear usado nas explicações.
+            tree_scorer = load_tree_scorer(model_version)
+            if tree_scorer is not None:
+                ltr_scores = tree_scorer.score(feature_matrix)
+            else:
+                ltr_scores = delta_matrix.sum(axis=1)
+            scorer_name = "tree" if tree_scorer is not None else "linear"
+
+        return self._finalize(
+            case, available_lawyers, feature_matrix, ltr_scores, delta_matrix, weights,
+            top_n=top_n, preset=preset, model_version=model_version,
+            degraded_mode=degraded_mode, scorer_name=scorer_name)
+
+    def explain(self, case: Case, lawyers: List[Lawyer], *, preset: str = "balanced",
+                model_version: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Features e breakdown por advogado, sem efeitos colaterais.
+
+        Mesmo cálculo do ``rank()`` até o score linear, mas sem disponibilidade,
+        cache Redis, equidade, auditoria nem ``last_offered_at``. Usado pelas
+        explicações de advogados que não estão em ``case_matches``. Devolve um
+        dict por advogado, na ordem de entrada.
+        """
+        if not lawyers:
+            return []
+        weights = self.apply_dynamic_weights(case, self._base_weights(preset, model_version))
+        if lawyer_vector_store is not None:
+            lawyer_vector_store.ensure(lawyers)
+        feature_matrix = BatchFeatureCalculator(case, lawyers, vector_store=lawyer_vector_store).matrix()
+        weight_vec = np.array([weights.get(k, 0) for k in FEATURE_KEYS], dtype=np.float64)
+        delta_matrix = feature_matrix * weight_vec
+        raw = delta_matrix.sum(axis=1)
+
+        weights_used = {k: float(v) for k, v in weights.items()}
+        weights_version = weights_fingerprint(weights_used)
+        weight_keys = [k for k in weights if k in FEATURE_KEYS]
+        cols = [FEATURE_KEYS.index(k) for k in weight_keys]
+        return [
+            {
+                "lawyer_id": lw.id,
+                "features": dict(zip(FEATURE_KEYS, feature_matrix[i].tolist())),
+                "delta": {k: float(delta_matrix[i, c]) for k, c in zip(weight_keys, cols)},
+                "ltr": float(raw[i]),
+                "preset": preset,
+                "complexity": case.complexity,
+                "weights_used": weights_used,
+                "weights_version": weights_version,
+            }
+            for i, lw in enumerate(lawyers)
+        ]
+
+    async def rank_many(self, cases: List[Case], lawyers: List[Lawyer], *, top_n: int = 5,
+                        preset: str = "balanced", model_version: Optional[str] = None,
+                        prefilter: bool = False) -> List[List[Lawyer]]:
+        """Classifica vários casos contra o mesmo pool de candidatos (um ranking por caso).
+
+        Pesos, disponibilidade e cache de estáticas são consultados uma vez
+        por lote; as features saem de um tensor casos × candidatos × 8 (S em
+        um matmul, G de uma única matriz Haversine) e o scorer roda uma vez
+        sobre todas as linhas. Com ``prefilter`` cada caso só considera
+        candidatos da sua área e a até ``case.radius_km`` (o pré-filtro do
+        match individual). O pós-processamento por caso é o mesmo do ``rank()``.
+        """
+        if not cases:
+            return []
+        if not lawyers:
+            return [[] for _ in cases]
+        batch_id = f"batch:{cases[0].id}+{len(cases) - 1}"
+        with stage_timer(preset, model_version, label=batch_id):
+            return await self._rank_many(cases, lawyers, batch_id, top_n=top_n, preset=preset,
+                                         model_version=model_version, prefilter=prefilter)
+
+    async def _rank_many(self, cases: List[Case], lawyers: List[Lawyer], batch_id: str, *,
+                         top_n: int, preset: str, model_version: Optional[str],
+                         prefilter: bool) -> List[List[Lawyer]]:
+        with timed("weights"):
+            base_weights = self._base_weights(preset, model_version)
+            case_weights = [self.apply_dynamic_weights(case, base_weights) for case in cases]
+        with timed("availability"):
+            available_lawyers, degraded_mode = await self._filter_available(lawyers, batch_id)
+        if not available_lawyers:
+            return [[] for _ in cases]
+
+        with timed("features"):
+            if lawyer_vector_store is not None:
+                lawyer_vector_store.ensure(available_lawyers)
+            calc = BatchFeatureCalculator(cases[0], available_lawyers, vector_store=lawyer_vector_store)
+            distances = haversine_matrix([c.coords for c in cases], calc.lat, calc.lon)
+            tensor = calc.tensor(cases, distances=distances)
+        # Q é estático por (advogado, área): uma coluna por área presente no lote
+        q_col = FEATURE_KEYS.index("Q")
+        with timed("static_cache"):
+            first_of_area = {}
+            for k, case in enumerate(cases):
+                first_of_area.setdefault(case.area, k)
+            q_by_area = await self._static_q(
+                available_lawyers, {area: tensor[k, :, q_col] for area, k in first_of_area.items()})
+            for k, case in enumerate(cases):
+                tensor[k, :, q_col] = q_by_area[case.area]
+
+        with timed("scoring"):
+            weight_matrix = np.array([[w.get(k, 0) for k in FEATURE_KEYS] for w in case_weights],
+                                     dtype=np.float64)
+            delta = tensor * weight_matrix[:, None, :]
+            tree_scorer = load_tree_scorer(model_version)
+            m, n = tensor.shape[:2]
+            if tree_scorer is not None:
+                ltr_scores = tree_scorer.score(tensor.reshape(m * n, -1)).reshape(m, n)
+            else:
+                ltr_scores = delta.sum(axis=2)
+            scorer_name = "tree" if tree_scorer is not None else "linear"
+
+        a_col = FEATURE_KEYS.index("A")
+        results: List[List[Lawyer]] = []
+        for k, case in enumerate(cases):
+            if prefilter:
+                idx = np.flatnonzero((tensor[k, :, a_col] > 0) & (distances[k] <= case.radius_km))
+                if not len(idx):
+                    results.append([])
+                    continue
+                pool = [available_lawyers[i] for i in idx.tolist()]
+            else:
+                idx = slice(None)
+                pool = available_lawyers
+            results.append(self._finalize(
+                case, pool, tensor[k, idx], ltr_scores[k, idx], delta[k, idx], case_weights[k],
+                top_n=top_n, preset=preset, model_version=model_version,
+                degraded_mode=degraded_mode, scorer_name=scorer_name))
+        return results
 
 # =============================================================================
 # 8. Exemplo de uso expandido
@@ -1073,6 +2050,12 @@ if __name__ == "__main__":
     asyncio.run(demo_v2())
 
 
+@atexit.register
+def _close_audit_sink():
+    if AUDIT_SINK is not None:
+        AUDIT_SINK.close()
+
+
 @atexit.register
 def _close_redis():
     try:
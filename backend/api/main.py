@@ -12,6 +12,7 @@ import logging
 import os
 import time
 import uuid
+from dataclasses import replace
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
@@ -40,6 +41,7 @@ from backend.algoritmo_match import (
     DiversityMeta,
     Lawyer,
     MatchmakingAlgorithm,
+    ReviewDigest,
 )
 from backend.routes import (
     cases, recommendations, users, payments, offers, reviews_route, timeline, contracts, financials,
@@ -58,13 +60,19 @@ from backend.api.schemas import (
 )
 from backend.auth import get_current_user
 from backend.services.ab_testing import ab_testing_service
-from backend.services.hybrid_integration import HybridLegalDataService
+from backend.services.geo_index import bounding_box, geo_index, run_geo_index_refresher
+from backend.services.enrichment_cache import EnrichmentCache
+from backend.services.hybrid_integration import HybridLawyerStats, HybridLegalDataService
+from backend.services.lawyer_snapshot import LawyerSnapshotStore, run_lawyer_snapshot_pruner
+from backend.services.match_cache import MATCH_CACHE_TTL, match_cache_key, match_single_flight
 
 # Configuração
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 ESCAVADOR_API_KEY = os.getenv("ESCAVADOR_API_KEY")
+# Limite de candidatos carregados por matching (motor em lote suporta > 200)
+MATCH_MAX_CANDIDATES = int(os.getenv("MATCH_MAX_CANDIDATES", "200"))
 JUSBRASIL_API_KEY = os.getenv("JUSBRASIL_API_KEY")
 
 # Logging
@@ -103,6 +111,9 @@ app.include_router(availability.router, prefix="/api")
 
 # Conexão Redis global
 redis_client: Optional[aioredis.Redis] = None
+# Tarefas de fundo: índice geoespacial e poda do snapshot de advogados
+geo_refresh_task: Optional[asyncio.Task] = None
+snapshot_prune_task: Optional[asyncio.Task] = None
 
 # ============================================================================
 # STARTUP/SHUTDOWN
@@ -131,6 +142,15 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Erro ao conectar com PostgreSQL: {e}")
 
+    # Índice geoespacial em memória para pré-filtro de candidatos
+    global geo_refresh_task
+    geo_refresh_task = asyncio.create_task(
+        run_geo_index_refresher(geo_index, load_changed_lawyer_locations))
+    # Snapshot sob demanda: advogados excluídos ou inativos saem periodicamente
+    global snapshot_prune_task
+    snapshot_prune_task = asyncio.create_task(
+        run_lawyer_snapshot_pruner(api_lawyer_snapshot, load_active_lawyer_ids))
+
     logger.info("🚀 API LITGO5 HÍBRIDA iniciada")
 
 
@@ -140,6 +160,10 @@ async def shutdown_event():
     global redis_client
     if redis_client:
         await redis_client.close()
+    if geo_refresh_task:
+        geo_refresh_task.cancel()
+    if snapshot_prune_task:
+        snapshot_prune_task.cancel()
     logger.info("🔻 API LITGO5 HÍBRIDA encerrada")
 
 # ============================================================================
@@ -162,6 +186,39 @@ def get_db_connection():
         cursor_factory=psycopg2.extras.DictCursor
     )
 
+def load_changed_lawyer_locations(since: Optional[str], since_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Localização dos advogados alterados depois de ``(since, since_id)`` (carga completa se None)"""
+    connection = get_db_connection()
+    try:
+        cursor = connection.cursor()
+        query = """
+            SELECT l.id::text AS id, l.latitude, l.longitude, l.tags_expertise,
+                   l.ativo, l.updated_at::text AS updated_at
+            FROM lawyers l
+        """
+        params = []
+        if since and since_id:
+            query += " WHERE (l.updated_at, l.id::text) > (%s::timestamptz, %s)"
+            params.extend([since, since_id])
+        elif since:
+            query += " WHERE l.updated_at >= %s"
+            params.append(since)
+        cursor.execute(query + " ORDER BY l.updated_at, l.id::text", params)
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
+
+def load_active_lawyer_ids() -> List[str]:
+    """IDs dos advogados ativos (poda do snapshot em memória)"""
+    connection = get_db_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT l.id::text AS id FROM lawyers l WHERE l.ativo = true")
+        return [row["id"] for row in cursor.fetchall()]
+    finally:
+        connection.close()
+
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
@@ -227,28 +284,83 @@ def convert_lawyer_to_schema(lawyer: Lawyer, case_coords: tuple) -> MatchedLawye
     )
 
 
+LAWYER_FULL_SELECT = """
+    SELECT
+        l.id::text AS id, l.nome, l.oab_numero, l.uf,
+        l.latitude, l.longitude,
+        l.kpi, l.curriculo_json,
+        l.tags_expertise,
+        l.review_texts,
+        l.review_digest,
+        l.is_available,
+        l.success_rate, l.total_cases,
+        l.kpi_subarea,
+        l.estimated_success_rate,
+        l.jusbrasil_areas,
+        l.jusbrasil_activity_level,
+        l.jusbrasil_specialization,
+        l.jusbrasil_data_quality,
+        l.jusbrasil_limitations,
+        l.updated_at::text AS updated_at
+    FROM lawyers l
+"""
+
+
+def lawyer_from_db_row(row: Dict[str, Any]) -> Lawyer:
+    """Hidrata um advogado a partir de uma linha de ``LAWYER_FULL_SELECT``"""
+    kpi_data = row.get("kpi", {}) or {}
+
+    lawyer = Lawyer(
+        id=row["id"],
+        nome=row["nome"],
+        tags_expertise=row.get("tags_expertise", []),
+        review_texts=row.get("review_texts", []),
+        review_digest=ReviewDigest.from_dict(row.get("review_digest")),
+        geo_latlon=(row.get("latitude", 0.0), row.get("longitude", 0.0)),
+        curriculo_json=row.get("curriculo_json", {}),
+        kpi=KPI(
+            success_rate=row.get("success_rate", 0.0),
+            cases_30d=kpi_data.get("cases_30d", 0),
+            capacidade_mensal=kpi_data.get("capacidade_mensal", 25),
+            avaliacao_media=kpi_data.get("avaliacao_media", 4.0),
+            tempo_resposta_h=kpi_data.get("tempo_resposta_h", 24),
+            cv_score=kpi_data.get("cv_score", 0.0)
+        ),
+        kpi_subarea=row.get("kpi_subarea", {}),
+    )
+
+    # Adicionar atributos extras usando setattr para evitar erros do linter
+    setattr(lawyer, 'is_available', row.get("is_available", False))
+    setattr(lawyer, 'oab_numero', row.get("oab_numero"))
+    setattr(lawyer, 'uf', row.get("uf"))
+
+    # Adicionar dados REALISTAS do Jusbrasil
+    setattr(lawyer, 'jusbrasil_stats', {
+        'total_processes': row.get("total_cases", 0),
+        'estimated_success_rate': row.get("estimated_success_rate", 0.5),
+        'areas_distribution': row.get("jusbrasil_areas", {}),
+        'activity_level': row.get("jusbrasil_activity_level", "low"),
+        'specialization_score': row.get("jusbrasil_specialization", 0.0),
+        'data_quality': row.get("jusbrasil_data_quality", "unavailable"),
+        'limitations': row.get("jusbrasil_limitations", [])
+    })
+
+    return lawyer
+
+
+# Snapshot dos advogados hidratados, validado pela versão (updated_at) a cada consulta
+api_lawyer_snapshot = LawyerSnapshotStore(hydrate=lawyer_from_db_row)
+
+
 async def load_lawyers_from_db(
         connection, filters: Optional[dict] = None) -> List[Lawyer]:
     """Carrega advogados do banco de dados com filtros opcionais"""
     cursor = connection.cursor()
 
-    # Query base com novos campos realistas
+    # Filtros e ordenação no banco, mas só (id, versão): as linhas completas
+    # vêm do snapshot em memória quando a versão confere
     query = """
-        SELECT
-            l.id, l.nome, l.oab_numero, l.uf,
-            l.latitude, l.longitude,
-            l.kpi, l.curriculo_json,
-            l.tags_expertise,
-            l.review_texts,
-            l.is_available,
-            l.success_rate, l.total_cases,
-            l.kpi_subarea,
-            l.estimated_success_rate,
-            l.jusbrasil_areas,
-            l.jusbrasil_activity_level,
-            l.jusbrasil_specialization,
-            l.jusbrasil_data_quality,
-            l.jusbrasil_limitations
+        SELECT l.id::text AS id, l.updated_at::text AS updated_at
         FROM lawyers l
         WHERE l.ativo = true
     """
@@ -266,18 +378,27 @@ async def load_lawyers_from_db(
             params.append(filters["uf"])
 
         if filters.get("coordinates") and filters.get("radius_km"):
-            # Filtro geográfico usando Haversine
             lat, lon, radius = filters["coordinates"][0], filters["coordinates"][1], filters["radius_km"]
-            query += """
-                AND (
-                    6371 * acos(
-                        cos(radians(%s)) * cos(radians(l.latitude)) *
-                        cos(radians(l.longitude) - radians(%s)) +
-                        sin(radians(%s)) * sin(radians(l.latitude))
-                    )
-                ) <= %s
-            """
-            params.extend([lat, lon, lat, radius])
+            nearby_ids = geo_index.nearby_ids((lat, lon), radius, area=filters.get("area"))
+            if nearby_ids is not None:
+                # Candidatos já filtrados pelo índice geoespacial em memória
+                query += " AND l.id::text = ANY(%s)"
+                params.append(nearby_ids)
+            else:
+                # Bounding box (usa idx_lawyers_lat_lon) antes do Haversine exato
+                lat_min, lat_max, lon_min, lon_max = bounding_box(lat, lon, radius)
+                query += """
+                    AND l.latitude BETWEEN %s AND %s
+                    AND l.longitude BETWEEN %s AND %s
+                    AND (
+                        6371 * acos(LEAST(1.0,
+                            cos(radians(%s)) * cos(radians(l.latitude)) *
+                            cos(radians(l.longitude) - radians(%s)) +
+                            sin(radians(%s)) * sin(radians(l.latitude))
+                        ))
+                    ) <= %s
+                """
+                params.extend([lat_min, lat_max, lon_min, lon_max, lat, lon, lat, radius])
 
         if filters.get("min_rating"):
             query += " AND COALESCE((l.kpi->>'avaliacao_media')::float, 0) >= %s"
@@ -290,49 +411,17 @@ async def load_lawyers_from_db(
     params.extend([limit, offset])
 
     cursor.execute(query, params)
-    rows = cursor.fetchall()
-
-    lawyers = []
-    for row in rows:
-        kpi_data = row.get("kpi", {}) or {}
-
-        lawyer = Lawyer(
-            id=row["id"],
-            nome=row["nome"],
-            tags_expertise=row.get("tags_expertise", []),
-            review_texts=row.get("review_texts", []),
-            geo_latlon=(row.get("latitude", 0.0), row.get("longitude", 0.0)),
-            curriculo_json=row.get("curriculo_json", {}),
-            kpi=KPI(
-                success_rate=row.get("success_rate", 0.0),
-                cases_30d=kpi_data.get("cases_30d", 0),
-                capacidade_mensal=kpi_data.get("capacidade_mensal", 25),
-                avaliacao_media=kpi_data.get("avaliacao_media", 4.0),
-                tempo_resposta_h=kpi_data.get("tempo_resposta_h", 24),
-                cv_score=kpi_data.get("cv_score", 0.0)
-            ),
-            kpi_subarea=row.get("kpi_subarea", {}),
-        )
-
-        # Adicionar atributos extras usando setattr para evitar erros do linter
-        setattr(lawyer, 'is_available', row.get("is_available", False))
-        setattr(lawyer, 'oab_numero', row.get("oab_numero"))
-        setattr(lawyer, 'uf', row.get("uf"))
+    versions = {row["id"]: row["updated_at"] for row in cursor.fetchall()}
 
-        # Adicionar dados REALISTAS do Jusbrasil
-        setattr(lawyer, 'jusbrasil_stats', {
-            'total_processes': row.get("total_cases", 0),
-            'estimated_success_rate': row.get("estimated_success_rate", 0.5),
-            'areas_distribution': row.get("jusbrasil_areas", {}),
-            'activity_level': row.get("jusbrasil_activity_level", "low"),
-            'specialization_score': row.get("jusbrasil_specialization", 0.0),
-            'data_quality': row.get("jusbrasil_data_quality", "unavailable"),
-            'limitations': row.get("jusbrasil_limitations", [])
-        })
+    records, stale = api_lawyer_snapshot.get_versions(versions)
+    if stale:
+        cursor.execute(LAWYER_FULL_SELECT + " WHERE l.id::text = ANY(%s)", [stale])
+        api_lawyer_snapshot.put_rows(dict(row) for row in cursor.fetchall())
+        records += api_lawyer_snapshot.get_many(stale)[0]
 
-        lawyers.append(lawyer)
-
-    return lawyers
+    # Mantém a ordenação do banco
+    by_id = {rec.lawyer.id: rec.lawyer for rec in records}
+    return [by_id[lid] for lid in versions if lid in by_id]
 
 # ============================================================================
 # ENDPOINTS DA API
@@ -389,18 +478,42 @@ async def health_check(redis: Optional[aioredis.Redis] = Depends(get_redis)):
     )
 
 
-async def enrich_lawyer(lawyer: Lawyer, service: HybridLegalDataService) -> Lawyer:
+# Serviço híbrido usado apenas pelo refresher do cache (conexão própria, fora da requisição)
+_hybrid_service: Optional[HybridLegalDataService] = None
+
+
+async def fetch_hybrid_stats(lawyer_info: Dict[str, Any]) -> HybridLawyerStats:
+    """Coleta os dados híbridos (Escavador → Jusbrasil) de um advogado."""
+    global _hybrid_service
+    if _hybrid_service is None:
+        _hybrid_service = HybridLegalDataService(
+            db_connection=get_db_connection(),
+            escavador_api_key=ESCAVADOR_API_KEY,
+            jusbrasil_api_key=JUSBRASIL_API_KEY
+        )
+    return await _hybrid_service.get_unified_lawyer_data(lawyer_info)
+
+
+# Cache SWR do enriquecimento: sem ESCAVADOR_API_KEY serve só os dados do banco
+enrichment_cache = EnrichmentCache(
+    fetch=fetch_hybrid_stats if ESCAVADOR_API_KEY else None,
+    encode=HybridLawyerStats.to_dict,
+    decode=HybridLawyerStats.from_dict,
+    redis_url=REDIS_URL,
+)
+
+
+def enrich_lawyer(lawyer: Lawyer, hybrid_stats: HybridLawyerStats) -> Lawyer:
     """Função auxiliar para enriquecer um advogado com dados híbridos."""
-    lawyer_info = {'id': lawyer.id, 'oab_numero': getattr(
-        lawyer, 'oab_numero', None), 'uf': getattr(lawyer, 'uf', None)}
-    hybrid_stats = await service.get_unified_lawyer_data(lawyer_info)
+    # O advogado vem do snapshot compartilhado: alterações vão para uma cópia
+    lawyer = replace(lawyer)
 
     # Adicionar os dados ao objeto do advogado
     setattr(lawyer, 'hybrid_stats', hybrid_stats)
 
     # Atualizar KPI com dados mais precisos
     if hybrid_stats.primary_source == 'escavador':
-        lawyer.kpi.success_rate = hybrid_stats.real_success_rate
+        lawyer.kpi = replace(lawyer.kpi, success_rate=hybrid_stats.real_success_rate)
 
     return lawyer
 
@@ -442,18 +555,9 @@ async def match_lawyers(
         case = convert_case_schema_to_model(request.case)
         case.id = case_id
 
-        # Cache key para o matching
-        cache_key = f"match_hybrid:{hash(str(request.dict()))}:{model_version}"
-
-        # Verificar cache (opcional)
-        if redis:
-            cached_result = await redis.get(cache_key)
-            if cached_result:
-                # Nota: O cache aqui pode não refletir um teste A/B para este usuário específico.
-                # Para uma implementação robusta, a chave de cache deveria incluir o
-                # `model_version`.
-                logger.info(f"Cache hit para matching híbrido {case_id}")
-                return JSONResponse(content=json.loads(cached_result))
+        # Chave canônica (blake2b): estável entre workers e inclui preset/model_version
+        cache_key = match_cache_key(request.dict(), preset=request.preset.value,
+                                    model_version=model_version)
 
         # (v2.6) Armazenar dados do teste A/B no Redis para futura conversão
         if redis and test_id and test_group:
@@ -468,100 +572,99 @@ async def match_lawyers(
             logger.info(
                 f"Usuário {current_user.id} no grupo '{test_group}' do teste '{test_id}' para o caso {case_id}")
 
-        # Conectar ao banco e carregar advogados
-        connection = get_db_connection()
-        try:
-            # Filtros baseados no caso
-            filters = {
-                "area": request.case.area.value,
-                "coordinates": (request.case.coordinates.latitude, request.case.coordinates.longitude),
-                "radius_km": 100,  # 100km de raio
-                # Carregar mais para melhor seleção
-                "limit": min(request.top_n * 10, 200)
-            }
-
-            lawyers = await load_lawyers_from_db(connection, filters)
-
-            if not lawyers:
-                raise HTTPException(
-                    status_code=404,
-                    detail="Nenhum advogado encontrado para os critérios especificados"
-                )
-
-            # Inicia o serviço híbrido
-            if not ESCAVADOR_API_KEY:
-                raise HTTPException(status_code=500,
-                                    detail="ESCAVADOR_API_KEY não configurada.")
-
-            hybrid_service = HybridLegalDataService(
-                db_connection=connection,
-                escavador_api_key=ESCAVADOR_API_KEY,
-                jusbrasil_api_key=JUSBRASIL_API_KEY
-            )
+        # Cache + single-flight: requisições idênticas simultâneas (neste ou em
+        # outros workers) aguardam um único cálculo
+        async def compute_response() -> str:
+            # Conectar ao banco e carregar advogados
+            connection = get_db_connection()
+            try:
+                # Filtros baseados no caso
+                filters = {
+                    "area": request.case.area.value,
+                    "coordinates": (request.case.coordinates.latitude, request.case.coordinates.longitude),
+                    "radius_km": 100,  # 100km de raio
+                    # Carregar mais para melhor seleção
+                    "limit": min(request.top_n * 10, MATCH_MAX_CANDIDATES)
+                }
 
-            # Enriquecer advogados com dados HÍBRIDOS
-            enrich_tasks = [enrich_lawyer(lawyer, hybrid_service) for lawyer in lawyers]
-            enriched_lawyers = await asyncio.gather(*enrich_tasks)
+                lawyers = await load_lawyers_from_db(connection, filters)
 
-            algorithm = MatchmakingAlgorithm()
-            ranked_lawyers = await algorithm.rank(
-                case, enriched_lawyers, request.top_n, request.preset.value, model_version=model_version
-            )
+                if not lawyers:
+                    raise HTTPException(
+                        status_code=404,
+                        detail="Nenhum advogado encontrado para os critérios especificados"
+                    )
 
-            # Converter para schema de resposta
-            case_coords = (
-                request.case.coordinates.latitude,
-                request.case.coordinates.longitude)
-            matched_lawyers = [
-                convert_lawyer_to_schema(lawyer, case_coords)
-                for lawyer in ranked_lawyers
-            ]
+                # Enriquecer advogados com dados HÍBRIDOS (cache SWR: APIs externas
+                # só em background; sem cache, campos jusbrasil_* do banco)
+                rows = {lw.id: api_lawyer_snapshot.get(lw.id).row for lw in lawyers}
+                lawyer_infos = {
+                    lid: {'id': lid, 'oab_numero': row.get('oab_numero'), 'uf': row.get('uf')}
+                    for lid, row in rows.items()
+                }
+                hybrid_stats = await enrichment_cache.get_many(
+                    lawyer_infos, fallback=lambda lid: HybridLawyerStats.from_db_row(rows[lid]))
+                enriched_lawyers = [enrich_lawyer(lw, hybrid_stats[lw.id]) for lw in lawyers]
 
-            # Preparar resposta
-            execution_time_ms = (time.time() - start_time) * 1000
+                algorithm = MatchmakingAlgorithm()
+                ranked_lawyers = await algorithm.rank(
+                    case, enriched_lawyers, request.top_n, request.preset.value, model_version=model_version
+                )
 
-            response = MatchResponseSchema(
-                success=True,
-                case_id=case_id,
-                lawyers=matched_lawyers,
-                total_lawyers_evaluated=len(lawyers),
-                algorithm_version="v3.0-hybrid",
-                preset_used=request.preset,
-                execution_time_ms=round(execution_time_ms, 2),
-                weights_used=ranked_lawyers[0].scores.get(
-                    "weights_used", {}) if ranked_lawyers and ranked_lawyers[0].scores else {},
-                case_complexity=request.case.complexity,
-                # (v2.6) Adicionar dados do A/B Test na resposta
-                ab_test_group=test_group,
-                model_version_used=model_version,
-                # Adicionar transparência sobre limitações
-                data_transparency={
-                    "jusbrasil_limitations": [
-                        "Dados são estimativas baseadas em heurísticas",
-                        "API não fornece vitórias/derrotas reais",
-                        "Foco em volume e distribuição de casos",
-                        "Adequado para matching por experiência, não performance"
-                    ],
-                    "estimation_disclaimer": "Taxas de sucesso são estimativas baseadas em padrões históricos do setor"
-                }
-            )
+                # Converter para schema de resposta
+                case_coords = (
+                    request.case.coordinates.latitude,
+                    request.case.coordinates.longitude)
+                matched_lawyers = [
+                    convert_lawyer_to_schema(lawyer, case_coords)
+                    for lawyer in ranked_lawyers
+                ]
+
+                # Preparar resposta
+                execution_time_ms = (time.time() - start_time) * 1000
+
+                response = MatchResponseSchema(
+                    success=True,
+                    case_id=case_id,
+                    lawyers=matched_lawyers,
+                    total_lawyers_evaluated=len(lawyers),
+                    algorithm_version="v3.0-hybrid",
+                    preset_used=request.preset,
+                    execution_time_ms=round(execution_time_ms, 2),
+                    weights_used=ranked_lawyers[0].scores.get(
+                        "weights_used", {}) if ranked_lawyers and ranked_lawyers[0].scores else {},
+                    case_complexity=request.case.complexity,
+                    # (v2.6) Adicionar dados do A/B Test na resposta
+                    ab_test_group=test_group,
+                    model_version_used=model_version,
+                    # Adicionar transparência sobre limitações
+                    data_transparency={
+                        "jusbrasil_limitations": [
+                            "Dados são estimativas baseadas em heurísticas",
+                            "API não fornece vitórias/derrotas reais",
+                            "Foco em volume e distribuição de casos",
+                            "Adequado para matching por experiência, não performance"
+                        ],
+                        "estimation_disclaimer": "Taxas de sucesso são estimativas baseadas em padrões históricos do setor"
+                    }
+                )
 
-            # Salvar no cache (TTL de 1 hora)
-            if redis:
-                await redis.setex(cache_key, 3600, response.json())
+                # Log da operação
+                logger.info(
+                    f"Matching HÍBRIDA concluído: {case_id}, {len(matched_lawyers)} advogados, {execution_time_ms:.1f}ms")
 
-            # Log da operação
-            logger.info(
-                f"Matching HÍBRIDA concluído: {case_id}, {len(matched_lawyers)} advogados, {execution_time_ms:.1f}ms")
+                # Task em background para analytics
+                background_tasks.add_task(log_matching_analytics, case_id,
+                                          request, len(lawyers), execution_time_ms)
 
-            # Task em background para analytics
-            background_tasks.add_task(log_matching_analytics, case_id,
-                                      request, len(lawyers), execution_time_ms)
+                return response.json()
 
-            return response
+            finally:
+                connection.close()
 
-        finally:
-            connection.close()
+        result = await match_single_flight.get_or_compute(
+            cache_key, compute_response, redis=redis, ttl=MATCH_CACHE_TTL)
+        return JSONResponse(content=json.loads(result))
 
     except HTTPException:
         raise
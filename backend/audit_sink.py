@@ -0,0 +1,241 @@
+"""
+backend/audit_sink.py
+
+Pipeline de auditoria em JSON-lines fora do caminho da requisição.
+
+- ``AuditSink``: fila em memória limitada + thread escritora. ``submit`` nunca
+  bloqueia; a serialização (formatação JSON, ``safe_json_dump``) acontece na
+  thread. Os eventos vão para segmentos ``audit-<escritor>-<seq>.jsonl``
+  rotacionados por tamanho e, opcionalmente, comprimidos em gzip ao fechar.
+  O escritor (``<host>-<pid>``) separa os processos que compartilham o
+  ``AUDIT_DIR``: cada um numera os próprios segmentos.
+- ``AuditSinkHandler``: ``logging.Handler`` que apenas enfileira o LogRecord.
+- ``AuditLogReader``: leitura incremental dos segmentos a partir de um
+  checkpoint (segmento + offset por escritor), usada pelos jobs de ETL do LTR.
+"""
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import socket
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AUDIT_DIR = Path(os.getenv("AUDIT_DIR", "logs/audit"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_SEGMENT_BYTES = int(os.getenv("AUDIT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+AUDIT_COMPRESS = os.getenv("AUDIT_COMPRESS", "1") == "1"
+
+# Escritor opcional: segmentos ``audit-<seq>.jsonl`` anteriores têm escritor ""
+_SEGMENT_RE = re.compile(r"^audit-(?:(.+)-)?(\d{8})\.jsonl(\.gz)?$")
+
+
+def _writer_id() -> str:
+    """``<host>-<pid>``: único entre os processos vivos que gravam no diretório."""
+    host = re.sub(r"[^A-Za-z0-9_.]", "_", socket.gethostname()) or "host"
+    return f"{host}-{os.getpid()}"
+
+
+def _segment_name(seq: int, writer: str = "") -> str:
+    return f"audit-{writer}-{seq:08d}.jsonl" if writer else f"audit-{seq:08d}.jsonl"
+
+
+def segments_by_writer(directory: Path) -> Dict[str, List[Tuple[int, Path]]]:
+    """Segmentos existentes por escritor, ordenados por sequência (comprimidos ou não)."""
+    if not directory.exists():
+        return {}
+    found: Dict[str, Dict[int, Path]] = {}
+    for path in directory.iterdir():
+        m = _SEGMENT_RE.match(path.name)
+        if m:
+            writer, seq = m.group(1) or "", int(m.group(2))
+            own = found.setdefault(writer, {})
+            # Durante a compressão os dois arquivos coexistem; o .jsonl é o completo
+            if seq not in own or not m.group(3):
+                own[seq] = path
+    return {writer: sorted(own.items()) for writer, own in sorted(found.items())}
+
+
+def list_segments(directory: Path, writer: Optional[str] = None) -> List[Tuple[int, Path]]:
+    """Segmentos de ``writer`` (ou de todos, agrupados por escritor) em ordem de sequência."""
+    by_writer = segments_by_writer(directory)
+    if writer is not None:
+        return by_writer.get(writer, [])
+    return [segment for segments in by_writer.values() for segment in segments]
+
+
+class AuditSink:
+    """Escritor assíncrono de eventos de auditoria em segmentos JSON-lines."""
+
+    _STOP = object()
+
+    def __init__(self, directory: Path = AUDIT_DIR, formatter: Optional[Callable[[Any], str]] = None,
+                 segment_bytes: int = AUDIT_SEGMENT_BYTES, compress: bool = AUDIT_COMPRESS,
+                 queue_size: int = AUDIT_QUEUE_SIZE):
+        self.directory = Path(directory)
+        self.formatter = formatter or (lambda item: json.dumps(item, default=str))
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.dropped = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._fh = None
+        self._writer = ""
+        self._seq = 0
+        self._size = 0
+
+    # ---------------- produtor (caminho da requisição) ----------------
+
+    def submit(self, item: Any) -> bool:
+        """Enfileira sem bloquear; descarta (e conta) se a fila estiver cheia."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self) -> None:
+        """Espera até que todos os eventos enfileirados estejam no disco."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    # ---------------- thread escritora ----------------
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                self._thread.start()
+
+    def _open_segment(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Calculado aqui (na thread escritora) para valer também após fork
+        self._writer = _writer_id()
+        segments = list_segments(self.directory, self._writer)
+        self._seq = segments[-1][0] + 1 if segments else 1
+        self._fh = open(self.directory / _segment_name(self._seq, self._writer), "ab")
+        self._size = 0
+
+    def _rotate(self) -> None:
+        path = Path(self._fh.name)
+        self._fh.close()
+        self._fh = None
+        if self.compress:
+            try:
+                with open(path, "rb") as src, gzip.open(path.with_name(path.name + ".gz"), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Falha ao comprimir segmento de auditoria {path}: {e}")
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    if self._fh is not None:
+                        self._fh.close()
+                        self._fh = None
+                    return
+                line = (self.formatter(item) + "\n").encode("utf-8")
+                if self._fh is None:
+                    self._open_segment()
+                self._fh.write(line)
+                self._size += len(line)
+                if self._queue.empty():
+                    self._fh.flush()
+                if self._size >= self.segment_bytes:
+                    self._rotate()
+            except Exception as e:
+                logger.error(f"Erro ao gravar evento de auditoria: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class AuditSinkHandler(logging.Handler):
+    """Handler que entrega o LogRecord cru ao sink; a formatação ocorre na thread."""
+
+    def __init__(self, sink: AuditSink):
+        super().__init__()
+        self.sink = sink
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.sink.submit(record)
+
+
+# =============================================================================
+# Leitura incremental
+# =============================================================================
+
+
+class AuditLogReader:
+    """
+    Lê eventos novos dos segmentos a partir de um checkpoint persistido.
+
+    O checkpoint guarda, por escritor, ``{"segment": seq, "offset": bytes}``
+    (offset em bytes descomprimidos, estável quando o segmento é comprimido).
+    Só é gravado em ``commit()``, depois que o consumidor processou os eventos.
+    Checkpoints antigos (``{"segment", "offset"}``) valem para o escritor "".
+    """
+
+    def __init__(self, directory: Path = AUDIT_DIR, checkpoint_file: Optional[Path] = None):
+        self.directory = Path(directory)
+        self.checkpoint_file = Path(checkpoint_file) if checkpoint_file else self.directory / "checkpoint.json"
+        self.position = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict[str, Tuple[int, int]]:
+        try:
+            data = json.loads(self.checkpoint_file.read_text())
+            if "writers" not in data:
+                return {"": (int(data["segment"]), int(data["offset"]))}
+            return {writer: (int(pos["segment"]), int(pos["offset"]))
+                    for writer, pos in data["writers"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
+
+    def commit(self) -> None:
+        self.checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.checkpoint_file.with_suffix(".tmp")
+        writers = {writer: {"segment": seq, "offset": offset}
+                   for writer, (seq, offset) in self.position.items()}
+        tmp.write_text(json.dumps({"writers": writers}))
+        os.replace(tmp, self.checkpoint_file)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for writer, segments in segments_by_writer(self.directory).items():
+            start_seq, start_offset = self.position.get(writer, (0, 0))
+            for seq, path in segments:
+                if seq < start_seq:
+                    continue
+                offset = start_offset if seq == start_seq else 0
+                opener = gzip.open if path.suffix == ".gz" else open
+                with opener(path, "rb") as f:
+                    f.seek(offset)
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break  # linha ainda sendo escrita no segmento ativo
+                        offset += len(raw)
+                        self.position[writer] = (seq, offset)
+                        try:
+                            yield json.loads(raw)
+                        except json.JSONDecodeError:
+                            continue
+                self.position[writer] = (seq, offset)
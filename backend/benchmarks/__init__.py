@@ -0,0 +1,12 @@
+"""
+Benchmarks do matching (geradores sintéticos, runner do rank() e comparador de baselines).
+"""
+
+from .compare import compare_results, format_report
+from .generators import MatchDataGenerator
+
+__all__ = [
+    'MatchDataGenerator',
+    'compare_results',
+    'format_report',
+]
@@ -0,0 +1,91 @@
+"""
+backend/benchmarks/compare.py
+
+Comparação de um resultado do benchmark com um baseline JSON.
+
+Cada métrica tem uma tolerância relativa: latências e pico de memória
+regridem quando sobem além dela; a vazão, quando cai além dela. Diferenças
+de ambiente (Python, NumPy, CPU, seed, dimensão) são listadas no relatório,
+já que invalidam a comparação direta.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# (extrator, maior_é_pior)
+METRICS: Dict[str, Tuple[Callable[[Dict[str, Any]], Optional[float]], bool]] = {
+    "latency_p50": (lambda r: r["latency_ms"]["p50"], True),
+    "latency_p99": (lambda r: r["latency_ms"]["p99"], True),
+    "throughput": (lambda r: r["throughput_rps"], False),
+    "alloc_peak": (lambda r: r.get("alloc_peak_kb"), True),
+}
+
+DEFAULT_TOLERANCES = {
+    "latency_p50": 0.15,
+    "latency_p99": 0.30,
+    "throughput": 0.15,
+    "alloc_peak": 0.20,
+}
+
+_META_KEYS = ("python", "numpy", "platform", "cpu_count", "seed", "dim", "preset", "top_n",
+              "persisted_digests")
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    tolerances: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """Regressões (uma por tamanho × métrica) do ``current`` em relação ao ``baseline``."""
+    tol = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    base_by_size = {r["candidates"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in current.get("results", []):
+        base = base_by_size.get(result["candidates"])
+        if base is None:
+            continue
+        for name, (extract, higher_is_worse) in METRICS.items():
+            old, new = extract(base), extract(result)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tol[name] if higher_is_worse else change < -tol[name]
+            if worse:
+                regressions.append({
+                    "candidates": result["candidates"],
+                    "metric": name,
+                    "baseline": old,
+                    "current": new,
+                    "change": round(change, 4),
+                    "tolerance": tol[name],
+                })
+    return regressions
+
+
+def environment_diff(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    old, new = baseline.get("meta", {}), current.get("meta", {})
+    return {k: (old.get(k), new.get(k)) for k in _META_KEYS if old.get(k) != new.get(k)}
+
+
+def format_report(baseline: Dict[str, Any], current: Dict[str, Any],
+                  regressions: List[Dict[str, Any]]) -> str:
+    lines = []
+    env = environment_diff(baseline, current)
+    if env:
+        lines.append("⚠️  Ambiente diferente do baseline:")
+        lines.extend(f"   {k}: {old} → {new}" for k, (old, new) in env.items())
+    base_by_size = {r["candidates"]: r for r in baseline.get("results", [])}
+    lines.append(f"{'candidatos':>10} {'métrica':>12} {'baseline':>11} {'atual':>11} {'Δ':>8}")
+    for result in current.get("results", []):
+        base = base_by_size.get(result["candidates"])
+        if base is None:
+            lines.append(f"{result['candidates']:>10} {'(sem baseline)':>12}")
+            continue
+        for name, (extract, _) in METRICS.items():
+            old, new = extract(base), extract(result)
+            if not old or new is None:
+                continue
+            lines.append(f"{result['candidates']:>10} {name:>12} {old:>11.3f} {new:>11.3f} "
+                         f"{(new - old) / old:>+8.1%}")
+    if regressions:
+        lines.append(f"\n❌ {len(regressions)} regressão(ões):")
+        lines.extend(f"   {r['candidates']} candidatos / {r['metric']}: {r['change']:+.1%} "
+                     f"(tolerância {r['tolerance']:.0%})" for r in regressions)
+    else:
+        lines.append("\n✅ Sem regressões além das tolerâncias")
+    return "\n".join(lines)
@@ -0,0 +1,167 @@
+"""
+backend/benchmarks/generators.py
+
+Geradores determinísticos (por seed) de advogados e casos sintéticos para o
+benchmark do matching.
+
+Os dados imitam a distribuição de produção o suficiente para exercitar todos
+os caminhos do ``rank()``: embeddings agrupados por área (centróide da área +
+ruído), histórico com desfechos, pareceres e reconhecimentos em parte dos
+perfis, reviews válidos/inválidos, KPI granular por subárea e metadados de
+diversidade. As coordenadas ficam espalhadas ao redor de capitais.
+
+Por padrão o ``review_digest`` vem pré-computado, como nos advogados
+hidratados do snapshot; ``persisted_digests=False`` força o caminho do memo
+em processo (``review_digest_for``).
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.algoritmo_match import (
+    EMBEDDING_DIM,
+    KPI,
+    Case,
+    DiversityMeta,
+    Lawyer,
+    Parecer,
+    Reconhecimento,
+    compute_review_digest,
+)
+
+AREAS: Dict[str, List[str]] = {
+    "Trabalhista": ["Rescisão", "Horas Extras", "Assédio"],
+    "Civil": ["Contratos", "Responsabilidade Civil", "Família"],
+    "Criminal": ["Defesa", "Execução Penal"],
+    "Tributário": ["Planejamento", "Contencioso"],
+    "Empresarial": ["Societário", "Recuperação Judicial"],
+    "Consumidor": ["Bancário", "Telefonia"],
+}
+
+CITIES: List[Tuple[float, float]] = [
+    (-23.5505, -46.6333),  # São Paulo
+    (-22.9068, -43.1729),  # Rio de Janeiro
+    (-19.9167, -43.9345),  # Belo Horizonte
+    (-15.7801, -47.9292),  # Brasília
+    (-30.0346, -51.2177),  # Porto Alegre
+    (-8.0476, -34.8770),   # Recife
+]
+
+REVIEWS = [
+    "Muito atencioso e profissional, resolveu tudo rápido",
+    "Excelente comunicação, sempre disponível",
+    "Top!",
+    "Muito bom 👍",
+    "nao recomendo, demorou demais para responder",
+    "ok",
+    "Explicou cada etapa do processo com clareza e paciência",
+    "Competente e dedicado",
+]
+
+PUBLICACOES = ["Chambers and Partners", "The Legal 500", "Análise Advocacia 500", "Leaders League",
+               "Revista Jurídica Regional"]
+
+
+def _unit(rng: np.random.Generator, center: np.ndarray, noise: float) -> np.ndarray:
+    vec = center + rng.normal(0, noise, center.shape[0])
+    return (vec / (np.linalg.norm(vec) or 1.0)).astype(np.float32)
+
+
+class MatchDataGenerator:
+    """Advogados e casos sintéticos reprodutíveis para um ``seed``."""
+
+    def __init__(self, seed: int = 0, dim: int = EMBEDDING_DIM, geo_spread_km: float = 40.0,
+                 persisted_digests: bool = True):
+        self.seed = seed
+        self.dim = dim
+        self.persisted_digests = persisted_digests
+        self.geo_spread_deg = geo_spread_km / 111.0
+        centers = np.random.default_rng(seed).normal(0, 1, (len(AREAS), dim))
+        self.area_centers = {area: centers[i] for i, area in enumerate(AREAS)}
+
+    def _coords(self, rng: np.random.Generator) -> Tuple[float, float]:
+        lat, lon = CITIES[int(rng.integers(len(CITIES)))]
+        return (lat + float(rng.normal(0, self.geo_spread_deg)),
+                lon + float(rng.normal(0, self.geo_spread_deg)))
+
+    def lawyer(self, i: int, rng: np.random.Generator) -> Lawyer:
+        areas = list(AREAS)
+        tags = [str(t) for t in rng.choice(areas, size=int(rng.integers(1, 4)), replace=False)]
+        main = tags[0]
+        n_hist = int(rng.integers(0, 7))
+        outcomes = [bool(rng.random() < 0.7) for _ in range(n_hist)]
+        if rng.random() < 0.2:
+            outcomes = outcomes[:-1]  # tamanhos divergentes acontecem em produção
+        n_par = int(rng.integers(1, 4)) if rng.random() < 0.25 else 0
+        cases_30d = int(rng.integers(0, 40))
+        reviews = [str(r) for r in rng.choice(REVIEWS, size=int(rng.integers(0, 8)))]
+        return Lawyer(
+            id=f"BENCH{i:06d}",
+            nome=f"Advogado Sintético {i}",
+            tags_expertise=tags,
+            geo_latlon=self._coords(rng),
+            curriculo_json={
+                "anos_experiencia": int(rng.integers(0, 35)),
+                "num_publicacoes": int(rng.poisson(3)),
+                "pos_graduacoes": [
+                    {"nivel": str(rng.choice(["lato", "mestrado", "doutorado"])), "area": main}
+                    for _ in range(int(rng.integers(0, 3)))
+                ],
+            },
+            kpi=KPI(
+                success_rate=float(rng.beta(6, 3)),
+                cases_30d=cases_30d,
+                avaliacao_media=float(np.clip(rng.normal(4.2, 0.5), 1, 5)),
+                tempo_resposta_h=int(rng.integers(1, 72)),
+                active_cases=int(rng.integers(0, 20)),
+                cv_score=float(rng.random()),
+                success_status=str(rng.choice(["V", "P", "N"], p=[0.5, 0.3, 0.2])),
+            ),
+            max_concurrent_cases=int(rng.integers(5, 25)),
+            diversity=DiversityMeta(
+                gender=str(rng.choice(["F", "M", "NB"], p=[0.48, 0.48, 0.04])),
+                ethnicity=str(rng.choice(["branca", "parda", "preta", "amarela", "indigena"])),
+                pcd=bool(rng.random() < 0.08),
+                orientation=str(rng.choice(["H", "G", "B"], p=[0.85, 0.1, 0.05])),
+            ),
+            kpi_subarea={f"{main}/{sub}": float(rng.beta(5, 3))
+                         for sub in AREAS[main] if rng.random() < 0.3},
+            kpi_softskill=float(rng.random()) if rng.random() < 0.4 else 0.0,
+            case_outcomes=outcomes,
+            review_texts=reviews,
+            review_digest=compute_review_digest(reviews) if self.persisted_digests else None,
+            last_offered_at=1.7e9 + float(rng.integers(0, 30 * 86400)),
+            casos_historicos_embeddings=[
+                _unit(rng, self.area_centers[str(rng.choice(tags))], 0.6) for _ in range(n_hist)],
+            pareceres=[
+                Parecer(f"Parecer {i}-{k}", "resumo", main, AREAS[main][0],
+                        _unit(rng, self.area_centers[main], 0.5))
+                for k in range(n_par)
+            ],
+            reconhecimentos=[
+                Reconhecimento("ranking", str(rng.choice(PUBLICACOES)), 2020 + int(rng.integers(0, 5)), main)
+                for _ in range(int(rng.integers(0, 3)) if rng.random() < 0.15 else 0)
+            ],
+        )
+
+    def lawyers(self, n: int, offset: int = 0) -> List[Lawyer]:
+        """``n`` advogados; o mesmo (seed, offset, n) gera sempre os mesmos perfis."""
+        rng = np.random.default_rng([self.seed, 1, offset])
+        return [self.lawyer(offset + i, rng) for i in range(n)]
+
+    def case(self, i: int, rng: np.random.Generator, radius_km: Optional[int] = None) -> Case:
+        area = str(rng.choice(list(AREAS)))
+        return Case(
+            id=f"BENCHCASE{i:05d}",
+            area=area,
+            subarea=str(rng.choice(AREAS[area])),
+            urgency_h=int(rng.choice([0, 12, 24, 48, 72, 168])),
+            coords=self._coords(rng),
+            complexity=str(rng.choice(["LOW", "MEDIUM", "HIGH"], p=[0.3, 0.5, 0.2])),
+            summary_embedding=_unit(rng, self.area_centers[area], 0.4),
+            radius_km=radius_km or int(rng.choice([25, 50, 100])),
+        )
+
+    def cases(self, n: int, offset: int = 0) -> List[Case]:
+        rng = np.random.default_rng([self.seed, 2, offset])
+        return [self.case(offset + i, rng) for i in range(n)]
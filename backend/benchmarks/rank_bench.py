@@ -0,0 +1,215 @@
+"""
+backend/benchmarks/rank_bench.py
+
+Benchmark do ``MatchmakingAlgorithm.rank`` com pools de 50/200/1k/10k
+candidatos sintéticos.
+
+Redis (cache de estáticas) e o serviço de disponibilidade são substituídos
+por stubs locais, então a medida isola o custo do algoritmo. Para cada
+tamanho registra vazão (ranks/s), percentis de latência, pico de memória e
+blocos alocados por rank (tracemalloc, em uma passada separada para não
+distorcer a latência) e o tempo médio por etapa (stage_timer).
+
+Uso:
+    python -m backend.benchmarks.rank_bench --save baseline.json
+    python -m backend.benchmarks.rank_bench --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from backend import algoritmo_match
+from backend.algoritmo_match import EMBEDDING_DIM, MatchmakingAlgorithm
+from backend.benchmarks.compare import compare_results, format_report
+from backend.benchmarks.generators import MatchDataGenerator
+from backend.stage_timer import stage_timer
+
+DEFAULT_SIZES = (50, 200, 1000, 10000)
+
+
+class LocalStaticCache:
+    """Substituto em memória do ``RedisCache`` (mesma interface em lote)."""
+
+    def __init__(self):
+        self.data: Dict[str, Dict[str, float]] = {}
+
+    async def mget_static_feats(self, lawyer_ids: List[str]) -> Dict[str, Optional[Dict[str, float]]]:
+        return {lid: self.data.get(lid) for lid in lawyer_ids}
+
+    async def mset_static_feats(self, features_by_id: Dict[str, Dict[str, float]]) -> None:
+        self.data.update(features_by_id)
+
+
+@contextmanager
+def local_stubs(availability_rate: float = 0.9, seed: int = 0) -> Iterator[LocalStaticCache]:
+    """Troca cache Redis e disponibilidade por stubs locais durante o benchmark."""
+    rng = np.random.default_rng(seed)
+    availability: Dict[str, bool] = {}
+
+    async def get_status(lawyer_ids):
+        for lid in lawyer_ids:
+            if lid not in availability:
+                availability[lid] = bool(rng.random() < availability_rate)
+        return {lid: availability[lid] for lid in lawyer_ids}
+
+    static_cache = LocalStaticCache()
+    saved = (algoritmo_match.cache, algoritmo_match.get_lawyers_availability_status)
+    algoritmo_match.cache = static_cache
+    algoritmo_match.get_lawyers_availability_status = get_status
+    try:
+        yield static_cache
+    finally:
+        algoritmo_match.cache, algoritmo_match.get_lawyers_availability_status = saved
+
+
+def _auto_iterations(n: int) -> int:
+    return int(np.clip(20000 // max(n, 1), 5, 200))
+
+
+def _percentiles(samples_ms: Sequence[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms)
+    return {
+        "mean": round(float(arr.mean()), 4),
+        "p50": round(float(np.percentile(arr, 50)), 4),
+        "p90": round(float(np.percentile(arr, 90)), 4),
+        "p99": round(float(np.percentile(arr, 99)), 4),
+        "max": round(float(arr.max()), 4),
+    }
+
+
+async def bench_size(algo: MatchmakingAlgorithm, gen: MatchDataGenerator, n: int, *,
+                     iterations: int, warmup: int = 3, n_cases: int = 20, top_n: int = 5,
+                     preset: str = "balanced", alloc_iterations: int = 3) -> Dict[str, Any]:
+    """Mede ``rank()`` com ``n`` candidatos (o pool é o mesmo em todas as iterações)."""
+    lawyers = gen.lawyers(n)
+    cases = gen.cases(n_cases)
+
+    for k in range(warmup):
+        await algo.rank(cases[k % n_cases], lawyers, top_n=top_n, preset=preset)
+
+    samples: List[float] = []
+    stages: Dict[str, float] = {}
+    wall_start = time.perf_counter()
+    for k in range(iterations):
+        case = cases[k % n_cases]
+        start = time.perf_counter()
+        with stage_timer(preset, label="bench") as timer:
+            await algo.rank(case, lawyers, top_n=top_n, preset=preset)
+        samples.append((time.perf_counter() - start) * 1000)
+        for stage, ms in timer.timings.items():
+            stages[stage] = stages.get(stage, 0.0) + ms
+    wall = time.perf_counter() - wall_start
+
+    # Alocações em passada separada (tracemalloc deixa tudo mais lento)
+    peaks, blocks = [], []
+    for k in range(alloc_iterations):
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            await algo.rank(cases[k % n_cases], lawyers, top_n=top_n, preset=preset)
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        peaks.append(peak)
+        blocks.append(sum(max(stat.count_diff, 0) for stat in after.compare_to(before, "filename")))
+
+    return {
+        "candidates": n,
+        "iterations": iterations,
+        "throughput_rps": round(iterations / wall, 3),
+        "latency_ms": _percentiles(samples),
+        "alloc_peak_kb": round(float(np.median(peaks)) / 1024, 1) if peaks else None,
+        "alloc_blocks": int(np.median(blocks)) if blocks else None,
+        "stages_ms": {stage: round(ms / iterations, 4) for stage, ms in sorted(stages.items())},
+    }
+
+
+def environment_meta(**extra: Any) -> Dict[str, Any]:
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **extra,
+    }
+
+
+async def run_benchmark(sizes: Sequence[int] = DEFAULT_SIZES, *, seed: int = 0, dim: int = EMBEDDING_DIM,
+                        iterations: Optional[int] = None, preset: str = "balanced",
+                        top_n: int = 5, alloc_iterations: int = 3,
+                        persisted_digests: bool = True) -> Dict[str, Any]:
+    """Executa o benchmark para cada tamanho de pool e devolve o documento JSON."""
+    gen = MatchDataGenerator(seed=seed, dim=dim, persisted_digests=persisted_digests)
+    algo = MatchmakingAlgorithm()
+    results = []
+    with local_stubs(seed=seed):
+        for n in sizes:
+            results.append(await bench_size(
+                algo, gen, n, iterations=iterations or _auto_iterations(n), preset=preset,
+                top_n=top_n, alloc_iterations=alloc_iterations))
+    return {
+        "meta": environment_meta(seed=seed, dim=dim, preset=preset, top_n=top_n,
+                                  persisted_digests=persisted_digests),
+        "results": results,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--iterations", type=int, default=None, help="padrão: automático por tamanho")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--preset", default="balanced")
+    parser.add_argument("--no-digests", action="store_true",
+                        help="sem review_digest persistido (exercita o memo em processo)")
+    parser.add_argument("--save", help="grava o resultado como baseline JSON")
+    parser.add_argument("--compare", help="baseline JSON para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help="tolerância relativa única para todas as métricas (ex.: 0.2)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    # Auditoria continua sendo medida (AuditSink), mas sem eco no console
+    logging.getLogger("audit.match").propagate = False
+    current = asyncio.run(run_benchmark(sizes, seed=args.seed, dim=args.dim, iterations=args.iterations,
+                                        preset=args.preset, persisted_digests=not args.no_digests))
+
+    print(f"{'candidatos':>10} {'ranks/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'pico KB':>9} {'blocos':>8}")
+    for r in current["results"]:
+        lat = r["latency_ms"]
+        print(f"{r['candidates']:>10} {r['throughput_rps']:>10.1f} {lat['p50']:>9.3f} "
+              f"{lat['p99']:>9.3f} {r['alloc_peak_kb']:>9.1f} {r['alloc_blocks']:>8}")
+
+    if args.save:
+        path = Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(current, indent=2, ensure_ascii=False))
+        print(f"\nBaseline gravado em {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        tolerances = None if args.tolerance is None else dict.fromkeys(
+            ("latency_p50", "latency_p99", "throughput", "alloc_peak"), args.tolerance)
+        regressions = compare_results(baseline, current, tolerances)
+        print()
+        print(format_report(baseline, current, regressions))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
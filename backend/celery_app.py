@@ -3,6 +3,7 @@ import os
 
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -23,11 +24,21 @@ celery_app = Celery(
         "backend.jobs.ltr_weekly",
         "backend.jobs.calculate_equity",
         "backend.jobs.train_pca_embeddings",
+        "backend.jobs.train_triage_classifier",
         "backend.jobs.sentiment_reviews",
         "backend.jobs.automated_reports",
     ]  # Aponta para os módulos onde as tarefas estão definidas
 )
 
+
+@worker_process_init.connect
+def _start_weights_registry(**_):
+    """Cada processo do worker mantém os pesos LTR em memória e atualizados."""
+    from backend.algoritmo_match import weights_registry
+
+    weights_registry.start_background_threads()
+
+
 # Configurações opcionais
 celery_app.conf.update(
     task_track_started=True,
@@ -58,6 +69,16 @@ celery_app.conf.beat_schedule = {
         'schedule': crontab(hour=2, minute=0, day_of_week='sat'),  # Sábado 02:00
         'options': {'queue': 'periodic'}
     },
+    'rematch-open-cases': {
+        'task': 'match.rematch_open_cases',
+        'schedule': crontab(hour=4, minute=30),  # 4:30 AM diário, após equidade e KPIs
+        'options': {'queue': 'batch'}
+    },
+    'drain-match-outbox': {
+        'task': 'match.drain_outbox',
+        'schedule': crontab(minute='*'),  # A cada minuto (registros que a API não drenou)
+        'options': {'queue': 'periodic'}
+    },
     'calculate-equity': {
         'task': 'backend.jobs.calculate_equity.calculate_equity_task',
         'schedule': crontab(hour=2, minute=0),  # 2:00 AM diário
@@ -68,6 +89,11 @@ celery_app.conf.beat_schedule = {
         'schedule': crontab(hour=3, minute=30, day_of_week='sun'),
         'options': {'queue': 'periodic'}
     },
+    'train-triage-classifier': {
+        'task': 'backend.jobs.train_triage_classifier.train_triage_classifier_task',
+        'schedule': crontab(hour=4, minute=0, day_of_week='sun'),
+        'options': {'queue': 'periodic'}
+    },
     'update-softskill': {
         'task': 'backend.jobs.sentiment_reviews.update_softskill',
         'schedule': crontab(hour=2, minute=10),
@@ -0,0 +1,88 @@
+"""
+backend/embedding_blob.py
+
+Formato binário compacto para os embeddings históricos dos advogados.
+
+Um blob guarda todos os vetores de um advogado como uma matriz contígua
+``count × dim`` em float32 ou float16 (little-endian), precedida por um
+cabeçalho de 16 bytes:
+
+    magic  b"EMB1"   4 bytes
+    dtype  uint8     1 = float32, 2 = float16
+    (reservado)      3 bytes
+    dim    uint32
+    count  uint32
+
+``unpack_embeddings`` devolve uma view somente-leitura sobre o próprio buffer
+(``np.frombuffer``, sem cópia). Comparado ao JSON (``casos_historicos_embeddings``),
+o blob float32 ocupa ~1/5 do payload e dispensa o parse de milhares de floats
+por advogado; o float16 reduz o tamanho pela metade de novo, com erro de
+similaridade de cosseno da ordem de 1e-3.
+
+No Supabase o blob fica em ``lawyers.casos_historicos_blob`` (bytea); o
+PostgREST o devolve como texto hexadecimal ``\\x...``, tratado por
+``decode_blob``.
+"""
+import base64
+import os
+import struct
+from typing import Any, Iterable, Optional, Union
+
+import numpy as np
+
+MAGIC = b"EMB1"
+HEADER = struct.Struct("<4sB3xII")
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+_CODES = {"float32": 1, "float16": 2}
+
+EMBEDDING_BLOB_DTYPE = os.getenv("EMBEDDING_BLOB_DTYPE", "float32")
+
+
+def pack_embeddings(vectors: Union[np.ndarray, Iterable[Any]], dtype: str = EMBEDDING_BLOB_DTYPE) -> bytes:
+    """Empacota uma lista de vetores (ou matriz ``count × dim``) em um blob."""
+    if dtype not in _CODES:
+        raise ValueError(f"dtype de embedding não suportado: {dtype}")
+    code = _CODES[dtype]
+    matrix = np.asarray(vectors if isinstance(vectors, np.ndarray) else list(vectors),
+                        dtype=_DTYPES[code])
+    if matrix.size == 0:
+        matrix = matrix.reshape(0, 0)
+    if matrix.ndim != 2:
+        raise ValueError(f"esperada matriz count × dim, recebido shape {matrix.shape}")
+    count, dim = matrix.shape
+    return HEADER.pack(MAGIC, code, dim, count) + np.ascontiguousarray(matrix).tobytes()
+
+
+def unpack_embeddings(blob: Union[bytes, bytearray, memoryview]) -> np.ndarray:
+    """Matriz ``count × dim`` (view somente-leitura, sem cópia) de um blob."""
+    if len(blob) < HEADER.size:
+        raise ValueError("blob de embeddings truncado")
+    magic, code, dim, count = HEADER.unpack_from(blob)
+    if magic != MAGIC or code not in _DTYPES:
+        raise ValueError("blob de embeddings inválido")
+    dtype = _DTYPES[code]
+    expected = HEADER.size + count * dim * dtype.itemsize
+    if len(blob) != expected:
+        raise ValueError(f"blob de embeddings com {len(blob)} bytes, esperado {expected}")
+    matrix = np.frombuffer(blob, dtype=dtype, count=count * dim, offset=HEADER.size).reshape(count, dim)
+    if matrix.flags.writeable:  # bytearray/memoryview graváveis
+        matrix.flags.writeable = False
+    return matrix
+
+
+def decode_blob(value: Any) -> Optional[bytes]:
+    """Bytes do blob como chegam do banco (bytes, hex ``\\x...`` do PostgREST ou base64)."""
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    if isinstance(value, str):
+        if value.startswith("\\x"):
+            return bytes.fromhex(value[2:])
+        return base64.b64decode(value)
+    raise TypeError(f"tipo de blob não suportado: {type(value).__name__}")
+
+
+def encode_blob(blob: bytes) -> str:
+    """Literal bytea para escrita via PostgREST/Supabase."""
+    return "\\x" + blob.hex()
@@ -25,7 +25,6 @@ try:
     import numpy as np
     import psycopg2
     from psycopg2.extras import RealDictCursor
-    from sentence_transformers import SentenceTransformer
     from tenacity import (
         retry,
         retry_if_exception_type,
@@ -37,6 +36,12 @@ except ImportError as e:
     print(f"Erro: Dependências não instaladas. Execute: pip install {e.name}")
     exit(1)
 
+from backend.embedding_blob import pack_embeddings
+from backend.services.embedding_cache import encode_cached
+from backend.services.embedding_space import space_for_model
+from backend.services.local_embeddings import get_local_encoder
+from backend.services.lawyer_vector_store import publish_vector_invalidation
+
 # Configurações
 JUSBRASIL_API_URL = "https://api.jusbrasil.com.br"
 API_KEY = os.getenv("JUSBRASIL_API_KEY")
@@ -270,7 +275,7 @@ class JusbrasilETL:
 
     def __init__(self):
         self.classifier = JusbrasilClassifier()
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        self.embedding_model = get_local_encoder(EMBEDDING_MODEL)
         self.db_connection = None
 
     def connect_db(self):
@@ -323,12 +328,14 @@ class JusbrasilETL:
         # Gerar resumo
         processo.resumo = self.classifier.generate_summary(processo)
 
-        # Gerar embedding
+        # Gerar embedding (resumos já vistos em syncs anteriores vêm do cache)
         if processo.resumo:
-            embedding = self.embedding_model.encode(
-                processo.resumo,
-                normalize_embeddings=True
-            )
+            embedding = encode_cached(
+                [processo.resumo],
+                lambda texts: self.embedding_model.encode(texts, normalize_embeddings=True),
+                model=f"{EMBEDDING_MODEL}:normalized",
+                dim=384,
+            )[0]
             processo.embedding = embedding.astype(np.float32)
 
         return processo
@@ -505,12 +512,27 @@ class JusbrasilETL:
                         'embedding': embedding.tolist(),
                         'outcome': outcome
                     })
+
+                # Cópia binária compacta lida pelo snapshot do matching (sem parse de JSON)
+                cursor.execute("""
+                    UPDATE lawyers SET casos_historicos_blob = %(blob)s,
+                                       casos_historicos_space = %(space)s
+                    WHERE id = %(lawyer_id)s
+                """, {
+                    'lawyer_id': lawyer_id,
+                    'blob': psycopg2.Binary(pack_embeddings(stats['embeddings'])),
+                    'space': space_for_model(EMBEDDING_MODEL, len(stats['embeddings'][0])).tag,
+                })
             
             if not self.db_connection:
                 raise ValueError("Conexão com banco não estabelecida")
             
             self.db_connection.commit()
             logger.info(f"Estatísticas atualizadas para advogado {lawyer_id}: {wins}/{total} vitórias")
+
+            # Novos embeddings → workers reconstroem os vetores deste advogado
+            if stats['embeddings']:
+                publish_vector_invalidation([lawyer_id])
             
         except Exception as e:
             if self.db_connection:
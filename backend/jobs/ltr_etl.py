@@ -1,69 +1,96 @@
 #!/usr/bin/env python3
 """Job ETL – gera dataset para LTR a partir dos logs de auditoria.
 Extrai eventos 'recommend' (exposição) e 'feedback' (aceite/decline/won/lost)
- 1. Lê logs/audit.log (JSON-lines)
- 2. Junta features + label
- 3. Salva em data/ltr_dataset.parquet
+ 1. Lê apenas os eventos novos dos segmentos em logs/audit/ (checkpoint)
+ 2. Acrescenta exposições e labels às partições do dia no feature store
+ 3. O join exposição × label acontece na leitura (ltr_feature_store.load_window)
+
+Só entram exposições com as features f_A..f_C registradas no evento
+(``features`` ou ``scores.features`` do contexto). Sem elas a linha seria um
+placeholder no mesmo store que o ltr_export preenche com valores reais, e o
+``load_window`` (mais recente por par caso × advogado) poderia escolhê-la.
 
 Programação sugerida: 03:30 UTC depois do Jusbrasil.
 """
-import json
 import logging
+import os
+import sys
 from pathlib import Path
+from typing import Any, Dict, Optional
 
 import pandas as pd
 
-AUDIT_FILE = Path("logs/audit.log")
-OUTPUT_FILE = Path("data/ltr_dataset.parquet")
+# Adiciona o diretório raiz ao path para importações
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.audit_sink import AUDIT_DIR, AuditLogReader
+from backend.jobs.ltr_feature_store import (
+    BASE_FEATURES,
+    FEATURE_KEYS,
+    STORE_DIR,
+    append_exposures,
+    append_labels,
+    valid_feature_mask,
+)
+
+CHECKPOINT_FILE = Path("data/ltr_etl.checkpoint.json")
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 logger = logging.getLogger(__name__)
 
 
-def build_dataset():
-    if not AUDIT_FILE.exists():
-        logger.error("Arquivo de log %s não encontrado", AUDIT_FILE)
+def logged_features(context: Dict[str, Any]) -> Optional[Dict[str, float]]:
+    """Features f_A..f_C registradas na exposição; None se o evento não traz todas."""
+    features = context.get("features") or (context.get("scores") or {}).get("features")
+    if not isinstance(features, dict):
+        return None
+    values = {}
+    for col, key in FEATURE_KEYS.items():
+        value = features.get(key, features.get(col))
+        try:
+            values[col] = float(value)
+        except (TypeError, ValueError):
+            return None
+    return values
+
+
+def build_dataset(audit_dir: Path = AUDIT_DIR, checkpoint_file: Path = CHECKPOINT_FILE,
+                  store_dir: Path = STORE_DIR):
+    if not Path(audit_dir).exists():
+        logger.error("Diretório de auditoria %s não encontrado", audit_dir)
         return
 
-    recommends = {}
-    labels = {}
+    recommends = []
+    feedback = []
+    skipped = 0
 
-    with AUDIT_FILE.open() as f:
-        for line in f:
-            try:
-                event = json.loads(line)
-            except json.JSONDecodeError:
+    reader = AuditLogReader(audit_dir, checkpoint_file)
+    for event in reader:
+        context = event.get("context") or {}
+        if event.get("message") == "recommend":
+            features = logged_features(context)
+            if features is None:
+                skipped += 1
                 continue
-            if event.get("message") == "recommend":
-                key = (event["context"].get("case"), event["context"].get("lawyer"))
-                recommends[key] = event["context"].get("fair")
-            elif event.get("message") == "feedback":
-                key = (event["context"].get("case"), event["context"].get("lawyer"))
-                label = event["context"].get("label")
-                labels[key] = 1 if label in {"accepted", "won"} else 0
-
-    # Build dataframe
-    rows = []
-    for key, score in recommends.items():
-        label = labels.get(key, 0)
-        rows.append({
-            "case_id": key[0],
-            "lawyer_id": key[1],
-            "relevance": label,
-            # placeholder features – real pipeline deve adicionar f_A, f_S ...
-            "f_A": score,
-            "f_S": score,
-            "f_T": score,
-            "f_G": score,
-            "f_Q": score,
-            "f_U": score,
-            "f_R": score,
-        })
-
-    df = pd.DataFrame(rows)
-    OUTPUT_FILE.parent.mkdir(exist_ok=True)
-    df.to_parquet(OUTPUT_FILE, index=False)
-    logger.info("Dataset LTR salvo em %s (%d linhas)", OUTPUT_FILE, len(df))
+            recommends.append({"case_id": context.get("case"), "lawyer_id": context.get("lawyer"),
+                               "timestamp": event.get("timestamp"), **features})
+        elif event.get("message") == "feedback":
+            feedback.append((context.get("case"), context.get("lawyer"),
+                             context.get("label"), event.get("timestamp")))
+
+    if skipped:
+        logger.warning("%d exposições sem features registradas ignoradas", skipped)
+    exposures = pd.DataFrame(recommends, columns=["case_id", "lawyer_id", "timestamp"] + BASE_FEATURES)
+    valid = valid_feature_mask(exposures)
+    if not valid.all():
+        logger.warning("%d exposições com features inválidas descartadas", int((~valid).sum()))
+        exposures = exposures[valid]
+    labels = pd.DataFrame(feedback, columns=["case_id", "lawyer_id", "label_str", "timestamp"])
+
+    n_exp = append_exposures(exposures, store_dir)
+    n_lab = append_labels(labels, store_dir)
+    reader.commit()
+    logger.info("Feature store %s: +%d exposições, +%d labels", store_dir, n_exp, n_lab)
 
 
 if __name__ == "__main__":
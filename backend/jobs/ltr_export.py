@@ -8,18 +8,34 @@ Features v2.2:
 - Labels numéricas (0-3) para relevância
 - Group ID para casos
 - Dados granulares de KPI
+- Saída append-only no feature store particionado (ltr_feature_store)
 """
-import json
 import logging
+import os
+import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List
 
 import numpy as np
 import pandas as pd
 
+# Adiciona o diretório raiz ao path para importações
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from backend.audit_sink import AUDIT_DIR, AuditLogReader
+from backend.jobs.ltr_feature_store import (
+    BASE_FEATURES,
+    DERIVED_FEATURES,
+    FEATURE_KEYS,
+    STORE_DIR,
+    add_derived_features,
+    append_exposures,
+    valid_feature_mask,
+)
+
 # --- Configuração ---
-LOG_FILE = Path("logs/audit.log")
+CHECKPOINT_FILE = Path("data/ltr_export.checkpoint.json")
 OUTPUT_FILE = Path("data/ltr_dataset.parquet")
 logging.basicConfig(
     level=logging.INFO,
@@ -40,171 +56,71 @@ def map_label_to_numeric(label_str: str) -> int:
     return label_mapping.get(label_str.lower(), 0)
 
 
-def extract_features_v2(log_entry: Dict) -> Dict:
-    """
-    Extrai features do log incluindo as novas features v2.2.
-    """
-    features = log_entry.get("features", {})
-
-    # Features v2.1 existentes
-    feature_dict = {
-        'f_A': features.get('A', 0.0),  # Area match
-        'f_S': features.get('S', 0.0),  # Case similarity
-        'f_T': features.get('T', 0.0),  # Success rate
-        'f_G': features.get('G', 0.0),  # Geographic score
-        'f_Q': features.get('Q', 0.0),  # Qualification score
-        'f_U': features.get('U', 0.0),  # Urgency capacity
-        'f_R': features.get('R', 0.0),  # Review score
-    }
-
-    # Feature v2.2 nova
-    feature_dict['f_C'] = features.get('C', 0.0)  # Soft-skills
-
-    return feature_dict
-
-
-def validate_features(features: Dict) -> bool:
+def events_to_frame(events: List[Dict]) -> pd.DataFrame:
     """
-    Valida se as features estão dentro dos ranges esperados.
+    Converte eventos 'match'/'recommend' em colunas (uma passada, sem dicts por linha).
+    Eventos sem as chaves necessárias são descartados; features ausentes valem 0.0.
     """
-    expected_features = ['f_A', 'f_S', 'f_T', 'f_G', 'f_Q', 'f_U', 'f_R', 'f_C']
-
-    # Verificar se todas as features estão presentes
-    for feature in expected_features:
-        if feature not in features:
-            return False
-
-        # Verificar se estão no range [0,1]
-        value = features[feature]
-        if not (0.0 <= value <= 1.0):
-            return False
-
-    return True
-
-
-def add_derived_features(record: Dict) -> Dict:
+    required_keys = ["features", "label", "case_id", "lawyer_id"]
+    events = [e for e in events
+              if e.get("event") in ("match", "recommend") and all(k in e for k in required_keys)]
+    if not events:
+        return pd.DataFrame()
+
+    df = pd.DataFrame({
+        'case_id': [e['case_id'] for e in events],
+        'lawyer_id': [e['lawyer_id'] for e in events],
+        'label_str': [e['label'] for e in events],
+        'timestamp': [e.get('timestamp', '') for e in events],
+    })
+    features = pd.DataFrame.from_records([e['features'] or {} for e in events])
+    for col, key in FEATURE_KEYS.items():
+        df[col] = pd.to_numeric(features[key], errors='coerce').fillna(0.0) if key in features else 0.0
+    return df
+
+
+def create_ltr_dataset(audit_dir: Path = AUDIT_DIR, checkpoint_file: Path = CHECKPOINT_FILE,
+                       store_dir: Path = STORE_DIR) -> int:
     """
-    Adiciona features derivadas para melhorar o modelo.
+    Lê os eventos novos dos logs de auditoria e os acrescenta ao feature store.
+    Versão expandida v2.2 com novas features e labels numéricas.
+    Features derivadas e validação são calculadas sobre as colunas; o treino lê
+    a janela desejada com ``ltr_feature_store.load_window``.
     """
-    # Feature de qualidade geral (média ponderada)
-    quality_score = (
-        record['f_Q'] * 0.4 +  # Qualificação
-        record['f_T'] * 0.3 +  # Taxa de sucesso
-        record['f_R'] * 0.2 +  # Reviews
-        record['f_C'] * 0.1    # Soft-skills
-    )
-    record['f_quality'] = quality_score
+    if not Path(audit_dir).exists():
+        logging.error(f"Diretório de auditoria não encontrado em '{audit_dir}'")
+        return 0
 
-    # Feature de disponibilidade (geográfica + urgência)
-    availability_score = (record['f_G'] + record['f_U']) / 2
-    record['f_availability'] = availability_score
+    logging.info(f"Iniciando ETL v2.2 incremental dos segmentos em: {audit_dir}")
 
-    # Feature de match total (área + similaridade)
-    match_score = (record['f_A'] + record['f_S']) / 2
-    record['f_match'] = match_score
+    reader = AuditLogReader(audit_dir, checkpoint_file)
+    events = list(reader)
+    df = events_to_frame(events)
 
-    return record
-
-
-def create_ltr_dataset():
-    """
-    Lê os logs de auditoria, extrai dados de match e salva em um dataset Parquet.
-    Versão expandida v2.2 com novas features e labels numéricas.
-    """
-    if not LOG_FILE.exists():
-        logging.error(f"Arquivo de log não encontrado em '{LOG_FILE}'")
-        return
+    if df.empty:
+        logging.warning("Nenhum registro de match novo desde o último checkpoint.")
+        reader.commit()
+        return 0
 
-    logging.info(f"Iniciando ETL v2.2 do arquivo de log: {LOG_FILE}")
+    # Validar features (vetorizado)
+    valid = valid_feature_mask(df)
+    if not valid.all():
+        logging.warning(f"{int((~valid).sum())} registros com features inválidas descartados")
+    df = df[valid]
 
-    records = []
-    processed_count = 0
-    valid_count = 0
-
-    with open(LOG_FILE, 'r') as f:
-        for line_num, line in enumerate(f, 1):
-            try:
-                log_entry = json.loads(line)
-                processed_count += 1
-
-                # Processar apenas logs de 'match' ou 'recommend'
-                event_type = log_entry.get("event")
-                if event_type not in ["match", "recommend"]:
-                    continue
-
-                # Verificar se tem as chaves necessárias
-                required_keys = ["features", "label", "case_id", "lawyer_id"]
-                if not all(key in log_entry for key in required_keys):
-                    continue
-
-                # Extrair features v2.2
-                features = extract_features_v2(log_entry)
-
-                # Validar features
-                if not validate_features(features):
-                    logging.warning(
-                        f"Features inválidas na linha {line_num}: {features}")
-                    continue
-
-                # Adicionar features derivadas
-                features = add_derived_features(features)
-
-                # Criar registro para o dataset
-                record = {
-                    'case_id': log_entry.get('case_id'),
-                    'lawyer_id': log_entry.get('lawyer_id'),
-                    'label_str': log_entry.get('label'),
-                    'label_num': map_label_to_numeric(log_entry.get('label')),
-                    'group_id': log_entry.get('case_id'),  # Para ranking por caso
-                    'timestamp': log_entry.get('timestamp', ''),
-                    **features  # Adicionar todas as features
-                }
-
-                records.append(record)
-                valid_count += 1
-
-            except json.JSONDecodeError:
-                logging.warning(f"Linha {line_num} mal formatada: {line.strip()}")
-                continue
-            except Exception as e:
-                logging.error(f"Erro processando linha {line_num}: {e}")
-                continue
-
-    if not records:
-        logging.warning("Nenhum registro de match válido encontrado nos logs.")
-        return
-
-    # Criar DataFrame
-    df = pd.DataFrame(records)
-
-    # Estatísticas do dataset
-    logging.info(
-        f"Dataset criado com {
-            len(df)} registros válidos de {processed_count} processados")
+    # Estatísticas do lote
+    logging.info(f"Lote com {len(df)} registros válidos de {len(events)} eventos processados")
     logging.info(f"Distribuição de labels: {df['label_str'].value_counts().to_dict()}")
-    logging.info(f"Distribuição numérica: {df['label_num'].value_counts().to_dict()}")
     logging.info(f"Casos únicos: {df['case_id'].nunique()}")
     logging.info(f"Advogados únicos: {df['lawyer_id'].nunique()}")
 
-    # Adicionar metadados
-    df['export_date'] = datetime.now().isoformat()
-    df['version'] = 'v2.2'
-
-    # Salvar em Parquet
-    OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(OUTPUT_FILE, index=False)
-
-    logging.info(f"Dataset salvo em '{OUTPUT_FILE}'")
-
-    # Salvar também em CSV para debug
-    csv_file = OUTPUT_FILE.with_suffix('.csv')
-    df.to_csv(csv_file, index=False)
-    logging.info(f"Dataset de debug salvo em '{csv_file}'")
+    written = append_exposures(df, store_dir)
+    reader.commit()
+    logging.info(f"{written} exposições acrescentadas ao feature store '{store_dir}'")
 
-    # Estatísticas finais das features
-    feature_cols = [col for col in df.columns if col.startswith('f_')]
-    feature_stats = df[feature_cols].describe()
+    feature_stats = add_derived_features(df.copy())[BASE_FEATURES + DERIVED_FEATURES].describe()
     logging.info(f"Estatísticas das features:\n{feature_stats}")
+    return written
 
 
 def create_test_dataset():
@@ -268,12 +184,10 @@ def create_test_dataset():
                 'version': 'v2.2_test'
             }
 
-            # Adicionar features derivadas
-            record = add_derived_features(record)
             records.append(record)
 
-    # Salvar dataset de teste
-    df_test = pd.DataFrame(records)
+    # Salvar dataset de teste (features derivadas calculadas nas colunas)
+    df_test = add_derived_features(pd.DataFrame(records))
     test_file = OUTPUT_FILE.parent / "ltr_dataset_test.parquet"
     df_test.to_parquet(test_file, index=False)
 
@@ -0,0 +1,164 @@
+# backend/jobs/ltr_feature_store.py
+"""
+Feature store colunar (Parquet) para o pipeline LTR.
+
+Duas tabelas append-only particionadas por data (``dt=YYYY-MM-DD``):
+
+- ``exposures``: uma linha por advogado exibido em um ranking, com as
+  features f_A..f_C (e label, quando o evento já a traz);
+- ``labels``: feedback posterior (accepted/declined/won/lost).
+
+Cada execução do ETL grava apenas arquivos novos nas partições do dia, e o
+treino lê somente a janela de datas de que precisa. Features derivadas e
+validação são calculadas vetorizadas sobre as colunas.
+"""
+import logging
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = Path(os.getenv("LTR_STORE_DIR", "data/ltr_store"))
+
+BASE_FEATURES = ['f_A', 'f_S', 'f_T', 'f_G', 'f_Q', 'f_U', 'f_R', 'f_C']
+DERIVED_FEATURES = ['f_quality', 'f_availability', 'f_match']
+FEATURE_KEYS = {f: f[2:] for f in BASE_FEATURES}
+
+LABEL_MAPPING = {
+    'lost': 0,        # Perdeu o caso
+    'declined': 1,    # Declinou a oferta
+    'accepted': 2,    # Aceitou mas não ganhou
+    'won': 3          # Ganhou o caso
+}
+
+_PARTITIONING = ds.partitioning(pa.schema([("dt", pa.string())]), flavor="hive")
+
+# Esquema fixo por tabela: arquivos de jobs diferentes precisam ser legíveis
+# como um único dataset. Features derivadas são calculadas na leitura.
+_KEY_FIELDS = [("case_id", pa.string()), ("lawyer_id", pa.string()), ("timestamp", pa.string())]
+EXPOSURE_SCHEMA = pa.schema(
+    _KEY_FIELDS + [("label_str", pa.string())] + [(f, pa.float64()) for f in BASE_FEATURES]
+    + [("dt", pa.string())])
+LABEL_SCHEMA = pa.schema(_KEY_FIELDS + [("label_str", pa.string()), ("dt", pa.string())])
+
+
+def map_labels(labels: pd.Series) -> pd.Series:
+    """Versão vetorizada de ``map_label_to_numeric`` (escala 0-3)."""
+    return labels.astype("string").str.lower().map(LABEL_MAPPING).fillna(0).astype("int8")
+
+
+def add_derived_features(df: pd.DataFrame) -> pd.DataFrame:
+    """Features derivadas calculadas sobre as colunas (qualidade, disponibilidade, match)."""
+    df['f_quality'] = df['f_Q'] * 0.4 + df['f_T'] * 0.3 + df['f_R'] * 0.2 + df['f_C'] * 0.1
+    df['f_availability'] = (df['f_G'] + df['f_U']) / 2
+    df['f_match'] = (df['f_A'] + df['f_S']) / 2
+    return df
+
+
+def valid_feature_mask(df: pd.DataFrame) -> np.ndarray:
+    """Linhas com todas as features base presentes e dentro de [0, 1]."""
+    if any(col not in df.columns for col in BASE_FEATURES):
+        return np.zeros(len(df), dtype=bool)
+    values = df[BASE_FEATURES].to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.all((values >= 0.0) & (values <= 1.0), axis=1)
+
+
+def partition_dates(timestamps: pd.Series) -> pd.Series:
+    """``dt`` (YYYY-MM-DD) a partir do timestamp do evento; hoje quando ausente."""
+    parsed = pd.to_datetime(timestamps.astype("string").str[:10], errors="coerce", format="%Y-%m-%d")
+    return parsed.dt.strftime("%Y-%m-%d").fillna(date.today().isoformat())
+
+
+def _append(table: str, df: pd.DataFrame, schema: pa.Schema, store_dir: Path) -> int:
+    if df.empty:
+        return 0
+    timestamps = df['timestamp'] if 'timestamp' in df else pd.Series([None] * len(df), index=df.index)
+    out = pd.DataFrame(index=df.index)
+    for name in schema.names:
+        if name == 'dt':
+            out[name] = partition_dates(timestamps)
+        elif name in df:
+            column = df[name]
+            out[name] = column.astype(float) if schema.field(name).type == pa.float64() else \
+                column.where(column.isna(), column.astype(str))
+        else:
+            out[name] = None
+    ds.write_dataset(
+        pa.Table.from_pandas(out, schema=schema, preserve_index=False),
+        Path(store_dir) / table,
+        format="parquet",
+        partitioning=_PARTITIONING,
+        basename_template=f"part-{datetime.now():%Y%m%dT%H%M%S%f}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return len(df)
+
+
+def append_exposures(df: pd.DataFrame, store_dir: Path = STORE_DIR) -> int:
+    """Acrescenta exposições (case_id, lawyer_id, features, label opcional)."""
+    return _append("exposures", df, EXPOSURE_SCHEMA, store_dir)
+
+
+def append_labels(df: pd.DataFrame, store_dir: Path = STORE_DIR) -> int:
+    """Acrescenta labels de feedback (case_id, lawyer_id, label_str, timestamp)."""
+    return _append("labels", df, LABEL_SCHEMA, store_dir)
+
+
+def _read(table: str, store_dir: Path, start: Optional[str], end: Optional[str],
+          columns: Optional[List[str]] = None) -> pd.DataFrame:
+    path = Path(store_dir) / table
+    if not path.exists():
+        return pd.DataFrame()
+    schema = EXPOSURE_SCHEMA if table == "exposures" else LABEL_SCHEMA
+    dataset = ds.dataset(path, format="parquet", schema=schema, partitioning=_PARTITIONING)
+    expr = None
+    if start:
+        expr = ds.field("dt") >= start
+    if end:
+        cond = ds.field("dt") <= end
+        expr = cond if expr is None else expr & cond
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def load_window(days: Optional[int] = None, end: Optional[date] = None,
+                store_dir: Path = STORE_DIR, require_label: bool = True) -> pd.DataFrame:
+    """
+    Dataset de treino para as exposições dos últimos ``days`` dias (todas se None).
+
+    Exposições repetidas do mesmo par (caso, advogado) ficam com a mais recente;
+    labels de feedback (lidas a partir do início da janela, pois chegam depois
+    da exposição) sobrescrevem a label trazida na própria exposição.
+    """
+    end_d = end or date.today()
+    start = (end_d - timedelta(days=days)).isoformat() if days else None
+    exposures = _read("exposures", store_dir, start, end_d.isoformat())
+    if exposures.empty:
+        return exposures
+
+    exposures = exposures.sort_values('timestamp', kind="stable")
+    exposures = exposures.drop_duplicates(['case_id', 'lawyer_id'], keep='last')
+
+    labels = _read("labels", store_dir, start, None,
+                   columns=['case_id', 'lawyer_id', 'label_str', 'timestamp'])
+    if not labels.empty:
+        labels = labels.sort_values('timestamp', kind="stable").drop_duplicates(
+            ['case_id', 'lawyer_id'], keep='last')
+        exposures = exposures.merge(labels[['case_id', 'lawyer_id', 'label_str']],
+                                    on=['case_id', 'lawyer_id'], how='left', suffixes=('', '_fb'))
+        exposures['label_str'] = exposures['label_str_fb'].fillna(exposures['label_str'])
+        exposures = exposures.drop(columns=['label_str_fb'])
+
+    if require_label:
+        exposures = exposures[exposures['label_str'].notna()].copy()
+    exposures = add_derived_features(exposures)
+    exposures['label_num'] = map_labels(exposures['label_str'])
+    exposures['group_id'] = exposures['case_id']
+    # Ranking por caso: linhas do mesmo grupo precisam ser contíguas
+    return exposures.sort_values('group_id', kind="stable").reset_index(drop=True)
@@ -7,13 +7,15 @@ Treina modelo com as novas features e salva pesos otimizados.
 Features v2.2:
 - Suporte para feature C (soft-skills)
 - Modelo LambdaMART para ranking
-- Validação cruzada com métricas de ranking
+- Validação cruzada com métricas de ranking (folds/grid em paralelo)
 - Exportação de pesos para algoritmo
 """
+import itertools
 import json
 import logging
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -27,15 +29,24 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.
 try:
     import joblib
     import lightgbm as lgb
-    from sklearn.metrics import ndcg_score
     from sklearn.model_selection import GroupKFold
 except ImportError as e:
     print(f"Dependência faltando: {e}")
     print("Instale com: pip install lightgbm scikit-learn joblib pandas numpy")
     sys.exit(1)
 
+from backend.jobs.ltr_feature_store import STORE_DIR, load_window
+from backend.jobs.ltr_metrics import group_ids_from_sizes, grouped_ndcg, grouped_precision
+
 # --- Configuração ---
 DATA_FILE = Path("data/ltr_dataset.parquet")
+# Janela de treino lida do feature store (0 = todo o histórico)
+TRAIN_WINDOW_DAYS = int(os.getenv("LTR_TRAIN_WINDOW_DAYS", "180"))
+# Processos para folds/grid (1 = serial, no próprio processo)
+TRAIN_WORKERS = int(os.getenv("LTR_TRAIN_WORKERS", str(min(5, os.cpu_count() or 1))))
+# Grid opcional, ex.: '{"num_leaves": [15, 31, 63], "learning_rate": [0.05, 0.1]}'
+PARAM_GRID = json.loads(os.getenv("LTR_PARAM_GRID", "{}"))
+N_SPLITS = 5
 MODEL_FILE = Path("backend/models/ltr_model.txt")
 WEIGHTS_FILE = Path("backend/models/ltr_weights.json")
 LOG_FILE = Path("logs/ltr_training.log")
@@ -67,16 +78,21 @@ FEATURE_COLUMNS = [
 ]
 
 
-def load_dataset() -> pd.DataFrame:
+def load_dataset(window_days: Optional[int] = TRAIN_WINDOW_DAYS) -> pd.DataFrame:
     """
     Carrega o dataset de treinamento.
+    Lê apenas as partições da janela no feature store; usa o Parquet legado
+    (DATA_FILE) quando o store ainda não existe.
     """
-    if not DATA_FILE.exists():
+    if (STORE_DIR / "exposures").exists():
+        df = load_window(days=window_days or None)
+        logger.info(f"Dataset carregado do feature store ({window_days or 'todos os'} dias): {len(df)} registros")
+    elif DATA_FILE.exists():
+        df = pd.read_parquet(DATA_FILE)
+        logger.info(f"Dataset carregado com {len(df)} registros")
+    else:
         raise FileNotFoundError(
-            f"Dataset não encontrado em '{DATA_FILE}'. Execute ltr_export.py primeiro.")
-
-    df = pd.read_parquet(DATA_FILE)
-    logger.info(f"Dataset carregado com {len(df)} registros")
+            f"Dataset não encontrado em '{STORE_DIR}' nem '{DATA_FILE}'. Execute ltr_export.py primeiro.")
 
     # Verificar se tem as colunas necessárias
     missing_cols = [col for col in FEATURE_COLUMNS if col not in df.columns]
@@ -106,89 +122,113 @@ def prepare_data(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     return X, y, groups
 
 
-def train_model(X: np.ndarray, y: np.ndarray, groups: np.ndarray) -> lgb.LGBMRanker:
-    """
-    Treina modelo LambdaMART usando LightGBM.
-    """
-    logger.info("Iniciando treinamento do modelo LTR...")
+BASE_MODEL_PARAMS = {
+    'objective': 'lambdarank',
+    'metric': 'ndcg',
+    'ndcg_eval_at': [1, 3, 5],
+    'num_leaves': 31,
+    'learning_rate': 0.05,
+    'feature_fraction': 0.9,
+    'bagging_fraction': 0.8,
+    'bagging_freq': 5,
+    'verbose': 0,
+    'random_state': 42
+}
 
-    # Configuração do modelo
-    model_params = {
-        'objective': 'lambdarank',
-        'metric': 'ndcg',
-        'ndcg_eval_at': [1, 3, 5],
-        'num_leaves': 31,
-        'learning_rate': 0.05,
-        'feature_fraction': 0.9,
-        'bagging_fraction': 0.8,
-        'bagging_freq': 5,
-        'verbose': 0,
-        'random_state': 42
-    }
 
-    # Criar modelo
-    model = lgb.LGBMRanker(**model_params)
+# Dados compartilhados com os processos do pool (enviados uma vez por worker)
+_FOLD_DATA: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
 
-    # Validação cruzada com grupos
-    cv_scores = []
-    group_kfold = GroupKFold(n_splits=5)
 
-    # Criar identificadores de grupo para CV
-    group_ids = []
-    current_group = 0
-    for group_size in groups:
-        group_ids.extend([current_group] * group_size)
-        current_group += 1
-    group_ids = np.array(group_ids)
+def _init_fold_worker(X: np.ndarray, y: np.ndarray, group_ids: np.ndarray) -> None:
+    global _FOLD_DATA
+    _FOLD_DATA = (X, y, group_ids)
 
-    for fold, (train_idx, val_idx) in enumerate(group_kfold.split(X, y, group_ids)):
-        logger.info(f"Fold {fold + 1}/5...")
 
-        X_train, X_val = X[train_idx], X[val_idx]
-        y_train, y_val = y[train_idx], y[val_idx]
+def _fit_fold(params: Dict, train_idx: np.ndarray, val_idx: np.ndarray) -> float:
+    """Treina um fold e retorna o NDCG@5 médio dos grupos de validação."""
+    X, y, group_ids = _FOLD_DATA
+    train_groups = np.bincount(group_ids[train_idx])
+    val_groups = np.bincount(group_ids[val_idx])
+    # Remover grupos vazios
+    train_groups = train_groups[train_groups > 0]
+    val_groups = val_groups[val_groups > 0]
 
-        # Recalcular grupos para train/val
-        train_groups = np.bincount(group_ids[train_idx])
-        val_groups = np.bincount(group_ids[val_idx])
+    model = lgb.LGBMRanker(**params)
+    model.fit(
+        X[train_idx], y[train_idx], group=train_groups, feature_name=FEATURE_COLUMNS,
+        eval_set=[(X[val_idx], y[val_idx])], eval_group=[val_groups],
+        callbacks=[lgb.early_stopping(50, verbose=False), lgb.log_evaluation(0)]
+    )
+    y_pred = model.predict(X[val_idx])
 
-        # Remover grupos vazios
-        train_groups = train_groups[train_groups > 0]
-        val_groups = val_groups[val_groups > 0]
+    val_ids = group_ids_from_sizes(val_groups)
+    ndcg = grouped_ndcg(y[val_idx], y_pred, val_ids, k=5)
+    multi = val_groups > 1  # Precisa de pelo menos 2 itens para NDCG
+    return float(ndcg[multi].mean()) if multi.any() else float("nan")
 
-        # Treinar modelo
-        model.fit(
-            X_train, y_train, group=train_groups,
-            eval_set=[(X_val, y_val)], eval_group=[val_groups],
-            callbacks=[lgb.early_stopping(50), lgb.log_evaluation(0)]
-        )
-
-        # Avaliar
-        y_pred = model.predict(X_val)
-
-        # Calcular NDCG por grupo
-        ndcg_scores = []
-        start_idx = 0
-        for group_size in val_groups:
-            end_idx = start_idx + group_size
-            if group_size > 1:  # Precisa de pelo menos 2 itens para NDCG
-                y_true_group = y_val[start_idx:end_idx]
-                y_pred_group = y_pred[start_idx:end_idx]
-                ndcg = ndcg_score([y_true_group], [y_pred_group], k=5)
-                ndcg_scores.append(ndcg)
-            start_idx = end_idx
-
-        if ndcg_scores:
-            fold_ndcg = np.mean(ndcg_scores)
-            cv_scores.append(fold_ndcg)
-            logger.info(f"Fold {fold + 1} NDCG@5: {fold_ndcg:.4f}")
+
+def _param_candidates(param_grid: Optional[Dict[str, List]]) -> List[Dict]:
+    if not param_grid:
+        return [dict(BASE_MODEL_PARAMS)]
+    keys = list(param_grid)
+    return [{**BASE_MODEL_PARAMS, **dict(zip(keys, values))}
+            for values in itertools.product(*(param_grid[k] for k in keys))]
+
+
+def train_model(X: np.ndarray, y: np.ndarray, groups: np.ndarray,
+                workers: int = TRAIN_WORKERS,
+                param_grid: Optional[Dict[str, List]] = None) -> lgb.LGBMRanker:
+    """
+    Treina modelo LambdaMART usando LightGBM.
+
+    Os folds do GroupKFold (e as combinações do grid, se houver) rodam em
+    paralelo em um ProcessPoolExecutor com ``workers`` processos; o modelo
+    final usa os parâmetros com maior NDCG@5 médio na validação cruzada.
+    """
+    logger.info("Iniciando treinamento do modelo LTR...")
+
+    group_ids = group_ids_from_sizes(groups)
+    folds = list(GroupKFold(n_splits=N_SPLITS).split(X, y, group_ids))
+    candidates = _param_candidates(PARAM_GRID if param_grid is None else param_grid)
+    if workers > 1:
+        # Evita oversubscription: threads do LightGBM divididas entre os processos
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        candidates = [{**c, 'n_jobs': threads} for c in candidates]
+
+    tasks = [(ci, fi, train_idx, val_idx)
+             for ci in range(len(candidates))
+             for fi, (train_idx, val_idx) in enumerate(folds)]
+    logger.info(f"{len(candidates)} combinação(ões) × {len(folds)} folds, {workers} processo(s)")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_fold_worker,
+                                 initargs=(X, y, group_ids)) as pool:
+            futures = [pool.submit(_fit_fold, candidates[ci], tr, va) for ci, _, tr, va in tasks]
+            results = [f.result() for f in futures]
+    else:
+        _init_fold_worker(X, y, group_ids)
+        results = [_fit_fold(candidates[ci], tr, va) for ci, _, tr, va in tasks]
+
+    cv = np.full((len(candidates), len(folds)), np.nan)
+    for (ci, fi, _, _), score in zip(tasks, results):
+        cv[ci, fi] = score
+        logger.info(f"Combinação {ci + 1} fold {fi + 1}/{len(folds)} NDCG@5: {score:.4f}")
+
+    mean_cv = np.array([np.nanmean(row) if np.isfinite(row).any() else 0.0 for row in cv])
+    best = int(np.argmax(mean_cv))
+    best_params = {k: v for k, v in candidates[best].items() if k != 'n_jobs'}
+    if len(candidates) > 1:
+        tuned = {k: best_params[k] for k in (param_grid or PARAM_GRID)}
+        logger.info(f"Melhores parâmetros: {tuned}")
 
     # Treinar modelo final com todos os dados
     logger.info("Treinando modelo final...")
-    model.fit(X, y, group=groups, callbacks=[lgb.log_evaluation(0)])
+    model = lgb.LGBMRanker(**best_params)
+    model.fit(X, y, group=groups, feature_name=FEATURE_COLUMNS, callbacks=[lgb.log_evaluation(0)])
 
     # Métricas finais
-    avg_ndcg = np.mean(cv_scores) if cv_scores else 0.0
-    logger.info(f"NDCG@5 médio (CV): {avg_ndcg:.4f}")
+    logger.info(f"NDCG@5 médio (CV): {mean_cv[best]:.4f}")
 
     return model
 
@@ -273,35 +313,15 @@ def evaluate_model(model: lgb.LGBMRanker, X: np.ndarray,
     # Predições
     y_pred = model.predict(X)
 
-    # Calcular métricas por grupo
-    ndcg_scores = []
-    precision_at_5 = []
-
-    start_idx = 0
-    for group_size in groups:
-        end_idx = start_idx + group_size
-
-        if group_size > 1:
-            y_true_group = y[start_idx:end_idx]
-            y_pred_group = y_pred[start_idx:end_idx]
-
-            # NDCG@5
-            ndcg = ndcg_score([y_true_group], [y_pred_group], k=5)
-            ndcg_scores.append(ndcg)
-
-            # Precision@5
-            top_5_indices = np.argsort(y_pred_group)[-5:]
-            top_5_true = y_true_group[top_5_indices]
-            precision = np.sum(top_5_true >= 2) / min(5,
-                                                      # Relevantes: label >= 2
-                                                      len(top_5_true))
-            precision_at_5.append(precision)
-
-        start_idx = end_idx
+    # Calcular métricas por grupo (vetorizado, grupos com pelo menos 2 itens)
+    group_ids = group_ids_from_sizes(groups)
+    multi = np.asarray(groups) > 1
+    ndcg_scores = grouped_ndcg(y, y_pred, group_ids, k=5)[multi]
+    precision_at_5 = grouped_precision(y, y_pred, group_ids, k=5)[multi]
 
     # Métricas finais
-    avg_ndcg = np.mean(ndcg_scores) if ndcg_scores else 0.0
-    avg_precision = np.mean(precision_at_5) if precision_at_5 else 0.0
+    avg_ndcg = float(np.mean(ndcg_scores)) if len(ndcg_scores) else 0.0
+    avg_precision = float(np.mean(precision_at_5)) if len(precision_at_5) else 0.0
 
     logger.info(f"NDCG@5 final: {avg_ndcg:.4f}")
     logger.info(f"Precision@5 final: {avg_precision:.4f}")
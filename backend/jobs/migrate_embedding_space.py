@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Job: Migração dos embeddings persistidos para o registro de espaços.
+
+Para as linhas ainda sem tag de espaço:
+
+- ``cases.summary_embedding``: recorta o padding legado (MiniLM completado
+  com zeros até 1536) e grava ``summary_embedding_space``;
+- ``lawyers.casos_historicos_blob``: idem, reempacotando o blob se houver
+  padding, e grava ``casos_historicos_space``.
+
+Com ``--reembed`` os resumos dos casos fora do espaço local (ex.: OpenAI)
+são re-gerados com o modelo local em lote (via cache de embeddings), de
+modo que casos e advogados fiquem no mesmo espaço nativo, mesmo sem
+projeção treinada.
+
+Uso:
+    python3 -m backend.jobs.migrate_embedding_space [--reembed] [--dtype float16]
+"""
+import argparse
+import logging
+import os
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+from backend.embedding_blob import EMBEDDING_BLOB_DTYPE, decode_blob, encode_blob, pack_embeddings, unpack_embeddings
+from backend.services.embedding_cache import encode_cached
+from backend.services.embedding_space import LOCAL_SPACE, infer_space
+from backend.services.local_embeddings import get_local_encoder
+from supabase import Client, create_client
+
+load_dotenv()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = int(os.getenv("MIGRATE_EMBEDDINGS_PAGE_SIZE", "200"))
+
+
+def _pages(supabase: Client, table: str, columns: str, vector_col: str, space_col: str, page_size: int):
+    last_id = None
+    while True:
+        query = supabase.table(table).select(columns).is_(space_col, "null").not_.is_(vector_col, "null")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data or []
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+
+
+def migrate_cases(supabase: Client, reembed: bool = False, page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """Tag (e, com ``reembed``, re-geração local) de ``cases.summary_embedding``."""
+    stats = {"tagged": 0, "unpadded": 0, "reembedded": 0, "unknown": 0, "failed": 0}
+    encoder = get_local_encoder(LOCAL_SPACE.model) if reembed else None
+    for rows in _pages(supabase, "cases", "id, summary, summary_embedding",
+                       "summary_embedding", "summary_embedding_space", page_size):
+        updates: Dict[str, dict] = {}
+        to_reembed: List[dict] = []
+        for row in rows:
+            raw = row["summary_embedding"]
+            vec, space = infer_space(raw)
+            if space is None:
+                stats["unknown"] += 1
+                continue
+            if reembed and space != LOCAL_SPACE and row.get("summary"):
+                to_reembed.append(row)
+                continue
+            if vec.size != len(raw):
+                stats["unpadded"] += 1
+            updates[row["id"]] = {"summary_embedding": vec.tolist(), "summary_embedding_space": space.tag}
+
+        if to_reembed:
+            # Uma chamada encode para a página inteira
+            matrix = encode_cached([r["summary"] for r in to_reembed], encoder.encode,
+                                   model=LOCAL_SPACE.model, dim=LOCAL_SPACE.dim)
+            for row, vec in zip(to_reembed, matrix):
+                updates[row["id"]] = {"summary_embedding": vec.tolist(),
+                                      "summary_embedding_space": LOCAL_SPACE.tag}
+            stats["reembedded"] += len(to_reembed)
+
+        for case_id, update in updates.items():
+            try:
+                supabase.table("cases").update(update).eq("id", case_id).execute()
+                stats["tagged"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.warning(f"Falha ao migrar embedding do caso {case_id}: {e}")
+    return stats
+
+
+def migrate_lawyers(supabase: Client, dtype: str = EMBEDDING_BLOB_DTYPE,
+                    page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """Tag de ``lawyers.casos_historicos_blob``, recortando padding legado."""
+    stats = {"tagged": 0, "unpadded": 0, "unknown": 0, "failed": 0}
+    for rows in _pages(supabase, "lawyers", "id, casos_historicos_blob",
+                       "casos_historicos_blob", "casos_historicos_space", page_size):
+        for row in rows:
+            try:
+                matrix = unpack_embeddings(decode_blob(row["casos_historicos_blob"]))
+                if not len(matrix):
+                    continue
+                native = [infer_space(v) for v in matrix]
+                spaces = {space for _, space in native}
+                if len(spaces) != 1 or None in spaces:
+                    stats["unknown"] += 1
+                    continue
+                update = {"casos_historicos_space": spaces.pop().tag}
+                if native[0][0].size != matrix.shape[1]:
+                    update["casos_historicos_blob"] = encode_blob(
+                        pack_embeddings([vec for vec, _ in native], dtype=dtype))
+                    stats["unpadded"] += 1
+                supabase.table("lawyers").update(update).eq("id", row["id"]).execute()
+                stats["tagged"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                logger.warning(f"Falha ao migrar embeddings do advogado {row['id']}: {e}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reembed", action="store_true")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=EMBEDDING_BLOB_DTYPE)
+    args = parser.parse_args()
+    client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    print({"cases": migrate_cases(client, reembed=args.reembed),
+           "lawyers": migrate_lawyers(client, dtype=args.dtype)})
@@ -25,7 +25,6 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '.
 try:
     import numpy as np
     from dotenv import load_dotenv
-    from sentence_transformers import SentenceTransformer
 
     from supabase import Client, create_client
 except ImportError as e:
@@ -33,6 +32,11 @@ except ImportError as e:
     print("Instale com: pip install supabase python-dotenv sentence-transformers numpy")
     sys.exit(1)
 
+from backend.services.embedding_cache import encode_cached
+from backend.services.embedding_space import space_for_model
+from backend.services.local_embeddings import get_local_encoder
+from backend.services.lawyer_vector_store import publish_vector_invalidation
+
 # --- Configuração ---
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -58,8 +62,8 @@ def load_embedding_model():
     """Carrega o modelo de embeddings."""
     global model
     if model is None:
-        logger.info(f"Carregando modelo de embeddings: {CV_EMBED_MODEL}")
-        model = SentenceTransformer(CV_EMBED_MODEL)
+        logger.info(f"Usando modelo de embeddings: {CV_EMBED_MODEL}")
+        model = get_local_encoder(CV_EMBED_MODEL)
     return model
 
 
@@ -179,7 +183,7 @@ def generate_cv_embedding(text: str) -> List[float]:
         return [0.0] * 384  # Dimensão padrão do modelo
 
     model = load_embedding_model()
-    embedding = model.encode(text)
+    embedding = encode_cached([text], model.encode, model=CV_EMBED_MODEL, dim=384)[0]
     return embedding.tolist()
 
 
@@ -250,10 +254,12 @@ async def process_lawyer_cv(supabase: Client, lawyer: dict) -> bool:
             "education": json.dumps(qualifications),
             "professional_experience": json.dumps(experiences),  # Salva como JSON
             "publications": publications,  # Salva na coluna de `publications` também
-            "cv_embedding": str(cv_embedding)  # Salva na nova coluna pgvector
+            "cv_embedding": str(cv_embedding),  # Salva na nova coluna pgvector
+            "cv_embedding_space": space_for_model(CV_EMBED_MODEL, len(cv_embedding)).tag,
         }
 
         supabase.table("lawyers").update(update_data).eq("id", lawyer_id).execute()
+        publish_vector_invalidation([lawyer_id])
 
         logger.info(json.dumps({
             "event": "cv_processed",
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Job: Empacotamento binário dos embeddings históricos dos advogados.
+
+Converte ``lawyers.casos_historicos_embeddings`` (JSON) em
+``lawyers.casos_historicos_blob`` (bytea, formato de backend/embedding_blob.py)
+para os advogados que ainda não têm o blob. O snapshot do matching passa a
+carregar os vetores com ``np.frombuffer``, sem parse de JSON nem cópias.
+
+Com ``--drop-json`` a coluna JSON é esvaziada depois de gravar o blob,
+reduzindo também o payload do ``select("*")`` do snapshot.
+
+Uso:
+    python3 -m backend.jobs.pack_lawyer_embeddings [--dtype float16] [--drop-json]
+"""
+import argparse
+import logging
+import os
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from backend.embedding_blob import EMBEDDING_BLOB_DTYPE, encode_blob, pack_embeddings
+from supabase import Client, create_client
+
+load_dotenv()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = int(os.getenv("PACK_EMBEDDINGS_PAGE_SIZE", "200"))
+
+
+def pack_lawyer_embeddings(supabase: Client, dtype: str = EMBEDDING_BLOB_DTYPE,
+                           drop_json: bool = False, page_size: int = PAGE_SIZE) -> Dict[str, int]:
+    """Grava o blob de todos os advogados com embeddings em JSON e sem blob."""
+    stats = {"packed": 0, "json_bytes": 0, "blob_bytes": 0, "failed": 0}
+    last_id = None
+    while True:
+        query = supabase.table("lawyers").select("id, casos_historicos_embeddings").is_(
+            "casos_historicos_blob", "null").not_.is_("casos_historicos_embeddings", "null")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data or []
+        if not rows:
+            break
+        for row in rows:
+            hist = row.get("casos_historicos_embeddings") or []
+            if not hist:
+                continue
+            try:
+                blob = pack_embeddings(hist, dtype=dtype)
+                update = {"casos_historicos_blob": encode_blob(blob)}
+                if drop_json:
+                    update["casos_historicos_embeddings"] = None
+                supabase.table("lawyers").update(update).eq("id", row["id"]).execute()
+                stats["packed"] += 1
+                stats["json_bytes"] += len(str(hist))
+                stats["blob_bytes"] += len(blob)
+            except Exception as e:
+                stats["failed"] += 1
+                logger.warning(f"Falha ao empacotar embeddings do advogado {row['id']}: {e}")
+        last_id = rows[-1]["id"]
+
+    if stats["blob_bytes"]:
+        logger.info(f"Embeddings empacotados: {stats['packed']} advogados, "
+                    f"{stats['json_bytes'] / stats['blob_bytes']:.1f}x menores que o JSON")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default=EMBEDDING_BLOB_DTYPE)
+    parser.add_argument("--drop-json", action="store_true")
+    args = parser.parse_args()
+    print(pack_lawyer_embeddings(create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY),
+                                 dtype=args.dtype, drop_json=args.drop_json))
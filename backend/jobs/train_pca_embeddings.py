@@ -1,6 +1,14 @@
+"""
+Treino da projeção de embeddings para o espaço compartilhado.
+
+A PCA é ajustada sobre o espaço âncora (MiniLM: histórico dos advogados e
+casos locais); os casos embedados com OpenAI têm o resumo re-embedado
+localmente (via cache) para formar pares e treinar o mapa linear
+OpenAI → compartilhado. O modelo vai para ``EMBEDDING_PROJECTION_PATH`` e é
+carregado pelos workers no próximo restart.
+"""
 import logging
 import os
-from datetime import datetime
 from typing import List
 
 import numpy as np
@@ -8,7 +16,10 @@ from celery import shared_task
 from dotenv import load_dotenv
 
 from backend.metrics import job_executions_total
-from backend.services.vector_compression import vector_compression_service
+from backend.services.embedding_cache import encode_cached
+from backend.services.embedding_space import EMBEDDING_PROJECTION_PATH, LOCAL_SPACE, EmbeddingProjector, infer_space
+from backend.services.lawyer_snapshot import historic_embeddings
+from backend.services.local_embeddings import get_local_encoder
 from supabase import Client, create_client
 
 load_dotenv()
@@ -19,6 +30,8 @@ logger = logging.getLogger(__name__)
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+MIN_SAMPLES = 100
+
 # -------------------------------------------
 # Celery Task
 # -------------------------------------------
@@ -26,62 +39,64 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 @shared_task(name="backend.jobs.train_pca_embeddings.train_pca_task", bind=True)
 def train_pca_task(self):
-    """Treina PCA sobre embeddings existentes e atualiza colunas comprimidas."""
+    """Treina a projeção PCA/linear dos espaços de embedding para o compartilhado."""
     job_name = "train_pca"
     try:
-        logger.info("🏁 Iniciando treinamento PCA para compressão de embeddings")
+        logger.info("🏁 Iniciando treinamento da projeção de embeddings")
 
         # 1. Coletar embeddings das tabelas
         case_rows = supabase.table("cases").select(
-            "id, summary_embedding").limit(2000).execute().data or []
+            "id, summary, summary_embedding, summary_embedding_space").limit(2000).execute().data or []
         lawyer_rows = supabase.table("lawyers").select(
-            "id, casos_historicos_embeddings").limit(2000).execute().data or []
+            "id, casos_historicos_embeddings, casos_historicos_blob, casos_historicos_space"
+        ).limit(2000).execute().data or []
 
-        embeddings: List[List[float]] = []
+        anchor: List[np.ndarray] = []
+        paired_texts: dict = {}
         for row in case_rows:
             emb = row.get("summary_embedding")
-            if emb:
-                embeddings.append(emb[:1536])  # garantir tamanho
+            if not emb:
+                continue
+            vec, space = infer_space(emb, row.get("summary_embedding_space"))
+            if space == LOCAL_SPACE:
+                anchor.append(vec)
+            elif space is not None and row.get("summary"):
+                paired_texts.setdefault(space.tag, []).append((vec, row["summary"]))
         for row in lawyer_rows:
-            hist = row.get("casos_historicos_embeddings", [])
-            if hist:
-                embeddings.extend([e[:1536] for e in hist[:3]])  # amostra
+            for emb in historic_embeddings(row)[:3]:  # amostra
+                vec, space = infer_space(emb, row.get("casos_historicos_space"))
+                if space == LOCAL_SPACE:
+                    anchor.append(vec)
 
-        if len(embeddings) < 100:
+        if len(anchor) < MIN_SAMPLES:
             logger.warning(
-                "Embeddings insuficientes para treinar PCA (>=100 necessários)")
+                f"Embeddings insuficientes para treinar a projeção (>={MIN_SAMPLES} necessários)")
             job_executions_total.labels(job_name=job_name, status="skipped").inc()
             return "skipped"
 
-        # 2. Treinar PCA
-        vector_compression_service.fit(embeddings)
-        logger.info("✅ PCA treinado com %d embeddings", len(embeddings))
-
-        # 3. Atualizar colunas comprimidas (casos)
-        for row in case_rows:
-            emb = row.get("summary_embedding")
-            if not emb:
+        # 2. Pares (outro espaço, âncora) para os mapas lineares
+        paired = {}
+        encoder = get_local_encoder(LOCAL_SPACE.model)
+        for tag, items in paired_texts.items():
+            if len(items) < MIN_SAMPLES:
+                logger.warning(f"Pares insuficientes para o espaço {tag}: {len(items)}")
                 continue
-            comp = vector_compression_service.compress(emb[:1536])
-            supabase.table("cases").update(
-                {"embedding_compressed": comp}).eq("id", row["id"]).execute()
+            targets = encode_cached([text for _, text in items], encoder.encode,
+                                    model=LOCAL_SPACE.model, dim=LOCAL_SPACE.dim)
+            paired[tag] = (np.vstack([vec for vec, _ in items]), targets)
+            anchor.extend(targets)
 
-        # 4. Atualizar advogados
-        for row in lawyer_rows:
-            hist = row.get("casos_historicos_embeddings", [])
-            if not hist:
-                continue
-            compressed_list = [vector_compression_service.compress(
-                e[:1536]) for e in hist[:1]]  # pegar último
-            supabase.table("lawyers").update(
-                {"embedding_compressed": compressed_list[0]}).eq("id", row["id"]).execute()
+        # 3. Treinar e persistir
+        projector = EmbeddingProjector(path=None).fit(np.vstack(anchor), paired)
+        projector.save(EMBEDDING_PROJECTION_PATH)
+        logger.info("✅ Projeção %s treinada: %d âncoras, espaços %s → %d dims",
+                    projector.version, len(anchor), sorted(projector.maps), projector.dim)
 
         job_executions_total.labels(job_name=job_name, status="success").inc()
-        logger.info("🎉 Compressão de embeddings concluída com sucesso")
         return "success"
 
     except Exception as exc:
-        logger.exception("Erro crítico no treinamento PCA: %s", exc)
+        logger.exception("Erro crítico no treinamento da projeção: %s", exc)
         job_executions_total.labels(job_name=job_name, status="failed").inc()
         # Registrar retries automáticos
         raise self.retry(exc=exc, countdown=300, max_retries=3)
@@ -0,0 +1,106 @@
+"""
+Treino do classificador local da triagem.
+
+Lê os casos triados pelo LLM (``triage_source`` 'llm' ou legado sem tag;
+previsões do próprio classificador e do fallback de regex ficam de fora),
+treina o TF-IDF + regressão logística por campo, avalia em 20% separados
+e grava em ``TRIAGE_CLASSIFIER_PATH``. Os workers carregam o modelo novo no
+próximo restart; a cobertura e a acurácia no limiar vão para
+``model_performance_gauge`` (model_type="triage_classifier").
+
+O rótulo de complexidade vem da estratégia do roteador (``triage_strategy``)
+só quando ``triage_strategy_source`` indica uma decisão real (regras); o
+padrão do roteador e o próprio classificador não são rótulos. A coluna
+``complexity`` (pesos do ranking) não é usada.
+"""
+import logging
+import os
+import random
+
+from celery import shared_task
+from dotenv import load_dotenv
+
+from backend.metrics import job_executions_total, model_performance_gauge
+from backend.services.triage_classifier import (STRATEGY_COMPLEXITY, TRIAGE_CLASSIFIER_PATH,
+                                                TriageClassifier)
+from supabase import Client, create_client
+
+load_dotenv()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+logger = logging.getLogger(__name__)
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+MIN_SAMPLES = 200
+MAX_SAMPLES = int(os.getenv("TRIAGE_CLASSIFIER_MAX_SAMPLES", "20000"))
+HOLDOUT = 0.2
+STRATEGY_SOURCES = ("rules",)
+
+
+def load_training_rows(client: Client = supabase, limit: int = MAX_SAMPLES):
+    """Casos com texto e área, triados pelo LLM, mais recentes primeiro."""
+    return (client.table("cases")
+            .select("texto_cliente, area, subarea, urgency_h, triage_strategy, triage_strategy_source")
+            .not_.is_("texto_cliente", "null")
+            .not_.is_("area", "null")
+            .or_("triage_source.is.null,triage_source.eq.llm")
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute().data or [])
+
+
+def _complexity_label(row):
+    """Complexidade derivada da estratégia do roteador, só se veio de uma decisão real."""
+    complexity = None
+    if row.get("triage_strategy_source") in STRATEGY_SOURCES:
+        complexity = STRATEGY_COMPLEXITY.get(row.get("triage_strategy"))
+    return dict(row, complexity=complexity)
+
+
+def train(rows, path: str = TRIAGE_CLASSIFIER_PATH, seed: int = 42):
+    """Treina, avalia no holdout e, se houver dados suficientes, salva."""
+    rows = [_complexity_label(r) for r in rows if (r.get("texto_cliente") or "").strip()]
+    if len(rows) < MIN_SAMPLES:
+        return None, {}
+    random.Random(seed).shuffle(rows)
+    cut = int(len(rows) * (1 - HOLDOUT))
+    train_rows, test_rows = rows[:cut], rows[cut:]
+
+    classifier = TriageClassifier(path=path).fit([r["texto_cliente"] for r in train_rows], train_rows)
+    report = classifier.evaluate([r["texto_cliente"] for r in test_rows], test_rows)
+    classifier.save(path)
+    return classifier, report
+
+
+# -------------------------------------------
+# Celery Task
+# -------------------------------------------
+
+
+@shared_task(name="backend.jobs.train_triage_classifier.train_triage_classifier_task", bind=True)
+def train_triage_classifier_task(self):
+    """Retreina o classificador local da triagem com as saídas do LLM."""
+    job_name = "train_triage_classifier"
+    try:
+        logger.info("🏁 Iniciando treinamento do classificador de triagem")
+        classifier, report = train(load_training_rows())
+        if classifier is None:
+            logger.warning(f"Casos insuficientes para treinar o classificador (>={MIN_SAMPLES} necessários)")
+            job_executions_total.labels(job_name=job_name, status="skipped").inc()
+            return "skipped"
+
+        for field_name, metrics in report.items():
+            for metric in ("accuracy", "coverage", "confident_accuracy"):
+                model_performance_gauge.labels(model_type="triage_classifier",
+                                               metric=f"{field_name}_{metric}").set(metrics[metric])
+        logger.info("✅ Classificador de triagem %s treinado: %s", classifier.version, report)
+
+        job_executions_total.labels(job_name=job_name, status="success").inc()
+        return "success"
+
+    except Exception as exc:
+        logger.exception("Erro crítico no treinamento do classificador de triagem: %s", exc)
+        job_executions_total.labels(job_name=job_name, status="failed").inc()
+        raise self.retry(exc=exc, countdown=300, max_retries=3)
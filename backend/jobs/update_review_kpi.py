@@ -58,6 +58,22 @@ class ReviewKPIUpdater:
         }
         logger.info(json.dumps(log_data))
 
+    def refresh_review_digests(self) -> int:
+        """Recalcula o digest de reviews (features R/C) dos advogados com texto alterado."""
+        from backend.services.reviews_service import sync_review_digest
+        from backend.services.supabase_paging import fetch_all_rows
+
+        # Paginado por id: o PostgREST corta a resposta em max-rows
+        rows = fetch_all_rows(self.supabase, "lawyers", "id, review_texts, review_digest")
+        updated = 0
+        for row in rows:
+            try:
+                updated += sync_review_digest(self.supabase, row)
+            except Exception as e:
+                self.log_structured("WARNING", "Falha ao atualizar digest de reviews",
+                                    lawyer_id=row.get("id"), error=str(e))
+        return updated
+
     async def update_all_lawyers_kpi(self) -> dict:
         """
         Atualiza o KPI avaliacao_media para todos os advogados.
@@ -76,8 +92,11 @@ class ReviewKPIUpdater:
             else:
                 updated_count = result.data
 
+            digests_updated = self.refresh_review_digests()
+
             stats = {
                 "updated_lawyers": updated_count,
+                "updated_review_digests": digests_updated,
                 "start_time": self.start_time.isoformat(),
                 "end_time": datetime.utcnow().isoformat(),
                 "duration_seconds": (datetime.utcnow() - self.start_time).total_seconds(),
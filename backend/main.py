@@ -1,4 +1,5 @@
 # backend/main.py
+import asyncio
 import logging
 import os
 from contextlib import asynccontextmanager
@@ -12,6 +13,7 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
+from backend.algoritmo_match import weights_registry
 from backend.main_routes import router as api_router
 from backend.routes import (
     auth, cases, users, contracts, matching,
@@ -33,6 +35,20 @@ from backend.routes.tasks_routes import router as celery_tasks_router
 from backend.routes.webhooks import router as webhooks_router
 from backend.routes.weights import router as weights_router
 from backend.services.cache_service_simple import close_simple_cache, init_simple_cache
+from backend.config import get_supabase_client
+from backend.services.availability_service import (
+    availability_index,
+    load_changed_availability,
+    run_availability_sync,
+)
+from backend.services.geo_index import geo_index, load_changed_lawyers, run_geo_index_refresher
+from backend.services.lawyer_snapshot import (
+    load_changed_lawyer_rows,
+    lawyer_snapshot,
+    run_lawyer_snapshot_refresher,
+)
+from backend.services.lawyer_vector_store import lawyer_vector_store
+from backend.services.match_outbox import MATCH_OUTBOX_ENABLED, match_outbox, run_outbox_drainer
 from backend.services.redis_service import redis_service
 
 # --- Configuração de Logging ---
@@ -64,10 +80,32 @@ async def lifespan(app: FastAPI):
         # Decide-se por não levantar a exceção para permitir que a API
         # suba mesmo sem Redis, mas com funcionalidade limitada.
 
+    # Invalidações de embeddings publicadas pelos jobs (vector store da feature S)
+    background_listeners = [asyncio.create_task(lawyer_vector_store.listen_invalidations())]
+    # Índice geoespacial em memória (pré-filtro de candidatos por raio)
+    background_listeners.append(asyncio.create_task(run_geo_index_refresher(
+        geo_index, lambda since, since_id: load_changed_lawyers(get_supabase_client(), since, since_id))))
+    # Snapshot dos advogados hidratados (candidatos do /api/match lidos da memória)
+    background_listeners.append(asyncio.create_task(run_lawyer_snapshot_refresher(
+        lawyer_snapshot, lambda since, since_id: load_changed_lawyer_rows(get_supabase_client(), since, since_id))))
+    # Disponibilidade: snapshot local via pub/sub + sincronização de is_available
+    background_listeners.append(asyncio.create_task(availability_index.listen()))
+    background_listeners.append(asyncio.create_task(run_availability_sync(
+        availability_index,
+        lambda since, since_id: load_changed_availability(get_supabase_client(), since, since_id))))
+    # Registro de pesos LTR: varredura por mtime + atualizações de outros workers
+    background_listeners.append(asyncio.create_task(weights_registry.watch()))
+    background_listeners.append(asyncio.create_task(weights_registry.listen()))
+    # Outbox de matching: efeitos pós-ranking fora do caminho da requisição
+    if MATCH_OUTBOX_ENABLED:
+        background_listeners.append(asyncio.create_task(run_outbox_drainer(match_outbox)))
+
     yield
 
     # Shutdown
     logger.info("Finalizando serviços da aplicação...")
+    for task in background_listeners:
+        task.cancel()
     try:
         await close_simple_cache()
         logger.info("Simple Cache Service finalizado.")
@@ -1,20 +1,24 @@
 # backend/routes.py
+import asyncio
+import os
 from datetime import datetime
 from typing import Any, Dict, List
 
 from celery.result import AsyncResult
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse
 
 # TODO: run_triage_async_task foi removida, usar run_full_triage_flow_task
 from pydantic import BaseModel
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
-# Importa a função de recarregamento
-from backend.algoritmo_match import load_weights as reload_algorithm_weights
+# Registro de pesos (recarregamento propagado a todos os workers)
+from backend.algoritmo_match import weights_registry
 from backend.auth import get_current_user
 from backend.celery_app import celery_app
 from backend.models import (
+    BatchMatchRequest,
     ExplainRequest,
     ExplainResponse,
     MatchRequest,
@@ -29,7 +33,8 @@ from backend.routes.intelligent_triage_routes import router as intelligent_triag
 from backend.routes.offers import router as offers_router
 from backend.services import generate_explanations_for_matches
 from backend.services.conversation_service import conversation_service
-from backend.services.match_service import find_and_notify_matches
+from backend.services.match_service import find_and_notify_matches, find_matches_batch
+from backend.tasks.match_tasks import match_cases_batch
 from backend.tasks.triage_tasks import process_triage_async as run_full_triage_flow_task
 
 # Configuração do rate limiter para as rotas
@@ -131,12 +136,35 @@ async def http_find_matches(req: MatchRequest, user: dict = Depends(get_current_
     return result
 
 
+MATCH_BATCH_SYNC_LIMIT = int(os.getenv("MATCH_BATCH_SYNC_LIMIT", "50"))
+
+
+@router.post("/match/batch")
+async def http_find_matches_batch(req: BatchMatchRequest, user: dict = Depends(get_current_user)):
+    """
+    Endpoint para gerar matches de vários casos de uma vez.
+    Até MATCH_BATCH_SYNC_LIMIT casos são ranqueados na própria requisição
+    (um único rank_many); lotes maiores vão para a fila Celery `batch`.
+    """
+    if not req.case_ids:
+        raise HTTPException(status_code=422, detail="Informe ao menos um case_id.")
+    if len(req.case_ids) > MATCH_BATCH_SYNC_LIMIT:
+        options = req.dict(exclude={"case_ids"})
+        task = match_cases_batch.delay(req.case_ids, options)
+        return JSONResponse(status_code=202, content={
+            "task_id": task.id,
+            "status": "queued",
+            "message": f"{len(req.case_ids)} casos enviados para matching em lote.",
+        })
+    return await find_matches_batch(req)
+
+
 @router.post("/explain", response_model=ExplainResponse)
 @limiter.limit("30/minute")
 async def http_explain_matches(
         request: Request, req: ExplainRequest, user: dict = Depends(get_current_user)):
     try:
-        explanations = await generate_explanations_for_matches(req.case_id, req.lawyer_ids)
+        explanations = await generate_explanations_for_matches(req.case_id, req.lawyer_ids, req.preset)
         return ExplainResponse(explanations=explanations)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -240,7 +268,10 @@ async def http_reload_weights():
     Isso permite atualizar o modelo de LTR sem reiniciar a aplicação.
     """
     try:
-        new_weights = reload_algorithm_weights()
+        # Leitura dos arquivos e publicação no Redis fora do event loop
+        changes = await asyncio.to_thread(weights_registry.scan, True)
+        await asyncio.to_thread(weights_registry.publish, changes)
+        new_weights = weights_registry.production()
         return {"status": "success", "message": "Pesos do algoritmo recarregados.",
                 "new_weights": new_weights}
     except Exception as e:
@@ -75,6 +75,40 @@ cache_misses_total = Counter(
     'Total de misses no cache de matching'
 )
 
+# Outbox dos efeitos colaterais do matching
+match_outbox_events_total = Counter(
+    'match_outbox_events_total',
+    'Registros do outbox de matching por transição',
+    ['status']  # Labels: enqueued/done/retried/failed
+)
+
+# Cache de embeddings endereçado por conteúdo
+embedding_cache_lookups_total = Counter(
+    'embedding_cache_lookups_total',
+    'Consultas ao cache de embeddings por camada',
+    ['tier']  # Labels: memory/redis/disk/miss
+)
+
+# Cache de resultados da triagem
+triage_cache_lookups_total = Counter(
+    'triage_cache_lookups_total',
+    'Consultas ao cache de triagem',
+    ['layer', 'result']  # Labels: exact/semantic, hit/miss
+)
+
+# Classificador local da triagem (modo shadow/active)
+triage_classifier_predictions_total = Counter(
+    'triage_classifier_predictions_total',
+    'Previsões do classificador local comparadas à triagem do LLM',
+    ['field', 'confident', 'outcome']  # Labels: area/subarea/urgency_h, true/false, agree/disagree
+)
+
+triage_classifier_decisions_total = Counter(
+    'triage_classifier_decisions_total',
+    'Decisões tomadas pelo classificador local no lugar do LLM ou das palavras-chave',
+    ['decision']  # Labels: llm_skipped/routed
+)
+
 # Métricas de A/B Testing
 ab_test_exposure_total = Counter(
     'ab_test_exposure_total',
@@ -119,6 +153,13 @@ matching_duration = Histogram(
     buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5)
 )
 
+match_stage_duration = Histogram(
+    'match_stage_duration_seconds',
+    'Tempo por etapa do matching (rank e find_and_notify_matches)',
+    ['stage', 'preset', 'model_version'],  # Labels: etapa, preset, versão do modelo
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
 notification_duration = Histogram(
     'notification_duration_seconds',
     'Tempo de envio de notificação',
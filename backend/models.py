@@ -48,6 +48,16 @@ class MatchRequest(BaseModel):
     area: Optional[str] = None      # Permite sobrepor a área do caso
     subarea: Optional[str] = None   # Permite sobrepor a subárea do caso
     radius_km: Optional[int] = None # Raio máximo de busca em km
+    debug: bool = False             # Inclui o tempo por etapa (ms) na resposta
+
+
+class BatchMatchRequest(BaseModel):
+    """Payload para o match de vários casos em lote."""
+    case_ids: List[str]
+    k: int = 5
+    preset: str = "balanced"
+    radius_km: Optional[int] = None  # Sobrepõe o raio de todos os casos
+    notify: bool = False             # Cria ofertas e notifica os advogados
 
 
 class MatchFeatures(BaseModel):
@@ -84,12 +94,14 @@ class MatchResponse(BaseModel):
     """Resposta da requisição de match."""
     case_id: str
     matches: List[MatchResult]
+    timings: Optional[Dict[str, float]] = None  # Tempo por etapa (ms), só com debug
 
 
 class ExplainRequest(BaseModel):
     """Payload para a rota de explicação."""
     case_id: str
     lawyer_ids: List[str]
+    preset: str = "balanced"  # Usado só para advogados fora de case_matches
 
 
 class ExplainResponse(BaseModel):
@@ -2,12 +2,13 @@
 Rota para debugging e transparência do algoritmo de match v2.2.
 Permite visualizar os pesos atualmente carregados.
 """
-from typing import Dict
+import asyncio
+from typing import Any, Dict, List
 
 from fastapi import APIRouter, HTTPException
 
-# Importar a variável _current_weights diretamente do módulo do algoritmo
-from backend.algoritmo_match import PRESET_WEIGHTS, _current_weights, load_weights
+from backend.algoritmo_match import PRESET_WEIGHTS, weights_registry
+from backend.stage_timer import slow_request_profiler
 
 router = APIRouter()
 
@@ -17,15 +18,16 @@ async def get_current_weights():
     """
     Retorna os pesos que o algoritmo de match está utilizando no momento.
     """
-    if not _current_weights:
-        # Se estiver vazio, tenta carregar
-        load_weights()
+    # Retorna uma cópia para evitar modificação externa
+    return dict(weights_registry.production())
 
-    if not _current_weights:
-        raise HTTPException(status_code=500, detail="Pesos não puderam ser carregados.")
 
-    # Retorna uma cópia para evitar modificação externa
-    return _current_weights.copy()
+@router.get("/debug/weights/versions", response_model=Dict[str, Dict[str, float]])
+async def get_weight_versions():
+    """
+    Retorna todas as versões de pesos em memória (produção e experimentais).
+    """
+    return weights_registry.versions()
 
 
 @router.get("/debug/presets", response_model=Dict[str, Dict[str, float]])
@@ -36,14 +38,25 @@ async def get_available_presets():
     return PRESET_WEIGHTS
 
 
+@router.get("/debug/match/profiles", response_model=List[Dict[str, Any]])
+async def get_slowest_match_profiles():
+    """
+    Retorna os traces (cProfile/pyinstrument) das requisições de match mais
+    lentas entre as amostradas (MATCH_PROFILE_SAMPLE_RATE > 0).
+    """
+    return slow_request_profiler.slowest()
+
+
 @router.post("/debug/reload_weights", response_model=Dict[str, float])
 async def reload_weights_endpoint():
     """
     Força o recarregamento dos pesos do arquivo ltr_weights.json.
-    Útil após um novo treinamento do modelo LTR.
+    Útil após um novo treinamento do modelo LTR. A atualização é publicada
+    para todos os workers via Redis.
     """
     try:
-        reloaded_weights = load_weights()
-        return reloaded_weights
+        changes = await asyncio.to_thread(weights_registry.scan, True)
+        await asyncio.to_thread(weights_registry.publish, changes)
+        return dict(weights_registry.production())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao recarregar pesos: {e}")
@@ -31,19 +31,22 @@ if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
-# Importar serviço de explicação IA
-from .explanation_service import (  # noqa: E402
-    generate_explanations_for_matches as explanation_service,
-)
+# Serviço de explicação IA. Nada de backend.algoritmo_match aqui: ele importa
+# availability_service e lawyer_vector_store deste pacote (ciclo de import).
+# O alias evita sombrear o submódulo backend.services.explanation_service.
+from backend.explanation_service import explanation_service as ai_explanation_service  # noqa: E402
 
 
 async def generate_explanations_for_matches(
-        case_id: str, lawyer_ids: List[str]) -> Dict[str, str]:
+        case_id: str, lawyer_ids: List[str], preset: str = "balanced") -> Dict[str, str]:
     """Gera explicações IA para uma lista de advogados de um caso."""
+    from backend.algoritmo_match import haversine
+    from backend.services.explanation_service import get_match_breakdowns
+
     # 1. Buscar resumo do caso
     case_row = (
         supabase.table("cases")
-        .select("texto_cliente")
+        .select("texto_cliente, coords")
         .eq("id", case_id)
         .single()
         .execute()
@@ -63,18 +66,26 @@ async def generate_explanations_for_matches(
     )
     lawyers_data = {lw["id"]: lw for lw in lawyer_rows}
 
-    # 3. Gerar explicações usando o serviço de IA
+    # 3. Breakdown já calculado no matching (case_matches), sem re-ranking
+    breakdowns = await get_match_breakdowns(case_id, lawyer_ids, preset) or {}
+
+    # 4. Gerar explicações usando o serviço de IA
     explanations: Dict[str, str] = {}
     for lw_id in lawyer_ids:
         if lw_id in lawyers_data:
-            mock_match_data = {
-                **lawyers_data[lw_id],
-                "fair": 0.9,
-                "features": {},
-                "distance_km": 10,
+            lawyer = lawyers_data[lw_id]
+            breakdown = breakdowns.get(lw_id, {})
+            distance_km = 0.0
+            if case_row.get("coords") and lawyer.get("geo_latlon"):
+                distance_km = haversine(tuple(case_row["coords"]), tuple(lawyer["geo_latlon"]))
+            match_data = {
+                **lawyer,
+                "fair": breakdown.get("fair_score") or breakdown.get("raw_score", 0.0),
+                "features": breakdown.get("features", {}),
+                "distance_km": distance_km,
             }
-            explanations[lw_id] = await explanation_service.generate_explanation(
-                case_summary, mock_match_data
+            explanations[lw_id] = await ai_explanation_service.generate_explanation(
+                case_summary, match_data
             )
         else:
             explanations[lw_id] = "Dados do advogado não encontrados."
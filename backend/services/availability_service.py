@@ -2,20 +2,283 @@
 backend/services/availability_service.py
 
 Serviço para gerenciar a disponibilidade dos advogados.
+
+A disponibilidade consultada pelo ``rank()`` vem de um bitmap denso no Redis:
+
+- ``lawyer_avail:index`` (hash) atribui a cada advogado um índice inteiro
+  estável; ``lawyer_avail:bits`` guarda um bit por índice (1 = disponível).
+- Escritas e consultas em lote rodam como scripts Lua: 200 IDs são
+  respondidos em uma única ida ao Redis.
+- Cada processo mantém um snapshot local (dict) carregado do bitmap e
+  atualizado via pub/sub (``lawyer_avail:update``); com o snapshot pronto a
+  consulta não sai do processo.
+- O bitmap é alimentado por ``update_lawyer_availability`` e por uma
+  sincronização incremental da coluna ``is_available`` (marca d'água
+  ``(updated_at, id)``, paginada), que cobre alterações feitas fora da API.
+- Se o Redis cair (inclusive na partida), ``listen`` tenta de novo com
+  backoff exponencial; enquanto isso as consultas vão direto ao Redis.
 """
+import asyncio
+import json
 import os
 import logging
-from typing import Dict, Any
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
 from uuid import UUID
+
+import numpy as np
 from supabase import create_client, Client
 
+from backend.services.supabase_paging import advance_watermark, fetch_changed_rows
+
 # Configuração
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+AVAIL_INDEX_KEY = "lawyer_avail:index"
+AVAIL_SEQ_KEY = "lawyer_avail:seq"
+AVAIL_BITMAP_KEY = "lawyer_avail:bits"
+AVAIL_CHANNEL = "lawyer_avail:update"
+AVAIL_SYNC_INTERVAL = float(os.getenv("AVAIL_SYNC_INTERVAL", "30"))
+AVAIL_WRITE_CHUNK = 1000  # IDs por chamada do script de escrita
+AVAIL_LISTEN_BACKOFF_MAX = float(os.getenv("AVAIL_LISTEN_BACKOFF_MAX", "60"))
+
 logger = logging.getLogger(__name__)
 
+# Atribui índices aos IDs novos e grava os bits (ARGV = id1, flag1, id2, flag2...)
+_SET_SCRIPT = """
+for i = 1, #ARGV, 2 do
+    local idx = redis.call('HGET', KEYS[1], ARGV[i])
+    if not idx then
+        idx = redis.call('INCR', KEYS[2]) - 1
+        redis.call('HSET', KEYS[1], ARGV[i], idx)
+    end
+    redis.call('SETBIT', KEYS[3], idx, tonumber(ARGV[i + 1]))
+end
+return #ARGV / 2
+"""
+
+# Bit de cada ID (ARGV = ids); -1 para IDs sem índice
+_QUERY_SCRIPT = """
+local idx = redis.call('HMGET', KEYS[1], unpack(ARGV))
+local out = {}
+for i = 1, #ARGV do
+    if idx[i] then
+        out[i] = redis.call('GETBIT', KEYS[2], idx[i])
+    else
+        out[i] = -1
+    end
+end
+return out
+"""
+
+
+def decode_bitmap(index: Dict[Any, Any], raw: Optional[bytes]) -> Dict[str, bool]:
+    """Converte o hash ID→índice e o bitmap bruto em ``{lawyer_id: disponível}``.
+
+    O bit 0 do Redis é o bit mais significativo do primeiro byte
+    (mesma ordem de ``np.unpackbits``).
+    """
+    if not index:
+        return {}
+    bits = np.unpackbits(np.frombuffer(raw or b"", dtype=np.uint8))
+    ids = [k.decode() if isinstance(k, bytes) else str(k) for k in index.keys()]
+    idx = np.fromiter((int(v) for v in index.values()), dtype=np.int64, count=len(ids))
+    values = np.zeros(len(ids), dtype=bool)
+    inside = idx < len(bits)
+    values[inside] = bits[idx[inside]].astype(bool)
+    return dict(zip(ids, values.tolist()))
+
+
+class AvailabilityIndex:
+    """Bitmap de disponibilidade no Redis + snapshot local por processo."""
+
+    def __init__(self, redis_url: str = REDIS_URL):
+        self.redis_url = redis_url
+        self._snapshot: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_loop = None
+        self.watermark: Optional[str] = None
+        self.watermark_id: Optional[str] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def _redis(self):
+        # Clientes asyncio ficam presos ao event loop em que foram criados
+        # (tasks Celery usam um loop por execução).
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            import redis.asyncio as aioredis
+
+            self._client = aioredis.from_url(
+                self.redis_url, socket_timeout=1, socket_connect_timeout=1)
+            self._client_loop = loop
+        return self._client
+
+    # ---------------- snapshot local ----------------
+
+    def apply(self, changes: Dict[str, bool]) -> None:
+        with self._lock:
+            self._snapshot.update({str(k): bool(v) for k, v in changes.items()})
+
+    def replace(self, snapshot: Dict[str, bool]) -> None:
+        with self._lock:
+            self._snapshot = snapshot
+        self.ready = True
+
+    async def load_snapshot(self) -> int:
+        """Recarrega o snapshot inteiro a partir do Redis (hash + bitmap)."""
+        client = self._redis()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hgetall(AVAIL_INDEX_KEY)
+            pipe.get(AVAIL_BITMAP_KEY)
+            index, raw = await pipe.execute()
+        self.replace(decode_bitmap(index, raw))
+        return len(self._snapshot)
+
+    # ---------------- escrita / consulta ----------------
+
+    async def set_many(self, changes: Dict[str, bool]) -> None:
+        """Grava os bits no Redis, atualiza o snapshot e avisa os outros processos.
+
+        Falhas de Redis não interrompem a escrita no banco: a sincronização
+        da coluna ``is_available`` reconcilia o bitmap depois.
+        """
+        if not changes:
+            return
+        changes = {str(k): bool(v) for k, v in changes.items()}
+        self.apply(changes)
+        items = list(changes.items())
+        try:
+            client = self._redis()
+            for start in range(0, len(items), AVAIL_WRITE_CHUNK):
+                argv: List[Any] = []
+                for lawyer_id, available in items[start:start + AVAIL_WRITE_CHUNK]:
+                    argv.extend((lawyer_id, int(available)))
+                await client.eval(_SET_SCRIPT, 3, AVAIL_INDEX_KEY, AVAIL_SEQ_KEY, AVAIL_BITMAP_KEY, *argv)
+            await client.publish(AVAIL_CHANNEL, json.dumps(changes))
+        except Exception as e:
+            logger.warning(f"Não foi possível gravar disponibilidade no Redis: {e}")
+
+    async def get_status(self, lawyer_ids: Iterable[str]) -> Dict[str, bool]:
+        """Disponibilidade dos IDs conhecidos; IDs sem registro ficam de fora do mapa."""
+        lawyer_ids = [str(lid) for lid in lawyer_ids]
+        if self.ready:
+            snapshot = self._snapshot
+            return {lid: snapshot[lid] for lid in lawyer_ids if lid in snapshot}
+        if not lawyer_ids:
+            return {}
+        try:
+            bits = await self._redis().eval(_QUERY_SCRIPT, 2, AVAIL_INDEX_KEY, AVAIL_BITMAP_KEY, *lawyer_ids)
+        except Exception as e:
+            logger.warning(f"Consulta de disponibilidade no Redis falhou: {e}")
+            return {}
+        return {lid: bool(bit) for lid, bit in zip(lawyer_ids, bits) if int(bit) >= 0}
+
+    # ---------------- background ----------------
+
+    def _on_message(self, data: Any) -> None:
+        try:
+            self.apply(json.loads(data))
+        except (TypeError, ValueError, AttributeError) as e:
+            logger.warning(f"Mensagem de disponibilidade inválida: {e}")
+
+    async def listen(self, backoff_max: float = AVAIL_LISTEN_BACKOFF_MAX) -> None:
+        """Carrega o snapshot e aplica as atualizações publicadas (roda em background).
+
+        Falhas de Redis (na partida ou com a inscrição ativa) não encerram o
+        listener: ele reconecta com backoff exponencial até ``backoff_max``
+        segundos e recarrega o snapshot, já que mensagens podem ter se perdido.
+        """
+        import redis.asyncio as aioredis
+
+        delay = 1.0
+        while True:
+            client = aioredis.from_url(self.redis_url, decode_responses=True)
+            pubsub = client.pubsub()
+            try:
+                # Inscreve antes de carregar: nada publicado durante a carga se perde
+                await pubsub.subscribe(AVAIL_CHANNEL)
+                count = await self.load_snapshot()
+                logger.info(f"Snapshot de disponibilidade carregado com {count} advogados")
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._on_message(message["data"])
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                logger.warning(f"Snapshot de disponibilidade indisponível (Redis): {e}; "
+                               f"nova tentativa em {delay:.0f}s")
+            finally:
+                self.ready = False
+                try:
+                    await pubsub.unsubscribe(AVAIL_CHANNEL)
+                    await client.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, backoff_max)
+
+    def changed_rows(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, bool]:
+        """Linhas de ``lawyers`` cujo ``is_available`` difere do snapshot; avança a marca d'água."""
+        changes: Dict[str, bool] = {}
+        for row in rows:
+            lawyer_id = row.get("id")
+            if not lawyer_id:
+                continue
+            available = bool(row.get("is_available"))
+            if self._snapshot.get(str(lawyer_id)) is not available:
+                changes[str(lawyer_id)] = available
+            self.watermark, self.watermark_id = advance_watermark(self.watermark, self.watermark_id, row)
+        return changes
+
+
+# =============================================================================
+# Sincronização com a coluna lawyers.is_available
+# =============================================================================
+
+AVAIL_COLUMNS = "id, is_available, updated_at"
+
+
+def load_changed_availability(client, since: Optional[str],
+                              since_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Linhas de ``lawyers`` depois da marca d'água (todas se ``since`` for None), paginadas."""
+    return fetch_changed_rows(client, "lawyers", AVAIL_COLUMNS, since, since_id)
+
+
+async def run_availability_sync(index: "AvailabilityIndex",
+                                loader: Callable[[Optional[str], Optional[str]], List[Dict[str, Any]]],
+                                interval: float = AVAIL_SYNC_INTERVAL) -> None:
+    """Carga inicial completa e, depois, polling incremental de ``is_available``."""
+    while True:
+        try:
+            rows = await asyncio.to_thread(loader, index.watermark, index.watermark_id)
+            changes = index.changed_rows(rows)
+            if changes:
+                await index.set_many(changes)
+                logger.debug(f"Disponibilidade: {len(changes)} advogados sincronizados")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Falha ao sincronizar disponibilidade: {e}")
+        await asyncio.sleep(interval)
+
+
+# Instância global (um snapshot por processo)
+availability_index = AvailabilityIndex()
+
+
+async def get_lawyers_availability_status(lawyer_ids: List[str]) -> Dict[str, bool]:
+    """Disponibilidade em lote usada pelo ``rank()`` (snapshot local ou 1 ida ao Redis)."""
+    return await availability_index.get_status(lawyer_ids)
+
+
 class AvailabilityService:
     """
     Classe de serviço para operações de disponibilidade.
@@ -36,6 +299,7 @@ class AvailabilityService:
 
             if response.data:
                 logger.info(f"Disponibilidade do advogado {lawyer_id} atualizada para {is_available}.")
+                await availability_index.set_many({str(lawyer_id): is_available})
                 return response.data[0]
             else:
                 raise Exception("Advogado não encontrado ou falha ao atualizar.")
@@ -44,4 +308,4 @@ class AvailabilityService:
             logger.error(f"Erro ao atualizar disponibilidade do advogado {lawyer_id}: {e}")
             raise
 
-availability_service = AvailabilityService() 
\ No newline at end of file
+availability_service = AvailabilityService() 
@@ -0,0 +1,208 @@
+"""
+backend/services/embedding_cache.py
+
+Cache de embeddings endereçado por conteúdo.
+
+A chave é o blake2b de (modelo, dimensão, texto): o mesmo resumo de triagem,
+o mesmo CV ou a mesma sentença do Jusbrasil nunca é enviado duas vezes ao
+provedor, em nenhum worker. Três camadas, consultadas em ordem:
+
+1. LRU em processo (``EMBEDDING_CACHE_SIZE`` vetores);
+2. Redis (``emb:v1:<hash>``, float32 binário, TTL ``EMBEDDING_CACHE_TTL``);
+3. disco (``EMBEDDING_CACHE_DIR``, opcional; útil para jobs sem Redis).
+
+Acertos nas camadas de baixo são promovidos para as de cima. Falhas do Redis
+ou do disco nunca quebram a geração: o cache só deixa de ajudar (com um
+intervalo antes de tentar o Redis de novo).
+
+A API é síncrona (jobs e Celery usam direto); o ``EmbeddingService``
+assíncrono a chama em thread.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from backend.metrics import embedding_cache_lookups_total
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 86400)))
+EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "true").lower() == "true"
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR") or None
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_RETRY_S = 60.0
+
+_PREFIX = "emb:v1:"
+
+
+def embedding_key(text: str, model: str, dim: int) -> str:
+    """Hash do conteúdo (modelo + dimensão + texto)."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{model}\x1f{dim}\x1f".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class EmbeddingCache:
+    """LRU em processo + Redis + disco, endereçado por ``embedding_key``."""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl: int = EMBEDDING_CACHE_TTL,
+                 redis_url: Optional[str] = REDIS_URL if EMBEDDING_CACHE_REDIS else None,
+                 disk_dir: Optional[str] = EMBEDDING_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_down_until = 0.0
+
+    # ---------------- camadas ----------------
+
+    def _redis_client(self):
+        if not self.redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5,
+                                               socket_connect_timeout=0.5)
+        return self._redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Cache de embeddings: Redis indisponível ({e}); "
+                       f"tentando de novo em {REDIS_RETRY_S:.0f}s")
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_S
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.f32"
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    # ---------------- API ----------------
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Vetores encontrados (float32 somente-leitura) por chave."""
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vec
+        embedding_cache_lookups_total.labels(tier="memory").inc(len(found))
+
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        client = self._redis_client() if missing else None
+        if client is not None:
+            try:
+                values = client.mget([_PREFIX + k for k in missing])
+                for key, raw in zip(missing, values):
+                    if raw:
+                        found[key] = self._frozen(raw)
+                        self._remember(key, found[key])
+                        embedding_cache_lookups_total.labels(tier="redis").inc()
+            except Exception as e:
+                self._redis_failed(e)
+            missing = [k for k in missing if k not in found]
+
+        if self.disk_dir is not None:
+            promote = {}
+            for key in missing:
+                try:
+                    raw = self._disk_path(key).read_bytes()
+                except OSError:
+                    continue
+                found[key] = promote[key] = self._frozen(raw)
+                self._remember(key, found[key])
+                embedding_cache_lookups_total.labels(tier="disk").inc()
+            if promote:
+                self._set_redis(promote)
+            missing = [k for k in missing if k not in found]
+
+        embedding_cache_lookups_total.labels(tier="miss").inc(len(missing))
+        return found
+
+    def set_many(self, vectors: Dict[str, Iterable[float]]) -> None:
+        if not vectors:
+            return
+        frozen = {k: self._frozen(np.asarray(v, dtype=np.float32).tobytes()) for k, v in vectors.items()}
+        for key, vec in frozen.items():
+            self._remember(key, vec)
+        self._set_redis(frozen)
+        if self.disk_dir is not None:
+            for key, vec in frozen.items():
+                path = self._disk_path(key)
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = path.with_suffix(".tmp")
+                    tmp.write_bytes(vec.tobytes())
+                    tmp.replace(path)
+                except OSError as e:
+                    logger.warning(f"Cache de embeddings: falha ao gravar em disco ({e})")
+                    break
+
+    def _set_redis(self, vectors: Dict[str, np.ndarray]) -> None:
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, vec in vectors.items():
+                pipe.set(_PREFIX + key, vec.tobytes(), ex=self.ttl)
+            pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    @staticmethod
+    def _frozen(raw: bytes) -> np.ndarray:
+        vec = np.frombuffer(raw, dtype=np.float32)
+        if vec.flags.writeable:
+            vec.flags.writeable = False
+        return vec
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+
+def encode_cached(texts: Sequence[str], encode: Callable[[List[str]], np.ndarray], *,
+                  model: str, dim: int, cache: Optional[EmbeddingCache] = None) -> np.ndarray:
+    """Embeddings (``len(texts) × dim``, ordem de entrada) com uma chamada de ``encode`` para os ausentes.
+
+    ``encode`` recebe a lista de textos únicos ainda não cacheados (ex.:
+    ``SentenceTransformer.encode``) e devolve uma matriz na mesma ordem.
+    """
+    cache = cache or embedding_cache
+    keys = [embedding_key(t, model, dim) for t in texts]
+    found = cache.get_many(keys)
+    pending = {k: t for k, t in zip(keys, texts) if k not in found}
+    if pending:
+        encoded = np.asarray(encode(list(pending.values())), dtype=np.float32).reshape(len(pending), -1)
+        computed = dict(zip(pending, encoded))
+        cache.set_many(computed)
+        found.update(computed)
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    return np.vstack([found[k] for k in keys])
+
+
+# Instância global (um cache por processo)
+embedding_cache = EmbeddingCache()
@@ -2,7 +2,18 @@
 """
 Serviço de geração de embeddings com fallback local.
 Usa OpenAI como principal e sentence-transformers como fallback.
+
+Todo embedding passa pelo cache endereçado por conteúdo
+(``embedding_cache``): textos repetidos (triagem, backfill de CVs, sync do
+Jusbrasil) não voltam ao provedor. Em lote, só os ausentes do cache são
+enviados, em requisições multi-input, e o fallback local codifica todos os
+que faltarem em uma única chamada ``encode(lista)``.
+
+Os vetores saem na dimensão nativa do modelo (1536 OpenAI, 384 local), sem
+padding; ``embedding_space.storage_tag`` identifica o espaço para gravação e
+``to_shared`` os leva ao espaço compartilhado para comparação.
 """
+import asyncio
 import logging
 import os
 import time
@@ -11,7 +22,10 @@ from typing import Any, Dict, List, Optional
 import numpy as np
 from dotenv import load_dotenv
 
+from backend.services.embedding_cache import embedding_cache, embedding_key
 from backend.services.embedding_service_parallel import parallel_embedding_service
+from backend.services.embedding_space import LOCAL_SPACE, OPENAI_SPACE, to_shared
+from backend.services.local_embeddings import get_local_encoder, local_encoder_available
 from supabase import Client, create_client
 
 # Configuração
@@ -20,6 +34,8 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_TIMEOUT = int(os.getenv("OPENAI_TIMEOUT", "30"))
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+LOCAL_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
 logger = logging.getLogger(__name__)
 
@@ -36,15 +52,13 @@ except ImportError:
     OPENAI_AVAILABLE = False
     openai_client = None
 
-try:
-    from sentence_transformers import SentenceTransformer
-
-    # Modelo multilíngue pequeno e eficiente
-    local_model = SentenceTransformer('all-MiniLM-L6-v2')
-    LOCAL_MODEL_AVAILABLE = True
-except ImportError:
+# Modelo local compartilhado (servidor do nó, se LOCAL_EMBED_SERVER; senão
+# carregado sob demanda no processo)
+LOCAL_MODEL_AVAILABLE = local_encoder_available()
+if LOCAL_MODEL_AVAILABLE:
+    local_model = get_local_encoder(LOCAL_EMBEDDING_MODEL)
+else:
     logger.warning("Sentence-transformers não disponível")
-    LOCAL_MODEL_AVAILABLE = False
     local_model = None
 
 # Importar métricas se disponível
@@ -64,15 +78,22 @@ except ImportError:
 class EmbeddingService:
     """Serviço de embeddings com fallback automático."""
 
-    def __init__(self):
+    def __init__(self, cache=embedding_cache):
         self.openai_enabled = OPENAI_AVAILABLE and OPENAI_API_KEY
         self.local_enabled = LOCAL_MODEL_AVAILABLE
-        self.embedding_dim = 1536  # Dimensão OpenAI
-        self.local_dim = 384  # Dimensão do modelo local
+        self.embedding_dim = OPENAI_SPACE.dim  # Dimensão OpenAI
+        self.local_dim = LOCAL_SPACE.dim  # Dimensão do modelo local
+        self.cache = cache
 
         if not self.openai_enabled and not self.local_enabled:
             raise RuntimeError("Nenhum modelo de embedding disponível!")
 
+    def _openai_key(self, text: str) -> str:
+        return embedding_key(text, OPENAI_EMBEDDING_MODEL, self.embedding_dim)
+
+    def _local_key(self, text: str) -> str:
+        return embedding_key(text, LOCAL_EMBEDDING_MODEL, self.local_dim)
+
     async def generate_embedding(
         self,
         text: str,
@@ -90,8 +111,13 @@ class EmbeddingService:
         """
         # Tentar OpenAI primeiro (se não forçar local)
         if self.openai_enabled and not force_local:
+            key = self._openai_key(text)
+            cached = (await asyncio.to_thread(self.cache.get_many, [key])).get(key)
+            if cached is not None:
+                return cached.tolist()
             try:
                 embedding = await self._generate_openai_embedding(text)
+                await asyncio.to_thread(self.cache.set_many, {key: embedding})
                 if METRICS_AVAILABLE:
                     fallback_usage_total.labels(
                         service="embeddings",
@@ -117,13 +143,11 @@ class EmbeddingService:
                 service="openai", operation="embeddings")
     async def _generate_openai_embedding(self, text: str) -> List[float]:
         """Gera embedding usando OpenAI."""
-        import asyncio
-
         # Implementar timeout manual
         try:
             response = await asyncio.wait_for(
                 openai_client.embeddings.create(
-                    model="text-embedding-3-small",
+                    model=OPENAI_EMBEDDING_MODEL,
                     input=text
                 ),
                 timeout=OPENAI_TIMEOUT
@@ -135,25 +159,20 @@ class EmbeddingService:
 
     async def _generate_local_embedding(self, text: str) -> List[float]:
         """Gera embedding usando modelo local."""
-        # sentence-transformers é síncrono, então rodamos em thread
-        import asyncio
-
-        loop = asyncio.get_event_loop()
-        embedding = await loop.run_in_executor(
-            None,
-            local_model.encode,
-            text
-        )
-
-        # Converter para lista e fazer padding para dimensão esperada
-        embedding_list = embedding.tolist()
-
-        # Padding com zeros para manter compatibilidade dimensional
-        if len(embedding_list) < self.embedding_dim:
-            padding = [0.0] * (self.embedding_dim - len(embedding_list))
-            embedding_list.extend(padding)
-
-        return embedding_list
+        return (await self._generate_local_embeddings([text]))[0]
+
+    async def _generate_local_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings locais (384 dims), uma só chamada ``encode`` para os ausentes do cache."""
+        keys = [self._local_key(t) for t in texts]
+        found = await asyncio.to_thread(self.cache.get_many, keys)
+        pending = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+        if pending:
+            # encode é síncrono (socket ou modelo no processo), então rodamos em thread
+            encoded = await asyncio.to_thread(local_model.encode, pending)
+            computed = {self._local_key(t): vec for t, vec in zip(pending, encoded)}
+            await asyncio.to_thread(self.cache.set_many, computed)
+            found.update(computed)
+        return [np.asarray(found[k], dtype=float).tolist() for k in keys]
 
     async def generate_batch_embeddings(
         self,
@@ -168,46 +187,62 @@ class EmbeddingService:
             force_local: Forçar uso do modelo local
 
         Returns:
-            Lista de embeddings
+            Lista de embeddings, na ordem de ``texts``
         """
-        embeddings = []
+        if not texts:
+            return []
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
 
-        # Usar serviço paralelo se OpenAI e não force_local
+        # OpenAI: cache primeiro, depois lotes multi-input só com os textos novos
         if self.openai_enabled and not force_local:
-            try:
-                embeddings = await parallel_embedding_service.generate_embeddings_batch(texts)
-                if METRICS_AVAILABLE:
-                    fallback_usage_total.labels(
-                        service="embeddings_parallel",
-                        reason="none"
-                    ).inc()
-                return embeddings
-            except Exception as e:
-                logger.warning(f"Parallel embedding falhou, fallback batch local: {e}")
-                if METRICS_AVAILABLE:
-                    fallback_usage_total.labels(
-                        service="embeddings_parallel",
-                        reason=type(e).__name__
-                    ).inc()
-
-        # Se não conseguir paralelizar, usar batch antigo ou local ... existing
-        # code batch loop ...
+            keys = [self._openai_key(t) for t in texts]
+            found = await asyncio.to_thread(self.cache.get_many, keys)
+            pending = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in found))
+            if pending:
+                try:
+                    generated = await parallel_embedding_service.generate_embeddings_batch(pending)
+                    computed = {self._openai_key(t): emb
+                                for t, emb in zip(pending, generated) if emb is not None}
+                    await asyncio.to_thread(self.cache.set_many, computed)
+                    found.update(computed)
+                    if METRICS_AVAILABLE:
+                        fallback_usage_total.labels(
+                            service="embeddings_parallel",
+                            reason="none" if len(computed) == len(pending) else "partial"
+                        ).inc()
+                except Exception as e:
+                    logger.warning(f"Parallel embedding falhou, fallback batch local: {e}")
+                    if METRICS_AVAILABLE:
+                        fallback_usage_total.labels(
+                            service="embeddings_parallel",
+                            reason=type(e).__name__
+                        ).inc()
+            for i, key in enumerate(keys):
+                if key in found:
+                    embeddings[i] = np.asarray(found[key], dtype=float).tolist()
+
+        # Fallback local para o que faltou, em uma única chamada encode
+        missing = [i for i, emb in enumerate(embeddings) if emb is None]
+        if missing:
+            if not self.local_enabled:
+                raise RuntimeError("Nenhum modelo de embedding disponível!")
+            local = await self._generate_local_embeddings([texts[i] for i in missing])
+            for i, emb in zip(missing, local):
+                embeddings[i] = emb
 
         return embeddings
 
     def get_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """
         Calcula similaridade coseno entre dois embeddings.
-        Funciona independente do modelo usado.
+        Vetores de modelos diferentes são comparados no espaço compartilhado.
         """
-        # Converter para numpy arrays
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
-
-        # Truncar ao menor tamanho se necessário
-        min_len = min(len(vec1), len(vec2))
-        vec1 = vec1[:min_len]
-        vec2 = vec2[:min_len]
+        vec1 = np.asarray(embedding1, dtype=np.float32)
+        vec2 = np.asarray(embedding2, dtype=np.float32)
+        if len(vec1) != len(vec2):
+            vec1, vec2 = to_shared(vec1), to_shared(vec2)
+            if vec1 is None or vec2 is None or len(vec1) != len(vec2):
+                return 0.0
 
         # Calcular similaridade coseno
         dot_product = np.dot(vec1, vec2)
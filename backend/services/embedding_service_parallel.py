@@ -1,14 +1,18 @@
 """
-Serviço de geração de embeddings em paralelo usando httpx + asyncio.
-Permite até BATCH_SIZE requisições simultâneas à API OpenAI, com controle
-por semáforo para evitar estouro de limite.
+Serviço de geração de embeddings em lote usando httpx + asyncio.
+
+Os textos são agrupados em requisições multi-input (``input: [...]``) de até
+``EMBEDDING_MAX_ITEMS_PER_CALL`` textos e ~``EMBEDDING_MAX_TOKENS_PER_CALL``
+tokens; até BATCH_SIZE requisições ficam em voo, com controle por semáforo
+para evitar estouro de limite. O resultado segue a ordem de entrada.
 """
 from __future__ import annotations
 
 import asyncio
+import logging
 import os
 from asyncio import Semaphore
-from typing import List
+from typing import List, Optional
 
 import httpx
 from dotenv import load_dotenv
@@ -17,50 +21,97 @@ from backend.metrics import external_api_duration, fallback_usage_total
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDINGS_URL = "https://api.openai.com/v1/embeddings"
 
 # Concurrency
 MAX_CONCURRENT_REQUESTS = int(os.getenv("EMBEDDING_BATCH_SIZE", "10"))
 POOL_SIZE = max(1, MAX_CONCURRENT_REQUESTS // 2)  # metade do batch para pool
 TIMEOUT = int(os.getenv("OPENAI_TIMEOUT", "30"))
 
+# Limites por requisição (a API aceita até 2048 inputs e ~300k tokens)
+MAX_ITEMS_PER_CALL = int(os.getenv("EMBEDDING_MAX_ITEMS_PER_CALL", "256"))
+MAX_TOKENS_PER_CALL = int(os.getenv("EMBEDDING_MAX_TOKENS_PER_CALL", "100000"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token)."""
+    return len(text) // 4 + 1
+
+
+def pack_batches(texts: List[str], max_items: int = MAX_ITEMS_PER_CALL,
+                 max_tokens: int = MAX_TOKENS_PER_CALL) -> List[List[int]]:
+    """Índices de ``texts`` agrupados em lotes que respeitam os dois limites.
+
+    Um texto que sozinho excede ``max_tokens`` vai em um lote próprio (a API
+    trunca ou rejeita só aquele lote).
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    tokens = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if current and (len(current) >= max_items or tokens + cost > max_tokens):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(i)
+        tokens += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
 # ---------------------------------------------------------------------------
 # Parallel Embedding Service
 # ---------------------------------------------------------------------------
 
 
 class ParallelEmbeddingService:
-    """Gera embeddings em paralelo com limite de simultaneidade."""
+    """Gera embeddings em lotes multi-input com limite de simultaneidade."""
 
-    def __init__(self, max_concurrency: int = MAX_CONCURRENT_REQUESTS):
+    def __init__(self, max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                 max_items: int = MAX_ITEMS_PER_CALL, max_tokens: int = MAX_TOKENS_PER_CALL,
+                 model: str = EMBEDDING_MODEL, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.semaphore = Semaphore(max_concurrency)
+        self.max_items = max_items
+        self.max_tokens = max_tokens
+        self.model = model
         self.session_pool = [
             httpx.AsyncClient(
-                timeout=TIMEOUT) for _ in range(POOL_SIZE)]
-
-    async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Gera embeddings para uma lista de textos em paralelo."""
-        tasks = []
-        for i, txt in enumerate(texts):
-            session = self.session_pool[i % len(self.session_pool)]
-            tasks.append(self._generate_single_embedding(session, txt))
-
-        embeddings = await asyncio.gather(*tasks, return_exceptions=True)
+                timeout=TIMEOUT, transport=transport) for _ in range(POOL_SIZE)]
+
+    async def generate_embeddings_batch(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Gera embeddings para uma lista de textos, um POST por lote.
+
+        Returns:
+            Lista alinhada com ``texts``; textos de lotes que falharam ficam
+            como ``None`` (o chamador decide o fallback).
+        """
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        batches = pack_batches(texts, self.max_items, self.max_tokens)
+        outcomes = await asyncio.gather(*[
+            self._generate_batch(self.session_pool[n % len(self.session_pool)],
+                                 [texts[i] for i in batch])
+            for n, batch in enumerate(batches)
+        ], return_exceptions=True)
 
         # Tratar erros e métricas
-        valid_embeddings: List[List[float]] = []
-        for emb in embeddings:
-            if isinstance(emb, Exception):
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Lote de {len(batch)} embeddings falhou: {outcome}")
                 fallback_usage_total.labels(service="openai", reason="error").inc()
-            else:
-                valid_embeddings.append(emb)
-
-        return valid_embeddings
-
-    async def _generate_single_embedding(
-            self, session: httpx.AsyncClient, text: str) -> List[float]:
-        """Faz uma única chamada à API OpenAI para gerar embedding."""
+                continue
+            for i, embedding in zip(batch, outcome):
+                results[i] = embedding
+        return results
+
+    async def _generate_batch(
+            self, session: httpx.AsyncClient, texts: List[str]) -> List[List[float]]:
+        """Uma chamada multi-input à API OpenAI; devolve na ordem de ``texts``."""
         async with self.semaphore:
             labels = {"service": "openai", "operation": "embedding"}
             with external_api_duration.labels(**labels).time():
@@ -68,14 +119,13 @@ class ParallelEmbeddingService:
                     "Authorization": f"Bearer {OPENAI_API_KEY}",
                     "Content-Type": "application/json",
                 }
-                payload = {"model": EMBEDDING_MODEL, "input": text}
-                try:
-                    resp = await session.post("https://api.openai.com/v1/embeddings", json=payload, headers=headers)
-                    resp.raise_for_status()
-                    data = resp.json()
-                    return data["data"][0]["embedding"]
-                except Exception as exc:
-                    raise exc
+                payload = {"model": self.model, "input": texts}
+                resp = await session.post(EMBEDDINGS_URL, json=payload, headers=headers)
+                resp.raise_for_status()
+                data = sorted(resp.json()["data"], key=lambda item: item["index"])
+                if len(data) != len(texts):
+                    raise ValueError(f"API devolveu {len(data)} embeddings para {len(texts)} textos")
+                return [item["embedding"] for item in data]
 
     async def aclose(self):
         """Fecha todas as conexões httpx."""
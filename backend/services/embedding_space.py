@@ -0,0 +1,240 @@
+"""
+backend/services/embedding_space.py
+
+Registro de espaços de embedding e projeção para um espaço compartilhado.
+
+Cada vetor persistido carrega o seu espaço (``modelo/dimensão``, ex.:
+``all-MiniLM-L6-v2/384``) e é guardado na dimensão nativa, sem padding. Para
+comparar vetores de modelos diferentes (casos com OpenAI, histórico dos
+advogados com MiniLM), ``to_shared`` aplica a projeção linear aprendida por
+``train_pca_embeddings``:
+
+- espaço âncora (MiniLM, o modelo local sempre disponível): PCA para
+  ``EMBEDDING_SHARED_DIM`` componentes;
+- demais espaços: mapa linear (ridge) treinado em pares de embeddings do
+  mesmo texto, cujo alvo são as coordenadas PCA do âncora.
+
+A projeção é aplicada na leitura (snapshot dos advogados e carga do caso),
+nunca gravada: um novo treino só exige reiniciar os workers, e todos os
+vetores de um processo ficam na mesma versão. Sem projeção treinada cada
+vetor segue no espaço nativo (como antes, mas sem os 75% de zeros) e só é
+comparado com vetores da mesma dimensão.
+
+Vetores legados de 1536 posições com o MiniLM preenchido por zeros são
+reconhecidos e recortados em ``infer_space``.
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_SHARED_DIM = int(os.getenv("EMBEDDING_SHARED_DIM", "256"))
+EMBEDDING_PROJECTION_PATH = os.getenv("EMBEDDING_PROJECTION_PATH", "models/embedding_projection.npz")
+RIDGE_ALPHA = float(os.getenv("EMBEDDING_PROJECTION_RIDGE", "1.0"))
+
+
+@dataclass(frozen=True)
+class EmbeddingSpace:
+    model: str
+    dim: int
+
+    @property
+    def tag(self) -> str:
+        """Identificador persistido junto do vetor (colunas ``*_space``)."""
+        return f"{self.model}/{self.dim}"
+
+
+OPENAI_SPACE = EmbeddingSpace("text-embedding-3-small", 1536)
+LOCAL_SPACE = EmbeddingSpace("all-MiniLM-L6-v2", 384)
+
+_SPACES: Dict[str, EmbeddingSpace] = {}
+
+
+def register_space(space: EmbeddingSpace) -> EmbeddingSpace:
+    _SPACES[space.tag] = space
+    return space
+
+
+for _space in (OPENAI_SPACE, LOCAL_SPACE):
+    register_space(_space)
+
+
+def get_space(tag: str) -> Optional[EmbeddingSpace]:
+    return _SPACES.get(tag)
+
+
+def space_for_model(model: str, dim: int) -> EmbeddingSpace:
+    """Espaço de ``model`` (nome com ou sem o prefixo ``sentence-transformers/``)."""
+    prefix = "sentence-transformers/"
+    model = model[len(prefix):] if model.startswith(prefix) else model
+    return _SPACES.get(f"{model}/{dim}") or register_space(EmbeddingSpace(model, dim))
+
+
+def infer_space(vector: Sequence[float], tag: Optional[str] = None) -> Tuple[np.ndarray, Optional[EmbeddingSpace]]:
+    """Vetor float32 (sem padding legado) e seu espaço, pela tag ou pela dimensão."""
+    vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+    if vec.size == OPENAI_SPACE.dim and not np.any(vec[LOCAL_SPACE.dim:]):
+        # MiniLM antigo completado com zeros até 1536
+        vec = vec[:LOCAL_SPACE.dim]
+        return vec, LOCAL_SPACE
+    if tag:
+        space = get_space(tag)
+        if space is not None and space.dim == vec.size:
+            return vec, space
+    by_dim = [s for s in _SPACES.values() if s.dim == vec.size]
+    return vec, (by_dim[0] if len(by_dim) == 1 else None)
+
+
+class EmbeddingProjector:
+    """Projeções lineares ``(x - média) @ matriz`` de cada espaço para o compartilhado."""
+
+    def __init__(self, path: Optional[str] = EMBEDDING_PROJECTION_PATH):
+        self.maps: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.dim: Optional[int] = None
+        self.version: Optional[str] = None
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Projeção de embeddings inválida em {path}: {e}")
+
+    @property
+    def is_fitted(self) -> bool:
+        return bool(self.maps)
+
+    def fit(self, anchor: np.ndarray, paired: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+            n_components: int = EMBEDDING_SHARED_DIM, anchor_space: EmbeddingSpace = LOCAL_SPACE,
+            alpha: float = RIDGE_ALPHA) -> "EmbeddingProjector":
+        """
+        Treina a projeção.
+
+        Args:
+            anchor: amostra ``n × d`` do espaço âncora (PCA)
+            paired: por tag de espaço, ``(vetores do espaço, vetores âncora)``
+                dos mesmos textos, linha a linha
+            n_components: dimensão do espaço compartilhado
+        """
+        x = np.asarray(anchor, dtype=np.float64)
+        mean = x.mean(axis=0)
+        _, _, vt = np.linalg.svd(x - mean, full_matrices=False)
+        k = min(n_components, vt.shape[0])
+        components = vt[:k].T
+        maps = {anchor_space.tag: (mean, components)}
+
+        for tag, (source, target) in (paired or {}).items():
+            s = np.asarray(source, dtype=np.float64)
+            z = (np.asarray(target, dtype=np.float64) - mean) @ components
+            s_mean = s.mean(axis=0)
+            sc = s - s_mean
+            # Ridge: (SᵀS + αI) W = SᵀZ
+            w = np.linalg.solve(sc.T @ sc + alpha * np.eye(sc.shape[1]), sc.T @ z)
+            maps[tag] = (s_mean, w)
+
+        self.maps = {tag: (m.astype(np.float32), w.astype(np.float32)) for tag, (m, w) in maps.items()}
+        self.dim = k
+        self.version = self._fingerprint()
+        return self
+
+    def _fingerprint(self) -> str:
+        h = hashlib.blake2b(digest_size=8)
+        for tag in sorted(self.maps):
+            mean, matrix = self.maps[tag]
+            h.update(tag.encode("utf-8"))
+            h.update(mean.tobytes())
+            h.update(matrix.tobytes())
+        return h.hexdigest()
+
+    def save(self, path: str = EMBEDDING_PROJECTION_PATH) -> None:
+        arrays = {}
+        for i, (tag, (mean, matrix)) in enumerate(sorted(self.maps.items())):
+            arrays[f"mean_{i}"], arrays[f"matrix_{i}"] = mean, matrix
+        meta = {"tags": sorted(self.maps), "dim": self.dim, "version": self.version}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8), **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path: str = EMBEDDING_PROJECTION_PATH) -> None:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            self.maps = {tag: (data[f"mean_{i}"], data[f"matrix_{i}"]) for i, tag in enumerate(meta["tags"])}
+        self.dim = meta["dim"]
+        self.version = meta["version"]
+
+    def supports(self, space: Optional[EmbeddingSpace]) -> bool:
+        return space is not None and space.tag in self.maps
+
+    def project(self, vectors: np.ndarray, space: EmbeddingSpace) -> np.ndarray:
+        """Matriz ``n × d`` do espaço ``space`` → ``n × dim`` no compartilhado."""
+        mean, matrix = self.maps[space.tag]
+        return (np.asarray(vectors, dtype=np.float32) - mean) @ matrix
+
+
+# Instância global (carregada uma vez por processo; novo treino vale após restart)
+embedding_projector = EmbeddingProjector()
+
+
+def to_shared_many(vectors: Iterable[Sequence[float]], tag: Optional[str] = None,
+                   projector: Optional[EmbeddingProjector] = None) -> List[np.ndarray]:
+    """Vetores no espaço compartilhado; sem projeção para o espaço, no nativo (sem padding)."""
+    projector = projector or embedding_projector
+    native = [infer_space(v, tag) for v in vectors]
+    if not native:
+        return []
+    out: List[Optional[np.ndarray]] = [vec for vec, _ in native]
+    groups: Dict[EmbeddingSpace, List[int]] = {}
+    for i, (_, space) in enumerate(native):
+        if projector.supports(space):
+            groups.setdefault(space, []).append(i)
+    for space, idx in groups.items():
+        projected = projector.project(np.vstack([native[i][0] for i in idx]), space)
+        for i, row in zip(idx, projected):
+            out[i] = row
+    return out
+
+
+def to_shared(vector: Optional[Sequence[float]], tag: Optional[str] = None,
+              projector: Optional[EmbeddingProjector] = None) -> Optional[np.ndarray]:
+    if vector is None or len(vector) == 0:
+        return None
+    return to_shared_many([vector], tag, projector)[0]
+
+
+def comparison_dim(projector: Optional[EmbeddingProjector] = None) -> int:
+    """Dimensão em que as comparações acontecem neste processo."""
+    projector = projector or embedding_projector
+    return projector.dim if projector.is_fitted else LOCAL_SPACE.dim
+
+
+def case_embedding(row: Dict[str, object], projector: Optional[EmbeddingProjector] = None) -> np.ndarray:
+    """``summary_embedding`` de uma linha ``cases`` pronto para o matching (zeros se ausente).
+
+    Sem projeção treinada o vetor segue no espaço nativo: durante a migração
+    de modelo, casos e advogados do mesmo espaço continuam comparáveis, e os
+    vetores de outra dimensão são ignorados pelo cálculo da feature S.
+    """
+    projector = projector or embedding_projector
+    dim = comparison_dim(projector)
+    vec = to_shared(row.get("summary_embedding"), row.get("summary_embedding_space"), projector)
+    if vec is None:
+        return np.zeros(dim, dtype=np.float32)
+    if vec.size != dim and projector.is_fitted:
+        # Espaço sem projeção treinada: não há como comparar com os advogados
+        logger.warning(f"Embedding do caso {row.get('id')} ({vec.size} dims) fora do espaço "
+                       f"de comparação ({dim} dims); feature S zerada")
+        return np.zeros(dim, dtype=np.float32)
+    return vec
+
+
+def storage_tag(vector: Optional[Sequence[float]]) -> Optional[str]:
+    """Tag do espaço nativo de um vetor recém-gerado (None se ambíguo ou vazio)."""
+    if vector is None or len(vector) == 0:
+        return None
+    _, space = infer_space(vector)
+    return space.tag if space else None
@@ -0,0 +1,142 @@
+"""
+backend/services/enrichment_cache.py
+
+Cache stale-while-revalidate para o enriquecimento de advogados com dados
+externos (Escavador/Jusbrasil via ``HybridLegalDataService``).
+
+Cada entrada fica no Redis (``enrich:lawyer:<id>``) com o instante da coleta
+e expira no TTL rígido. Na leitura (um único MGET para todos os candidatos):
+
+- fresca (idade < TTL suave): servida diretamente;
+- velha (entre TTL suave e rígido): servida na hora e reenfileirada para
+  atualização em background;
+- ausente: usa o ``fallback`` (campos jusbrasil_* gravados no banco) e
+  agenda a coleta.
+
+A atualização roda fora da requisição, com concorrência limitada
+(``ENRICH_REFRESH_CONCURRENCY``) e no máximo ``ENRICH_MAX_PENDING`` coletas
+pendentes; a latência do matching deixa de depender das APIs de terceiros.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+ENRICH_SOFT_TTL = int(os.getenv("ENRICH_SOFT_TTL", str(6 * 3600)))
+ENRICH_HARD_TTL = int(os.getenv("ENRICH_HARD_TTL", str(7 * 24 * 3600)))
+ENRICH_REFRESH_CONCURRENCY = int(os.getenv("ENRICH_REFRESH_CONCURRENCY", "4"))
+ENRICH_MAX_PENDING = int(os.getenv("ENRICH_MAX_PENDING", "1000"))
+
+
+class EnrichmentCache:
+    """Cache SWR persistente (Redis) com atualização em background limitada."""
+
+    def __init__(self, fetch: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]],
+                 encode: Callable[[Any], Dict[str, Any]], decode: Callable[[Dict[str, Any]], Any], *,
+                 redis: Any = None, redis_url: str = REDIS_URL, prefix: str = "enrich:lawyer",
+                 soft_ttl: int = ENRICH_SOFT_TTL, hard_ttl: int = ENRICH_HARD_TTL,
+                 concurrency: int = ENRICH_REFRESH_CONCURRENCY, max_pending: int = ENRICH_MAX_PENDING):
+        self.fetch = fetch
+        self.encode = encode
+        self.decode = decode
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.stats = {"fresh": 0, "stale": 0, "miss": 0, "refreshed": 0, "refresh_errors": 0}
+        self._redis_client = redis
+        self._owns_client = redis is None
+        self._client_loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def _key(self, item_id: str) -> str:
+        return f"{self.prefix}:{item_id}"
+
+    def _redis(self):
+        # Cliente e semáforo ficam presos ao event loop em que foram criados
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            if self._owns_client:
+                import redis.asyncio as aioredis
+
+                self._redis_client = aioredis.from_url(
+                    self.redis_url, socket_timeout=1, socket_connect_timeout=1, decode_responses=True)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._client_loop = loop
+        return self._redis_client
+
+    # ---------------- leitura ----------------
+
+    async def get_many(self, items: Dict[str, Dict[str, Any]],
+                       fallback: Callable[[str], Any]) -> Dict[str, Any]:
+        """Valor de cada ID (fresco, velho ou fallback); agenda as atualizações necessárias."""
+        ids = list(items)
+        if not ids:
+            return {}
+        client = self._redis()
+        try:
+            raw_values = await client.mget([self._key(i) for i in ids])
+        except Exception as e:
+            logger.warning(f"Cache de enriquecimento indisponível (Redis): {e}")
+            raw_values = [None] * len(ids)
+
+        now = time.time()
+        result: Dict[str, Any] = {}
+        for item_id, raw in zip(ids, raw_values):
+            entry = None
+            if raw:
+                try:
+                    payload = json.loads(raw)
+                    entry = (self.decode(payload["value"]), now - float(payload["fetched_at"]))
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Entrada de enriquecimento inválida para {item_id}: {e}")
+            if entry is None:
+                self.stats["miss"] += 1
+                result[item_id] = fallback(item_id)
+                self._schedule(item_id, items[item_id])
+                continue
+            value, age = entry
+            result[item_id] = value
+            if age < self.soft_ttl:
+                self.stats["fresh"] += 1
+            else:
+                self.stats["stale"] += 1
+                self._schedule(item_id, items[item_id])
+        return result
+
+    # ---------------- atualização em background ----------------
+
+    def _schedule(self, item_id: str, info: Dict[str, Any]) -> None:
+        if self.fetch is None or item_id in self._pending or len(self._pending) >= self.max_pending:
+            return
+        task = asyncio.ensure_future(self.refresh(item_id, info))
+        self._pending[item_id] = task
+        task.add_done_callback(lambda _: self._pending.pop(item_id, None))
+
+    async def refresh(self, item_id: str, info: Dict[str, Any]) -> Optional[Any]:
+        """Coleta o valor na fonte externa e grava no Redis (respeita o limite de concorrência)."""
+        client = self._redis()
+        async with self._semaphore:
+            try:
+                value = await self.fetch(info)
+                payload = json.dumps({"fetched_at": time.time(), "value": self.encode(value)}, default=str)
+                await client.set(self._key(item_id), payload, ex=self.hard_ttl)
+                self.stats["refreshed"] += 1
+                return value
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                logger.warning(f"Falha ao atualizar enriquecimento de {item_id}: {e}")
+                return None
+
+    async def drain(self) -> None:
+        """Aguarda as atualizações pendentes (testes e shutdown)."""
+        while self._pending:
+            await asyncio.gather(*list(self._pending.values()), return_exceptions=True)
@@ -1,12 +1,27 @@
 # backend/explanation_service.py
+"""
+Breakdown dos matches para as explicações, sem re-executar o ranking.
+
+O breakdown (features, delta por feature e pesos) de cada advogado ranqueado
+já é persistido em ``case_matches`` junto com o preset e a versão dos pesos.
+As explicações leem essas linhas em uma consulta e só as aproveitam se o
+preset for o pedido e a versão for a que o ranking geraria agora; os demais
+advogados (ausentes ou com linha desatualizada) têm as features recalculadas com ``algo.explain`` (sem
+disponibilidade, cache Redis, auditoria ou ``last_offered_at``). O resultado
+recalculado fica em memória por (caso, advogado, preset, versão dos pesos):
+uma troca de pesos muda a chave e invalida as entradas antigas.
+"""
 import os
-from typing import Any, Dict, List, Optional
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-import numpy as np
 from dotenv import load_dotenv
 
-from backend.algoritmo_match import KPI, Case, Lawyer, MatchmakingAlgorithm
-from backend.models import ExplainRequest, ExplainResponse, Explanation
+from backend.algoritmo_match import Case, MatchmakingAlgorithm, weights_fingerprint
+from backend.models import ExplainRequest, Explanation
+from backend.services.embedding_space import case_embedding
+from backend.services.lawyer_snapshot import lawyer_snapshot
 from supabase import Client, create_client
 
 # Configuração
@@ -15,74 +30,167 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+EXPLAIN_CACHE_TTL = int(os.getenv("EXPLAIN_CACHE_TTL", "900"))
+EXPLAIN_CACHE_SIZE = int(os.getenv("EXPLAIN_CACHE_SIZE", "5000"))
+
 algo = MatchmakingAlgorithm()
 
+_MATCH_FIELDS = ("lawyer_id, raw_score, fair_score, features, breakdown, "
+                 "weights_used, weights_version, preset_used")
 
-async def generate_explanations_for_matches(
-    req: ExplainRequest,
-) -> Optional[ExplainResponse]:
-    """
-    Gera explicações detalhadas para o match entre um caso e advogados.
-    v2.2: Usa o novo `algo.rank` para obter o breakdown detalhado.
+_computed: "OrderedDict[Tuple[str, str, str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def _cache_get(key: Tuple[str, str, str, str]) -> Optional[Dict[str, Any]]:
+    hit = _computed.get(key)
+    if hit is None:
+        return None
+    if time.monotonic() - hit[0] > EXPLAIN_CACHE_TTL:
+        del _computed[key]
+        return None
+    _computed.move_to_end(key)
+    return hit[1]
+
+
+def _cache_put(key: Tuple[str, str, str, str], value: Dict[str, Any]) -> None:
+    _computed[key] = (time.monotonic(), value)
+    _computed.move_to_end(key)
+    while len(_computed) > EXPLAIN_CACHE_SIZE:
+        _computed.popitem(last=False)
+
+
+def _current_versions(preset: str) -> Set[str]:
+    """Versões dos pesos que o ranking geraria agora com ``preset``.
+
+    Os pesos dinâmicos só dependem da complexidade do caso, então há uma
+    versão por complexidade; assim não é preciso carregar o caso.
     """
-    # 1. Carregar dados do caso
+    base = MatchmakingAlgorithm._base_weights(preset, None)
+    return {
+        weights_fingerprint(MatchmakingAlgorithm.apply_dynamic_weights(
+            Case(id="", area="", subarea="", urgency_h=0, coords=(0.0, 0.0), complexity=complexity),
+            base))
+        for complexity in ("LOW", "MEDIUM", "HIGH")
+    }
+
+
+def _persisted(case_id: str, lawyer_ids: List[str], preset: str) -> Dict[str, Dict[str, Any]]:
+    """Breakdowns de ``case_matches`` do preset pedido e com os pesos atuais."""
+    rows = supabase.table("case_matches").select(_MATCH_FIELDS).eq(
+        "case_id", case_id).eq("preset_used", preset).in_("lawyer_id", lawyer_ids).execute().data or []
+    versions = _current_versions(preset) if rows else set()
+    return {
+        str(r["lawyer_id"]): {
+            "source": "persisted",
+            "features": r.get("features") or {},
+            "breakdown": r.get("breakdown"),
+            "raw_score": float(r.get("raw_score") or 0.0),
+            "fair_score": float(r.get("fair_score") or 0.0),
+            "weights_used": r.get("weights_used"),
+            "weights_version": r.get("weights_version"),
+            "preset": r.get("preset_used"),
+        }
+        for r in rows if r.get("features") and r.get("weights_version") in versions
+    }
+
+
+def _load_case(case_id: str) -> Optional[Case]:
     case_row = supabase.table("cases").select(
-        "*").eq("id", req.case_id).single().execute().data
+        "*").eq("id", case_id).single().execute().data
     if not case_row:
         return None
-
-    case = Case(
+    return Case(
         id=case_row["id"],
         area=case_row["area"],
         subarea=case_row["subarea"],
         urgency_h=case_row["urgency_h"],
         coords=tuple(case_row["coords"]),
         complexity=case_row.get("complexity", "MEDIUM"),
-        summary_embedding=np.array(
-            case_row.get(
-                "summary_embedding",
-                []),
-            dtype=np.float32),
+        summary_embedding=case_embedding(case_row),
     )
 
-    # 2. Carregar dados dos advogados especificados
-    lawyer_rows = supabase.table("lawyers").select(
-        "*").in_("id", req.lawyer_ids).execute().data
-
-    candidates = [
-        Lawyer(
-            id=r["id"],
-            nome=r["nome"],
-            tags_expertise=r["tags_expertise"],
-            geo_latlon=tuple(r["geo_latlon"]),
-            curriculo_json=r.get("curriculo_json", {}),
-            kpi=KPI(**r.get("kpi", {})),
-            kpi_subarea=r.get("kpi_subarea", {}),
-            kpi_softskill=r.get("kpi_softskill", 0.0),
-            case_outcomes=r.get("case_outcomes", [])
-        ) for r in lawyer_rows
-    ]
 
-    if not candidates:
+def _load_lawyers(lawyer_ids: List[str]) -> List[Any]:
+    """Advogados do snapshot em memória; só os ausentes vão ao banco."""
+    records, missing = lawyer_snapshot.get_many(lawyer_ids)
+    if missing:
+        lawyer_snapshot.put_rows(supabase.table("lawyers").select(
+            "*").in_("id", missing).execute().data or [])
+        records += lawyer_snapshot.get_many(missing)[0]
+    return [rec.lawyer for rec in records]
+
+
+def _computed_breakdowns(case_id: str, lawyer_ids: List[str],
+                         preset: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Features recalculadas (sem efeitos colaterais) para quem não tem linha atual em case_matches."""
+    version = weights_fingerprint(MatchmakingAlgorithm._base_weights(preset, None))
+    result: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    for lawyer_id in lawyer_ids:
+        cached = _cache_get((case_id, lawyer_id, preset, version))
+        if cached is not None:
+            result[lawyer_id] = cached
+        else:
+            pending.append(lawyer_id)
+    if not pending:
+        return result
+
+    case = _load_case(case_id)
+    if case is None:
         return None
+    for scores in algo.explain(case, _load_lawyers(pending), preset=preset):
+        entry = {
+            "source": "computed",
+            "features": scores["features"],
+            "breakdown": scores["delta"],
+            "raw_score": scores["ltr"],
+            "fair_score": None,
+            "weights_used": scores["weights_used"],
+            "weights_version": scores["weights_version"],
+            "preset": preset,
+        }
+        _cache_put((case_id, str(scores["lawyer_id"]), preset, version), entry)
+        result[str(scores["lawyer_id"])] = entry
+    return result
 
-    # 3. Executar o ranking para obter scores detalhados
-    ranked_lawyers = await algo.rank(case, candidates, top_n=len(candidates), preset=req.preset)
-
-    explanations = []
-    for lw in ranked_lawyers:
-        scores = lw.scores
-        explanations.append(
-            Explanation(
-                lawyer_id=lw.id,
-                raw_score=scores.get("raw", 0),
-                features=scores.get("features", {}),
-                breakdown=scores.get("delta")
-            )
-        )
 
-    return ExplainResponse(case_id=case.id, explanations=explanations)
+async def get_match_breakdowns(case_id: str, lawyer_ids: List[str],
+                               preset: str = "balanced") -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Breakdown por advogado (features, delta, scores, pesos e origem).
+
+    Returns:
+        Dict por lawyer_id (advogados inexistentes ficam de fora), ou None
+        se for preciso recalcular e o caso não existir.
+    """
+    lawyer_ids = [str(lid) for lid in lawyer_ids]
+    breakdowns = _persisted(case_id, lawyer_ids, preset)
+    missing = [lid for lid in lawyer_ids if lid not in breakdowns]
+    if missing:
+        computed = _computed_breakdowns(case_id, missing, preset)
+        if computed is None:
+            return None
+        breakdowns.update(computed)
+    return {lid: breakdowns[lid] for lid in lawyer_ids if lid in breakdowns}
 
 
-# Instância do serviço para importação
-explanation_service = generate_explanations_for_matches
+async def generate_explanations_for_matches(
+    req: ExplainRequest,
+) -> Optional[List[Explanation]]:
+    """
+    Gera explicações detalhadas para o match entre um caso e advogados.
+    v2.9: Serve o breakdown persistido em ``case_matches`` (mesmo preset e pesos
+    atuais); não re-executa o ``algo.rank``.
+    """
+    breakdowns = await get_match_breakdowns(req.case_id, req.lawyer_ids, req.preset)
+    if not breakdowns:
+        return None
+    return [
+        Explanation(
+            lawyer_id=lawyer_id,
+            raw_score=item["raw_score"],
+            features=item["features"],
+            breakdown=item["breakdown"],
+        )
+        for lawyer_id, item in breakdowns.items()
+    ]
@@ -11,7 +11,7 @@ Serviço de integração híbrida para dados jurídicos.
 
 import asyncio
 import logging
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
@@ -50,19 +50,51 @@ class HybridLawyerStats:
     last_sync: datetime
     limitations: List[str]
 
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["last_sync"] = self.last_sync.isoformat() if self.last_sync else None
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HybridLawyerStats":
+        data = dict(data)
+        data["last_sync"] = datetime.fromisoformat(data["last_sync"]) if data.get("last_sync") else None
+        return cls(**data)
+
+    @classmethod
+    def from_db_row(cls, row: Dict[str, Any]) -> "HybridLawyerStats":
+        """Estatísticas a partir dos campos jusbrasil_* já gravados em ``lawyers``."""
+        return cls(
+            primary_source='database',
+            total_cases=row.get("total_cases") or 0,
+            victories=0,
+            defeats=0,
+            ongoing=0,
+            real_success_rate=row.get("estimated_success_rate") or 0.0,
+            analysis_confidence=0.3,  # Mesma confiança do fallback Jusbrasil
+            area_distribution=row.get("jusbrasil_areas") or {},
+            tribunal_distribution={},
+            activity_level=row.get("jusbrasil_activity_level") or 'low',
+            specialization_score=row.get("jusbrasil_specialization") or 0.0,
+            data_quality=row.get("jusbrasil_data_quality") or DataQuality.UNAVAILABLE.value,
+            last_sync=None,
+            limitations=row.get("jusbrasil_limitations") or [],
+        )
+
 
 class HybridLegalDataService:
     """
     Orquestra a coleta e unificação de dados das APIs do Escavador e Jusbrasil.
     """
 
-    def __init__(self, db_connection, escavador_api_key: str,
-                 jusbrasil_api_key: Optional[str] = None):
-        if not escavador_api_key:
+    def __init__(self, db_connection, escavador_api_key: Optional[str],
+                 jusbrasil_api_key: Optional[str] = None, escavador_client: Any = None):
+        if not escavador_api_key and escavador_client is None:
             raise ValueError("A API Key do Escavador é obrigatória.")
 
         self.db_connection = db_connection
-        self.escavador_client = EscavadorClient(api_key=escavador_api_key)
+        # `escavador_client` permite injetar um cliente fake em testes/dev local
+        self.escavador_client = escavador_client or EscavadorClient(api_key=escavador_api_key)
         self.jusbrasil_integration = RealisticJusbrasilIntegration(
             db_connection, api_key=jusbrasil_api_key)
 
@@ -83,8 +115,7 @@ class HybridLegalDataService:
 
         if not oab_number or not state:
             logger.warning(
-                f"Advogado {
-                    lawyer_data.get('id')} sem OAB/UF para consulta.")
+                f"Advogado {lawyer_data.get('id')} sem OAB/UF para consulta.")
             return self._create_empty_stats()
 
         # 1. Tenta buscar dados do Escavador (fonte primária)
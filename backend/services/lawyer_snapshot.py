@@ -0,0 +1,239 @@
+"""
+backend/services/lawyer_snapshot.py
+
+Snapshot em memória (por processo) dos advogados já hidratados.
+
+Cada linha de ``lawyers`` vira um ``LawyerRecord`` imutável: o ``Lawyer``
+pronto para o ``rank()`` (KPI, digest dos reviews e embeddings históricos
+convertidos uma única vez em arrays float32 somente-leitura — ou views sem
+cópia sobre o blob binário ``casos_historicos_blob``, ver
+backend/embedding_blob.py; projetados para o espaço compartilhado de
+embeddings quando há projeção treinada, ver embedding_space.py) e a linha
+original, usada na formatação da resposta. A versão de cada registro é a
+coluna ``updated_at``.
+
+O snapshot é mantido por um feed de alterações (polling incremental com
+marca d'água ``(updated_at, id)``, paginado como o índice geoespacial); as
+requisições de match leem os candidatos direto da memória. Advogados
+excluídos não aparecem no feed: ``run_lawyer_snapshot_pruner`` compara o
+snapshot com os IDs ativos de tempos em tempos e descarta o resto. Como o ``rank()`` guarda os
+scores de cada requisição em arrays próprios e devolve cópias, requisições
+concorrentes compartilham os mesmos objetos com segurança.
+"""
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.algoritmo_match import KPI, Lawyer, ReviewDigest
+from backend.embedding_blob import decode_blob, unpack_embeddings
+from backend.services.embedding_space import to_shared_many
+from backend.services.supabase_paging import advance_watermark, fetch_changed_rows
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("LAWYER_SNAPSHOT_REFRESH_INTERVAL", "30"))
+SNAPSHOT_PRUNE_INTERVAL = float(os.getenv("LAWYER_SNAPSHOT_PRUNE_INTERVAL", "600"))
+
+
+@dataclass(frozen=True, slots=True)
+class LawyerRecord:
+    """Advogado hidratado + linha original, na versão ``version`` (updated_at)."""
+    lawyer: Lawyer
+    row: Dict[str, Any]
+    version: Optional[str]
+
+
+def _frozen_array(values: Any) -> np.ndarray:
+    arr = np.asarray(values, dtype=np.float32)
+    arr.setflags(write=False)
+    return arr
+
+
+def historic_embeddings(row: Dict[str, Any]) -> List[np.ndarray]:
+    """Embeddings históricos da linha: blob binário (sem cópia) ou, na falta dele, o JSON."""
+    blob = row.get("casos_historicos_blob")
+    if blob:
+        try:
+            # Linhas da matriz são views sobre o mesmo buffer somente-leitura
+            return list(unpack_embeddings(decode_blob(blob)))
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Blob de embeddings inválido para o advogado {row.get('id')}: {e}")
+    return [_frozen_array(v) for v in row.get("casos_historicos_embeddings") or []]
+
+
+def hydrate_lawyer(row: Dict[str, Any]) -> Lawyer:
+    """Constrói o ``Lawyer`` a partir de uma linha ``lawyers`` do Supabase."""
+    return Lawyer(
+        id=row["id"],
+        nome=row["nome"],
+        tags_expertise=row["tags_expertise"],
+        geo_latlon=tuple(row["geo_latlon"]),
+        curriculo_json=row.get("curriculo_json", {}),
+        casos_historicos_embeddings=to_shared_many(historic_embeddings(row),
+                                                   row.get("casos_historicos_space")),
+        kpi=KPI(**row.get("kpi", {})),
+        kpi_subarea=row.get("kpi_subarea", {}),
+        kpi_softskill=row.get("kpi_softskill", 0.0),
+        case_outcomes=row.get("case_outcomes", []),
+        review_texts=row.get("review_texts") or [],
+        review_digest=ReviewDigest.from_dict(row.get("review_digest")),
+    )
+
+
+class LawyerSnapshotStore:
+    """Registros imutáveis por ID, atualizados por versão (``updated_at``)."""
+
+    def __init__(self, hydrate: Callable[[Dict[str, Any]], Lawyer] = hydrate_lawyer):
+        self.hydrate = hydrate
+        self._records: Dict[str, LawyerRecord] = {}
+        self._lock = threading.Lock()
+        self.watermark: Optional[str] = None
+        self.watermark_id: Optional[str] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, lawyer_id: str) -> bool:
+        return lawyer_id in self._records
+
+    # ---------------- atualização ----------------
+
+    def apply_rows(self, rows: Iterable[Dict[str, Any]], advance: bool = True) -> int:
+        """Hidrata linhas novas ou mais recentes que o snapshot; avança a marca d'água.
+
+        Só o feed (``run_lawyer_snapshot_refresher``) deve avançar a marca:
+        linhas buscadas por ID entram por ``put_rows``.
+        """
+        applied = 0
+        for row in rows:
+            lawyer_id = row.get("id")
+            if not lawyer_id:
+                continue
+            lawyer_id = str(lawyer_id)
+            version = str(row["updated_at"]) if row.get("updated_at") else None
+            if advance:
+                # Versões já presentes (vindas de put_rows) também contam para o feed
+                self.watermark, self.watermark_id = advance_watermark(self.watermark, self.watermark_id, row)
+            if row.get("ativo", True) is False:
+                with self._lock:
+                    self._records.pop(lawyer_id, None)
+            else:
+                current = self._records.get(lawyer_id)
+                if current is not None and version is not None and current.version is not None \
+                        and version <= current.version:
+                    continue
+                try:
+                    record = LawyerRecord(self.hydrate(row), dict(row), version)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Linha de advogado {lawyer_id} inválida para o snapshot: {e}")
+                    continue
+                with self._lock:
+                    self._records[lawyer_id] = record
+            applied += 1
+        return applied
+
+    def put_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Aplica linhas buscadas por ID (caminho de requisição) sem mexer na marca d'água.
+
+        Avançar a marca com um advogado A (t20) buscado avulso faria o feed
+        pular um B alterado em t15, e um fallback antes da carga inicial a
+        tornaria incremental.
+        """
+        return self.apply_rows(rows, advance=False)
+
+    def remove(self, lawyer_id: str) -> None:
+        with self._lock:
+            self._records.pop(str(lawyer_id), None)
+
+    def retain(self, lawyer_ids: Iterable[str]) -> int:
+        """Mantém só os IDs informados (ex.: os ativos no banco); retorna quantos saíram."""
+        keep = {str(lid) for lid in lawyer_ids}
+        with self._lock:
+            gone = [lid for lid in self._records if lid not in keep]
+            for lid in gone:
+                del self._records[lid]
+        return len(gone)
+
+    # ---------------- consultas ----------------
+
+    def get(self, lawyer_id: str) -> Optional[LawyerRecord]:
+        return self._records.get(str(lawyer_id))
+
+    def get_many(self, lawyer_ids: Iterable[str]) -> Tuple[List[LawyerRecord], List[str]]:
+        """Registros encontrados (na ordem pedida) e IDs ausentes do snapshot."""
+        found, missing = [], []
+        for lawyer_id in lawyer_ids:
+            record = self._records.get(str(lawyer_id))
+            if record is None:
+                missing.append(str(lawyer_id))
+            else:
+                found.append(record)
+        return found, missing
+
+    def get_versions(self, versions: Dict[str, Any]) -> Tuple[List[LawyerRecord], List[str]]:
+        """Como ``get_many``, tratando como ausentes os registros com versão diferente."""
+        found, missing = [], []
+        for lawyer_id, version in versions.items():
+            record = self._records.get(str(lawyer_id))
+            if record is None or (version is not None and record.version != str(version)):
+                missing.append(str(lawyer_id))
+            else:
+                found.append(record)
+        return found, missing
+
+
+# =============================================================================
+# Feed de alterações a partir do Supabase
+# =============================================================================
+
+
+def load_changed_lawyer_rows(supabase, since: Optional[str],
+                             since_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Linhas completas de ``lawyers`` depois da marca d'água (todas se None), paginadas."""
+    return fetch_changed_rows(supabase, "lawyers", "*", since, since_id)
+
+
+async def run_lawyer_snapshot_refresher(store: "LawyerSnapshotStore",
+                                        loader: Callable[[Optional[str], Optional[str]], List[Dict[str, Any]]],
+                                        interval: float = SNAPSHOT_REFRESH_INTERVAL) -> None:
+    """Carga inicial completa e, depois, polling incremental por ``(updated_at, id)``."""
+    while True:
+        try:
+            rows = await asyncio.to_thread(loader, store.watermark, store.watermark_id)
+            applied = await asyncio.to_thread(store.apply_rows, rows)
+            if not store.ready:
+                store.ready = True
+                logger.info(f"Snapshot de advogados carregado com {len(store)} registros")
+            elif applied:
+                logger.debug(f"Snapshot de advogados: {applied} registros atualizados")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Falha ao atualizar snapshot de advogados: {e}")
+        await asyncio.sleep(interval)
+
+
+async def run_lawyer_snapshot_pruner(store: "LawyerSnapshotStore",
+                                     active_ids: Callable[[], Iterable[str]],
+                                     interval: float = SNAPSHOT_PRUNE_INTERVAL) -> None:
+    """Descarta periodicamente do snapshot os advogados excluídos ou inativos."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = store.retain(await asyncio.to_thread(active_ids))
+            if removed:
+                logger.info(f"Snapshot de advogados: {removed} registros inativos descartados")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Falha ao podar snapshot de advogados: {e}")
+
+
+# Instância global (um snapshot por processo)
+lawyer_snapshot = LawyerSnapshotStore()
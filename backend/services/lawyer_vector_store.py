@@ -0,0 +1,394 @@
+"""
+backend/services/lawyer_vector_store.py
+
+Vector store em memória com os embeddings do lado do advogado (casos
+históricos e pareceres) já normalizados (L2), usado pela feature S.
+
+- O histórico de cada advogado é condensado em um único centróide
+  ponderado pelos outcomes: como cos(q, e) = q̂·ê, a média ponderada das
+  similaridades é exatamente q̂·(Σ wᵢ êᵢ / Σ wᵢ). A similaridade histórica
+  de N candidatos vira um único produto matriz × vetor.
+- Pareceres ficam empilhados e normalizados; o máximo por advogado sai
+  de uma multiplicação + ``np.maximum.at``.
+- Embeddings de espaços diferentes (ex.: MiniLM 384 x OpenAI 1536) ficam
+  agrupados por dimensão; cada consulta só usa o grupo da sua dimensão,
+  como o fallback do BatchFeatureCalculator.
+- Um índice IVF (NumPy puro) por dimensão sobre os centróides permite
+  consultas top-k de advogados mais similares a um caso. Ele é atualizado
+  sob demanda pelo ``top_k()``, fora do caminho do ``rank()``.
+- Jobs que gravam embeddings (jusbrasil_sync, nlp_cv_embed) publicam
+  invalidações via Redis pub/sub; cada worker reconstrói apenas as
+  entradas afetadas na próxima consulta.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+INVALIDATION_CHANNEL = "lawyer_vectors:invalidate"
+IVF_NLIST = int(os.getenv("VECTOR_IVF_NLIST", "64"))
+IVF_NPROBE = int(os.getenv("VECTOR_IVF_NPROBE", "8"))
+
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """Normaliza linhas (ou um vetor) em float32; vetores nulos permanecem nulos."""
+    arr = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+# =============================================================================
+# Índice IVF (inverted file) em NumPy puro
+# =============================================================================
+
+
+class IVFIndex:
+    """Índice ANN estilo IVF para produto interno sobre vetores normalizados.
+
+    Os vetores são particionados em ``nlist`` listas por k-means; a busca
+    visita apenas as ``nprobe`` listas mais próximas da consulta. Inserções
+    e remoções são incrementais; os centróides são re-treinados quando o
+    índice dobra de tamanho desde o último treino. Todos os vetores têm a
+    dimensão do primeiro inserido (``dim``).
+    """
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, seed: int = 0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._rng = np.random.default_rng(seed)
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._assign: Dict[str, int] = {}
+        self._lists: Dict[int, Dict[str, np.ndarray]] = {}
+        self._packed: Dict[int, Tuple[List[str], np.ndarray]] = {}
+        self.centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self.dim: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _train(self) -> None:
+        keys = list(self._vectors)
+        data = np.vstack([self._vectors[k] for k in keys])
+        k = min(self.nlist, len(keys))
+        centroids = data[self._rng.choice(len(keys), size=k, replace=False)].copy()
+        for _ in range(10):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for c in range(k):
+                members = data[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = l2_normalize(centroids)
+        self.centroids = centroids
+        self._trained_size = len(keys)
+        self._lists, self._assign, self._packed = {}, {}, {}
+        labels = np.argmax(data @ centroids.T, axis=1)
+        for key, label in zip(keys, labels.tolist()):
+            self._assign[key] = label
+            self._lists.setdefault(label, {})[key] = self._vectors[key]
+
+    def add(self, key: str, vector: np.ndarray) -> None:
+        vector = l2_normalize(vector)
+        if self.dim is None:
+            self.dim = vector.shape[-1]
+        elif vector.shape[-1] != self.dim:
+            raise ValueError(f"Vetor de dimensão {vector.shape[-1]} em índice de dimensão {self.dim}")
+        self.remove(key)
+        self._vectors[key] = vector
+        if not self.is_trained:
+            if len(self._vectors) >= 4 * self.nlist:
+                self._train()
+            return
+        if len(self._vectors) >= 2 * self._trained_size:
+            self._train()
+            return
+        label = int(np.argmax(self.centroids @ vector))
+        self._assign[key] = label
+        self._lists.setdefault(label, {})[key] = vector
+        self._packed.pop(label, None)
+
+    def remove(self, key: str) -> None:
+        if self._vectors.pop(key, None) is None:
+            return
+        label = self._assign.pop(key, None)
+        if label is not None:
+            self._lists.get(label, {}).pop(key, None)
+            self._packed.pop(label, None)
+
+    def _packed_list(self, label: int) -> Tuple[List[str], np.ndarray]:
+        packed = self._packed.get(label)
+        if packed is None:
+            members = self._lists.get(label, {})
+            keys = list(members)
+            matrix = np.vstack(list(members.values())) if keys else np.zeros((0, 0), np.float32)
+            packed = self._packed[label] = (keys, matrix)
+        return packed
+
+    def search(self, query: np.ndarray, k: int = 10) -> List[Tuple[str, float]]:
+        """Retorna até ``k`` pares ``(key, similaridade)`` em ordem decrescente."""
+        q = l2_normalize(query)
+        if not self._vectors or q.shape[-1] != self.dim:
+            return []
+        if not self.is_trained:
+            keys = list(self._vectors)
+            scores = np.vstack([self._vectors[key] for key in keys]) @ q
+        else:
+            probe = np.argsort(-(self.centroids @ q))[: self.nprobe]
+            keys, chunks = [], []
+            for label in probe.tolist():
+                list_keys, matrix = self._packed_list(label)
+                if list_keys:
+                    keys.extend(list_keys)
+                    chunks.append(matrix @ q)
+            if not keys:
+                return []
+            scores = np.concatenate(chunks)
+        top = np.argsort(-scores)[:k]
+        return [(keys[i], float(scores[i])) for i in top.tolist()]
+
+
+# =============================================================================
+# Vector store por advogado
+# =============================================================================
+
+
+@dataclass
+class LawyerVectors:
+    """Vetores pré-normalizados de um advogado, agrupados por dimensão."""
+    hist_centroids: Dict[int, np.ndarray]
+    pareceres: Dict[int, np.ndarray]
+    fingerprint: Tuple
+
+
+def _group_by_dim(vectors: Iterable[np.ndarray]) -> Dict[int, List[int]]:
+    """Posições dos vetores agrupadas pela dimensão de cada um."""
+    groups: Dict[int, List[int]] = {}
+    for i, v in enumerate(vectors):
+        if np.size(v):
+            groups.setdefault(int(np.size(v)), []).append(i)
+    return groups
+
+
+def _fingerprint(lawyer) -> Tuple:
+    """Assinatura barata (contagens + amostra de componentes) para detectar mudanças."""
+    hist = lawyer.casos_historicos_embeddings or []
+    pareceres = lawyer.pareceres or []
+    sample = tuple(float(v[0]) for v in (hist[:1] + hist[-1:]) if len(v)) + \
+        tuple(float(p.embedding[0]) for p in pareceres[:1] if len(p.embedding))
+    return (len(hist), tuple(bool(o) for o in (lawyer.case_outcomes or [])),
+            len(pareceres), sample)
+
+
+class LawyerVectorStore:
+    """Cache de embeddings normalizados por advogado + índice ANN de centróides.
+
+    ``index`` atende a primeira dimensão indexada; outras dimensões ganham
+    um ``IVFIndex`` próprio com os mesmos parâmetros.
+    """
+
+    def __init__(self, index: Optional[IVFIndex] = None):
+        self._entries: Dict[str, LawyerVectors] = {}
+        self._dirty: set = set()
+        self._lock = threading.Lock()
+        self.index = index if index is not None else IVFIndex()
+        self._indexes: Dict[int, IVFIndex] = {}
+        if self.index.dim is not None:
+            self._indexes[self.index.dim] = self.index
+        # Advogados cujo centróide mudou desde a última sincronização do índice
+        self._index_pending: set = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, lawyer_id: str) -> bool:
+        return lawyer_id in self._entries
+
+    # ---------------- construção incremental ----------------
+
+    @staticmethod
+    def build_entry(lawyer) -> LawyerVectors:
+        hist = lawyer.casos_historicos_embeddings or []
+        outcomes = lawyer.case_outcomes
+        # Mesma regra do fallback: os pesos valem se há um outcome por embedding
+        weights = None
+        if outcomes and len(outcomes) == len(hist):
+            weights = np.array([1.0 if o else 0.8 for o in outcomes], dtype=np.float32)
+        centroids = {}
+        for dim, idx in _group_by_dim(hist).items():
+            normed = l2_normalize(np.vstack([hist[i] for i in idx]))
+            if weights is not None:
+                w = weights[idx]
+                centroids[dim] = (w @ normed) / w.sum()
+            else:
+                centroids[dim] = normed.mean(axis=0)
+        embeddings = [p.embedding for p in lawyer.pareceres or []]
+        pareceres = {
+            dim: l2_normalize(np.vstack([embeddings[i] for i in idx]))
+            for dim, idx in _group_by_dim(embeddings).items()
+        }
+        return LawyerVectors(centroids, pareceres, _fingerprint(lawyer))
+
+    def upsert(self, lawyer) -> LawyerVectors:
+        entry = self.build_entry(lawyer)
+        with self._lock:
+            self._entries[lawyer.id] = entry
+            self._dirty.discard(lawyer.id)
+            self._index_pending.add(lawyer.id)
+        return entry
+
+    def ensure(self, lawyers: Iterable) -> None:
+        """Garante entradas atualizadas para os advogados (reconstrói só o necessário)."""
+        for lw in lawyers:
+            entry = self._entries.get(lw.id)
+            if entry is None or lw.id in self._dirty or entry.fingerprint != _fingerprint(lw):
+                self.upsert(lw)
+
+    def invalidate(self, lawyer_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._dirty.update(lawyer_ids)
+
+    def remove(self, lawyer_id: str) -> None:
+        with self._lock:
+            self._entries.pop(lawyer_id, None)
+            self._dirty.discard(lawyer_id)
+            self._index_pending.discard(lawyer_id)
+            for index in self._indexes.values():
+                index.remove(lawyer_id)
+
+    # ---------------- consultas ----------------
+
+    def case_similarity(self, query: np.ndarray, lawyer_ids: Sequence[str]) -> Optional[np.ndarray]:
+        """Feature S para os advogados informados (mesma fórmula do FeatureCalculator).
+
+        Retorna None se algum advogado não estiver no store. Vetores de outra
+        dimensão que a do caso não são comparáveis e ficam de fora.
+        """
+        sims = self.case_similarity_many(np.asarray(query)[None, :], lawyer_ids)
+        return None if sims is None else sims[0]
+
+    def case_similarity_many(self, queries: np.ndarray,
+                             lawyer_ids: Sequence[str]) -> Optional[np.ndarray]:
+        """Feature S (casos × advogados) com um único matmul por tipo de vetor."""
+        q = l2_normalize(queries)
+        dim = q.shape[-1]
+        m, n = q.shape[0], len(lawyer_ids)
+        hist_rows, hist_idx, par_chunks, par_idx = [], [], [], []
+        for i, lid in enumerate(lawyer_ids):
+            entry = self._entries.get(lid)
+            if entry is None:
+                return None
+            centroid = entry.hist_centroids.get(dim)
+            if centroid is not None:
+                hist_rows.append(centroid)
+                hist_idx.append(i)
+            pareceres = entry.pareceres.get(dim)
+            if pareceres is not None:
+                par_chunks.append(pareceres)
+                par_idx.append(i)
+
+        sim_hist = np.zeros((m, n), dtype=np.float64)
+        if hist_rows:
+            sim_hist[:, hist_idx] = q @ np.vstack(hist_rows).T
+
+        sim_par = np.zeros((m, n), dtype=np.float64)
+        if par_chunks:
+            # Pareceres de cada advogado são contíguos: máximo por segmento
+            starts = np.cumsum([0] + [len(c) for c in par_chunks[:-1]])
+            sim_par[:, par_idx] = np.maximum.reduceat(q @ np.vstack(par_chunks).T, starts, axis=1)
+
+        return np.where(sim_par == 0, sim_hist, 0.6 * sim_hist + 0.4 * sim_par)
+
+    def _index_for(self, dim: int) -> IVFIndex:
+        index = self._indexes.get(dim)
+        if index is None:
+            if not self._indexes and self.index.dim in (None, dim):
+                index = self.index
+            else:
+                index = IVFIndex(nlist=self.index.nlist, nprobe=self.index.nprobe)
+            self._indexes[dim] = index
+        return index
+
+    def _sync_index(self) -> None:
+        """Aplica aos índices IVF os centróides alterados desde a última consulta."""
+        with self._lock:
+            for lawyer_id in self._index_pending:
+                entry = self._entries.get(lawyer_id)
+                centroids = entry.hist_centroids if entry is not None else {}
+                for dim, index in self._indexes.items():
+                    if dim not in centroids:
+                        index.remove(lawyer_id)
+                for dim, centroid in centroids.items():
+                    self._index_for(dim).add(lawyer_id, centroid)
+            self._index_pending.clear()
+
+    def top_k(self, query: np.ndarray, k: int = 50) -> List[Tuple[str, float]]:
+        """Advogados com histórico mais similar ao caso (ANN sobre centróides).
+
+        O índice (e o k-means do IVF) só é mantido aqui, nunca pelo ``ensure()``
+        do ranking.
+        """
+        self._sync_index()
+        index = self._indexes.get(int(np.size(query)))
+        return index.search(query, k) if index is not None else []
+
+    # ---------------- invalidação entre processos ----------------
+
+    async def listen_invalidations(self, redis_url: str = REDIS_URL) -> None:
+        """Consome o canal de invalidação e marca entradas como sujas (roda em background)."""
+        import redis.asyncio as aioredis
+
+        client = aioredis.from_url(redis_url, decode_responses=True)
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+        except Exception as e:
+            logger.warning(f"Invalidação de vetores indisponível (Redis): {e}")
+            await client.close()
+            return
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    self.invalidate(json.loads(message["data"]))
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"Mensagem de invalidação inválida: {e}")
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await pubsub.unsubscribe(INVALIDATION_CHANNEL)
+            await client.close()
+
+
+def publish_vector_invalidation(lawyer_ids: List[str], redis_url: str = REDIS_URL) -> None:
+    """Notifica todos os workers de que os embeddings destes advogados mudaram.
+
+    Usado pelos jobs (síncronos) após gravar novos embeddings. Falhas de Redis
+    não interrompem o job: a entrada será reconstruída pelo fingerprint.
+    """
+    lawyer_vector_store.invalidate(lawyer_ids)
+    try:
+        import redis
+
+        client = redis.Redis.from_url(redis_url, socket_timeout=1)
+        client.publish(INVALIDATION_CHANNEL, json.dumps(list(lawyer_ids)))
+        client.close()
+    except Exception as e:
+        logger.warning(f"Não foi possível publicar invalidação de vetores: {e}")
+
+
+# Instância global (um store por processo)
+lawyer_vector_store = LawyerVectorStore()
@@ -0,0 +1,370 @@
+"""
+backend/services/local_embeddings.py
+
+Servidor local de embeddings (sentence-transformers) compartilhado por nó.
+
+Sem servidor, cada worker do uvicorn e do Celery e cada job carregava a sua
+própria cópia do modelo (centenas de MB e alguns segundos de startup cada).
+Aqui um único processo por nó mantém os modelos carregados e atende todos
+os clientes por socket Unix (ou TCP), agrupando pedidos concorrentes em
+micro-lotes: o lote é fechado ao atingir ``LOCAL_EMBED_MAX_BATCH`` textos
+ou após ``LOCAL_EMBED_MAX_WAIT_MS`` desde o primeiro pedido, e vira uma só
+chamada ``encode`` — bem mais throughput de CPU do que uma por texto.
+
+Protocolo (por conexão, vários pedidos em sequência), quadros com prefixo
+de tamanho (uint32 big-endian):
+
+    pedido:   JSON {"model": str, "texts": [str], "normalize": bool}
+    resposta: 1 byte de status + corpo; 0 = blob ``EMB1`` (backend.embedding_blob),
+              1 = mensagem de erro UTF-8
+
+Uso:
+    python -m backend.services.local_embeddings --listen unix:///tmp/litgo-embed.sock
+
+Os clientes usam ``get_local_encoder(modelo)``, que expõe o mesmo
+``encode(textos, normalize_embeddings=...)`` do SentenceTransformer. Com
+``LOCAL_EMBED_SERVER`` vazio (ou servidor fora do ar) o modelo é carregado
+no próprio processo, uma vez por nome, como antes.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from backend.embedding_blob import pack_embeddings, unpack_embeddings
+
+logger = logging.getLogger(__name__)
+
+LOCAL_EMBED_SERVER = os.getenv("LOCAL_EMBED_SERVER", "")
+LOCAL_EMBED_MAX_BATCH = int(os.getenv("LOCAL_EMBED_MAX_BATCH", "64"))
+LOCAL_EMBED_MAX_WAIT_MS = float(os.getenv("LOCAL_EMBED_MAX_WAIT_MS", "5"))
+LOCAL_EMBED_TIMEOUT = float(os.getenv("LOCAL_EMBED_TIMEOUT", "30"))
+DEFAULT_LISTEN = "unix:///tmp/litgo-embed.sock"
+RECONNECT_BACKOFF_S = 30.0
+
+_LENGTH = struct.Struct(">I")
+_OK, _ERROR = b"\x00", b"\x01"
+
+Encoder = Callable[[str, List[str], bool], np.ndarray]
+
+
+def canonical_model(name: str) -> str:
+    """``sentence-transformers/all-MiniLM-L6-v2`` e ``all-MiniLM-L6-v2`` são o mesmo modelo."""
+    prefix = "sentence-transformers/"
+    return name[len(prefix):] if name.startswith(prefix) else name
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """``unix:///caminho`` → ("unix", caminho); ``tcp://host:porta`` → ("tcp", (host, porta))."""
+    if address.startswith("unix://"):
+        return "unix", address[len("unix://"):]
+    if address.startswith("tcp://"):
+        host, _, port = address[len("tcp://"):].rpartition(":")
+        return "tcp", (host or "127.0.0.1", int(port))
+    raise ValueError(f"endereço do servidor de embeddings inválido: {address}")
+
+
+# ---------------- modelos em processo ----------------
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_model(name: str):
+    """SentenceTransformer carregado uma única vez por processo e por nome canônico."""
+    name = canonical_model(name)
+    with _models_lock:
+        if name not in _models:
+            from sentence_transformers import SentenceTransformer
+
+            logger.info(f"Carregando modelo de embeddings local: {name}")
+            _models[name] = SentenceTransformer(name)
+        return _models[name]
+
+
+def encode_in_process(model: str, texts: List[str], normalize: bool) -> np.ndarray:
+    matrix = load_model(model).encode(texts, normalize_embeddings=normalize,
+                                      batch_size=max(1, min(len(texts), LOCAL_EMBED_MAX_BATCH)))
+    return np.asarray(matrix, dtype=np.float32).reshape(len(texts), -1)
+
+
+# ---------------- servidor ----------------
+
+@dataclass
+class _Pending:
+    key: Tuple[str, bool]
+    texts: List[str]
+    future: asyncio.Future = field(repr=False)
+
+
+class MicroBatcher:
+    """Agrupa pedidos concorrentes em lotes por (modelo, normalize).
+
+    Um lote fecha com ``max_batch`` textos ou ``max_wait_s`` após o primeiro
+    pedido. Pedidos nunca são divididos: o que não cabe fica para o próximo
+    lote. O ``encode`` roda em uma única thread (o modelo não é reentrante e
+    já usa todos os núcleos).
+    """
+
+    def __init__(self, encode: Encoder = encode_in_process, max_batch: int = LOCAL_EMBED_MAX_BATCH,
+                 max_wait_s: float = LOCAL_EMBED_MAX_WAIT_MS / 1000):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_s
+        self._queue: "asyncio.Queue[_Pending]" = asyncio.Queue()
+        self._carry: Optional[_Pending] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, model: str, texts: List[str], normalize: bool = False) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending((canonical_model(model), bool(normalize)), list(texts), future))
+        return await future
+
+    async def _collect(self) -> List[_Pending]:
+        first = self._carry or await self._queue.get()
+        self._carry = None
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait_s
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if size + len(item.texts) > self.max_batch:
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item.texts)
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            groups: Dict[Tuple[str, bool], List[_Pending]] = {}
+            for item in batch:
+                groups.setdefault(item.key, []).append(item)
+            for (model, normalize), items in groups.items():
+                texts = [t for item in items for t in item.texts]
+                try:
+                    matrix = await loop.run_in_executor(self._executor, self.encode, model, texts, normalize)
+                except Exception as e:
+                    for item in items:
+                        if not item.future.done():
+                            item.future.set_exception(e)
+                    continue
+                self.batches += 1
+                offset = 0
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_result(matrix[offset:offset + len(item.texts)])
+                    offset += len(item.texts)
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return await reader.readexactly(length)
+
+
+def _frame(payload: bytes) -> bytes:
+    return _LENGTH.pack(len(payload)) + payload
+
+
+class LocalEmbeddingServer:
+    """Servidor asyncio (socket Unix ou TCP) na frente de um ``MicroBatcher``."""
+
+    def __init__(self, address: str = DEFAULT_LISTEN, batcher: Optional[MicroBatcher] = None):
+        self.address = address
+        self.batcher = batcher or MicroBatcher()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        kind, target = parse_address(self.address)
+        self.batcher.start()
+        if kind == "unix":
+            if os.path.exists(target):
+                os.unlink(target)
+            self._server = await asyncio.start_unix_server(self._handle, path=target)
+        else:
+            self._server = await asyncio.start_server(self._handle, *target)
+        logger.info(f"Servidor de embeddings local ouvindo em {self.address}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = json.loads(await _read_frame(reader))
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    matrix = await self.batcher.submit(request["model"], request["texts"],
+                                                       request.get("normalize", False))
+                    writer.write(_frame(_OK + pack_embeddings(matrix, "float32")))
+                except Exception as e:
+                    writer.write(_frame(_ERROR + f"{type(e).__name__}: {e}".encode("utf-8")))
+                await writer.drain()
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logger.warning(f"Servidor de embeddings: conexão encerrada ({e})")
+        finally:
+            writer.close()
+
+
+# ---------------- cliente ----------------
+
+class LocalEncoder:
+    """Modelo local com a interface do SentenceTransformer (``encode``).
+
+    Com ``address`` fala com o servidor compartilhado (uma conexão por
+    thread); sem ``address``, ou com o servidor fora do ar, carrega o modelo
+    no processo via ``load_model``.
+    """
+
+    def __init__(self, model: str, address: Optional[str] = LOCAL_EMBED_SERVER or None,
+                 timeout: float = LOCAL_EMBED_TIMEOUT):
+        self.model = canonical_model(model)
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+        self._server_down_until = 0.0
+
+    def encode(self, sentences: Union[str, List[str]], normalize_embeddings: bool = False,
+               **_: Any) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = None
+        if self.address and time.monotonic() >= self._server_down_until:
+            try:
+                matrix = self._remote(texts, normalize_embeddings)
+            except OSError as e:
+                logger.warning(f"Servidor de embeddings {self.address} indisponível ({e}); "
+                               "usando modelo no processo")
+                self._server_down_until = time.monotonic() + RECONNECT_BACKOFF_S
+        if matrix is None:
+            matrix = encode_in_process(self.model, texts, normalize_embeddings)
+        return matrix[0] if single else matrix
+
+    def _connect(self) -> socket.socket:
+        kind, target = parse_address(self.address)
+        family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(target)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _remote(self, texts: List[str], normalize: bool) -> np.ndarray:
+        request = _frame(json.dumps({"model": self.model, "texts": texts,
+                                     "normalize": bool(normalize)}).encode("utf-8"))
+        for attempt in range(2):  # a conexão guardada pode ter caído
+            sock = getattr(self._local, "sock", None)
+            fresh = sock is None
+            if fresh:
+                sock = self._local.sock = self._connect()
+            try:
+                sock.sendall(request)
+                (length,) = _LENGTH.unpack(self._recv(sock, _LENGTH.size))
+                payload = self._recv(sock, length)
+                break
+            except OSError:
+                sock.close()
+                self._local.sock = None
+                if fresh or attempt:
+                    raise
+        if payload[:1] != _OK:
+            raise RuntimeError(f"servidor de embeddings: {payload[1:].decode('utf-8', 'replace')}")
+        return unpack_embeddings(payload[1:])
+
+    @staticmethod
+    def _recv(sock: socket.socket, size: int) -> bytes:
+        chunks, remaining = [], size
+        while remaining:
+            chunk = sock.recv(min(remaining, 1 << 20))
+            if not chunk:
+                raise ConnectionError("servidor de embeddings fechou a conexão")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+
+def local_encoder_available() -> bool:
+    """Há servidor configurado ou sentence-transformers instalado."""
+    return bool(LOCAL_EMBED_SERVER) or importlib.util.find_spec("sentence_transformers") is not None
+
+
+def get_local_encoder(model: str) -> LocalEncoder:
+    """Encoder local para ``model`` (servidor compartilhado se configurado)."""
+    return LocalEncoder(model)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Servidor local de embeddings compartilhado")
+    parser.add_argument("--listen", default=LOCAL_EMBED_SERVER or DEFAULT_LISTEN,
+                        help="unix:///caminho.sock ou tcp://host:porta")
+    parser.add_argument("--max-batch", type=int, default=LOCAL_EMBED_MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=LOCAL_EMBED_MAX_WAIT_MS)
+    parser.add_argument("--preload", action="append", default=[],
+                        help="modelo a carregar no startup (repetível)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    for name in args.preload:
+        load_model(name)
+
+    async def run():
+        batcher = MicroBatcher(max_batch=args.max_batch, max_wait_s=args.max_wait_ms / 1000)
+        await LocalEmbeddingServer(args.listen, batcher).serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
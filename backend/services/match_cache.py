@@ -0,0 +1,152 @@
+"""
+backend/services/match_cache.py
+
+Cache de respostas de matching com chave canônica e coalescência de
+requisições idênticas (single-flight).
+
+- ``match_cache_key``: impressão digital estável da requisição (campos
+  ordenados, coordenadas arredondadas, preset e model_version) com
+  blake2b. Ao contrário de ``hash()``, que é randomizado por processo, a
+  mesma requisição gera a mesma chave em todos os workers.
+- ``SingleFlight``: N requisições simultâneas com a mesma chave disparam
+  um único cálculo. Dentro do processo as demais aguardam o mesmo Future;
+  entre processos, um lock Redis (``SET NX PX``) elege o líder e os outros
+  aguardam o resultado aparecer no cache.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MATCH_CACHE_TTL = int(os.getenv("MATCH_CACHE_TTL", "3600"))
+MATCH_COORD_DECIMALS = int(os.getenv("MATCH_COORD_DECIMALS", "3"))  # ~110 m
+SINGLE_FLIGHT_LOCK_MS = int(os.getenv("SINGLE_FLIGHT_LOCK_MS", "30000"))
+SINGLE_FLIGHT_POLL_S = float(os.getenv("SINGLE_FLIGHT_POLL_S", "0.05"))
+
+_COORD_KEYS = {"latitude", "longitude", "lat", "lon", "lng"}
+
+# Remove o lock apenas se ainda pertencer a quem o criou
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _canonical(value: Any, key: Optional[str] = None, decimals: int = MATCH_COORD_DECIMALS) -> Any:
+    """Normaliza recursivamente: enums viram valores, coordenadas são arredondadas."""
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, dict):
+        return {str(k): _canonical(v, str(k), decimals) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if key in ("coords", "coordinates") and len(value) == 2:
+            return [round(float(v), decimals) for v in value]
+        return [_canonical(v, None, decimals) for v in value]
+    if isinstance(value, float):
+        return round(value, decimals) if key in _COORD_KEYS else value
+    return value
+
+
+def match_cache_key(payload: Dict[str, Any], *, preset: Optional[str] = None,
+                    model_version: Optional[str] = None, prefix: str = "match_hybrid",
+                    decimals: int = MATCH_COORD_DECIMALS) -> str:
+    """Chave estável entre processos para uma requisição de matching."""
+    canonical = {
+        "request": _canonical(payload, None, decimals),
+        "preset": _canonical(preset),
+        "model_version": model_version or "production",
+    }
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{prefix}:{digest}"
+
+
+class SingleFlight:
+    """Coalescência de cálculos idênticos (local + lock Redis)."""
+
+    def __init__(self, lock_ms: int = SINGLE_FLIGHT_LOCK_MS, poll_s: float = SINGLE_FLIGHT_POLL_S):
+        self.lock_ms = lock_ms
+        self.poll_s = poll_s
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]], *,
+                             redis: Any = None, ttl: int = MATCH_CACHE_TTL) -> str:
+        """Resultado serializado (JSON) do cache ou de um único ``compute()`` por chave."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            # O cálculo roda em uma task própria: se o cliente que o iniciou
+            # desconectar, os demais continuam aguardando o mesmo resultado
+            task = asyncio.ensure_future(self._leader(key, compute, redis, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # marca como consumida mesmo sem ninguém aguardando
+
+    async def _leader(self, key: str, compute: Callable[[], Awaitable[str]],
+                      redis: Any, ttl: int) -> str:
+        if redis is None:
+            self.stats["misses"] += 1
+            return await compute()
+
+        cached = await self._safe(redis.get(key))
+        if cached:
+            self.stats["hits"] += 1
+            logger.info(f"Cache hit para {key}")
+            return cached
+        self.stats["misses"] += 1
+
+        lock_key = f"{key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ms / 1000
+        try:
+            acquired = bool(await redis.set(lock_key, token, nx=True, px=self.lock_ms))
+            while not acquired and time.monotonic() < deadline:
+                # Outro processo está calculando: aguarda o resultado no cache
+                await asyncio.sleep(self.poll_s)
+                cached = await redis.get(key)
+                if cached:
+                    self.stats["coalesced"] += 1
+                    return cached
+                # Se o líder falhou (lock liberado sem resultado), assume o cálculo
+                acquired = bool(await redis.set(lock_key, token, nx=True, px=self.lock_ms))
+        except Exception as e:
+            logger.warning(f"Single-flight sem Redis: {e}")
+            acquired = False
+
+        try:
+            result = await compute()
+            await self._safe(redis.setex(key, ttl, result))
+            return result
+        finally:
+            if acquired:
+                await self._safe(redis.eval(_RELEASE_SCRIPT, 1, lock_key, token))
+
+    @staticmethod
+    async def _safe(awaitable: Awaitable[Any]) -> Any:
+        """Falhas de Redis degradam para o cálculo local."""
+        try:
+            return await awaitable
+        except Exception as e:
+            logger.warning(f"Single-flight sem Redis: {e}")
+            return None
+
+
+# Instância global (um registro de cálculos em andamento por processo)
+match_single_flight = SingleFlight()
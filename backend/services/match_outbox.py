@@ -0,0 +1,297 @@
+"""
+backend/services/match_outbox.py
+
+Outbox transacional dos efeitos colaterais do matching.
+
+Depois do ranking, a requisição grava um único registro em ``match_outbox``
+com tudo o que precisa acontecer (linhas de ``case_matches``, ofertas,
+notificação e advogados para ``last_offered_at``) e responde. O drenador
+(loop no lifespan da API e tarefa Celery periódica) reivindica lotes de
+registros pendentes e aplica os efeitos agrupados entre vários casos:
+
+1. um upsert de ``case_matches`` para todos os casos do lote;
+2. um upsert de ``offers`` (sem sobrescrever ofertas existentes) e uma
+   leitura dos IDs;
+3. as notificações de cada caso, em paralelo;
+4. um update de ``last_offered_at`` para todos os advogados ofertados;
+5. um update marcando os registros como concluídos.
+
+Cada registro tem uma ``idempotency_key`` (caso + advogados ranqueados +
+preset): reenfileirar o mesmo ranking é ignorado. Falhas voltam para
+``pending`` com backoff exponencial até ``MATCH_OUTBOX_MAX_ATTEMPTS``;
+registros presos em ``processing`` (worker que caiu) são recuperados após
+``MATCH_OUTBOX_LEASE_S``. As etapas 1, 2 e 4 são idempotentes, então um
+lote reprocessado só reenvia notificações dos casos que falharam.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.metrics import match_outbox_events_total
+
+logger = logging.getLogger(__name__)
+
+MATCH_OUTBOX_ENABLED = os.getenv("MATCH_OUTBOX_ENABLED", "true").lower() == "true"
+MATCH_OUTBOX_BATCH = int(os.getenv("MATCH_OUTBOX_BATCH", "100"))
+MATCH_OUTBOX_INTERVAL = float(os.getenv("MATCH_OUTBOX_INTERVAL", "1.0"))
+MATCH_OUTBOX_MAX_ATTEMPTS = int(os.getenv("MATCH_OUTBOX_MAX_ATTEMPTS", "8"))
+MATCH_OUTBOX_LEASE_S = int(os.getenv("MATCH_OUTBOX_LEASE_S", "300"))
+MATCH_OUTBOX_BACKOFF_S = float(os.getenv("MATCH_OUTBOX_BACKOFF_S", "5"))
+
+TABLE = "match_outbox"
+
+
+def _iso(ts: datetime) -> str:
+    return ts.isoformat()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def idempotency_key(case_id: str, lawyer_ids: List[str], preset: Optional[str] = None) -> str:
+    """Chave estável do ranking: o mesmo resultado nunca gera efeitos duas vezes."""
+    digest = hashlib.blake2b(
+        "|".join([str(case_id), preset or "", *map(str, lawyer_ids)]).encode(), digest_size=16)
+    return f"{case_id}:{digest.hexdigest()}"
+
+
+# O rank() grava fair_base/ltr/equity_raw; integrações antigas usam fair/raw/equity
+_SCORE_KEYS = {"fair": "fair_base", "raw": "ltr", "equity": "equity_raw"}
+
+
+def score(scores: Optional[Dict[str, Any]], key: str) -> float:
+    scores = scores or {}
+    return scores.get(key, scores.get(_SCORE_KEYS[key], 0.0))
+
+
+def match_records(case_id: str, ranked_lawyers: List[Any]) -> List[Dict[str, Any]]:
+    """Linhas de ``case_matches`` para os advogados ranqueados."""
+    records = []
+    for lw in ranked_lawyers:
+        scores = lw.scores
+        records.append({
+            "case_id": case_id,
+            "lawyer_id": lw.id,
+            "fair_score": score(scores, "fair"),
+            "equity_score": score(scores, "equity"),
+            "raw_score": score(scores, "raw"),
+            "features": scores.get("features", {}),
+            "breakdown": scores.get("delta"),
+            "weights_used": scores.get("weights_used"),
+            "weights_version": scores.get("weights_version"),
+            "preset_used": scores.get("preset"),
+        })
+    return records
+
+
+def build_entry(case: Any, ranked_lawyers: List[Any], *, notify: bool = True,
+                preset: Optional[str] = None) -> Dict[str, Any]:
+    """Registro do outbox com os efeitos de um ranking (sem tocar no banco)."""
+    lawyer_ids = [lw.id for lw in ranked_lawyers]
+    payload: Dict[str, Any] = {"matches": match_records(case.id, ranked_lawyers), "notify": notify}
+    if notify:
+        payload["offers"] = [
+            {"lawyer_id": lw.id, "scores": {k: score(lw.scores, k) for k in _SCORE_KEYS}}
+            for lw in ranked_lawyers
+        ]
+        payload["lawyer_ids"] = lawyer_ids
+        payload["notification"] = {
+            "case_id": case.id,
+            "headline": f"Novo caso na área de {case.area}",
+            "summary": f"Um novo caso com urgência de {case.urgency_h}h está disponível para seu perfil.",
+        }
+    return {
+        "idempotency_key": idempotency_key(case.id, lawyer_ids, preset),
+        "case_id": case.id,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": _iso(_now()),
+    }
+
+
+class MatchOutbox:
+    """Enfileiramento e drenagem do ``match_outbox`` (um por processo)."""
+
+    def __init__(self, client_factory: Optional[Callable[[], Any]] = None,
+                 batch_size: int = MATCH_OUTBOX_BATCH,
+                 max_attempts: int = MATCH_OUTBOX_MAX_ATTEMPTS,
+                 lease_s: int = MATCH_OUTBOX_LEASE_S,
+                 backoff_s: float = MATCH_OUTBOX_BACKOFF_S):
+        self._client_factory = client_factory
+        self._client = None
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease_s = lease_s
+        self.backoff_s = backoff_s
+        self._last_reclaim = 0.0
+
+    @property
+    def client(self):
+        if self._client is None:
+            if self._client_factory is None:
+                from backend.config import get_supabase_client
+                self._client_factory = get_supabase_client
+            self._client = self._client_factory()
+        return self._client
+
+    # --- Enfileiramento (caminho da requisição) ---------------------------
+
+    async def enqueue(self, entries: List[Dict[str, Any]]) -> None:
+        """Grava os registros em um único insert; chaves repetidas são ignoradas."""
+        if not entries:
+            return
+        await asyncio.to_thread(
+            lambda: self.client.table(TABLE).upsert(
+                entries, on_conflict="idempotency_key", ignore_duplicates=True).execute())
+        match_outbox_events_total.labels(status="enqueued").inc(len(entries))
+
+    # --- Drenagem (worker) -------------------------------------------------
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        table = self.client.table(TABLE)
+        now = _now()
+        # Registros de um worker que caiu voltam para a fila depois do lease
+        if time.monotonic() - self._last_reclaim >= self.lease_s / 2:
+            table.update({"status": "pending"}).eq("status", "processing").lt(
+                "claimed_at", _iso(now - timedelta(seconds=self.lease_s))).execute()
+            self._last_reclaim = time.monotonic()
+
+        due = table.select("id").eq("status", "pending").lte(
+            "next_attempt_at", _iso(now)).order("created_at").limit(self.batch_size).execute().data or []
+        if not due:
+            return []
+        # O filtro por status torna a reivindicação atômica entre workers
+        return table.update({"status": "processing", "claimed_at": _iso(now)}).in_(
+            "id", [row["id"] for row in due]).eq("status", "pending").execute().data or []
+
+    async def drain_once(self) -> Dict[str, int]:
+        """Processa um lote; devolve as contagens de concluídos, reagendados e falhos."""
+        entries = await asyncio.to_thread(self._claim)
+        stats = {"claimed": len(entries), "done": 0, "retried": 0, "failed": 0}
+        if not entries:
+            return stats
+
+        try:
+            offer_ids = await asyncio.to_thread(self._apply_writes, entries)
+        except Exception as e:
+            logger.warning(f"Outbox de matching: falha nas escritas do lote ({len(entries)} registros): {e}")
+            await asyncio.to_thread(self._reschedule, entries, str(e), stats)
+            return stats
+
+        failed: Dict[str, str] = {}
+        to_notify = [entry for entry in entries if entry["payload"].get("notify")]
+        if to_notify:
+            from backend.services.notify_service import send_notifications_to_lawyers
+
+            results = await asyncio.gather(*[
+                send_notifications_to_lawyers(entry["payload"]["lawyer_ids"], {
+                    **entry["payload"]["notification"],
+                    "offer_ids": offer_ids.get(str(entry["case_id"]), []),
+                    "idempotency_key": entry["idempotency_key"],
+                })
+                for entry in to_notify
+            ], return_exceptions=True)
+            for entry, result in zip(to_notify, results):
+                if isinstance(result, Exception):
+                    failed[entry["id"]] = str(result)
+
+        done = [entry for entry in entries if entry["id"] not in failed]
+        try:
+            await asyncio.to_thread(self._finish, done)
+        except Exception as e:
+            # Sem marcar como concluído o lease devolve o lote; escritas são idempotentes
+            logger.warning(f"Outbox de matching: falha ao concluir o lote: {e}")
+            return stats
+        stats["done"] = len(done)
+        match_outbox_events_total.labels(status="done").inc(len(done))
+        if failed:
+            retry = [entry for entry in entries if entry["id"] in failed]
+            await asyncio.to_thread(self._reschedule, retry, "; ".join(set(failed.values())), stats)
+        return stats
+
+    def _apply_writes(self, entries: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        from backend.services.offer_service import build_offer_row, create_offers_bulk
+
+        matches = [row for entry in entries for row in entry["payload"].get("matches", [])]
+        if matches:
+            self.client.table("case_matches").upsert(
+                matches, on_conflict="case_id, lawyer_id").execute()
+
+        offers = [build_offer_row(entry["case_id"], offer["lawyer_id"], offer["scores"])
+                  for entry in entries for offer in entry["payload"].get("offers", [])]
+        return create_offers_bulk(offers, self.client)
+
+    def _finish(self, done: List[Dict[str, Any]]) -> None:
+        if not done:
+            return
+        lawyer_ids = sorted({lid for entry in done for lid in entry["payload"].get("lawyer_ids", [])})
+        if lawyer_ids:
+            self.client.table("lawyers").update(
+                {"last_offered_at": time.time()}).in_("id", lawyer_ids).execute()
+        self.client.table(TABLE).update({
+            "status": "done",
+            "processed_at": _iso(_now()),
+            "last_error": None,
+        }).in_("id", [entry["id"] for entry in done]).execute()
+
+    def _reschedule(self, entries: List[Dict[str, Any]], error: str, stats: Dict[str, int]) -> None:
+        table = self.client.table(TABLE)
+        for entry in entries:
+            attempts = int(entry.get("attempts") or 0) + 1
+            if attempts >= self.max_attempts:
+                update = {"status": "failed", "attempts": attempts, "last_error": error[:500]}
+                stats["failed"] += 1
+                match_outbox_events_total.labels(status="failed").inc()
+                logger.warning(f"Outbox de matching: registro {entry['id']} (caso {entry['case_id']}) "
+                               f"descartado após {attempts} tentativas: {error}")
+            else:
+                delay = self.backoff_s * 2 ** (attempts - 1)
+                update = {
+                    "status": "pending",
+                    "attempts": attempts,
+                    "last_error": error[:500],
+                    "next_attempt_at": _iso(_now() + timedelta(seconds=delay)),
+                }
+                stats["retried"] += 1
+                match_outbox_events_total.labels(status="retried").inc()
+            try:
+                table.update(update).eq("id", entry["id"]).execute()
+            except Exception as e:
+                logger.warning(f"Outbox de matching: falha ao reagendar {entry['id']}: {e}")
+
+    async def drain(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Drena lotes até a fila esvaziar (ou ``max_batches``)."""
+        totals = {"claimed": 0, "done": 0, "retried": 0, "failed": 0}
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            stats = await self.drain_once()
+            for key, value in stats.items():
+                totals[key] += value
+            batches += 1
+            if stats["claimed"] < self.batch_size:
+                break
+        return totals
+
+
+async def run_outbox_drainer(outbox: MatchOutbox, interval: float = MATCH_OUTBOX_INTERVAL) -> None:
+    """Loop de drenagem do lifespan da API (espera ``interval`` com a fila vazia)."""
+    while True:
+        try:
+            stats = await outbox.drain()
+            if stats["claimed"]:
+                logger.debug(f"Outbox de matching: {stats}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Falha ao drenar outbox de matching: {e}")
+        await asyncio.sleep(interval)
+
+
+# Instância global (um outbox por processo)
+match_outbox = MatchOutbox()
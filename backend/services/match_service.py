@@ -1,19 +1,37 @@
 """
 Serviço de Matchmaking, responsável por orquestrar o ranking e as notificações.
 """
+import logging
 import os
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 from dotenv import load_dotenv
 
-from backend.algoritmo_match import KPI, Case, Lawyer, MatchmakingAlgorithm, haversine
+from backend.algoritmo_match import (
+    Case,
+    Lawyer,
+    MatchmakingAlgorithm,
+    haversine,
+    haversine_many,
+)
 from backend.metrics import cache_hits_total, cache_misses_total
-from backend.models import MatchRequest
+from backend.models import BatchMatchRequest, MatchRequest
 from backend.services.cache_service_simple import simple_cache_service as cache_service
+from backend.services.embedding_space import case_embedding
+from backend.services.geo_index import geo_index, parse_latlon
+from backend.services.lawyer_snapshot import lawyer_snapshot
+from backend.services.match_outbox import (
+    MATCH_OUTBOX_ENABLED,
+    build_entry,
+    match_outbox,
+    match_records,
+)
 from backend.services.notify_service import send_notifications_to_lawyers
 from backend.services.offer_service import create_offers_from_ranking
+from backend.services.supabase_paging import fetch_by_ids
+from backend.stage_timer import stage_timer, timed
 from supabase import Client, create_client
 
 # --- Configuração ---
@@ -23,24 +41,12 @@ SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 algo = MatchmakingAlgorithm()
+logger = logging.getLogger(__name__)
 
 
 async def _persist_matches(case_id: str, ranked_lawyers: List[Lawyer]):
     """Salva os matches gerados na tabela case_matches."""
-    records_to_insert = []
-    for lw in ranked_lawyers:
-        scores = lw.scores
-        records_to_insert.append({
-            "case_id": case_id,
-            "lawyer_id": lw.id,
-            "fair_score": scores.get("fair", 0),
-            "equity_score": scores.get("equity", 0),
-            "raw_score": scores.get("raw", 0),
-            "features": scores.get("features", {}),
-            "breakdown": scores.get("delta"),
-            "weights_used": scores.get("weights_used"),
-            "preset_used": scores.get("preset"),
-        })
+    records_to_insert = match_records(case_id, ranked_lawyers)
 
     if records_to_insert:
         try:
@@ -55,33 +61,142 @@ async def _persist_matches(case_id: str, ranked_lawyers: List[Lawyer]):
             print(f"Erro ao persistir matches: {e}")
 
 
+def _filter_rows_by_radius(rows: List[Dict[str, Any]], coords, radius_km: float) -> List[Dict[str, Any]]:
+    """Mantém apenas as linhas dentro do raio (Haversine vetorizado)."""
+    located = [(r, parse_latlon(r)) for r in rows]
+    located = [(r, c) for r, c in located if c is not None]
+    if not located:
+        return []
+    lat = np.array([c[0] for _, c in located])
+    lon = np.array([c[1] for _, c in located])
+    inside = haversine_many(coords, lat, lon) <= radius_km
+    return [r for (r, _), ok in zip(located, inside.tolist()) if ok]
+
+
+def _case_from_row(case_row: Dict[str, Any]) -> Case:
+    """Constrói o ``Case`` a partir de uma linha ``cases`` do Supabase."""
+    return Case(
+        id=case_row["id"],
+        area=case_row["area"],
+        subarea=case_row["subarea"],
+        urgency_h=case_row["urgency_h"],
+        coords=tuple(case_row["coords"]),
+        complexity=case_row.get("complexity", "MEDIUM"),
+        summary_embedding=case_embedding(case_row),
+    )
+
+
+async def _offer_and_notify(case: Case, top_lawyers: List[Lawyer]) -> None:
+    """Cria as ofertas, notifica os advogados e persiste ``last_offered_at``."""
+    # Criar ofertas para os advogados (Fase 4 - Sinal de Interesse)
+    with timed("offers"):
+        offer_ids = await create_offers_from_ranking(case, top_lawyers)
+
+    # Enviar notificações (assíncrono, não bloqueia a resposta)
+    lawyer_ids = [lw.id for lw in top_lawyers]
+    notification_payload = {
+        "case_id": case.id,
+        "headline": f"Novo caso na área de {case.area}",
+        "summary": f"Um novo caso com urgência de {case.urgency_h}h está disponível para seu perfil.",
+        "offer_ids": offer_ids  # Incluir IDs das ofertas para referência
+    }
+    with timed("notifications"):
+        await send_notifications_to_lawyers(lawyer_ids, notification_payload)
+
+    with timed("persist"):
+        now = time.time()
+        supabase.table("lawyers").update(
+            {"last_offered_at": now}).in_("id", lawyer_ids).execute()
+
+
+async def _dispatch_side_effects(ranked: List[Tuple[Case, List[Lawyer]]], *, notify: bool, preset: str) -> None:
+    """Efeitos pós-ranking: um registro de outbox por caso, gravados de uma vez.
+
+    ``ranked`` é uma lista de ``(case, top_lawyers)``. Sem outbox (desligado
+    ou indisponível) os efeitos rodam em linha, como antes.
+    """
+    if MATCH_OUTBOX_ENABLED:
+        with timed("outbox"):
+            try:
+                await match_outbox.enqueue([
+                    build_entry(case, top, notify=notify, preset=preset) for case, top in ranked])
+                return
+            except Exception as e:
+                logger.warning(f"Outbox de matching indisponível, efeitos em linha: {e}")
+    for case, top_lawyers in ranked:
+        with timed("persist"):
+            await _persist_matches(case.id, top_lawyers)
+        if notify:
+            await _offer_and_notify(case, top_lawyers)
+
+
+def _available(query):
+    return query.eq("is_available", True)
+
+
+def _load_candidates(case: Case, radius_km: float) -> List[Any]:
+    """Candidatos do caso (registros do snapshot) — pré-filtro geo pelo índice em memória."""
+    nearby_ids = geo_index.nearby_ids(case.coords, radius_km, area=case.area)
+    if nearby_ids is not None and lawyer_snapshot.ready:
+        # Candidatos já hidratados no snapshot; só os ausentes vão ao banco
+        records, missing = lawyer_snapshot.get_many(nearby_ids)
+        if missing:
+            lawyer_snapshot.put_rows(fetch_by_ids(supabase, "lawyers", missing))
+            records += lawyer_snapshot.get_many(missing)[0]
+        return [rec for rec in records if rec.row.get("is_available")]
+
+    if nearby_ids is not None:
+        lawyer_rows = fetch_by_ids(supabase, "lawyers", nearby_ids, filters=_available)
+    else:
+        try:
+            rpc_params = {
+                "area": case.area,
+                "lat": case.coords[0],
+                "lon": case.coords[1],
+                "km": radius_km,
+            }
+            lawyer_rows = supabase.rpc("find_nearby_lawyers", rpc_params).eq("is_available", True).execute().data
+        except Exception:
+            # Fallback para filtro por área + raio aplicado em memória
+            lawyer_rows = supabase.table("lawyers").select(
+                "*").contains("tags_expertise", [case.area]).eq("is_available", True).execute().data
+            lawyer_rows = _filter_rows_by_radius(lawyer_rows, case.coords, radius_km)
+    # Reaproveita registros já hidratados (mesma versão) e guarda os novos
+    lawyer_snapshot.put_rows(lawyer_rows)
+    return lawyer_snapshot.get_many([r["id"] for r in lawyer_rows])[0]
+
+
 async def find_and_notify_matches(req: MatchRequest) -> Optional[Dict[str, Any]]:
     """
     Orquestra o processo de match e agora também persiste os resultados.
+    Cada etapa é cronometrada (stage_timer); com ``req.debug`` a resposta
+    inclui o breakdown em ``timings`` (ms).
     """
+    with stage_timer(req.preset, label=req.case_id) as timer:
+        response = await _find_and_notify_matches(req)
+    if response is not None and getattr(req, "debug", False):
+        response = {**response, "timings": timer.breakdown()}
+    return response
+
+
+async def _find_and_notify_matches(req: MatchRequest) -> Optional[Dict[str, Any]]:
     # --- Cache de Matching ---
     # Busca no cache Redis
-    cached_result = await cache_service.get_case_matches(req.case_id, {"preset": req.preset, "k": req.k})
+    with timed("response_cache"):
+        cached_result = await cache_service.get_case_matches(req.case_id, {"preset": req.preset, "k": req.k})
     if cached_result:
         cache_hits_total.inc()
         return cached_result
     cache_misses_total.inc()
 
     # 1. Carregar dados do caso
-    case_row = supabase.table("cases").select(
-        "*").eq("id", req.case_id).single().execute().data
+    with timed("load_case"):
+        case_row = supabase.table("cases").select(
+            "*").eq("id", req.case_id).single().execute().data
     if not case_row:
         return None
 
-    case = Case(
-        id=case_row["id"],
-        area=case_row["area"],
-        subarea=case_row["subarea"],
-        urgency_h=case_row["urgency_h"],
-        coords=tuple(case_row["coords"]),
-        complexity=case_row.get("complexity", "MEDIUM"),
-        summary_embedding=np.array(case_row["summary_embedding"], dtype=np.float32),
-    )
+    case = _case_from_row(case_row)
 
     # --- 1.a Ajustes finos fornecidos pelo usuário ------------------------
     if getattr(req, "area", None):
@@ -95,81 +210,100 @@ async def find_and_notify_matches(req: MatchRequest) -> Optional[Dict[str, Any]]
     # Atualiza no objeto para cálculo de G
     case.radius_km = radius_km
 
-    # 2. Carregar advogados candidatos — tentativa de filtro geo via RPC
-    try:
-        rpc_params = {
-            "area": case.area,
-            "lat": case.coords[0],
-            "lon": case.coords[1],
-            "km": radius_km,
-        }
-        lawyer_rows = supabase.rpc("find_nearby_lawyers", rpc_params).eq("is_available", True).execute().data
-    except Exception:
-        # Fallback para filtro somente por área
-        lawyer_rows = supabase.table("lawyers").select(
-            "*").contains("tags_expertise", [case.area]).eq("is_available", True).execute().data
-
-    candidates = [
-        Lawyer(
-            id=r["id"],
-            nome=r["nome"],
-            tags_expertise=r["tags_expertise"],
-            geo_latlon=tuple(r["geo_latlon"]),
-            curriculo_json=r.get("curriculo_json", {}),
-            casos_historicos_embeddings=[np.array(v)
-                                         for v in r.get("casos_historicos_embeddings", [])],
-            kpi=KPI(**r.get("kpi", {})),
-            kpi_subarea=r.get("kpi_subarea", {}),
-            kpi_softskill=r.get("kpi_softskill", 0.0),
-            case_outcomes=r.get("case_outcomes", [])
-        ) for r in lawyer_rows
-    ]
+    # 2. Carregar advogados candidatos
+    with timed("candidates"):
+        records = _load_candidates(case, radius_km)
+
+    candidates = [rec.lawyer for rec in records]
+    lawyer_raw_data = {rec.lawyer.id: rec.row for rec in records}
 
     # Aplicar exclusões solicitadas (ex: "ver outras opções")
     if getattr(req, "exclude_ids", None):
         excl_set = set(req.exclude_ids)
         candidates = [lw for lw in candidates if lw.id not in excl_set]
 
-    # 3. Executar o algoritmo de ranking com preset
-    top_lawyers = await algo.rank(case, candidates, top_n=req.k, preset=req.preset)
+    # 3. Executar o algoritmo de ranking com preset (etapas internas no mesmo timer)
+    with timed("rank"):
+        top_lawyers = await algo.rank(case, candidates, top_n=req.k, preset=req.preset)
 
     if not top_lawyers:
         return {"case_id": case.id, "matches": []}
 
-    # 4. Persistir os matches gerados no banco de dados (assíncrono)
-    await _persist_matches(case.id, top_lawyers)
-
-    # 5. Criar ofertas para os advogados (Fase 4 - Sinal de Interesse)
-    offer_ids = await create_offers_from_ranking(case, top_lawyers)
-
-    # 6. Enviar notificações (assíncrono, não bloqueia a resposta)
-    lawyer_ids = [lw.id for lw in top_lawyers]
-    notification_payload = {
-        "case_id": case.id,
-        "headline": f"Novo caso na área de {case.area}",
-        "summary": f"Um novo caso com urgência de {case.urgency_h}h está disponível para seu perfil.",
-        "offer_ids": offer_ids  # Incluir IDs das ofertas para referência
-    }
-    await send_notifications_to_lawyers(lawyer_ids, notification_payload)
-
-    # 7. Persistir `last_offered_at` e formatar resposta
-    now = time.time()
-    supabase.table("lawyers").update(
-        {"last_offered_at": now}).in_("id", lawyer_ids).execute()
+    # 4-7. Matches, ofertas, notificações e `last_offered_at` (via outbox)
+    await _dispatch_side_effects([(case, top_lawyers)], notify=True, preset=req.preset)
 
-    lawyer_raw_data = {r['id']: r for r in lawyer_rows}
     response = format_match_response(case, top_lawyers, lawyer_raw_data)
 
     # Salvar no cache Redis
-    await cache_service.set_case_matches(
-        req.case_id,
-        response,
-        filters={"preset": req.preset, "k": req.k}
-    )
+    with timed("response_cache"):
+        await cache_service.set_case_matches(
+            req.case_id,
+            response,
+            filters={"preset": req.preset, "k": req.k}
+        )
 
     return response
 
 
+def _load_batch_pool(cases: List[Case]) -> List[Any]:
+    """Pool de candidatos compartilhado pelos casos do lote (registros do snapshot)."""
+    nearby = [geo_index.nearby_ids(c.coords, c.radius_km, area=c.area) for c in cases]
+    if all(ids is not None for ids in nearby):
+        pool_ids = list(dict.fromkeys(lid for ids in nearby for lid in ids))
+        if lawyer_snapshot.ready:
+            records, missing = lawyer_snapshot.get_many(pool_ids)
+            if missing:
+                lawyer_snapshot.put_rows(fetch_by_ids(supabase, "lawyers", missing))
+                records += lawyer_snapshot.get_many(missing)[0]
+            return [rec for rec in records if rec.row.get("is_available")]
+        lawyer_rows = fetch_by_ids(supabase, "lawyers", pool_ids, filters=_available)
+    else:
+        # Sem índice geo: uma consulta pelas áreas do lote; raio aplicado no rank_many
+        areas = sorted({c.area for c in cases})
+        lawyer_rows = supabase.table("lawyers").select(
+            "*").overlaps("tags_expertise", areas).eq("is_available", True).execute().data or []
+    lawyer_snapshot.put_rows(lawyer_rows)
+    return lawyer_snapshot.get_many([r["id"] for r in lawyer_rows])[0]
+
+
+async def find_matches_batch(req: BatchMatchRequest) -> Dict[str, Any]:
+    """Ranking de vários casos contra um pool de candidatos compartilhado.
+
+    Os casos são carregados em uma consulta, o pool é a união dos candidatos
+    de cada caso e o ranking sai de um único ``rank_many`` (cada caso só vê
+    candidatos da sua área e do seu raio). Os matches são persistidos (um
+    único insert no outbox para o lote); ofertas e notificações só são
+    enviadas com ``req.notify``.
+    """
+    case_rows = supabase.table("cases").select(
+        "*").in_("id", req.case_ids).execute().data or []
+    by_id = {str(row["id"]): row for row in case_rows}
+    cases = [_case_from_row(by_id[cid]) for cid in req.case_ids if cid in by_id]
+    for case in cases:
+        case.radius_km = req.radius_km or case.radius_km
+    missing_ids = [cid for cid in req.case_ids if cid not in by_id]
+    if not cases:
+        return {"results": [], "missing_case_ids": missing_ids}
+
+    with stage_timer(req.preset, label=f"batch:{len(cases)}"):
+        with timed("candidates"):
+            records = _load_batch_pool(cases)
+        candidates = [rec.lawyer for rec in records]
+        lawyer_raw_data = {rec.lawyer.id: rec.row for rec in records}
+
+        with timed("rank"):
+            rankings = await algo.rank_many(
+                cases, candidates, top_n=req.k, preset=req.preset, prefilter=True)
+
+        await _dispatch_side_effects(
+            [(case, top) for case, top in zip(cases, rankings) if top],
+            notify=req.notify, preset=req.preset)
+        results = [format_match_response(case, top_lawyers, lawyer_raw_data)
+                   for case, top_lawyers in zip(cases, rankings)]
+
+    return {"results": results, "missing_case_ids": missing_ids}
+
+
 def format_match_response(
         case: Case, ranked_lawyers: List[Lawyer], raw_data_map: Dict) -> Dict[str, Any]:
     """Formata a resposta do endpoint de match."""
@@ -207,6 +341,10 @@ class MatchService:
         """Encontra matches para um caso específico."""
         return await find_and_notify_matches(req)
 
+    async def find_matches_batch(self, req: BatchMatchRequest) -> Dict[str, Any]:
+        """Encontra matches para vários casos em um único lote."""
+        return await find_matches_batch(req)
+
     async def persist_matches(self, case_id: str, ranked_lawyers: List[Lawyer]):
         """Persiste matches no banco de dados."""
         return await _persist_matches(case_id, ranked_lawyers)
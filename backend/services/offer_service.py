@@ -23,6 +23,53 @@ def get_supabase_client() -> Client:
     """Retorna cliente Supabase configurado"""
     return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
+def build_offer_row(case_id: str, lawyer_id: str, scores: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Linha da tabela ``offers`` para um advogado ranqueado (expira em 24h)."""
+    scores = scores or {}
+    now = datetime.now()
+    return {
+        "case_id": str(case_id),
+        "lawyer_id": str(lawyer_id),
+        "status": "pending",
+        "sent_at": now.isoformat(),
+        "expires_at": (now + timedelta(hours=24)).isoformat(),
+        "fair_score": scores.get('fair', 0.0),
+        "raw_score": scores.get('raw', 0.0),
+        "equity_weight": scores.get('equity', 0.0),
+        "last_offered_at": now.isoformat()
+    }
+
+def create_offers_bulk(offers_data: List[Dict[str, Any]], supabase: Optional[Client] = None) -> Dict[str, List[str]]:
+    """
+    Cria ofertas de vários casos em um único upsert (usado pelo outbox de matching).
+    
+    Idempotente: ofertas já existentes para o par (caso, advogado) não são
+    sobrescritas (índice ``offers_case_lawyer_ux``), então um reprocessamento
+    não reabre ofertas já respondidas.
+    
+    Returns:
+        IDs das ofertas por caso, na ordem das linhas recebidas
+    """
+    if not offers_data:
+        return {}
+    supabase = supabase or get_supabase_client()
+    supabase.table("offers").upsert(
+        offers_data, on_conflict="case_id,lawyer_id", ignore_duplicates=True
+    ).execute()
+    
+    case_ids = sorted({row["case_id"] for row in offers_data})
+    existing = supabase.table("offers").select("id, case_id, lawyer_id").in_(
+        "case_id", case_ids).execute().data or []
+    ids_by_pair = {(str(o["case_id"]), str(o["lawyer_id"])): o["id"] for o in existing}
+    
+    offer_ids: Dict[str, List[str]] = {}
+    for row in offers_data:
+        offer_id = ids_by_pair.get((row["case_id"], row["lawyer_id"]))
+        if offer_id is not None:
+            offer_ids.setdefault(row["case_id"], []).append(offer_id)
+    logger.info(f"Ofertas em lote: {len(offers_data)} linhas para {len(case_ids)} casos")
+    return offer_ids
+
 async def create_offers_from_ranking(case: Case, ranking: List[Lawyer]) -> List[str]:
     """
     Cria ofertas para advogados baseado no ranking do algoritmo de matching.
@@ -41,20 +88,7 @@ async def create_offers_from_ranking(case: Case, ranking: List[Lawyer]) -> List[
         supabase = get_supabase_client()
         
         # Preparar dados das ofertas
-        offers_data = []
-        for lawyer in ranking:
-            offer_data = {
-                "case_id": str(case.id),
-                "lawyer_id": str(lawyer.id),
-                "status": "pending",
-                "sent_at": datetime.now().isoformat(),
-                "expires_at": (datetime.now() + timedelta(hours=24)).isoformat(),
-                "fair_score": lawyer.scores.get('fair', 0.0) if lawyer.scores else 0.0,
-                "raw_score": lawyer.scores.get('raw', 0.0) if lawyer.scores else 0.0,
-                "equity_weight": lawyer.scores.get('equity', 0.0) if lawyer.scores else 0.0,
-                "last_offered_at": datetime.now().isoformat()
-            }
-            offers_data.append(offer_data)
+        offers_data = [build_offer_row(case.id, lawyer.id, lawyer.scores) for lawyer in ranking]
         
         # Criar ofertas no banco
         response = supabase.table("offers").upsert(offers_data).execute()
@@ -16,6 +16,34 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 
 logger = logging.getLogger(__name__)
 
+
+def sync_review_digest(client: Client, row: Dict[str, Any]) -> bool:
+    """
+    Grava o digest de reviews (features R e C do matching) de uma linha de ``lawyers``.
+
+    O digest cobre exatamente ``review_texts``, o mesmo texto que o ``rank()``
+    recebe, e só ele é gravado (``review_digest``). Só grava quando o hash do
+    conteúdo muda. Retorna True se atualizou.
+    """
+    from backend.algoritmo_match import compute_review_digest, review_content_hash
+
+    texts = list(row.get("review_texts") or [])
+    stored = row.get("review_digest") or {}
+    if stored.get("content_hash") == review_content_hash(texts):
+        return False
+
+    digest = compute_review_digest(texts)
+    client.table("lawyers").update({"review_digest": digest.to_dict()}).eq("id", str(row["id"])).execute()
+    return True
+
+
+def refresh_lawyer_review_digest(client: Client, lawyer_id: str) -> bool:
+    """Recalcula o digest de reviews de um advogado (ver ``sync_review_digest``)."""
+    current = client.table("lawyers").select("id, review_texts, review_digest").eq(
+        "id", str(lawyer_id)).single().execute().data or {}
+    return sync_review_digest(client, {**current, "id": lawyer_id})
+
+
 class ReviewsService:
     """
     Classe de serviço para operações com avaliações.
@@ -0,0 +1,87 @@
+"""
+backend/services/supabase_paging.py
+
+Leituras paginadas no Supabase/PostgREST, que corta respostas em
+``max-rows`` (1000 por padrão) sem erro.
+
+- ``fetch_changed_rows``: linhas alteradas depois da marca d'água
+  ``(updated_at, id)``, por keyset até uma página vir incompleta. O id
+  desempata linhas com o mesmo timestamp (ex.: o backfill de uma migração).
+- ``fetch_all_rows``: varredura completa por keyset numa coluna única.
+- ``fetch_by_ids``: ``in_("id", ...)`` em blocos, para manter a URL curta.
+"""
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+SUPABASE_PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+SUPABASE_IN_CHUNK = int(os.getenv("SUPABASE_IN_CHUNK", "200"))
+
+Filters = Optional[Callable[[Any], Any]]
+
+
+def fetch_changed_rows(supabase, table: str, columns: str, since: Optional[str],
+                       since_id: Optional[str] = None, page_size: int = SUPABASE_PAGE_SIZE,
+                       filters: Filters = None) -> List[Dict[str, Any]]:
+    """Linhas de ``table`` depois de ``(since, since_id)`` (todas se ``since`` for None).
+
+    Sem ``since_id`` vale ``updated_at >= since``. ``columns`` deve incluir
+    ``id`` e ``updated_at``; as linhas vêm em ordem de keyset.
+    """
+    rows: List[Dict[str, Any]] = []
+    cursor = (since, since_id) if since and since_id else None
+    while True:
+        query = supabase.table(table).select(columns)
+        if filters is not None:
+            query = filters(query)
+        if cursor is not None:
+            ts, last_id = cursor
+            query = query.or_(f'updated_at.gt."{ts}",and(updated_at.eq."{ts}",id.gt."{last_id}")')
+        elif since:
+            query = query.gte("updated_at", since)
+        page = query.order("updated_at").order("id").limit(page_size).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        cursor = (page[-1]["updated_at"], page[-1]["id"])
+
+
+def fetch_all_rows(supabase, table: str, columns: str, key: str = "id",
+                   page_size: int = SUPABASE_PAGE_SIZE, filters: Filters = None) -> List[Dict[str, Any]]:
+    """Todas as linhas de ``table``, página a página por ``key`` (coluna única, em ``columns``)."""
+    rows: List[Dict[str, Any]] = []
+    last = None
+    while True:
+        query = supabase.table(table).select(columns)
+        if filters is not None:
+            query = filters(query)
+        if last is not None:
+            query = query.gt(key, last)
+        page = query.order(key).limit(page_size).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        last = page[-1][key]
+
+
+def advance_watermark(watermark: Optional[str], watermark_id: Optional[str],
+                      row: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """Maior ``(updated_at, id)`` entre a marca d'água e a linha."""
+    updated_at = row.get("updated_at")
+    if not updated_at:
+        return watermark, watermark_id
+    key = (str(updated_at), str(row.get("id") or ""))
+    if watermark is None or key > (watermark, watermark_id or ""):
+        return key
+    return watermark, watermark_id
+
+
+def fetch_by_ids(supabase, table: str, ids: Sequence[str], columns: str = "*",
+                 chunk: int = SUPABASE_IN_CHUNK, filters: Filters = None) -> List[Dict[str, Any]]:
+    """Linhas de ``table`` com ``id`` em ``ids``, consultadas em blocos de ``chunk``."""
+    rows: List[Dict[str, Any]] = []
+    for start in range(0, len(ids), chunk):
+        query = supabase.table(table).select(columns).in_("id", list(ids[start:start + chunk]))
+        if filters is not None:
+            query = filters(query)
+        rows.extend(query.execute().data or [])
+    return rows
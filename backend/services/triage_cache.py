@@ -0,0 +1,305 @@
+"""
+backend/services/triage_cache.py
+
+Cache de resultados da triagem (LLM), em duas camadas:
+
+1. exata: hash do texto normalizado (minúsculas, sem acentos, pontuação e
+   espaços repetidos) + estratégia, em Redis (``TRIAGE_CACHE_TTL``) com
+   uma LRU em processo na frente;
+2. semântica: embedding local do texto normalizado comparado (cosseno)
+   aos textos já triados da mesma partição — área e urgência detectadas
+   pela heurística de regex, mais a estratégia. Acima de
+   ``TRIAGE_SEMANTIC_THRESHOLD`` a triagem anterior é reaproveitada.
+
+O resumo só existe depois do LLM, então a camada semântica compara os
+textos de entrada, e a partição pela heurística evita reaproveitar, por
+exemplo, um caso urgente para um texto sem urgência. O resultado guardado
+inclui ``summary_embedding``: num acerto exato nem o LLM nem o embedding
+rodam. Num acerto semântico o texto é de outro cliente: só a classificação
+(``SEMANTIC_FIELDS``) é reaproveitada; resumo, palavras-chave e embedding
+são refeitos a partir do texto atual por quem chama.
+
+Acertos saem com ``triage_source`` 'cache' ou 'cache_semantic', nunca
+'llm': a triagem não foi feita para este texto e não pode virar rótulo do
+treino do classificador local.
+
+O índice semântico de cada partição fica em memória e é espelhado em uma
+lista Redis (``TRIAGE_SEMANTIC_MAX_ENTRIES`` mais recentes), recarregada a
+cada ``TRIAGE_SEMANTIC_REFRESH_S`` para ver os textos triados por outros
+workers.
+"""
+import asyncio
+import base64
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.metrics import triage_cache_lookups_total
+
+logger = logging.getLogger(__name__)
+
+TRIAGE_CACHE_ENABLED = os.getenv("TRIAGE_CACHE_ENABLED", "true").lower() == "true"
+TRIAGE_CACHE_TTL = int(os.getenv("TRIAGE_CACHE_TTL", str(7 * 86400)))
+TRIAGE_CACHE_LOCAL_SIZE = int(os.getenv("TRIAGE_CACHE_LOCAL_SIZE", "1000"))
+TRIAGE_SEMANTIC_ENABLED = os.getenv("TRIAGE_SEMANTIC_ENABLED", "true").lower() == "true"
+TRIAGE_SEMANTIC_THRESHOLD = float(os.getenv("TRIAGE_SEMANTIC_THRESHOLD", "0.95"))
+TRIAGE_SEMANTIC_TTL = int(os.getenv("TRIAGE_SEMANTIC_TTL", str(7 * 86400)))
+TRIAGE_SEMANTIC_MAX_ENTRIES = int(os.getenv("TRIAGE_SEMANTIC_MAX_ENTRIES", "2000"))
+TRIAGE_SEMANTIC_REFRESH_S = float(os.getenv("TRIAGE_SEMANTIC_REFRESH_S", "60"))
+
+_PREFIX = "triage:v1"
+
+# Campos reaproveitados num acerto semântico (nada que descreva o relato original)
+SEMANTIC_FIELDS = ("area", "subarea", "urgency_h", "sentiment")
+
+# cases.triage_source de cada camada
+CACHE_SOURCES = {"exact": "cache", "semantic": "cache_semantic"}
+
+
+def normalize_text(text: str) -> str:
+    """Forma canônica do relato: minúsculas, sem acentos nem pontuação, espaços simples."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_hash(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class TriageProbe:
+    """Resultado de ``lookup``: o acerto (se houve) e o necessário para ``store``."""
+    strategy: str
+    key: str
+    partition: str
+    normalized: str
+    result: Optional[Dict[str, Any]] = None
+    layer: Optional[str] = None
+    vector: Optional[np.ndarray] = field(default=None, repr=False)
+
+
+@dataclass
+class _Partition:
+    keys: List[str] = field(default_factory=list)
+    expires: List[float] = field(default_factory=list)
+    vectors: Optional[np.ndarray] = None
+    loaded_at: float = 0.0
+
+
+def _default_encoder():
+    from backend.services.embedding_cache import encode_cached
+    from backend.services.embedding_space import LOCAL_SPACE
+    from backend.services.local_embeddings import get_local_encoder, local_encoder_available
+
+    if not local_encoder_available():
+        return None
+    encoder = get_local_encoder(LOCAL_SPACE.model)
+
+    def encode(text: str) -> np.ndarray:
+        return encode_cached([text], encoder.encode, model=LOCAL_SPACE.model, dim=LOCAL_SPACE.dim)[0]
+    return encode
+
+
+def _default_redis():
+    from backend.services.redis_service import redis_service
+
+    if not redis_service.is_connected():
+        return None
+    return redis_service._redis or redis_service.get_redis()
+
+
+class TriageCache:
+    """Camadas exata e semântica sobre Redis, com fallback em memória."""
+
+    def __init__(self, encoder=_default_encoder, redis_factory=_default_redis,
+                 threshold: float = TRIAGE_SEMANTIC_THRESHOLD, ttl: int = TRIAGE_CACHE_TTL,
+                 semantic_ttl: int = TRIAGE_SEMANTIC_TTL, semantic: bool = TRIAGE_SEMANTIC_ENABLED):
+        self._encoder_factory = encoder
+        self._encoder = None
+        self._encoder_loaded = False
+        self.redis_factory = redis_factory
+        self.threshold = threshold
+        self.ttl = ttl
+        self.semantic_ttl = semantic_ttl
+        self.semantic = semantic
+        self._local: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._partitions: Dict[str, _Partition] = {}
+
+    # ---------------- suporte ----------------
+
+    def _redis(self):
+        try:
+            return self.redis_factory()
+        except Exception as e:
+            logger.warning(f"Cache de triagem: Redis indisponível ({e})")
+            return None
+
+    def _encode(self, normalized: str) -> Optional[np.ndarray]:
+        if not self._encoder_loaded:
+            self._encoder_loaded = True
+            try:
+                self._encoder = self._encoder_factory() if self._encoder_factory else None
+            except Exception as e:
+                logger.warning(f"Cache de triagem: camada semântica desativada ({e})")
+        if self._encoder is None:
+            return None
+        vec = np.asarray(self._encoder(normalized), dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else None
+
+    def _local_get(self, key: str) -> Optional[Dict[str, Any]]:
+        hit = self._local.get(key)
+        if hit is None:
+            return None
+        if hit[0] < time.time():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return hit[1]
+
+    def _local_put(self, key: str, value: Dict[str, Any]) -> None:
+        self._local[key] = (time.time() + self.ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > TRIAGE_CACHE_LOCAL_SIZE:
+            self._local.popitem(last=False)
+
+    async def _get_result(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._local_get(key)
+        if value is not None:
+            return value
+        client = self._redis()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(key)
+        except Exception as e:
+            logger.warning(f"Cache de triagem: falha ao ler {key} ({e})")
+            return None
+        if not raw:
+            return None
+        value = json.loads(raw)
+        self._local_put(key, value)
+        return value
+
+    # ---------------- índice semântico ----------------
+
+    async def _partition(self, name: str) -> _Partition:
+        part = self._partitions.setdefault(name, _Partition())
+        if time.monotonic() - part.loaded_at < TRIAGE_SEMANTIC_REFRESH_S:
+            return part
+        part.loaded_at = time.monotonic()
+        client = self._redis()
+        if client is None:
+            return part
+        try:
+            raw_entries = await client.lrange(f"{_PREFIX}:sem:{name}", 0, TRIAGE_SEMANTIC_MAX_ENTRIES - 1)
+        except Exception as e:
+            logger.warning(f"Cache de triagem: falha ao carregar índice {name} ({e})")
+            return part
+        keys, expires, vectors = [], [], []
+        for raw in raw_entries:
+            entry = json.loads(raw)
+            keys.append(entry["key"])
+            expires.append(entry["exp"])
+            vectors.append(np.frombuffer(base64.b64decode(entry["vec"]), dtype=np.float32))
+        if vectors:
+            part.keys, part.expires, part.vectors = keys, expires, np.vstack(vectors)
+        return part
+
+    def _add_local(self, part: _Partition, key: str, vector: np.ndarray, expires_at: float) -> None:
+        part.keys.insert(0, key)
+        part.expires.insert(0, expires_at)
+        part.vectors = vector[None, :] if part.vectors is None else np.vstack([vector, part.vectors])
+        if len(part.keys) > TRIAGE_SEMANTIC_MAX_ENTRIES:
+            del part.keys[TRIAGE_SEMANTIC_MAX_ENTRIES:]
+            del part.expires[TRIAGE_SEMANTIC_MAX_ENTRIES:]
+            part.vectors = part.vectors[:TRIAGE_SEMANTIC_MAX_ENTRIES]
+
+    async def _semantic_lookup(self, probe: TriageProbe) -> Optional[Dict[str, Any]]:
+        probe.vector = await asyncio.to_thread(self._encode, probe.normalized)
+        if probe.vector is None:
+            return None
+        part = await self._partition(probe.partition)
+        if part.vectors is None or part.vectors.shape[1] != probe.vector.size:
+            return None
+        sims = part.vectors @ probe.vector
+        sims[np.asarray(part.expires) < time.time()] = -1.0
+        for i in np.argsort(-sims)[:3]:
+            if sims[i] < self.threshold:
+                break
+            result = await self._get_result(part.keys[i])
+            if result is not None:
+                return result
+        return None
+
+    # ---------------- API ----------------
+
+    async def lookup(self, text: str, strategy: str, area: str, urgency_h: Any) -> TriageProbe:
+        """Procura uma triagem reaproveitável (exata, depois semântica)."""
+        normalized = normalize_text(text)
+        probe = TriageProbe(strategy=strategy, key=f"{_PREFIX}:exact:{strategy}:{text_hash(normalized)}",
+                            partition=f"{strategy}:{area}:{urgency_h}", normalized=normalized)
+
+        probe.result = await self._get_result(probe.key)
+        triage_cache_lookups_total.labels(layer="exact", result="hit" if probe.result else "miss").inc()
+        if probe.result is not None:
+            probe.layer = "exact"
+        elif self.semantic:
+            probe.result = await self._semantic_lookup(probe)
+            triage_cache_lookups_total.labels(layer="semantic",
+                                              result="hit" if probe.result else "miss").inc()
+            if probe.result is not None:
+                probe.layer = "semantic"
+                probe.result = {k: probe.result[k] for k in SEMANTIC_FIELDS if k in probe.result}
+        if probe.result is not None:
+            probe.result = copy.deepcopy(probe.result)
+            probe.result["triage_source"] = CACHE_SOURCES[probe.layer]
+        return probe
+
+    async def store(self, probe: TriageProbe, result: Dict[str, Any]) -> None:
+        """Guarda a triagem (e o embedding do resumo) nas duas camadas."""
+        value = copy.deepcopy(result)
+        emb = value.get("summary_embedding")
+        if emb is not None and hasattr(emb, "tolist"):
+            value["summary_embedding"] = emb.tolist()
+        self._local_put(probe.key, value)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                await client.set(probe.key, json.dumps(value, ensure_ascii=False, default=str), ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Cache de triagem: falha ao gravar {probe.key} ({e})")
+                client = None
+
+        if not self.semantic or probe.vector is None:
+            return
+        expires_at = time.time() + self.semantic_ttl
+        self._add_local(self._partitions.setdefault(probe.partition, _Partition()),
+                        probe.key, probe.vector, expires_at)
+        if client is not None:
+            name = f"{_PREFIX}:sem:{probe.partition}"
+            entry = json.dumps({"key": probe.key, "exp": expires_at,
+                                "vec": base64.b64encode(probe.vector.astype(np.float32).tobytes()).decode()})
+            try:
+                await client.lpush(name, entry)
+                await client.ltrim(name, 0, TRIAGE_SEMANTIC_MAX_ENTRIES - 1)
+                await client.expire(name, self.semantic_ttl)
+            except Exception as e:
+                logger.warning(f"Cache de triagem: falha ao indexar {probe.key} ({e})")
+
+
+# Instância global
+triage_cache = TriageCache()
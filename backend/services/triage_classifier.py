@@ -0,0 +1,312 @@
+"""
+backend/services/triage_classifier.py
+
+Classificador local da triagem: TF-IDF sobre hashing de n-gramas (1-2) do
+texto normalizado e uma regressão logística por campo (área, subárea,
+urgência e complexidade), treinados offline por
+``backend.jobs.train_triage_classifier`` com as saídas do LLM gravadas em
+``cases``. O modelo é carregado uma vez por processo e responde em menos
+de 1 ms, sem rede.
+
+Modos (``TRIAGE_CLASSIFIER_MODE``):
+
+- ``off``: não é consultado;
+- ``shadow`` (padrão): prevê e compara com o LLM só para as métricas
+  ``triage_classifier_predictions_total`` (acurácia e cobertura no limiar);
+- ``active``: previsões com confiança >= ``TRIAGE_CLASSIFIER_THRESHOLD``
+  dispensam o LLM na estratégia ``simple`` e definem a complexidade no
+  roteador. As demais continuam sendo medidas como em ``shadow``.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import LogisticRegression
+
+from backend.metrics import triage_classifier_decisions_total, triage_classifier_predictions_total
+from backend.services.triage_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+TRIAGE_CLASSIFIER_PATH = os.getenv("TRIAGE_CLASSIFIER_PATH", "models/triage_classifier.joblib")
+TRIAGE_CLASSIFIER_MODE = os.getenv("TRIAGE_CLASSIFIER_MODE", "shadow").lower()
+TRIAGE_CLASSIFIER_THRESHOLD = float(os.getenv("TRIAGE_CLASSIFIER_THRESHOLD", "0.9"))
+TRIAGE_CLASSIFIER_FEATURES = int(os.getenv("TRIAGE_CLASSIFIER_FEATURES", str(2 ** 18)))
+
+# Campos previstos; os três primeiros compõem o resultado da triagem
+TRIAGE_FIELDS = ("area", "subarea", "urgency_h")
+FIELDS = TRIAGE_FIELDS + ("complexity",)
+
+# Complexidade (cases.complexity) → estratégia do roteador
+COMPLEXITY_STRATEGY = {"LOW": "simple", "MEDIUM": "failover", "HIGH": "ensemble"}
+STRATEGY_COMPLEXITY = {strategy: level for level, strategy in COMPLEXITY_STRATEGY.items()}
+
+# A subárea é treinada junto com a área para não prever, por exemplo,
+# "Justa Causa" dentro de "Consumidor"
+_SUBAREA_SEP = "::"
+
+
+@dataclass
+class TriagePrediction:
+    """Rótulo e probabilidade por campo."""
+    labels: Dict[str, Any]
+    confidence: Dict[str, float]
+    version: str = ""
+
+    def confident(self, fields: Iterable[str] = TRIAGE_FIELDS,
+                  threshold: float = TRIAGE_CLASSIFIER_THRESHOLD) -> bool:
+        return all(self.confidence.get(f, 0.0) >= threshold for f in fields)
+
+    def as_triage(self, text: str) -> Dict[str, Any]:
+        """Resultado no formato do ``run_triage`` (resumo e palavras-chave como no fallback)."""
+        return {
+            "area": self.labels["area"],
+            "subarea": self.labels["subarea"],
+            "urgency_h": self.labels["urgency_h"],
+            "summary": text[:150],
+            "keywords": re.findall(r'\b\w{5,}\b', text.lower())[:5],
+            "sentiment": "Neutro",
+            "triage_source": "classifier",
+        }
+
+
+def _vectorizer(n_features: int = TRIAGE_CLASSIFIER_FEATURES) -> HashingVectorizer:
+    # Sem vocabulário: nada a ajustar, só o IDF
+    return HashingVectorizer(n_features=n_features, ngram_range=(1, 2), alternate_sign=False,
+                             norm=None, preprocessor=normalize_text)
+
+
+def _label(row: Dict[str, Any], name: str) -> Optional[str]:
+    value = row.get(name)
+    if value in (None, ""):
+        return None
+    if name == "subarea":
+        return f"{row.get('area')}{_SUBAREA_SEP}{value}" if row.get("area") else None
+    if name == "urgency_h":
+        # Aceita "48" e "48 horas"; outros formatos ficam sem rótulo
+        match = re.match(r"\s*(\d+)", str(value))
+        return str(int(match.group(1))) if match else None
+    if name == "complexity":
+        return str(value).upper()
+    return str(value)
+
+
+def _unlabel(name: str, label: str) -> Any:
+    if name == "subarea":
+        return label.split(_SUBAREA_SEP, 1)[1]
+    if name == "urgency_h":
+        return int(label)
+    return label
+
+
+@dataclass
+class _Model:
+    tfidf: TfidfTransformer
+    classifiers: Dict[str, Any]
+    n_features: int
+    version: str
+    trained_at: str
+    metrics: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+
+@dataclass
+class _Head:
+    """Forma compacta de um classificador de campo, para a inferência."""
+    classes: np.ndarray
+    coef: np.ndarray
+    intercept: np.ndarray
+
+    @classmethod
+    def from_estimator(cls, clf) -> "_Head":
+        return cls(classes=clf.classes_, coef=np.ascontiguousarray(clf.coef_, dtype=np.float32),
+                   intercept=clf.intercept_.astype(np.float32))
+
+    def proba(self, idx: np.ndarray, vals: np.ndarray) -> np.ndarray:
+        z = self.coef[:, idx] @ vals + self.intercept
+        if z.size == 1:  # binário: coef_ só da classe positiva
+            p = 1.0 / (1.0 + np.exp(-z[0]))
+            return np.array([1.0 - p, p])
+        z = np.exp(z - z.max())
+        return z / z.sum()
+
+
+class TriageClassifier:
+    """Carrega (uma vez) e aplica o classificador; ``fit`` treina um novo."""
+
+    def __init__(self, path: Optional[str] = TRIAGE_CLASSIFIER_PATH):
+        self.path = path
+        self._model: Optional[_Model] = None
+        self._vectorizer: Optional[HashingVectorizer] = None
+        self._idf: Optional[np.ndarray] = None
+        self._heads: Dict[str, _Head] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    # ---------------- ciclo de vida ----------------
+
+    def _ensure_loaded(self) -> Optional[_Model]:
+        if self._loaded:
+            return self._model
+        with self._lock:
+            if not self._loaded:
+                if self.path and os.path.exists(self.path):
+                    try:
+                        self._set_model(joblib.load(self.path))
+                        logger.info(f"Classificador de triagem {self._model.version} carregado")
+                    except Exception as e:
+                        logger.warning(f"Falha ao carregar classificador de triagem {self.path}: {e}")
+                self._loaded = True
+        return self._model
+
+    def _set_model(self, model: _Model) -> None:
+        self._vectorizer = _vectorizer(model.n_features)
+        # predict_proba do sklearn custa ~0,3 ms por chamada em validação;
+        # com os coeficientes em float32 a previsão fica abaixo de 1 ms
+        self._idf = model.tfidf.idf_.astype(np.float32)
+        self._heads = {name: _Head.from_estimator(clf) for name, clf in model.classifiers.items()}
+        self._model = model
+        self._loaded = True
+
+    def reload(self) -> None:
+        self._loaded = False
+        self._model = None
+
+    @property
+    def version(self) -> Optional[str]:
+        model = self._ensure_loaded()
+        return model.version if model else None
+
+    @property
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        model = self._ensure_loaded()
+        return model.metrics if model else {}
+
+    def save(self, path: Optional[str] = None) -> str:
+        path = path or self.path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self._model, path)
+        return path
+
+    # ---------------- treino ----------------
+
+    def fit(self, texts: Sequence[str], rows: Sequence[Dict[str, Any]],
+            n_features: int = TRIAGE_CLASSIFIER_FEATURES, C: float = 4.0) -> "TriageClassifier":
+        """Treina com os textos dos clientes e os rótulos (linhas de ``cases``)."""
+        vectorizer = _vectorizer(n_features)
+        tfidf = TfidfTransformer(sublinear_tf=True).fit(vectorizer.transform(texts))
+        X = tfidf.transform(vectorizer.transform(texts))
+
+        classifiers: Dict[str, Any] = {}
+        for name in FIELDS:
+            idx = [i for i, row in enumerate(rows) if _label(row, name) is not None]
+            if not idx:
+                continue
+            y = [_label(rows[i], name) for i in idx]
+            if len(set(y)) == 1:
+                # Um rótulo só (ex.: o DEFAULT da coluna) não ensina nada: sem cabeça
+                logger.warning(f"Classificador de triagem: campo {name} com uma única classe, ignorado")
+                continue
+            classifiers[name] = LogisticRegression(C=C, max_iter=1000).fit(X[idx], y)
+
+        self._set_model(_Model(tfidf=tfidf, classifiers=classifiers, n_features=n_features,
+                               version=time.strftime("%Y%m%d%H%M%S"),
+                               trained_at=time.strftime("%Y-%m-%dT%H:%M:%S")))
+        return self
+
+    def evaluate(self, texts: Sequence[str], rows: Sequence[Dict[str, Any]],
+                 threshold: float = TRIAGE_CLASSIFIER_THRESHOLD) -> Dict[str, Dict[str, float]]:
+        """Acurácia geral, cobertura e acurácia acima do limiar, por campo."""
+        predictions = self.predict_many(texts)
+        report: Dict[str, Dict[str, float]] = {}
+        for name in FIELDS:
+            pairs = [(p, _label(r, name)) for p, r in zip(predictions, rows)
+                     if p is not None and name in p.labels and _label(r, name) is not None]
+            if not pairs:
+                continue
+            hits = [_label(p.labels, name) == truth for p, truth in pairs]
+            confident = [p.confidence[name] >= threshold for p, _ in pairs]
+            covered = [h for h, c in zip(hits, confident) if c]
+            report[name] = {
+                "accuracy": float(np.mean(hits)),
+                "coverage": float(np.mean(confident)),
+                "confident_accuracy": float(np.mean(covered)) if covered else 0.0,
+                "samples": float(len(pairs)),
+            }
+        if self._model is not None:
+            self._model.metrics = report
+        return report
+
+    # ---------------- inferência ----------------
+
+    def predict_many(self, texts: Sequence[str]) -> List[Optional[TriagePrediction]]:
+        model = self._ensure_loaded()
+        if model is None or not texts:
+            return [None] * len(texts)
+        counts = self._vectorizer.transform(texts)
+
+        out: List[Optional[TriagePrediction]] = []
+        for i in range(len(texts)):
+            # TF-IDF (sublinear, L2) só nas colunas não nulas da linha
+            row = slice(counts.indptr[i], counts.indptr[i + 1])
+            idx = counts.indices[row]
+            vals = (1.0 + np.log(counts.data[row])).astype(np.float32) * self._idf[idx]
+            norm = float(np.linalg.norm(vals))
+            if norm:
+                vals /= norm
+
+            labels, confidence = {}, {}
+            for name, head in self._heads.items():
+                proba = head.proba(idx, vals)
+                best = int(np.argmax(proba))
+                labels[name] = _unlabel(name, head.classes[best])
+                confidence[name] = float(proba[best])
+                if name == "subarea":
+                    subarea_area = head.classes[best].split(_SUBAREA_SEP, 1)[0]
+            # Subárea de outra área que não a prevista não é confiável
+            if "subarea" in labels and subarea_area != labels.get("area"):
+                confidence["subarea"] = 0.0
+            out.append(TriagePrediction(labels=labels, confidence=confidence, version=model.version))
+        return out
+
+    def predict(self, text: str) -> Optional[TriagePrediction]:
+        """Previsão para um texto, ou None se não houver modelo treinado."""
+        try:
+            return self.predict_many([text])[0]
+        except Exception as e:
+            logger.warning(f"Classificador de triagem falhou: {e}")
+            return None
+
+
+def record_shadow(prediction: Optional[TriagePrediction], result: Dict[str, Any],
+                  threshold: float = TRIAGE_CLASSIFIER_THRESHOLD) -> None:
+    """Compara a previsão com a triagem do LLM e registra acerto/erro por campo.
+
+    Só métricas: campos ausentes ou em formato inesperado são ignorados e
+    nunca interrompem a triagem.
+    """
+    if prediction is None:
+        return
+    for name in TRIAGE_FIELDS:
+        try:
+            if name not in prediction.labels:
+                continue
+            # Subárea exige a área (o rótulo é "área::subárea")
+            expected = _label(result, name)
+            if expected is None:
+                continue
+            outcome = "agree" if _label(prediction.labels, name) == expected else "disagree"
+            confident = "true" if prediction.confidence[name] >= threshold else "false"
+            triage_classifier_predictions_total.labels(field=name, confident=confident, outcome=outcome).inc()
+        except Exception as e:
+            logger.warning(f"Classificador de triagem: campo {name} não comparado ({e})")
+
+
+# Instância global (carregada na primeira previsão)
+triage_classifier = TriageClassifier()
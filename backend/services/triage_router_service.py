@@ -1,8 +1,18 @@
 # backend/services/triage_router_service.py
 import re
-from typing import Literal
+from typing import Literal, Tuple
+
+from backend.metrics import triage_classifier_decisions_total
+from backend.services.triage_classifier import (
+    COMPLEXITY_STRATEGY,
+    TRIAGE_CLASSIFIER_MODE,
+    TRIAGE_CLASSIFIER_THRESHOLD,
+    triage_classifier,
+)
 
 Strategy = Literal["simple", "failover", "ensemble"]
+# Origem da decisão: regras (palavras-chave/tamanho), classificador local ou padrão
+RouteSource = Literal["rules", "classifier", "default"]
 
 
 class TriageRouterService:
@@ -19,29 +29,49 @@ class TriageRouterService:
         ]
 
     def classify_complexity(self, text: str) -> Strategy:
+        """Classifica a complexidade do texto e retorna a estratégia de triagem apropriada."""
+        return self.route(text)[0]
+
+    def route(self, text: str) -> Tuple[Strategy, RouteSource]:
         """
-        Classifica a complexidade do texto e retorna a estratégia de triagem apropriada.
+        Estratégia de triagem e a origem da decisão.
+
+        Palavras-chave complexas sempre levam ao ensemble; fora isso, no modo
+        ``active``, a complexidade prevista pelo classificador local (acima
+        do limiar) decide antes das demais heurísticas. A origem é gravada
+        em ``cases.triage_strategy_source``: o treino do classificador só
+        aprende com estratégias vindas de regras, nunca do padrão ou de si mesmo.
         """
         text_lower = text.lower()
 
         # Critério 1: Palavras-chave de Complexidade
         if any(keyword in text_lower for keyword in self.complex_keywords):
             print("Complexidade detectada: ENSEMBLE (palavra-chave complexa)")
-            return "ensemble"
+            return "ensemble", "rules"
+
+        # Critério 2: Classificador local treinado com as triagens anteriores
+        if TRIAGE_CLASSIFIER_MODE == "active":
+            prediction = triage_classifier.predict(text)
+            if prediction is not None and prediction.confident(("complexity",), TRIAGE_CLASSIFIER_THRESHOLD):
+                strategy = COMPLEXITY_STRATEGY.get(prediction.labels["complexity"])
+                if strategy:
+                    print(f"Complexidade detectada: {strategy.upper()} (classificador local)")
+                    triage_classifier_decisions_total.labels(decision="routed").inc()
+                    return strategy, "classifier"
 
-        # Critério 2: Palavras-chave de Simplicidade
+        # Critério 3: Palavras-chave de Simplicidade
         if any(keyword in text_lower for keyword in self.simple_keywords):
             print("Complexidade detectada: SIMPLE (palavra-chave simples)")
-            return "simple"
+            return "simple", "rules"
 
-        # Critério 3: Tamanho do texto
+        # Critério 4: Tamanho do texto
         if len(text) > 2000:
             print("Complexidade detectada: ENSEMBLE (texto longo)")
-            return "ensemble"
+            return "ensemble", "rules"
 
         # Se não se encaixa em nenhum critério extremo, usa a estratégia padrão
         print("Complexidade detectada: FAILOVER (padrão)")
-        return "failover"
+        return "failover", "default"
 
 
 # Instância única
@@ -11,8 +11,12 @@ import anthropic
 import openai
 from dotenv import load_dotenv
 
+from backend.metrics import triage_classifier_decisions_total
+
 # Importação do serviço de embedding
 from .embedding_service import generate_embedding
+from .triage_cache import TRIAGE_CACHE_ENABLED, triage_cache
+from .triage_classifier import TRIAGE_CLASSIFIER_MODE, record_shadow, triage_classifier
 
 load_dotenv()
 
@@ -165,13 +169,50 @@ class TriageService:
         print("Resultados divergentes, acionando o Juiz.")
         return await self._run_judge_triage(text, res1, res2)
 
-    async def run_triage(self, text: str, strategy: Strategy) -> dict:
-        """Ponto de entrada principal para a triagem."""
+    async def run_triage(self, text: str, strategy: Strategy, bypass_cache: bool = False) -> dict:
+        """
+        Ponto de entrada principal para a triagem.
+
+        Textos iguais (normalizados) reaproveitam a triagem anterior do
+        ``triage_cache``, com o ``summary_embedding`` já calculado. Textos muito
+        similares na mesma área/urgência heurística reaproveitam só a
+        classificação; resumo, palavras-chave e embedding vêm do texto atual.
+        ``bypass_cache`` força o LLM.
+
+        Na estratégia ``simple``, com o classificador local em modo ``active``,
+        previsões confiantes de área/subárea/urgência dispensam o LLM.
+        """
         print(f"Executando estratégia de triagem: {strategy}")
         triage_results = {}
 
+        probe = None
+        if TRIAGE_CACHE_ENABLED and not bypass_cache:
+            hint = self._run_regex_fallback(text)
+            try:
+                probe = await triage_cache.lookup(text, strategy, hint["area"], hint["urgency_h"])
+            except Exception as e:
+                print(f"Cache de triagem indisponível: {e}")
+            if probe is not None and probe.result is not None:
+                print(f"Triagem reaproveitada do cache ({probe.layer}).")
+                if probe.layer == "semantic":
+                    # O relato em cache é de outro cliente: só a classificação serve
+                    probe.result["summary"] = text[:150]
+                    probe.result["keywords"] = re.findall(r'\b\w{5,}\b', text.lower())[:5]
+                    probe.result["summary_embedding"] = await generate_embedding(probe.result["summary"])
+                    await triage_cache.store(probe, probe.result)
+                return probe.result
+
+        prediction = triage_classifier.predict(text) if TRIAGE_CLASSIFIER_MODE != "off" else None
+
+        llm_ok = True
         try:
-            if strategy == 'simple':
+            if strategy == 'simple' and TRIAGE_CLASSIFIER_MODE == "active" \
+                    and prediction is not None and prediction.confident():
+                print(f"Triagem pelo classificador local {prediction.version}.")
+                triage_classifier_decisions_total.labels(decision="llm_skipped").inc()
+                triage_results = prediction.as_triage(text)
+                llm_ok = False
+            elif strategy == 'simple':
                 triage_results = await self._run_claude_triage(text, model=SIMPLE_MODEL_CLAUDE)
             elif strategy == 'ensemble':
                 triage_results = await self._run_ensemble_strategy(text)
@@ -180,6 +221,12 @@ class TriageService:
         except Exception as e:
             print(f"Estratégia '{strategy}' falhou: {e}. Usando fallback de regex.")
             triage_results = self._run_regex_fallback(text)
+            triage_results["triage_source"] = "regex"
+            llm_ok = False
+
+        if llm_ok:
+            triage_results.setdefault("triage_source", "llm")
+            record_shadow(prediction, triage_results)
 
         summary = triage_results.get("summary")
         if summary:
@@ -188,6 +235,10 @@ class TriageService:
         else:
             triage_results["summary_embedding"] = None
 
+        # Só triagens do LLM são reaproveitadas (regex e classificador são baratos)
+        if probe is not None and llm_ok:
+            await triage_cache.store(probe, triage_results)
+
         return triage_results
 
     def _run_regex_fallback(self, text: str) -> dict:
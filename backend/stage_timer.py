@@ -0,0 +1,209 @@
+"""
+backend/stage_timer.py
+
+Cronometragem por etapa do matching (``rank()`` e ``find_and_notify_matches``).
+
+``stage_timer()`` abre o timer da requisição e o publica em um ContextVar;
+qualquer código chamado dentro dele marca etapas com ``timed("features")``.
+Cada etapa é observada no histograma Prometheus
+``match_stage_duration_seconds`` (labels stage, preset e model_version) e
+acumulada em um breakdown em ms, anexado ao registro de auditoria e à
+resposta de debug. Chamadas aninhadas (ex.: o ``rank()`` dentro de
+``find_and_notify_matches``) reaproveitam o timer já ativo.
+
+Amostragem opcional: com ``MATCH_PROFILE_SAMPLE_RATE`` > 0 uma fração das
+requisições roda sob cProfile (ou pyinstrument, com
+``MATCH_PROFILER=pyinstrument``) e só os traces das ``MATCH_PROFILE_TOP_N``
+mais lentas são mantidos (em memória e, se ``MATCH_PROFILE_DIR`` estiver
+definido, em disco). O cProfile mede a thread inteira: tarefas concorrentes
+no mesmo event loop também aparecem no trace.
+"""
+import cProfile
+import heapq
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from backend.metrics import match_stage_duration
+except ImportError:  # Prometheus opcional
+    match_stage_duration = None
+
+logger = logging.getLogger(__name__)
+
+MATCH_PROFILE_SAMPLE_RATE = float(os.getenv("MATCH_PROFILE_SAMPLE_RATE", "0"))
+MATCH_PROFILE_TOP_N = int(os.getenv("MATCH_PROFILE_TOP_N", "10"))
+MATCH_PROFILER = os.getenv("MATCH_PROFILER", "cprofile")
+MATCH_PROFILE_DIR = os.getenv("MATCH_PROFILE_DIR")
+
+_current: ContextVar[Optional["StageTimer"]] = ContextVar("match_stage_timer", default=None)
+
+
+class StageTimer:
+    """Tempo acumulado (ms) por etapa de uma requisição de matching."""
+
+    def __init__(self, preset: str = "balanced", model_version: Optional[str] = None,
+                 histogram: Any = match_stage_duration):
+        self.preset = preset
+        self.model_version = model_version or "production"
+        self.histogram = histogram
+        self.timings: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds * 1000
+        if self.histogram is not None:
+            self.histogram.labels(
+                stage=name, preset=self.preset, model_version=self.model_version).observe(seconds)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def breakdown(self) -> Dict[str, float]:
+        """Etapas medidas até agora + ``total`` desde a abertura do timer."""
+        out = {name: round(ms, 3) for name, ms in self.timings.items()}
+        out["total"] = round(self.total_ms(), 3)
+        return out
+
+
+def current_timer() -> Optional[StageTimer]:
+    return _current.get()
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Mede a etapa ``name`` no timer ativo (no-op fora de ``stage_timer``)."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+@contextmanager
+def stage_timer(preset: str = "balanced", model_version: Optional[str] = None,
+                label: str = "") -> Iterator[StageTimer]:
+    """Timer da requisição (reaproveita o ativo) com amostragem opcional do profiler."""
+    active = _current.get()
+    if active is not None:
+        yield active
+        return
+    timer = StageTimer(preset, model_version)
+    token = _current.set(timer)
+    session = slow_request_profiler.start()
+    try:
+        yield timer
+    finally:
+        _current.reset(token)
+        timer.observe("total", timer.total_ms() / 1000)
+        slow_request_profiler.finish(session, timer, label)
+
+
+# =============================================================================
+# Amostragem das requisições mais lentas
+# =============================================================================
+
+
+class SlowRequestProfiler:
+    """Perfila uma amostra das requisições e guarda os traces das N mais lentas."""
+
+    def __init__(self, sample_rate: float = MATCH_PROFILE_SAMPLE_RATE, top_n: int = MATCH_PROFILE_TOP_N,
+                 backend: str = MATCH_PROFILER, out_dir: Optional[str] = MATCH_PROFILE_DIR):
+        self.sample_rate = sample_rate
+        self.top_n = top_n
+        self.backend = backend
+        self.out_dir = Path(out_dir) if out_dir else None
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+        # Um perfil por vez: cProfile/pyinstrument não suportam sessões sobrepostas
+        self._busy = threading.Lock()
+
+    def start(self) -> Optional[Any]:
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            if self.backend == "pyinstrument":
+                from pyinstrument import Profiler
+
+                profiler = Profiler(async_mode="enabled")
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            return profiler
+        except Exception as e:
+            self._busy.release()
+            logger.warning(f"Profiler de matching indisponível: {e}")
+            return None
+
+    def finish(self, profiler: Optional[Any], timer: StageTimer, label: str = "") -> None:
+        if profiler is None:
+            return
+        try:
+            profiler.stop() if self.backend == "pyinstrument" else profiler.disable()
+        finally:
+            self._busy.release()
+
+        total_ms = timer.total_ms()
+        if len(self._heap) >= self.top_n and total_ms <= self._heap[0][0]:
+            return
+        entry = {
+            "label": label,
+            "total_ms": round(total_ms, 3),
+            "timings": timer.breakdown(),
+            "captured_at": time.time(),
+            "trace": self._render(profiler),
+        }
+        item = (total_ms, next(self._seq), entry)
+        if len(self._heap) < self.top_n:
+            heapq.heappush(self._heap, item)
+        else:
+            heapq.heapreplace(self._heap, item)
+        if self.out_dir is not None:
+            self._dump(profiler, entry)
+
+    def _render(self, profiler: Any) -> str:
+        if self.backend == "pyinstrument":
+            return profiler.output_text()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(40)
+        return stream.getvalue()
+
+    def _dump(self, profiler: Any, entry: Dict[str, Any]) -> None:
+        try:
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            stem = f"{int(entry['captured_at'])}-{entry['label'] or 'match'}-{int(entry['total_ms'])}ms"
+            if self.backend == "pyinstrument":
+                (self.out_dir / f"{stem}.html").write_text(profiler.output_html())
+            else:
+                profiler.dump_stats(str(self.out_dir / f"{stem}.prof"))
+        except Exception as e:
+            logger.warning(f"Falha ao gravar trace de matching: {e}")
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        """Traces mantidos, do mais lento para o mais rápido."""
+        return [entry for _, _, entry in sorted(self._heap, reverse=True)]
+
+
+# Instância global (configurada por variáveis de ambiente)
+slow_request_profiler = SlowRequestProfiler()
@@ -5,6 +5,7 @@ import uuid
 
 from dotenv import load_dotenv
 
+from backend.services.embedding_space import storage_tag
 from backend.services.match_service import MatchRequest, find_and_notify_matches
 
 # Importar os serviços necessários
@@ -38,7 +39,8 @@ async def _process_triage_and_match_flow(
     supabase = get_supabase_client()
 
     # 1. Roteamento Inteligente: Classifica a complexidade e define a estratégia
-    strategy: Strategy = triage_router_service.classify_complexity(text)
+    strategy: Strategy
+    strategy, route_source = triage_router_service.route(text)
 
     # 2. Executa a triagem com a estratégia definida
     triage_result = await triage_service.run_triage(text, strategy)
@@ -60,7 +62,13 @@ async def _process_triage_and_match_flow(
         "summary": triage_result.get("summary"),
         "keywords": triage_result.get("keywords"),
         "sentiment": triage_result.get("sentiment"),
+        "triage_source": triage_result.get("triage_source"),
+        # A estratégia não é a complexidade do caso: cases.complexity muda os
+        # pesos do ranking (apply_dynamic_weights) e fica com o DEFAULT
+        "triage_strategy": strategy,
+        "triage_strategy_source": route_source,
         "summary_embedding": triage_result.get("summary_embedding"),
+        "summary_embedding_space": storage_tag(triage_result.get("summary_embedding")),
         "detailed_analysis": detailed_analysis,
         "coords": coords_to_save,
         "status": "triage_completed"
@@ -2,6 +2,7 @@
 Módulo de tarefas Celery para processamento assíncrono.
 """
 
+from .match_tasks import drain_match_outbox, match_cases_batch, rematch_open_cases
 from .triage_tasks import (
     analyze_documents_async,
     batch_process_cases,
@@ -13,5 +14,8 @@ __all__ = [
     'process_triage_async',
     'analyze_documents_async',
     'generate_embeddings_async',
-    'batch_process_cases'
+    'batch_process_cases',
+    'match_cases_batch',
+    'rematch_open_cases',
+    'drain_match_outbox'
 ]
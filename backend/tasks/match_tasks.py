@@ -0,0 +1,97 @@
+"""
+Tarefas Celery de matching em lote.
+
+- ``match_cases_batch``: ranqueia uma lista de casos em blocos de
+  ``MATCH_BATCH_SIZE`` com ``rank_many`` (pool de candidatos, pesos e
+  disponibilidade compartilhados por bloco), publicando o progresso.
+- ``rematch_open_cases``: job noturno que reprocessa os casos ainda abertos.
+- ``drain_match_outbox``: drena o outbox dos efeitos pós-ranking (rede de
+  segurança para o drenador do lifespan da API).
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List
+
+from backend.celery_app import celery_app
+from backend.models import BatchMatchRequest
+from backend.services.redis_service import redis_service
+
+logger = logging.getLogger(__name__)
+
+MATCH_BATCH_SIZE = int(os.getenv("MATCH_BATCH_SIZE", "200"))
+REMATCH_STATUSES = [s.strip() for s in os.getenv(
+    "REMATCH_STATUSES", "summary_generated,matching").split(",") if s.strip()]
+
+
+async def _run_batches(task_id: str, case_ids: List[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    from backend.services.match_service import find_matches_batch
+
+    results: Dict[str, Any] = {
+        "total": len(case_ids),
+        "processed": 0,
+        "failed": 0,
+        "missing": [],
+    }
+    for start in range(0, len(case_ids), MATCH_BATCH_SIZE):
+        chunk = case_ids[start:start + MATCH_BATCH_SIZE]
+        try:
+            batch = await find_matches_batch(BatchMatchRequest(case_ids=chunk, **options))
+            results["processed"] += len(batch["results"])
+            results["missing"].extend(batch["missing_case_ids"])
+        except Exception as e:
+            logger.error(f"Erro no bloco de matching {start}-{start + len(chunk)}: {e}")
+            results["failed"] += len(chunk)
+
+        await redis_service.publish(f"batch:progress:{task_id}", {
+            "progress": min(start + len(chunk), len(case_ids)) / len(case_ids) * 100,
+            "processed": results["processed"],
+            "total": len(case_ids),
+        })
+    return results
+
+
+@celery_app.task(
+    name="match.batch",
+    bind=True,
+    queue="batch",
+    time_limit=1800  # 30 minutos
+)
+def match_cases_batch(self, case_ids: List[str], options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Gera os matches de vários casos em blocos (``rank_many``).
+
+    Args:
+        case_ids: Lista de IDs de casos
+        options: Campos de ``BatchMatchRequest`` (k, preset, radius_km, notify)
+
+    Returns:
+        Totais processados, falhas e IDs de casos não encontrados
+    """
+    logger.info(f"Iniciando matching em lote de {len(case_ids)} casos")
+    results = asyncio.run(_run_batches(self.request.id, case_ids, options or {}))
+    logger.info(
+        f"Matching em lote concluído: {results['processed']} sucesso, {results['failed']} falhas")
+    return results
+
+
+@celery_app.task(name="match.rematch_open_cases", queue="batch", time_limit=3600)
+def rematch_open_cases() -> Dict[str, Any]:
+    """Reprocessa (sem notificar) os matches de todos os casos ainda abertos."""
+    from backend.services.match_service import supabase
+
+    rows = supabase.table("cases").select("id").in_(
+        "status", REMATCH_STATUSES).execute().data or []
+    case_ids = [str(r["id"]) for r in rows]
+    if not case_ids:
+        return {"total": 0, "processed": 0, "failed": 0, "missing": []}
+    return match_cases_batch.apply(args=[case_ids]).get()
+
+
+@celery_app.task(name="match.drain_outbox", queue="periodic", time_limit=300)
+def drain_match_outbox() -> Dict[str, int]:
+    """Aplica os efeitos pendentes do outbox de matching (persistência, ofertas, notificações)."""
+    from backend.services.match_outbox import match_outbox
+
+    return asyncio.run(match_outbox.drain())
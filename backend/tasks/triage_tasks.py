@@ -21,6 +21,7 @@ from backend.services.intelligent_triage_orchestrator import (
     intelligent_triage_orchestrator,
 )
 from backend.services.redis_service import redis_service
+from backend.tasks.match_tasks import match_cases_batch
 
 logger = logging.getLogger(__name__)
 
@@ -268,9 +269,9 @@ def generate_embeddings_async(
         # Importar serviço de embeddings
         from backend.services.embedding_service import embedding_service
 
-        # Gerar embeddings
+        # Gerar embeddings (texto repetido vem do cache por conteúdo)
         embeddings = asyncio.run(
-            embedding_service.generate_embeddings(text_content)
+            embedding_service.generate_embedding(text_content)
         )
 
         # Salvar embeddings no Redis com TTL
@@ -323,6 +324,10 @@ def batch_process_cases(
     Returns:
         Resultado do processamento em lote
     """
+    if operation == "match":
+        # Matching usa o motor em lote (rank_many) em vez do laço por caso
+        return match_cases_batch.apply(args=[case_ids, options]).get()
+
     try:
         logger.info(f"Iniciando processamento em lote de {len(case_ids)} casos")
 
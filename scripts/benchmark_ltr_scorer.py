@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark do scorer LTR: pesos lineares × booster LightGBM (TreeScorer).
+
+Mede a latência de pontuar a matriz de candidatos inteira (o que rank() faz
+por requisição) e, quando há dataset rotulado no feature store, compara o
+NDCG@5 dos dois scorers na mesma janela.
+
+Uso:
+    python scripts/benchmark_ltr_scorer.py [--model backend/models/ltr_model.txt] [--days 30]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.algoritmo_match import (  # noqa: E402
+    DEFAULT_WEIGHTS,
+    FEATURE_KEYS,
+    MODEL_FILE,
+    TreeScorer,
+    load_weights,
+)
+
+
+def _median_ms(fn, repeat: int = 200) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def bench_latency(tree: TreeScorer, weight_vec: np.ndarray) -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'candidatos':>10} {'linear (ms)':>12} {'árvores (ms)':>13}")
+    for n in (20, 100, 500, 2000):
+        fm = rng.random((n, len(FEATURE_KEYS)))
+        linear = _median_ms(lambda: (fm * weight_vec).sum(axis=1))
+        trees = _median_ms(lambda: tree.score(fm))
+        print(f"{n:>10} {linear:>12.4f} {trees:>13.4f}")
+
+
+def bench_quality(tree: TreeScorer, weight_vec: np.ndarray, days: int) -> None:
+    from backend.jobs.ltr_feature_store import BASE_FEATURES, STORE_DIR, load_window
+    from backend.jobs.ltr_metrics import group_ids_from_sizes, grouped_ndcg
+
+    if not (STORE_DIR / "exposures").exists():
+        print("Feature store vazio: comparação de NDCG ignorada.")
+        return
+    df = load_window(days=days or None)
+    if df.empty:
+        print("Nenhuma exposição rotulada na janela.")
+        return
+
+    fm = df[BASE_FEATURES].to_numpy(dtype=np.float64)
+    y = df["label_num"].to_numpy()
+    sizes = df.groupby("group_id", sort=False).size().to_numpy()
+    group_ids = group_ids_from_sizes(sizes)
+    multi = sizes > 1
+
+    for name, scores in (("linear", fm @ weight_vec), ("árvores", tree.score(fm))):
+        ndcg = grouped_ndcg(y, scores, group_ids, k=5)[multi]
+        print(f"NDCG@5 {name:>8}: {ndcg.mean():.4f} ({multi.sum()} grupos)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=str(MODEL_FILE))
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    import lightgbm as lgb
+
+    tree = TreeScorer(lgb.Booster(model_file=args.model))
+    weights = load_weights() or DEFAULT_WEIGHTS
+    weight_vec = np.array([weights.get(k, 0) for k in FEATURE_KEYS], dtype=np.float64)
+
+    print(f"Modelo: {args.model} (features: {' '.join(tree.feature_names)})\n")
+    bench_latency(tree, weight_vec)
+    print()
+    bench_quality(tree, weight_vec, args.days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+-- Migração: Pré-filtro geográfico por bounding box (indexável)
+-- Data: 2025-08-08
+-- Descrição: O filtro por raio avaliava acos(cos·cos…) linha a linha, impedindo
+-- o uso de índices. Agora um bounding box em latitude/longitude (B-tree) reduz
+-- as linhas antes do Haversine exato. Também cria a RPC find_nearby_lawyers
+-- usada por match_service e um índice em updated_at para a atualização
+-- incremental do índice geoespacial em memória (backend/services/geo_index.py).
+
+-- Colunas usadas pelo pré-filtro e pela marca d'água incremental
+ALTER TABLE public.lawyers
+ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+-- Backfill a partir de geo_latlon (POINT(longitude, latitude))
+UPDATE public.lawyers
+SET latitude = geo_latlon[1], longitude = geo_latlon[0]
+WHERE latitude IS NULL AND geo_latlon IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_lawyers_lat_lon
+ON public.lawyers (latitude, longitude)
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_lawyers_updated_at
+ON public.lawyers (updated_at);
+
+-- RPC: advogados no raio, com bounding box antes da distância exata
+CREATE OR REPLACE FUNCTION public.find_nearby_lawyers(
+    area TEXT,
+    lat DOUBLE PRECISION,
+    lon DOUBLE PRECISION,
+    km DOUBLE PRECISION DEFAULT 50
+)
+RETURNS SETOF public.lawyers
+LANGUAGE sql
+STABLE
+AS $$
+    WITH bbox AS (
+        SELECT
+            lat - degrees(km / 6371.0) AS lat_min,
+            lat + degrees(km / 6371.0) AS lat_max,
+            -- Longitude extrema do círculo: sin(Δλ) = sin(r/R) / cos(φ)
+            CASE WHEN sin(km / 6371.0) < cos(radians(lat))
+                 THEN degrees(asin(sin(km / 6371.0) / cos(radians(lat))))
+                 ELSE 180.0 END AS dlon
+    ), bounds AS (
+        SELECT lat_min, lat_max, lon - dlon AS lon_min, lon + dlon AS lon_max FROM bbox
+    )
+    SELECT l.*
+    FROM public.lawyers l, bounds b
+    WHERE l.latitude BETWEEN b.lat_min AND b.lat_max
+      AND l.longitude BETWEEN b.lon_min AND b.lon_max
+      -- Parâmetros qualificados: lawyers também possui colunas lat/lng
+      AND (find_nearby_lawyers.area IS NULL OR find_nearby_lawyers.area = ANY(l.tags_expertise))
+      AND 6371.0 * acos(LEAST(1.0,
+            cos(radians(find_nearby_lawyers.lat)) * cos(radians(l.latitude)) *
+            cos(radians(l.longitude) - radians(find_nearby_lawyers.lon)) +
+            sin(radians(find_nearby_lawyers.lat)) * sin(radians(l.latitude))
+          )) <= find_nearby_lawyers.km;
+$$;
+
+COMMENT ON FUNCTION public.find_nearby_lawyers(TEXT, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION)
+IS 'Advogados da área dentro de km do ponto; bounding box indexável antes do Haversine exato.';
@@ -0,0 +1,14 @@
+-- Migração: Digest pré-computado de reviews
+-- Data: 2025-08-09
+-- Descrição: As features R (qualidade das reviews) e C (soft-skills) do
+-- algoritmo de matching varriam o texto de todas as reviews com dezenas de
+-- regex a cada requisição. O digest (contagens válidas, hits positivos/negativos
+-- e score de soft-skill, com hash do conteúdo) é calculado quando as reviews
+-- mudam (reviews_service e job update_review_kpi) e lido pronto no ranking.
+
+ALTER TABLE public.lawyers
+ADD COLUMN IF NOT EXISTS review_texts TEXT[] DEFAULT '{}',
+ADD COLUMN IF NOT EXISTS review_digest JSONB;
+
+COMMENT ON COLUMN public.lawyers.review_digest IS
+'Digest das reviews para o matching: n_reviews, valid_count, soft_valid_count, pos_hits, neg_hits, soft_skill, content_hash.';
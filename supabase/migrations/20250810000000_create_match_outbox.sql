@@ -0,0 +1,34 @@
+-- Migração: Outbox dos efeitos colaterais do matching
+-- Data: 2025-08-10
+-- Descrição: O /api/match persistia os matches, criava ofertas, notificava e
+-- atualizava last_offered_at em série dentro da requisição. Agora grava um
+-- registro por caso nesta tabela e um drenador (API + Celery) aplica os
+-- efeitos em lote, com chave de idempotência e novas tentativas.
+
+CREATE TABLE IF NOT EXISTS public.match_outbox (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    idempotency_key TEXT NOT NULL,
+    case_id UUID NOT NULL REFERENCES public.cases(id) ON DELETE CASCADE,
+    payload JSONB NOT NULL,
+
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'processing', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    claimed_at TIMESTAMPTZ,
+    processed_at TIMESTAMPTZ,
+    last_error TEXT,
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+
+    CONSTRAINT match_outbox_idempotency_ux UNIQUE (idempotency_key)
+);
+
+-- Fila: apenas registros ainda não concluídos
+CREATE INDEX IF NOT EXISTS idx_match_outbox_due
+    ON public.match_outbox(next_attempt_at, created_at)
+    WHERE status IN ('pending', 'processing');
+CREATE INDEX IF NOT EXISTS idx_match_outbox_case_id ON public.match_outbox(case_id);
+
+COMMENT ON TABLE public.match_outbox IS 'Efeitos pós-ranking (case_matches, ofertas, notificações, last_offered_at) aplicados em lote pelo drenador.';
+COMMENT ON COLUMN public.match_outbox.idempotency_key IS 'Caso + advogados ranqueados + preset; o mesmo ranking não é enfileirado duas vezes.';
@@ -0,0 +1,11 @@
+-- Migração: Versão dos pesos nos matches persistidos
+-- Data: 2025-08-11
+-- Descrição: As explicações (/api/explain) passam a ser servidas a partir do
+-- breakdown já gravado em case_matches, sem re-executar o ranking. A versão
+-- (fingerprint) dos pesos identifica com quais pesos o breakdown foi gerado.
+
+ALTER TABLE public.case_matches
+ADD COLUMN IF NOT EXISTS weights_version TEXT;
+
+COMMENT ON COLUMN public.case_matches.weights_version IS
+'Fingerprint (blake2b) dos pesos usados no breakdown; muda quando qualquer peso muda.';
@@ -0,0 +1,13 @@
+-- Migração: Embeddings históricos em formato binário
+-- Data: 2025-08-12
+-- Descrição: casos_historicos_embeddings (JSON) vira float64 a cada parse e
+-- ocupa ~5x mais que os floats em binário. O blob guarda todos os vetores do
+-- advogado como uma matriz contígua float32/float16 com cabeçalho (dimensão e
+-- quantidade), carregada com np.frombuffer pelo snapshot do matching.
+-- Backfill: python3 -m backend.jobs.pack_lawyer_embeddings
+
+ALTER TABLE public.lawyers
+ADD COLUMN IF NOT EXISTS casos_historicos_blob BYTEA;
+
+COMMENT ON COLUMN public.lawyers.casos_historicos_blob IS
+'Embeddings históricos empacotados: cabeçalho EMB1 (dtype, dim, count) + matriz count x dim little-endian. Ver backend/embedding_blob.py.';
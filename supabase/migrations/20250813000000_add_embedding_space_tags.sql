@@ -0,0 +1,22 @@
+-- Migração: Espaço de origem de cada embedding persistido
+-- Data: 2025-08-13
+-- Descrição: vetores passam a ser gravados na dimensão nativa do modelo (sem
+-- o padding com zeros do MiniLM até 1536) e marcados com "modelo/dimensão",
+-- ex.: 'all-MiniLM-L6-v2/384' ou 'text-embedding-3-small/1536'. O matching
+-- projeta todos para o espaço compartilhado treinado por train_pca_embeddings.
+-- Backfill (recorta padding legado e preenche as tags):
+--   python3 -m backend.jobs.migrate_embedding_space
+
+ALTER TABLE public.cases
+ADD COLUMN IF NOT EXISTS summary_embedding_space TEXT;
+
+ALTER TABLE public.lawyers
+ADD COLUMN IF NOT EXISTS casos_historicos_space TEXT,
+ADD COLUMN IF NOT EXISTS cv_embedding_space TEXT;
+
+COMMENT ON COLUMN public.cases.summary_embedding_space IS
+'Espaço do summary_embedding (modelo/dimensão). Ver backend/services/embedding_space.py.';
+COMMENT ON COLUMN public.lawyers.casos_historicos_space IS
+'Espaço dos vetores em casos_historicos_blob (modelo/dimensão).';
+COMMENT ON COLUMN public.lawyers.cv_embedding_space IS
+'Espaço do cv_embedding (modelo/dimensão).';
@@ -0,0 +1,11 @@
+-- Migração: Origem da triagem de cada caso
+-- Data: 2025-08-14
+-- Descrição: 'llm', 'classifier' (classificador local) ou 'regex' (fallback).
+-- O treino do classificador (backend.jobs.train_triage_classifier) usa só
+-- triagens do LLM, para não reaprender as próprias previsões.
+
+ALTER TABLE public.cases
+ADD COLUMN IF NOT EXISTS triage_source TEXT;
+
+COMMENT ON COLUMN public.cases.triage_source IS
+'Origem da triagem: llm, classifier ou regex. NULL em casos anteriores a 2025-08-14.';
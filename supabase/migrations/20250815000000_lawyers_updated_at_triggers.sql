@@ -0,0 +1,50 @@
+-- Migração: Triggers da marca d'água incremental de lawyers
+-- Data: 2025-08-15
+-- Descrição: 20250808000000 criou lawyers.updated_at com DEFAULT NOW() (mesmo
+-- valor para todas as linhas existentes) e latitude/longitude por backfill
+-- único. Sem triggers, edições não avançavam updated_at e mudanças de
+-- geo_latlon não chegavam a latitude/longitude, então o índice geoespacial,
+-- o snapshot de advogados e a disponibilidade em memória não as viam.
+-- Empates em updated_at são resolvidos pelo id na paginação por keyset
+-- (backend/services/supabase_paging.py).
+
+CREATE OR REPLACE FUNCTION public.sync_lawyer_latlon()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.geo_latlon IS NOT NULL THEN
+        NEW.latitude = NEW.geo_latlon[1];
+        NEW.longitude = NEW.geo_latlon[0];
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS sync_lawyers_latlon ON public.lawyers;
+CREATE TRIGGER sync_lawyers_latlon
+    BEFORE INSERT OR UPDATE OF geo_latlon ON public.lawyers
+    FOR EACH ROW
+    EXECUTE FUNCTION public.sync_lawyer_latlon();
+
+CREATE OR REPLACE FUNCTION public.touch_lawyer_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS touch_lawyers_updated_at ON public.lawyers;
+CREATE TRIGGER touch_lawyers_updated_at
+    BEFORE UPDATE ON public.lawyers
+    FOR EACH ROW
+    EXECUTE FUNCTION public.touch_lawyer_updated_at();
+
+-- Coordenadas que divergiram desde o backfill
+UPDATE public.lawyers
+SET latitude = geo_latlon[1], longitude = geo_latlon[0]
+WHERE geo_latlon IS NOT NULL
+  AND (latitude IS DISTINCT FROM geo_latlon[1] OR longitude IS DISTINCT FROM geo_latlon[0]);
+
+-- Keyset (updated_at, id) da atualização incremental
+CREATE INDEX IF NOT EXISTS idx_lawyers_updated_at_id
+ON public.lawyers (updated_at, id);
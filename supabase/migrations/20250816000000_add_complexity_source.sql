@@ -0,0 +1,14 @@
+-- Migração: Origem da complexidade de cada caso
+-- Data: 2025-08-16
+-- Descrição: cases.complexity tinha só o DEFAULT 'MEDIUM', porque o worker
+-- não gravava a complexidade decidida pelo roteador. Agora grava, junto com
+-- a origem: 'rules' (palavras-chave/tamanho), 'classifier' (classificador
+-- local) ou 'default' (nenhum critério). O treino do classificador
+-- (backend.jobs.train_triage_classifier) usa a complexidade só quando a
+-- origem é 'rules' ou 'llm'.
+
+ALTER TABLE public.cases
+ADD COLUMN IF NOT EXISTS complexity_source TEXT;
+
+COMMENT ON COLUMN public.cases.complexity_source IS
+'Origem de cases.complexity: rules, classifier, default ou llm. NULL em casos anteriores a 2025-08-16 (complexity é o DEFAULT).';
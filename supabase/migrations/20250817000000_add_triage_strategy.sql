@@ -0,0 +1,22 @@
+-- Migração: Estratégia de triagem do roteador em coluna própria
+-- Data: 2025-08-17
+-- Descrição: a estratégia escolhida pelo roteador (simple/failover/ensemble)
+-- era gravada como cases.complexity, o que ativava os ramos HIGH/LOW de
+-- apply_dynamic_weights e mudava o ranking de todos os casos novos. Ela
+-- passa a ir para cases.triage_strategy, com a origem da decisão em
+-- cases.triage_strategy_source; cases.complexity volta a ser só o que era
+-- (DEFAULT 'MEDIUM' ou preenchido por outras fontes). O treino do
+-- classificador (backend.jobs.train_triage_classifier) deriva o rótulo de
+-- complexidade da estratégia quando a origem é 'rules'.
+
+ALTER TABLE public.cases
+RENAME COLUMN complexity_source TO triage_strategy_source;
+
+ALTER TABLE public.cases
+ADD COLUMN IF NOT EXISTS triage_strategy TEXT;
+
+COMMENT ON COLUMN public.cases.triage_strategy IS
+'Estratégia de triagem do roteador: simple, failover ou ensemble. Não afeta o ranking.';
+
+COMMENT ON COLUMN public.cases.triage_strategy_source IS
+'Origem de cases.triage_strategy: rules, classifier ou default. NULL em casos anteriores a 2025-08-16.';
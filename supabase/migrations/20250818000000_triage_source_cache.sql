@@ -0,0 +1,9 @@
+-- Migração: Triagens reaproveitadas do cache
+-- Data: 2025-08-18
+-- Descrição: acertos do triage_cache eram gravados com a origem da triagem
+-- guardada ('llm') e viravam rótulos do treino do classificador. Agora
+-- ganham origem própria: 'cache' (texto idêntico) ou 'cache_semantic'
+-- (texto similar). O treino continua lendo só 'llm' e NULL.
+
+COMMENT ON COLUMN public.cases.triage_source IS
+'Origem da triagem: llm, classifier, regex, cache ou cache_semantic. NULL em casos anteriores a 2025-08-14.';
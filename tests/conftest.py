@@ -5,6 +5,7 @@ Este arquivo configura fixtures e mocks necessários para os testes.
 """
 import pytest
 import os
+import tempfile
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, AsyncMock
 
@@ -14,6 +15,7 @@ os.environ["SUPABASE_URL"] = "https://test.supabase.co"
 os.environ["SUPABASE_SERVICE_KEY"] = "test-service-key"
 os.environ["ANTHROPIC_API_KEY"] = "test-anthropic-key"
 os.environ["OPENAI_API_KEY"] = "test-openai-key"
+os.environ.setdefault("AUDIT_DIR", tempfile.mkdtemp(prefix="litgo-audit-"))
 
 # Usar Redis do contêiner se já estiver configurado, senão usar localhost
 # Isso permite que os testes funcionem tanto localmente quanto no Docker
@@ -0,0 +1,109 @@
+"""
+Testes para o pipeline de auditoria assíncrono (backend/audit_sink.py)
+"""
+import gzip
+import logging
+
+import numpy as np
+
+from backend.algoritmo_match import JsonFormatter
+from backend import audit_sink
+from backend.audit_sink import AuditLogReader, AuditSink, AuditSinkHandler, list_segments
+
+
+def test_sink_rotates_and_compresses_segments(tmp_path):
+    sink = AuditSink(tmp_path, segment_bytes=200, compress=True)
+    for i in range(50):
+        assert sink.submit({"i": i, "pad": "x" * 20})
+    sink.close()
+
+    segments = list_segments(tmp_path)
+    assert len(segments) > 1
+    assert all(p.suffix == ".gz" for _, p in segments[:-1])
+    with gzip.open(segments[0][1], "rt") as f:
+        assert '"i": 0' in f.readline()
+
+    assert [e["i"] for e in AuditLogReader(tmp_path)] == list(range(50))
+
+
+def test_reader_resumes_from_checkpoint(tmp_path):
+    sink = AuditSink(tmp_path, segment_bytes=150, compress=True)
+    for i in range(10):
+        sink.submit({"i": i})
+    sink.flush()
+
+    reader = AuditLogReader(tmp_path)
+    assert [e["i"] for e in reader] == list(range(10))
+    reader.commit()
+
+    for i in range(10, 25):
+        sink.submit({"i": i})
+    sink.close()
+
+    # Novo leitor: só eventos posteriores ao checkpoint, mesmo após compressão
+    assert [e["i"] for e in AuditLogReader(tmp_path)] == list(range(10, 25))
+
+
+def test_reader_skips_partial_trailing_line(tmp_path):
+    (tmp_path / "audit-00000001.jsonl").write_text('{"i": 1}\n{"i": ')
+    reader = AuditLogReader(tmp_path)
+    assert [e["i"] for e in reader] == [1]
+    assert reader.position == {"": (1, len('{"i": 1}\n'))}
+
+
+def test_processes_sharing_directory_write_separate_segments(tmp_path, monkeypatch):
+    sinks = []
+    for writer in ("host-101", "host-202"):
+        # Cada processo tem o seu escritor; a sequência é própria de cada um
+        monkeypatch.setattr(audit_sink, "_writer_id", lambda w=writer: w)
+        sink = AuditSink(tmp_path, segment_bytes=100, compress=False)
+        sink.submit({"w": writer, "i": 0})
+        sink.flush()
+        sinks.append(sink)
+    for i in range(1, 6):
+        for sink, writer in zip(sinks, ("host-101", "host-202")):
+            sink.submit({"w": writer, "i": i})
+    for sink in sinks:
+        sink.close()
+
+    by_writer = audit_sink.segments_by_writer(tmp_path)
+    assert set(by_writer) == {"host-101", "host-202"}
+    assert [seq for seq, _ in by_writer["host-101"]] == list(range(1, len(by_writer["host-101"]) + 1))
+
+    reader = AuditLogReader(tmp_path)
+    events = list(reader)
+    for writer in ("host-101", "host-202"):
+        assert [e["i"] for e in events if e["w"] == writer] == list(range(6))
+    reader.commit()
+    assert list(AuditLogReader(tmp_path)) == []
+
+
+def test_reader_accepts_legacy_checkpoint(tmp_path):
+    (tmp_path / "audit-00000001.jsonl").write_text('{"i": 1}\n{"i": 2}\n')
+    (tmp_path / "checkpoint.json").write_text('{"segment": 1, "offset": 9}')
+    assert [e["i"] for e in AuditLogReader(tmp_path)] == [2]
+
+
+def test_submit_drops_when_queue_full(tmp_path):
+    sink = AuditSink(tmp_path, queue_size=1)
+    sink._thread = object()  # simula escritora parada
+    assert sink.submit({"a": 1})
+    assert not sink.submit({"a": 2})
+    assert sink.dropped == 1
+
+
+def test_handler_serializes_log_records_in_writer_thread(tmp_path):
+    sink = AuditSink(tmp_path, formatter=JsonFormatter().format)
+    log = logging.getLogger("test.audit.sink")
+    log.propagate = False
+    log.addHandler(AuditSinkHandler(sink))
+    log.setLevel(logging.INFO)
+
+    log.info("ranked", {"case_id": "c1", "scores": {"x": np.float32(0.5), "n": np.int64(3)}})
+    log.info("feedback", extra={"case": "c1", "lawyer": "l1", "label": "won"})
+    sink.close()
+
+    events = list(AuditLogReader(tmp_path))
+    assert events[0]["context"]["scores"] == {"x": 0.5, "n": 3}
+    assert events[1]["message"] == "feedback"
+    assert events[1]["context"] == {"case": "c1", "lawyer": "l1", "label": "won"}
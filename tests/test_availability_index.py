@@ -0,0 +1,152 @@
+"""
+Testes para o índice de disponibilidade (bitmap Redis + snapshot local)
+"""
+import asyncio
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import redis.asyncio as aioredis
+
+from backend.services import availability_service
+from backend.services.availability_service import AvailabilityIndex, decode_bitmap, load_changed_availability
+from tests.test_geo_index import FakePostgrest
+
+
+def _bitmap(bits):
+    return np.packbits(np.array(bits, dtype=np.uint8)).tobytes()
+
+
+def test_decode_bitmap_uses_redis_bit_order():
+    index = {b"adv_a": b"0", b"adv_b": b"1", b"adv_c": b"9", b"adv_d": b"40"}
+    raw = _bitmap([1, 0, 0, 0, 0, 0, 0, 0, 0, 1])
+    assert decode_bitmap(index, raw) == {"adv_a": True, "adv_b": False, "adv_c": True, "adv_d": False}
+    assert decode_bitmap({}, None) == {}
+
+
+def test_snapshot_lookup_skips_redis():
+    index = AvailabilityIndex(redis_url="redis://invalid-host:1/0")
+    index.replace({"adv_a": True, "adv_b": False})
+    status = asyncio.run(index.get_status(["adv_a", "adv_b", "adv_novo"]))
+    assert status == {"adv_a": True, "adv_b": False}
+
+
+def test_pubsub_message_updates_snapshot():
+    index = AvailabilityIndex()
+    index.replace({"adv_a": True})
+    index._on_message(json.dumps({"adv_a": False, "adv_b": True}))
+    index._on_message("não é json")
+    assert index._snapshot == {"adv_a": False, "adv_b": True}
+
+
+def test_changed_rows_only_reports_differences():
+    index = AvailabilityIndex()
+    index.replace({"adv_a": True, "adv_b": False})
+    rows = [
+        {"id": "adv_a", "is_available": True, "updated_at": "2025-01-01T00:00:00"},
+        {"id": "adv_b", "is_available": True, "updated_at": "2025-01-02T00:00:00"},
+        {"id": "adv_c", "is_available": False, "updated_at": "2025-01-01T12:00:00"},
+    ]
+    assert index.changed_rows(rows) == {"adv_b": True, "adv_c": False}
+    assert (index.watermark, index.watermark_id) == ("2025-01-02T00:00:00", "adv_b")
+
+
+def test_availability_sync_is_paged_past_the_row_cap():
+    rows = [{"id": f"ADV{i:05d}", "is_available": i % 2 == 0, "updated_at": "2025-08-08T00:00:00+00:00"}
+            for i in range(2500)]
+    db = FakePostgrest(rows)
+    index = AvailabilityIndex()
+    index.replace({})
+    assert len(index.changed_rows(load_changed_availability(db, None))) == 2500
+    assert len(db.requests) == 3
+
+    rows[9]["updated_at"] = "2025-08-09T00:00:00+00:00"
+    rows[9]["is_available"] = True
+    changed = load_changed_availability(db, index.watermark, index.watermark_id)
+    assert index.changed_rows(changed) == {"ADV00009": True}
+
+
+def test_listen_retries_with_backoff_when_redis_is_down(monkeypatch):
+    attempts, delays = [], []
+
+    class FakePubSub:
+        async def subscribe(self, channel):
+            attempts.append(channel)
+            if len(attempts) <= 2:
+                raise ConnectionError("Redis fora do ar")
+            if len(attempts) == 4:
+                raise asyncio.CancelledError()
+
+        async def listen(self):
+            yield {"type": "message", "data": json.dumps({"adv_a": False})}
+            raise ConnectionError("conexão perdida")
+
+        async def unsubscribe(self, channel):
+            pass
+
+    class FakeClient:
+        def pubsub(self):
+            return FakePubSub()
+
+        async def close(self):
+            pass
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    async def fake_load():
+        index.replace({"adv_a": True})
+        return 1
+
+    index = AvailabilityIndex()
+    monkeypatch.setattr(aioredis, "from_url", lambda *a, **kw: FakeClient())
+    monkeypatch.setattr(availability_service.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(index, "load_snapshot", fake_load)
+
+    asyncio.run(index.listen())
+    # Duas falhas na partida (1s, 2s); após conectar o backoff volta a 1s
+    assert delays == [1.0, 2.0, 1.0]
+    assert index._snapshot == {"adv_a": False} and not index.ready
+
+
+def test_redis_failure_returns_empty_map():
+    """Sem snapshot e sem Redis o mapa vem vazio e o rank() entra em modo degradado."""
+    index = AvailabilityIndex(redis_url="redis://127.0.0.1:1/0")
+    assert asyncio.run(index.get_status(["adv_a"])) == {}
+
+
+# Ordem de import da API e do worker: backend.algoritmo_match antes de backend.services
+PRODUCTION_IMPORT_ORDER = """
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+import backend.algoritmo_match as am
+from backend.algoritmo_match import KPI, Case, Lawyer, MatchmakingAlgorithm
+from backend.services import availability_service
+
+assert am.get_lawyers_availability_status is availability_service.get_lawyers_availability_status
+availability_service.availability_index.replace({"L0": True, "L1": False, "L2": True, "L3": True})
+am.cache = MagicMock(mget_static_feats=AsyncMock(return_value={}), mset_static_feats=AsyncMock())
+
+lawyers = [Lawyer(id=f"L{i}", nome=f"Adv {i}", tags_expertise=["civil"], geo_latlon=(-23.55, -46.63),
+                  curriculo_json={}, kpi=KPI(success_rate=0.7, cases_30d=5, avaliacao_media=4.0,
+                                             tempo_resposta_h=10))
+           for i in range(4)]
+case = Case(id="c1", area="civil", subarea="x", urgency_h=24, coords=(-23.55, -46.63),
+            summary_embedding=np.ones(4, dtype=np.float32))
+ranked = asyncio.run(MatchmakingAlgorithm().rank(case, lawyers, top_n=4))
+print(",".join(sorted(lw.id for lw in ranked)))
+"""
+
+
+def test_rank_reads_availability_index_in_production_import_order():
+    """Interpretador novo: o ciclo algoritmo_match ↔ services não pode trocar o serviço por um mock."""
+    root = Path(__file__).resolve().parents[1]
+    out = subprocess.run([sys.executable, "-c", PRODUCTION_IMPORT_ORDER], cwd=root,
+                         capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr[-2000:]
+    assert out.stdout.strip().splitlines()[-1] == "L0,L2,L3"
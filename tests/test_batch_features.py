@@ -0,0 +1,214 @@
+"""
+Testes para o motor de features em lote (BatchFeatureCalculator)
+"""
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+from backend.algoritmo_match import (
+    FEATURE_KEYS, KPI, BatchFeatureCalculator, Case, DiversityMeta, FeatureCalculator,
+    Lawyer, MatchmakingAlgorithm, Parecer, Reconhecimento, haversine, haversine_many,
+    haversine_matrix
+)
+
+
+def make_lawyer(i: int, rng: np.random.Generator) -> Lawyer:
+    n_hist = int(rng.integers(0, 5))
+    outcomes = [bool(rng.integers(0, 2)) for _ in range(n_hist)]
+    if i % 3 == 0:
+        outcomes = outcomes[:-1]  # tamanho divergente → média simples
+    return Lawyer(
+        id=f"ADV{i}",
+        nome=f"Advogado {i}",
+        tags_expertise=["Trabalhista", "Civil"] if i % 2 else ["Civil"],
+        geo_latlon=(-23.55 + rng.normal(0, 0.3), -46.63 + rng.normal(0, 0.3)),
+        curriculo_json={
+            "anos_experiencia": int(rng.integers(0, 30)),
+            "num_publicacoes": int(rng.integers(0, 12)),
+            "pos_graduacoes": [{"nivel": "mestrado", "area": "Trabalhista"},
+                               {"nivel": "lato", "area": "Trabalhista"}][: i % 3],
+        },
+        kpi=KPI(
+            success_rate=float(rng.random()),
+            cases_30d=int(rng.integers(0, 40)),
+            avaliacao_media=float(rng.uniform(3, 5)),
+            tempo_resposta_h=int(rng.integers(1, 72)),
+            cv_score=float(rng.random()),
+            success_status=["V", "P", "N"][i % 3],
+        ),
+        kpi_subarea={"Trabalhista/Rescisão": 0.7} if i % 4 == 0 else {},
+        kpi_softskill=0.0 if i % 2 else 0.6,
+        review_texts=["Muito atencioso e profissional", "Top!", "nao recomendo, lento"][: i % 4],
+        case_outcomes=outcomes,
+        casos_historicos_embeddings=[rng.random(8) for _ in range(n_hist)],
+        pareceres=[Parecer("t", "r", "Trabalhista", "Rescisão", rng.random(8))] if i % 5 == 0 else [],
+        reconhecimentos=[Reconhecimento("ranking", "Chambers and Partners", 2024, "Trabalhista")]
+        if i % 6 == 0 else [],
+        diversity=DiversityMeta(gender="F" if i % 2 else "M"),
+    )
+
+
+@pytest.fixture
+def case():
+    return Case(
+        id="caso_batch",
+        area="Trabalhista",
+        subarea="Rescisão",
+        urgency_h=48,
+        coords=(-23.5505, -46.6333),
+        summary_embedding=np.random.default_rng(1).random(8),
+    )
+
+
+@pytest.fixture
+def lawyers():
+    rng = np.random.default_rng(42)
+    return [make_lawyer(i, rng) for i in range(40)]
+
+
+def test_batch_matches_per_lawyer_calculator(case, lawyers):
+    """O motor em lote deve reproduzir FeatureCalculator.all() advogado a advogado."""
+    batch_rows = BatchFeatureCalculator(case, lawyers).all()
+    for lw, row in zip(lawyers, batch_rows):
+        expected = FeatureCalculator(case, lw).all()
+        for key in FEATURE_KEYS:
+            assert row[key] == pytest.approx(float(expected[key]), abs=1e-9), (lw.id, key)
+
+
+def test_batch_empty_and_zero_urgency(case, lawyers):
+    assert BatchFeatureCalculator(case, []).matrix().shape == (0, len(FEATURE_KEYS))
+    case.urgency_h = 0
+    matrix = BatchFeatureCalculator(case, lawyers).matrix()
+    assert np.all(matrix[:, FEATURE_KEYS.index("U")] == 0)
+
+
+def test_case_similarity_skips_vectors_of_another_space(case, lawyers):
+    """Histórico/pareceres de outra dimensão são ignorados em vez de quebrar o vstack."""
+    same_space = lawyers[:10]
+    expected = BatchFeatureCalculator(case, same_space).case_similarity_many(case.summary_embedding[None, :])[0]
+    for lw in same_space:
+        if len(lw.case_outcomes) == len(lw.casos_historicos_embeddings):
+            lw.case_outcomes = lw.case_outcomes + [True]
+        lw.casos_historicos_embeddings = lw.casos_historicos_embeddings + [np.ones(384)]
+        lw.pareceres = lw.pareceres + [Parecer("t", "r", "Civil", "x", np.ones(384))]
+    sims = BatchFeatureCalculator(case, same_space).case_similarity_many(case.summary_embedding[None, :])[0]
+    np.testing.assert_allclose(sims, expected)
+
+
+def test_haversine_many_matches_scalar():
+    origin = (-23.5505, -46.6333)
+    lat = np.array([-22.9068, -23.5505, -15.78])
+    lon = np.array([-43.1729, -46.6333, -47.93])
+    expected = [haversine(origin, (a, b)) for a, b in zip(lat, lon)]
+    assert haversine_many(origin, lat, lon) == pytest.approx(expected)
+
+
+@pytest.mark.asyncio
+async def test_rank_uses_batch_scores(case, lawyers, monkeypatch):
+    fake_cache = MagicMock()
+    fake_cache.mget_static_feats = AsyncMock(return_value={})
+    fake_cache.mset_static_feats = AsyncMock()
+    monkeypatch.setattr("backend.algoritmo_match.cache", fake_cache)
+
+    ranking = await MatchmakingAlgorithm().rank(case, lawyers, top_n=5)
+    assert 0 < len(ranking) <= 5
+    for lw in ranking:
+        feats = lw.scores["features"]
+        assert set(feats) == set(FEATURE_KEYS)
+        assert lw.scores["ltr"] == pytest.approx(sum(lw.scores["delta"].values()))
+
+
+def _cases():
+    rng = np.random.default_rng(7)
+    specs = [("Trabalhista", "Rescisão", 48, "MEDIUM"), ("Civil", "Contratos", 0, "HIGH"),
+             ("Trabalhista", "Assédio", 12, "LOW"), ("Civil", "Contratos", 72, "MEDIUM")]
+    return [Case(id=f"caso_{k}", area=area, subarea=sub, urgency_h=urg, complexity=cx,
+                 coords=(-23.55 + rng.normal(0, 0.2), -46.63 + rng.normal(0, 0.2)),
+                 radius_km=30 + 10 * k, summary_embedding=rng.random(8))
+            for k, (area, sub, urg, cx) in enumerate(specs)]
+
+
+def test_tensor_matches_per_case_matrix(lawyers):
+    cases = _cases()
+    tensor = BatchFeatureCalculator(cases[0], lawyers).tensor(cases)
+    assert tensor.shape == (len(cases), len(lawyers), len(FEATURE_KEYS))
+    for k, case in enumerate(cases):
+        expected = BatchFeatureCalculator(case, lawyers).matrix()
+        assert tensor[k] == pytest.approx(expected, abs=1e-9), case.id
+
+
+def test_haversine_matrix_matches_rows():
+    origins = [(-23.5505, -46.6333), (-22.9068, -43.1729)]
+    lat = np.array([-22.9068, -23.5505, -15.78])
+    lon = np.array([-43.1729, -46.6333, -47.93])
+    dist = haversine_matrix(origins, lat, lon)
+    for k, origin in enumerate(origins):
+        assert dist[k] == pytest.approx(haversine_many(origin, lat, lon))
+
+
+@pytest.mark.asyncio
+async def test_rank_many_matches_rank_per_case(lawyers, monkeypatch):
+    fake_cache = MagicMock()
+    fake_cache.mget_static_feats = AsyncMock(return_value={})
+    fake_cache.mset_static_feats = AsyncMock()
+    monkeypatch.setattr("backend.algoritmo_match.cache", fake_cache)
+    availability = AsyncMock(side_effect=lambda ids: {i: True for i in ids})
+    monkeypatch.setattr("backend.algoritmo_match.get_lawyers_availability_status", availability)
+
+    # Mesma área: Q (estático por advogado) coincide entre os casos
+    cases = [c for c in _cases() if c.area == "Trabalhista"]
+    algo = MatchmakingAlgorithm()
+    batch = await algo.rank_many(cases, lawyers, top_n=5)
+    assert availability.await_count == 1
+    assert fake_cache.mget_static_feats.await_count == 1
+
+    for case, ranked in zip(cases, batch):
+        single = await algo.rank(case, lawyers, top_n=5)
+        assert [lw.id for lw in ranked] == [lw.id for lw in single]
+        for a, b in zip(ranked, single):
+            assert a.scores["ltr"] == pytest.approx(b.scores["ltr"])
+            assert a.scores["fair_base"] == pytest.approx(b.scores["fair_base"])
+
+
+@pytest.mark.asyncio
+async def test_rank_many_mixed_areas_matches_rank(lawyers, monkeypatch):
+    from backend.benchmarks.rank_bench import LocalStaticCache
+
+    static_cache = LocalStaticCache()
+    monkeypatch.setattr("backend.algoritmo_match.cache", static_cache)
+    availability = AsyncMock(side_effect=lambda ids: {i: True for i in ids})
+    monkeypatch.setattr("backend.algoritmo_match.get_lawyers_availability_status", availability)
+
+    # Q depende da área: o lote (e o cache que ele grava) não pode usar o Q do primeiro caso
+    cases = _cases()
+    algo = MatchmakingAlgorithm()
+    batch = await algo.rank_many(cases, lawyers, top_n=5)
+    q_col = FEATURE_KEYS.index("Q")
+    assert any(feats["Q:Trabalhista"] != feats["Q:Civil"] for feats in static_cache.data.values())
+
+    for case, ranked in zip(cases, batch):
+        single = await algo.rank(case, lawyers, top_n=5)
+        assert [lw.id for lw in ranked] == [lw.id for lw in single]
+        for a, b in zip(ranked, single):
+            assert a.scores["ltr"] == pytest.approx(b.scores["ltr"])
+            expected_q = BatchFeatureCalculator(case, [a]).matrix()[0, q_col]
+            assert a.scores["features"]["Q"] == pytest.approx(expected_q)
+
+
+@pytest.mark.asyncio
+async def test_rank_many_prefilter_by_area_and_radius(lawyers, monkeypatch):
+    fake_cache = MagicMock()
+    fake_cache.mget_static_feats = AsyncMock(return_value={})
+    fake_cache.mset_static_feats = AsyncMock()
+    monkeypatch.setattr("backend.algoritmo_match.cache", fake_cache)
+
+    cases = _cases()
+    batch = await MatchmakingAlgorithm().rank_many(cases, lawyers, top_n=40, prefilter=True)
+    assert len(batch) == len(cases)
+    for case, ranked in zip(cases, batch):
+        for lw in ranked:
+            assert case.area in lw.tags_expertise
+            assert haversine(case.coords, lw.geo_latlon) <= case.radius_km
+    assert await MatchmakingAlgorithm().rank_many([], lawyers) == []
+    assert await MatchmakingAlgorithm().rank_many(cases, []) == [[] for _ in cases]
@@ -0,0 +1,82 @@
+"""
+Testes para os geradores sintéticos e o comparador do benchmark de matching
+"""
+import copy
+
+import numpy as np
+import pytest
+
+from backend import algoritmo_match
+from backend.benchmarks import MatchDataGenerator, compare_results, format_report
+from backend.benchmarks.rank_bench import local_stubs, run_benchmark
+
+
+def test_generators_are_deterministic_per_seed():
+    a, b = MatchDataGenerator(seed=3, dim=16), MatchDataGenerator(seed=3, dim=16)
+    la, lb = a.lawyers(30), b.lawyers(30)
+    assert [lw.id for lw in la] == [lw.id for lw in lb]
+    assert [lw.geo_latlon for lw in la] == [lw.geo_latlon for lw in lb]
+    for x, y in zip(la, lb):
+        assert len(x.casos_historicos_embeddings) == len(y.casos_historicos_embeddings)
+        for ex, ey in zip(x.casos_historicos_embeddings, y.casos_historicos_embeddings):
+            np.testing.assert_array_equal(ex, ey)
+    assert [c.area for c in a.cases(10)] == [c.area for c in b.cases(10)]
+    assert [lw.geo_latlon for lw in MatchDataGenerator(seed=4, dim=16).lawyers(5)] != \
+        [lw.geo_latlon for lw in la[:5]]
+
+
+def test_generated_profiles_cover_rank_paths():
+    lawyers = MatchDataGenerator(seed=0, dim=16).lawyers(200)
+    assert any(lw.pareceres for lw in lawyers)
+    assert any(lw.reconhecimentos for lw in lawyers)
+    assert any(lw.kpi_subarea for lw in lawyers)
+    assert all(lw.diversity is not None for lw in lawyers)
+    assert all(lw.review_digest is not None for lw in lawyers)
+    assert all(lw.review_digest is None for lw in MatchDataGenerator(seed=0, dim=16, persisted_digests=False).lawyers(5))
+
+
+@pytest.mark.asyncio
+async def test_run_benchmark_schema_and_restores_stubs():
+    original = (algoritmo_match.cache, algoritmo_match.get_lawyers_availability_status)
+    report = await run_benchmark([20, 40], dim=16, iterations=3, alloc_iterations=1)
+    assert (algoritmo_match.cache, algoritmo_match.get_lawyers_availability_status) == original
+
+    assert report["meta"]["dim"] == 16
+    assert [r["candidates"] for r in report["results"]] == [20, 40]
+    for r in report["results"]:
+        assert r["throughput_rps"] > 0
+        assert r["latency_ms"]["p50"] <= r["latency_ms"]["p99"] <= r["latency_ms"]["max"]
+        assert r["alloc_peak_kb"] > 0
+        assert {"features", "fairness", "total"} <= set(r["stages_ms"])
+
+
+def test_local_stubs_availability_is_stable():
+    import asyncio
+
+    with local_stubs(availability_rate=0.5, seed=1):
+        status = algoritmo_match.get_lawyers_availability_status
+        first = asyncio.run(status([f"L{i}" for i in range(50)]))
+        second = asyncio.run(status([f"L{i}" for i in range(50)]))
+    assert first == second
+    assert 0 < sum(first.values()) < 50
+
+
+def _doc(p50, p99, rps, peak):
+    return {"meta": {"python": "3.11", "seed": 0},
+            "results": [{"candidates": 100, "throughput_rps": rps, "alloc_peak_kb": peak,
+                         "latency_ms": {"p50": p50, "p99": p99}}]}
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    base = _doc(10.0, 20.0, 100.0, 1000.0)
+    assert compare_results(base, _doc(8.0, 15.0, 130.0, 900.0)) == []
+    assert compare_results(base, _doc(11.0, 22.0, 95.0, 1100.0)) == []
+
+    regressions = compare_results(base, _doc(13.0, 20.0, 70.0, 1000.0))
+    assert {r["metric"] for r in regressions} == {"latency_p50", "throughput"}
+    assert compare_results(base, _doc(11.0, 20.0, 100.0, 1000.0), {"latency_p50": 0.05})
+
+    current = copy.deepcopy(base)
+    current["meta"]["python"] = "3.12"
+    report = format_report(base, current, [])
+    assert "3.11 → 3.12" in report and "Sem regressões" in report
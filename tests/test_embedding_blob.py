@@ -0,0 +1,73 @@
+"""
+Testes para o formato binário dos embeddings históricos
+"""
+import numpy as np
+import pytest
+
+from backend.embedding_blob import (
+    HEADER,
+    decode_blob,
+    encode_blob,
+    pack_embeddings,
+    unpack_embeddings,
+)
+from backend.services.lawyer_snapshot import hydrate_lawyer
+
+
+def _vectors(count=5, dim=384, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_float32_round_trip_is_zero_copy():
+    vecs = _vectors()
+    blob = pack_embeddings(vecs, dtype="float32")
+    assert len(blob) == HEADER.size + vecs.nbytes
+
+    matrix = unpack_embeddings(blob)
+    assert matrix.shape == (5, 384) and matrix.dtype == np.float32
+    np.testing.assert_array_equal(matrix, vecs)
+    assert np.shares_memory(matrix, np.frombuffer(blob, dtype=np.uint8))
+    assert not matrix.flags.writeable
+
+
+def test_float16_halves_payload_with_small_error():
+    vecs = _vectors()
+    blob = pack_embeddings(vecs.tolist(), dtype="float16")
+    assert len(blob) == HEADER.size + vecs.size * 2
+    matrix = unpack_embeddings(blob)
+    assert matrix.dtype == np.float16
+    cos = (matrix.astype(np.float32) * vecs).sum(1) / (
+        np.linalg.norm(matrix.astype(np.float32), axis=1) * np.linalg.norm(vecs, axis=1))
+    assert cos.min() > 0.999
+
+
+def test_empty_and_invalid_blobs():
+    assert unpack_embeddings(pack_embeddings([])).shape == (0, 0)
+    blob = pack_embeddings(_vectors(2, 8))
+    with pytest.raises(ValueError):
+        unpack_embeddings(blob[:-4])
+    with pytest.raises(ValueError):
+        unpack_embeddings(b"XXXX" + blob[4:])
+    with pytest.raises(ValueError):
+        pack_embeddings(_vectors(2, 8), dtype="float64")
+
+
+def test_postgrest_hex_round_trip():
+    blob = pack_embeddings(_vectors(3, 16))
+    assert decode_blob(encode_blob(blob)) == blob
+    assert decode_blob(None) is None
+
+
+def test_hydrate_prefers_blob_over_json():
+    vecs = _vectors(3, 16)
+    row = {"id": "L1", "nome": "Adv", "tags_expertise": ["civil"], "geo_latlon": [-23.5, -46.6],
+           "kpi": {"success_rate": 0.8, "cases_30d": 5, "avaliacao_media": 4.5, "tempo_resposta_h": 12},
+           "casos_historicos_embeddings": [[0.0] * 16],
+           "casos_historicos_blob": encode_blob(pack_embeddings(vecs))}
+    lawyer = hydrate_lawyer(row)
+    assert len(lawyer.casos_historicos_embeddings) == 3
+    np.testing.assert_array_equal(np.vstack(lawyer.casos_historicos_embeddings), vecs)
+    assert all(v.base is not None for v in lawyer.casos_historicos_embeddings)
+
+    row["casos_historicos_blob"] = "\\x00"  # blob corrompido → JSON
+    assert len(hydrate_lawyer(row).casos_historicos_embeddings) == 1
@@ -0,0 +1,129 @@
+"""
+Testes para o cache de embeddings por conteúdo e o batching multi-input
+"""
+import asyncio
+import importlib
+import json
+
+import httpx
+import numpy as np
+import pytest
+
+from backend.services.embedding_cache import EmbeddingCache, embedding_key, encode_cached
+from backend.services.embedding_service_parallel import ParallelEmbeddingService, pack_batches
+
+
+def _vec(text, dim=4):
+    return [float(len(text)), float(sum(map(ord, text)) % 97), 1.0, 0.0][:dim]
+
+
+def test_key_depends_on_text_model_and_dimension():
+    key = embedding_key("contrato", "m", 384)
+    assert key == embedding_key("contrato", "m", 384)
+    assert len({key, embedding_key("contrato ", "m", 384), embedding_key("contrato", "n", 384),
+                embedding_key("contrato", "m", 1536)}) == 4
+
+
+def test_lru_eviction_and_disk_tier(tmp_path):
+    cache = EmbeddingCache(max_entries=2, redis_url=None, disk_dir=str(tmp_path))
+    cache.set_many({"a": [1, 2], "b": [3, 4], "c": [5, 6]})
+    assert len(cache) == 2
+
+    # "a" saiu da memória, mas volta do disco e é promovido
+    found = cache.get_many(["a", "c", "zz"])
+    assert sorted(found) == ["a", "c"]
+    assert found["a"].tolist() == [1.0, 2.0] and found["a"].dtype == np.float32
+    assert not found["a"].flags.writeable
+
+    fresh = EmbeddingCache(redis_url=None, disk_dir=str(tmp_path))
+    assert fresh.get_many(["b"])["b"].tolist() == [3.0, 4.0]
+
+
+def test_unreachable_redis_degrades_to_memory(caplog):
+    cache = EmbeddingCache(redis_url="redis://127.0.0.1:1/0")
+    cache.set_many({"k": [1.0]})
+    assert cache.get_many(["k", "x"])["k"].tolist() == [1.0]
+    assert cache._redis_client() is None  # desligado até o próximo retry
+    assert "Redis indisponível" in caplog.text
+
+
+def test_encode_cached_encodes_only_new_unique_texts():
+    cache = EmbeddingCache(redis_url=None, disk_dir=None)
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([_vec(t) for t in texts])
+
+    out = encode_cached(["a", "bb", "a"], encode, model="m", dim=4, cache=cache)
+    assert out.shape == (3, 4) and out[0].tolist() == out[2].tolist() == _vec("a")
+    encode_cached(["bb", "ccc"], encode, model="m", dim=4, cache=cache)
+    assert calls == [["a", "bb"], ["ccc"]]
+
+
+def test_pack_batches_respects_item_and_token_limits():
+    texts = ["x" * 40] * 5 + ["y" * 400] + ["z"]
+    batches = pack_batches(texts, max_items=3, max_tokens=50)
+    assert [i for batch in batches for i in batch] == list(range(len(texts)))
+    assert all(len(b) <= 3 for b in batches)
+    assert [5] in batches  # texto grande sozinho no lote
+
+
+def test_parallel_batches_keep_input_order_and_isolate_failures():
+    requests = []
+
+    def handler(request):
+        inputs = json.loads(request.content)["input"]
+        requests.append(inputs)
+        if "boom" in inputs:
+            return httpx.Response(500)
+        data = [{"index": i, "embedding": _vec(t)} for i, t in enumerate(inputs)]
+        return httpx.Response(200, json={"data": list(reversed(data))})
+
+    service = ParallelEmbeddingService(max_items=2, transport=httpx.MockTransport(handler))
+    texts = ["a", "bb", "boom", "ccc", "dddd"]
+    result = asyncio.run(service.generate_embeddings_batch(texts))
+
+    assert len(requests) == 3 and all(len(r) <= 2 for r in requests)
+    assert result[0] == _vec("a") and result[1] == _vec("bb") and result[4] == _vec("dddd")
+    assert result[2] is None and result[3] is None
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    svc = importlib.import_module("backend.services.embedding_service")
+    monkeypatch.setattr(svc, "OPENAI_AVAILABLE", True)
+    monkeypatch.setattr(svc, "OPENAI_API_KEY", "test-key")
+    instance = svc.EmbeddingService(cache=EmbeddingCache(redis_url=None, disk_dir=None))
+    instance.local_enabled = True
+    return svc, instance
+
+
+def test_batch_embeddings_use_cache_and_single_local_encode(service, monkeypatch):
+    svc, instance = service
+    api_calls, encode_calls = [], []
+
+    class FakeParallel:
+        async def generate_embeddings_batch(self, texts):
+            api_calls.append(list(texts))
+            return [None if t.startswith("falha") else _vec(t) for t in texts]
+
+    class FakeLocal:
+        def encode(self, texts):
+            encode_calls.append(list(texts))
+            return np.ones((len(texts), instance.local_dim), dtype=np.float32)
+
+    monkeypatch.setattr(svc, "parallel_embedding_service", FakeParallel())
+    monkeypatch.setattr(svc, "local_model", FakeLocal())
+
+    texts = ["a", "falha 1", "bb", "a", "falha 2"]
+    first = asyncio.run(instance.generate_batch_embeddings(texts))
+    assert api_calls == [["a", "falha 1", "bb", "falha 2"]]
+    assert encode_calls == [["falha 1", "falha 2"]]
+    assert first[0] == first[3] == _vec("a") and first[2] == _vec("bb")
+    assert len(first[1]) == instance.local_dim and first[1][0] == 1.0
+
+    second = asyncio.run(instance.generate_batch_embeddings(["bb", "a", "falha 1"]))
+    assert api_calls[1:] == [["falha 1"]] and len(encode_calls) == 1
+    assert second == [first[2], first[0], first[1]]
@@ -0,0 +1,89 @@
+"""
+Testes para o registro de espaços de embedding e a projeção compartilhada
+"""
+import numpy as np
+import pytest
+
+from backend.services.embedding_space import (
+    LOCAL_SPACE,
+    OPENAI_SPACE,
+    EmbeddingProjector,
+    case_embedding,
+    infer_space,
+    space_for_model,
+    storage_tag,
+    to_shared,
+    to_shared_many,
+)
+
+
+def _cos(a, b):
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+@pytest.fixture(scope="module")
+def paired():
+    rng = np.random.default_rng(7)
+    # Textos "reais" num subespaço de 32 dims, vistos por dois modelos
+    latent = rng.normal(size=(400, 32))
+    local = latent @ rng.normal(size=(32, LOCAL_SPACE.dim)) + 0.01 * rng.normal(size=(400, LOCAL_SPACE.dim))
+    openai = latent @ rng.normal(size=(32, OPENAI_SPACE.dim))
+    return local.astype(np.float32), openai.astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def projector(paired):
+    local, openai = paired
+    return EmbeddingProjector(path=None).fit(local[:300], {OPENAI_SPACE.tag: (openai[:300], local[:300])},
+                                             n_components=48)
+
+
+def test_space_tags_and_legacy_padding():
+    assert space_for_model("sentence-transformers/all-MiniLM-L6-v2", 384) is LOCAL_SPACE
+    padded = np.r_[np.ones(384), np.zeros(1152)]
+    vec, space = infer_space(padded, OPENAI_SPACE.tag)
+    assert space is LOCAL_SPACE and vec.size == 384
+    assert storage_tag(np.ones(1536)) == "text-embedding-3-small/1536"
+    assert storage_tag(np.ones(7)) is None and storage_tag(None) is None
+
+
+def test_without_projection_vectors_stay_native():
+    unfitted = EmbeddingProjector(path=None)
+    out = to_shared_many([np.r_[np.ones(384), np.zeros(1152)], np.ones(384)], projector=unfitted)
+    assert [v.size for v in out] == [384, 384]
+    assert case_embedding({"summary_embedding": None}, unfitted).shape == (384,)
+    # Caso OpenAI sem projeção: fica no espaço nativo, comparável a advogados do mesmo espaço
+    row = {"summary_embedding": np.ones(1536).tolist(), "summary_embedding_space": OPENAI_SPACE.tag}
+    vec = case_embedding(row, unfitted)
+    assert vec.shape == (1536,) and vec.any()
+
+
+def test_projection_aligns_models_in_compact_space(paired, projector):
+    local, openai = paired
+    held_out = range(300, 400)
+    a = to_shared_many(local[300:], LOCAL_SPACE.tag, projector)
+    b = to_shared_many(openai[300:], OPENAI_SPACE.tag, projector)
+    assert a[0].size == 48  # 1536 → 48: 32× menos por produto interno
+    # O mesmo texto nos dois modelos cai no mesmo ponto do espaço compartilhado
+    assert np.mean([_cos(a[i], b[i]) for i in range(len(held_out))]) > 0.95
+    # e a vizinhança do espaço âncora é preservada
+    assert _cos(a[0], a[1]) == pytest.approx(_cos(local[300] - local[:300].mean(0),
+                                                  local[301] - local[:300].mean(0)), abs=0.05)
+
+
+def test_projection_roundtrips_through_disk(tmp_path, projector, paired):
+    path = str(tmp_path / "proj.npz")
+    projector.save(path)
+    loaded = EmbeddingProjector(path=path)
+    assert loaded.version == projector.version and loaded.dim == 48
+    vec = paired[1][0]
+    np.testing.assert_allclose(to_shared(vec, projector=loaded), to_shared(vec, projector=projector))
+
+
+def test_case_embedding_outside_comparison_space_is_zeroed(projector, caplog):
+    local_only = EmbeddingProjector(path=None).fit(np.random.default_rng(0).normal(size=(50, 384)),
+                                                   n_components=16)
+    row = {"id": "c1", "summary_embedding": np.ones(1536).tolist(),
+           "summary_embedding_space": OPENAI_SPACE.tag}
+    assert not case_embedding(row, local_only).any() and "feature S zerada" in caplog.text
+    assert case_embedding(row, projector).shape == (48,)
@@ -0,0 +1,103 @@
+"""
+Testes para o cache stale-while-revalidate do enriquecimento híbrido
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from backend.services.enrichment_cache import EnrichmentCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def mget(self, keys):
+        return [self.data.get(k) for k in keys]
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+class FakeEscavador:
+    """Fonte externa fake: conta chamadas e mede a concorrência máxima."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+
+    async def fetch(self, info):
+        self.calls += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        return {"source": "escavador", "id": info["id"]}
+
+
+def _cache(redis, source, **kwargs):
+    return EnrichmentCache(source.fetch, encode=dict, decode=dict, redis=redis, **kwargs)
+
+
+def _entry(value, age):
+    return json.dumps({"fetched_at": time.time() - age, "value": value})
+
+
+@pytest.mark.asyncio
+async def test_cold_miss_serves_fallback_and_refreshes_in_background():
+    redis, source = FakeRedis(), FakeEscavador()
+    cache = _cache(redis, source)
+    items = {"adv_1": {"id": "adv_1"}}
+
+    result = await cache.get_many(items, fallback=lambda lid: {"source": "database", "id": lid})
+    assert result["adv_1"]["source"] == "database"
+    assert source.calls == 0  # nada externo no caminho da requisição
+
+    await cache.drain()
+    assert source.calls == 1
+    result = await cache.get_many(items, fallback=lambda lid: None)
+    assert result["adv_1"]["source"] == "escavador"
+    assert cache.stats["fresh"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_is_served_then_revalidated():
+    redis, source = FakeRedis(), FakeEscavador()
+    cache = _cache(redis, source, soft_ttl=60)
+    redis.data["enrich:lawyer:adv_1"] = _entry({"source": "antigo"}, age=120)
+    redis.data["enrich:lawyer:adv_2"] = _entry({"source": "recente"}, age=10)
+
+    items = {lid: {"id": lid} for lid in ("adv_1", "adv_2")}
+    result = await cache.get_many(items, fallback=lambda lid: None)
+    assert result == {"adv_1": {"source": "antigo"}, "adv_2": {"source": "recente"}}
+
+    await cache.drain()
+    assert source.calls == 1
+    assert json.loads(redis.data["enrich:lawyer:adv_1"])["value"]["source"] == "escavador"
+
+
+@pytest.mark.asyncio
+async def test_refresh_concurrency_and_queue_are_bounded():
+    redis, source = FakeRedis(), FakeEscavador()
+    cache = _cache(redis, source, concurrency=3, max_pending=50)
+    items = {f"adv_{i}": {"id": f"adv_{i}"} for i in range(200)}
+
+    await cache.get_many(items, fallback=lambda lid: None)
+    # Requisição repetida não duplica coletas pendentes
+    await cache.get_many(items, fallback=lambda lid: None)
+    await cache.drain()
+    assert source.calls == 50
+    assert source.max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_without_fetch_only_fallback_is_served():
+    redis = FakeRedis()
+    cache = EnrichmentCache(None, encode=dict, decode=dict, redis=redis)
+    result = await cache.get_many({"adv_1": {"id": "adv_1"}}, fallback=lambda lid: {"db": True})
+    assert result == {"adv_1": {"db": True}}
+    assert not cache._pending
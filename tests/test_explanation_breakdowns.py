@@ -0,0 +1,162 @@
+"""
+Testes para as explicações servidas do breakdown persistido (sem re-ranking)
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+from backend import algoritmo_match
+from backend.algoritmo_match import KPI, Case, Lawyer, MatchmakingAlgorithm
+from backend.services import explanation_service as svc
+from backend.services.match_outbox import match_records
+
+
+def _lawyer(i, area="civil"):
+    return Lawyer(id=f"L{i}", nome=f"Adv {i}", tags_expertise=[area],
+                  geo_latlon=(-23.55, -46.63 + i / 100), curriculo_json={"anos_experiencia": 5 + i},
+                  kpi=KPI(success_rate=0.5 + i / 20, cases_30d=5, avaliacao_media=4.0,
+                          tempo_resposta_h=10),
+                  last_offered_at=123.0)
+
+
+CASE = Case(id="c1", area="civil", subarea="x", urgency_h=24, coords=(-23.55, -46.63),
+            summary_embedding=np.ones(4, dtype=np.float32))
+
+
+class FakeTable:
+    def __init__(self, db, name):
+        self.db, self.name, self.filters = db, name, {}
+
+    def select(self, *_):
+        return self
+
+    def eq(self, col, val):
+        self.filters[col] = {val}
+        return self
+
+    def in_(self, col, vals):
+        self.filters[col] = set(vals)
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def execute(self):
+        self.db.calls.append(self.name)
+        rows = [r for r in self.db.tables.get(self.name, [])
+                if all(str(r.get(c)) in {str(v) for v in vals} for c, vals in self.filters.items())]
+        return SimpleNamespace(data=rows[0] if getattr(self, "one", False) and rows else
+                               (None if getattr(self, "one", False) else rows))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = SimpleNamespace(tables={}, calls=[])
+    fake.table = lambda name: FakeTable(fake, name)
+    monkeypatch.setattr(svc, "supabase", fake)
+    svc._computed.clear()
+    return fake
+
+
+def test_explain_matches_rank_breakdown_without_side_effects(monkeypatch):
+    fake_cache = MagicMock()
+    fake_cache.mget_static_feats = AsyncMock(return_value={})
+    fake_cache.mset_static_feats = AsyncMock()
+    monkeypatch.setattr(algoritmo_match, "cache", fake_cache)
+    availability = AsyncMock(return_value={})
+    monkeypatch.setattr(algoritmo_match, "get_lawyers_availability_status", availability)
+
+    lawyers = [_lawyer(i) for i in range(4)]
+    algo = MatchmakingAlgorithm()
+    explained = {e["lawyer_id"]: e for e in algo.explain(CASE, lawyers)}
+    assert availability.await_count == 0 and fake_cache.mset_static_feats.await_count == 0
+    assert all(lw.last_offered_at == 123.0 and not lw.scores for lw in lawyers)
+
+    ranked = asyncio.run(algo.rank(CASE, lawyers, top_n=4))
+    for lw in ranked:
+        e = explained[lw.id]
+        assert e["features"] == pytest.approx(lw.scores["features"])
+        assert e["delta"] == pytest.approx(lw.scores["delta"])
+        assert e["weights_version"] == lw.scores["weights_version"]
+
+
+def test_rank_scores_persist_weights_and_scores():
+    lw = _lawyer(1)
+    scores = {"features": {"A": 1.0}, "delta": {"A": 0.3}, "ltr": 0.7, "fair_base": 0.72,
+              "equity_raw": 0.4, "weights_used": {"A": 0.3}, "weights_version": "abc", "preset": "fast"}
+    lw.scores = scores
+    record = match_records("c1", [lw])[0]
+    assert (record["raw_score"], record["fair_score"], record["equity_score"]) == (0.7, 0.72, 0.4)
+    assert record["weights_version"] == "abc" and record["weights_used"] == {"A": 0.3}
+
+
+def _persisted_row(lawyer_id, version, preset="balanced"):
+    return {
+        "case_id": "c1", "lawyer_id": lawyer_id, "raw_score": 0.6, "fair_score": 0.65,
+        "features": {k: 0.5 for k in "ASTGQURC"}, "breakdown": {"A": 0.15},
+        "weights_used": {"A": 0.3}, "weights_version": version, "preset_used": preset,
+    }
+
+
+def _ranked_version(preset="balanced", complexity="MEDIUM"):
+    weights = MatchmakingAlgorithm._base_weights(preset, None)
+    case = Case(id="c1", area="civil", subarea="x", urgency_h=24, coords=(0.0, 0.0), complexity=complexity)
+    return algoritmo_match.weights_fingerprint(MatchmakingAlgorithm.apply_dynamic_weights(case, weights))
+
+
+def test_breakdowns_served_from_case_matches(db, monkeypatch):
+    db.tables["case_matches"] = [_persisted_row("L1", _ranked_version(complexity="HIGH"))]
+    explain = MagicMock(side_effect=AssertionError("não deve recalcular"))
+    monkeypatch.setattr(svc.algo, "explain", explain)
+
+    result = asyncio.run(svc.get_match_breakdowns("c1", ["L1"]))
+    assert result["L1"]["source"] == "persisted"
+    assert result["L1"]["fair_score"] == 0.65
+    assert db.calls == ["case_matches"]
+
+
+def test_stale_or_other_preset_rows_are_recomputed(db, monkeypatch):
+    db.tables["cases"] = [{"id": "c1", "area": "civil", "subarea": "x", "urgency_h": 24,
+                           "coords": [-23.55, -46.63], "summary_embedding": [1.0, 1.0, 1.0, 1.0]}]
+    db.tables["case_matches"] = [_persisted_row("L0", "pesos-antigos"),
+                                 _persisted_row("L1", _ranked_version("fast"), preset="fast"),
+                                 _persisted_row("L2", _ranked_version())]
+    lawyers = {f"L{i}": _lawyer(i) for i in range(3)}
+    monkeypatch.setattr(svc, "_load_lawyers", lambda ids: [lawyers[i] for i in ids if i in lawyers])
+
+    result = asyncio.run(svc.get_match_breakdowns("c1", ["L0", "L1", "L2"]))
+    assert {lid: r["source"] for lid, r in result.items()} == {
+        "L0": "computed", "L1": "computed", "L2": "persisted"}
+    assert result["L1"]["preset"] == "balanced"
+
+    fast = asyncio.run(svc.get_match_breakdowns("c1", ["L1"], preset="fast"))
+    assert fast["L1"]["source"] == "persisted"
+
+
+def test_missing_lawyers_are_recomputed_once_per_weights_version(db, monkeypatch):
+    db.tables["cases"] = [{"id": "c1", "area": "civil", "subarea": "x", "urgency_h": 24,
+                           "coords": [-23.55, -46.63], "summary_embedding": [1.0, 1.0, 1.0, 1.0]}]
+    lawyers = {f"L{i}": _lawyer(i) for i in range(3)}
+    monkeypatch.setattr(svc, "_load_lawyers", lambda ids: [lawyers[i] for i in ids if i in lawyers])
+    spy = MagicMock(wraps=svc.algo.explain)
+    monkeypatch.setattr(svc.algo, "explain", spy)
+
+    first = asyncio.run(svc.get_match_breakdowns("c1", ["L0", "L2", "unknown"]))
+    assert list(first) == ["L0", "L2"]
+    assert first["L0"]["source"] == "computed"
+    asyncio.run(svc.get_match_breakdowns("c1", ["L0", "L2"]))
+    assert spy.call_count == 1
+
+    # Pesos novos → nova versão → recalcula
+    monkeypatch.setattr(MatchmakingAlgorithm, "_base_weights",
+                        staticmethod(lambda preset, mv: {**algoritmo_match.DEFAULT_WEIGHTS, "A": 0.9}))
+    asyncio.run(svc.get_match_breakdowns("c1", ["L0"]))
+    assert spy.call_count == 2
+
+
+def test_unknown_case_returns_none(db):
+    assert asyncio.run(svc.get_match_breakdowns("nope", ["L1"])) is None
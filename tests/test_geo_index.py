@@ -0,0 +1,163 @@
+"""
+Testes para o índice geoespacial em memória (backend/services/geo_index.py)
+"""
+import re
+
+import numpy as np
+import pytest
+
+from backend.algoritmo_match import haversine
+from backend.services.geo_index import GeoGridIndex, bounding_box, load_changed_lawyers, parse_latlon
+from backend.services.supabase_paging import fetch_all_rows, fetch_by_ids
+
+SP = (-23.5505, -46.6333)
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(0)
+    idx = GeoGridIndex(cell_deg=0.25)
+    for i in range(2000):
+        lat, lon = SP[0] + rng.normal(0, 1.5), SP[1] + rng.normal(0, 1.5)
+        idx.upsert(f"ADV{i}", lat, lon, ["Trabalhista"] if i % 2 else ["Civil"])
+    return idx
+
+
+def test_query_radius_matches_brute_force(index):
+    result = index.query_radius(SP[0], SP[1], 50)
+    expected = {lid for lid, pt in index._points.items() if haversine(SP, pt) <= 50}
+    assert {lid for lid, _ in result} == expected
+    dists = [d for _, d in result]
+    assert dists == sorted(dists)
+
+
+def test_query_radius_filters_by_area(index):
+    result = index.query_radius(SP[0], SP[1], 80, area="Trabalhista")
+    assert result
+    assert all("Trabalhista" in index._tags[lid] for lid, _ in result)
+
+
+def test_apply_rows_moves_and_removes(index):
+    index.apply_rows([
+        {"id": "NEW", "geo_latlon": [SP[0], SP[1]], "tags_expertise": ["Civil"], "updated_at": "2025-08-08T10:00:00"},
+        {"id": "ADV1", "geo_latlon": "(-43.17,-22.90)", "updated_at": "2025-08-08T11:00:00"},
+        {"id": "ADV2", "geo_latlon": None, "updated_at": "2025-08-08T09:00:00"},
+    ])
+    near = {lid for lid, _ in index.query_radius(SP[0], SP[1], 1)}
+    assert "NEW" in near
+    assert index._points["ADV1"] == pytest.approx((-22.90, -43.17))
+    assert "ADV2" not in index._points
+    assert index.watermark == "2025-08-08T11:00:00"
+
+
+def test_nearby_ids_none_until_ready(index):
+    assert index.nearby_ids(SP, 10) is None
+    index.ready = True
+    assert isinstance(index.nearby_ids(SP, 10), list)
+
+
+def test_bounding_box_contains_circle():
+    import math
+    lat_min, lat_max, lon_min, lon_max = bounding_box(SP[0], SP[1], 100)
+    # Pontos sobre o círculo de 100 km (fórmula de destino por azimute)
+    ang = 100 / 6371.0
+    lat1, lon1 = math.radians(SP[0]), math.radians(SP[1])
+    for bearing in np.linspace(0, 2 * math.pi, 360):
+        lat2 = math.asin(math.sin(lat1) * math.cos(ang) + math.cos(lat1) * math.sin(ang) * math.cos(bearing))
+        lon2 = lon1 + math.atan2(math.sin(bearing) * math.sin(ang) * math.cos(lat1),
+                                 math.cos(ang) - math.sin(lat1) * math.sin(lat2))
+        assert lat_min - 1e-9 <= math.degrees(lat2) <= lat_max + 1e-9
+        assert lon_min - 1e-9 <= math.degrees(lon2) <= lon_max + 1e-9
+
+
+def test_parse_latlon_formats():
+    assert parse_latlon({"latitude": 1, "longitude": 2}) == (1.0, 2.0)
+    assert parse_latlon({"geo_latlon": [1, 2]}) == (1.0, 2.0)
+    assert parse_latlon({"geo_latlon": "(2,1)"}) == (1.0, 2.0)
+    assert parse_latlon({}) is None
+
+
+class FakePostgrest:
+    """PostgREST em memória que, como o real, corta respostas em ``max_rows``."""
+
+    def __init__(self, rows, max_rows=1000):
+        self.rows, self.max_rows, self.requests = rows, max_rows, []
+
+    def table(self, name):
+        return _FakeQuery(self)
+
+
+class _FakeQuery:
+    def __init__(self, db):
+        self.db, self.preds, self.n = db, [], None
+
+    def select(self, columns):
+        return self
+
+    def gte(self, col, value):
+        self.preds.append(lambda r: r[col] >= value)
+        return self
+
+    def gt(self, col, value):
+        self.preds.append(lambda r: r[col] > value)
+        return self
+
+    def eq(self, col, value):
+        self.preds.append(lambda r: r.get(col) == value)
+        return self
+
+    def in_(self, col, values):
+        self.preds.append(lambda r: r[col] in set(values))
+        return self
+
+    def or_(self, expr):
+        ts, _, last_id = re.findall(r'"([^"]*)"', expr)
+        self.preds.append(lambda r: (r["updated_at"], r["id"]) > (ts, last_id))
+        return self
+
+    def order(self, col, desc=False):
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        self.db.requests.append(self)
+        rows = sorted((r for r in self.db.rows if all(p(r) for p in self.preds)),
+                      key=lambda r: (r["updated_at"], r["id"]))
+        return type("Resp", (), {"data": rows[:min(self.n or self.db.max_rows, self.db.max_rows)]})()
+
+
+def test_changed_lawyers_are_paged_past_the_row_cap():
+    # Backfill: todas as linhas com o mesmo updated_at
+    rows = [{"id": f"ADV{i:05d}", "geo_latlon": [SP[0], SP[1]], "tags_expertise": ["Civil"],
+             "updated_at": "2025-08-08T00:00:00+00:00"} for i in range(2500)]
+    db = FakePostgrest(rows)
+    index = GeoGridIndex()
+    assert index.apply_rows(load_changed_lawyers(db, None)) == 2500 and len(index) == 2500
+
+    rows[7]["updated_at"] = "2025-08-09T00:00:00+00:00"
+    rows[7]["geo_latlon"] = [-22.90, -43.17]
+    assert index.watermark_id == "ADV02499"
+    changed = load_changed_lawyers(db, index.watermark, index.watermark_id)
+    assert [r["id"] for r in changed] == ["ADV00007"]
+    index.apply_rows(changed)
+    assert index._points["ADV00007"] == pytest.approx((-22.90, -43.17))
+    assert index.watermark == "2025-08-09T00:00:00+00:00"
+
+
+def test_fetch_all_rows_pages_by_key():
+    rows = [{"id": f"R{i:05d}", "lawyer_id": f"L{i % 7}", "updated_at": ""} for i in range(2300)]
+    db = FakePostgrest(rows)
+    got = fetch_all_rows(db, "reviews", "id, lawyer_id")
+    assert [r["id"] for r in got] == [r["id"] for r in rows]
+    assert len(db.requests) == 3
+
+
+def test_fetch_by_ids_chunks_in_filter():
+    rows = [{"id": f"L{i}", "is_available": i % 2 == 0, "updated_at": ""} for i in range(450)]
+    db = FakePostgrest(rows)
+    got = fetch_by_ids(db, "lawyers", [r["id"] for r in rows], chunk=200,
+                       filters=lambda q: q.eq("is_available", True))
+    assert len(got) == 225 and len(db.requests) == 3
@@ -0,0 +1,127 @@
+"""
+Testes para o snapshot de advogados e o rank() sem mutação dos candidatos
+"""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+from backend import algoritmo_match
+from backend.algoritmo_match import Case, MatchmakingAlgorithm
+from backend.services.lawyer_snapshot import LawyerSnapshotStore, load_changed_lawyer_rows
+from tests.test_geo_index import FakePostgrest
+
+
+def _row(i, updated_at="2025-01-01T00:00:00", **extra):
+    row = {
+        "id": f"adv_{i}",
+        "nome": f"Advogado {i}",
+        "tags_expertise": ["civil"],
+        "geo_latlon": [-23.55 + i * 0.01, -46.63],
+        "curriculo_json": {"anos_experiencia": 5 + i},
+        "kpi": {"success_rate": 0.5 + i * 0.05, "cases_30d": i, "avaliacao_media": 4.0,
+                "tempo_resposta_h": 12},
+        "casos_historicos_embeddings": [[0.1 * i, 0.2, 0.3]],
+        "case_outcomes": [True],
+        "is_available": True,
+        "updated_at": updated_at,
+    }
+    row.update(extra)
+    return row
+
+
+def test_apply_rows_hydrates_once_per_version():
+    store = LawyerSnapshotStore()
+    store.apply_rows([_row(1), _row(2)])
+    first = store.get("adv_1")
+    emb = first.lawyer.casos_historicos_embeddings[0]
+    assert emb.dtype == np.float32 and not emb.flags.writeable
+
+    assert store.apply_rows([_row(1)]) == 0
+    assert store.get("adv_1") is first
+
+    store.apply_rows([_row(1, updated_at="2025-02-01T00:00:00", nome="Novo Nome")])
+    assert store.get("adv_1").lawyer.nome == "Novo Nome"
+    assert store.watermark == "2025-02-01T00:00:00"
+
+    store.apply_rows([_row(2, updated_at="2025-03-01T00:00:00", ativo=False)])
+    records, missing = store.get_many(["adv_1", "adv_2", "adv_9"])
+    assert [r.lawyer.id for r in records] == ["adv_1"]
+    assert missing == ["adv_2", "adv_9"]
+
+
+def test_changed_rows_are_paged_and_deleted_lawyers_pruned():
+    rows = [_row(i, updated_at="2025-08-08T00:00:00+00:00") for i in range(2500)]
+    db = FakePostgrest(rows)
+    store = LawyerSnapshotStore()
+    assert store.apply_rows(load_changed_lawyer_rows(db, None)) == 2500 and len(store) == 2500
+    assert (store.watermark, store.watermark_id) == ("2025-08-08T00:00:00+00:00", "adv_999")
+
+    rows[3]["updated_at"] = "2025-08-09T00:00:00+00:00"
+    assert [r["id"] for r in load_changed_lawyer_rows(db, store.watermark, store.watermark_id)] == ["adv_3"]
+
+    # Exclusões não passam pelo feed: a poda mantém só os IDs ativos
+    assert store.retain(f"adv_{i}" for i in range(10)) == 2490
+    assert store.get_many(["adv_1", "adv_10"])[1] == ["adv_10"]
+
+
+def test_rows_fetched_by_id_do_not_advance_the_feed_watermark():
+    rows = [_row(1, updated_at="2025-01-10T00:00:00"), _row(2, updated_at="2025-01-10T00:00:00")]
+    db = FakePostgrest(rows)
+    store = LawyerSnapshotStore()
+
+    # Fallback antes da carga inicial não pode torná-la incremental
+    store.put_rows([_row(3, updated_at="2025-01-20T00:00:00")])
+    assert store.watermark is None
+    store.apply_rows(load_changed_lawyer_rows(db, store.watermark, store.watermark_id))
+    assert store.watermark == "2025-01-10T00:00:00"
+
+    # A (t20) é buscado por ID numa requisição; depois B muda em t15
+    rows[0]["updated_at"] = "2025-01-20T00:00:00"
+    store.put_rows([dict(rows[0])])
+    assert store.get("adv_1").version == "2025-01-20T00:00:00"
+    rows[1].update(updated_at="2025-01-15T00:00:00", nome="B novo")
+
+    store.apply_rows(load_changed_lawyer_rows(db, store.watermark, store.watermark_id))
+    assert store.get("adv_2").lawyer.nome == "B novo"
+    assert store.watermark == "2025-01-20T00:00:00"
+
+
+def test_get_versions_treats_stale_records_as_missing():
+    store = LawyerSnapshotStore()
+    store.apply_rows([_row(1), _row(2)])
+    records, stale = store.get_versions({"adv_1": "2025-01-01T00:00:00", "adv_2": "2025-05-01T00:00:00"})
+    assert [r.lawyer.id for r in records] == ["adv_1"]
+    assert stale == ["adv_2"]
+
+
+def test_concurrent_ranks_share_snapshot_without_mutation(monkeypatch):
+    fake_cache = MagicMock()
+    fake_cache.mget_static_feats = AsyncMock(return_value={})
+    fake_cache.mset_static_feats = AsyncMock()
+    monkeypatch.setattr(algoritmo_match, "cache", fake_cache)
+
+    store = LawyerSnapshotStore()
+    store.apply_rows([_row(i) for i in range(6)])
+    lawyers = [rec.lawyer for rec in store.get_many([f"adv_{i}" for i in range(6)])[0]]
+    before = [(lw.last_offered_at, dict(lw.scores)) for lw in lawyers]
+
+    case_a = Case(id="a", area="civil", subarea="contratos", urgency_h=24, coords=(-23.55, -46.63),
+                  summary_embedding=np.array([0.1, 0.2, 0.3], dtype=np.float32))
+    case_b = Case(id="b", area="civil", subarea="contratos", urgency_h=24, coords=(-23.60, -46.63),
+                  complexity="HIGH", summary_embedding=np.array([0.5, 0.2, 0.1], dtype=np.float32))
+    algo = MatchmakingAlgorithm()
+
+    async def both():
+        return await asyncio.gather(algo.rank(case_a, lawyers, top_n=3),
+                                    algo.rank(case_b, lawyers, top_n=3))
+
+    ranked_a, ranked_b = asyncio.run(both())
+    assert [(lw.last_offered_at, dict(lw.scores)) for lw in lawyers] == before
+    for ranked in (ranked_a, ranked_b):
+        assert ranked and all("fair_base" in lw.scores for lw in ranked)
+        assert all(lw is not store.get(lw.id).lawyer for lw in ranked)
+    assert ranked_a[0].scores["complexity"] == "MEDIUM"
+    assert ranked_b[0].scores["complexity"] == "HIGH"
+    assert ranked_a[0].scores["ltr"] == pytest.approx(sum(ranked_a[0].scores["delta"].values()))
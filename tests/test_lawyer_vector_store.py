@@ -0,0 +1,175 @@
+"""
+Testes para o vector store de advogados (backend/services/lawyer_vector_store.py)
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from backend.algoritmo_match import KPI, BatchFeatureCalculator, Case, FeatureCalculator, Lawyer, Parecer
+from backend.services.lawyer_vector_store import IVFIndex, LawyerVectorStore, l2_normalize
+
+
+def make_lawyer(i: int, rng: np.random.Generator, dim: int = 16) -> Lawyer:
+    n_hist = i % 4
+    return Lawyer(
+        id=f"ADV{i}",
+        nome=f"Advogado {i}",
+        tags_expertise=["Civil"],
+        geo_latlon=(-23.55, -46.63),
+        curriculo_json={},
+        kpi=KPI(success_rate=0.8, cases_30d=10, avaliacao_media=4.5, tempo_resposta_h=12),
+        case_outcomes=[bool(j % 2) for j in range(n_hist)],
+        casos_historicos_embeddings=[rng.normal(size=dim) for _ in range(n_hist)],
+        pareceres=[Parecer("t", "r", "Civil", "x", rng.normal(size=dim)) for _ in range(i % 3)],
+    )
+
+
+@pytest.fixture
+def case():
+    return Case(id="c1", area="Civil", subarea="x", urgency_h=24, coords=(-23.55, -46.63),
+                summary_embedding=np.random.default_rng(7).normal(size=16))
+
+
+def test_store_similarity_matches_feature_calculator(case):
+    rng = np.random.default_rng(3)
+    lawyers = [make_lawyer(i, rng) for i in range(30)]
+    store = LawyerVectorStore()
+    store.ensure(lawyers)
+
+    sims = BatchFeatureCalculator(case, lawyers, vector_store=store).case_similarity()
+    expected = [FeatureCalculator(case, lw).case_similarity() for lw in lawyers]
+    assert sims == pytest.approx(expected, abs=1e-5)
+
+
+def test_store_rebuilds_only_changed_entries(case):
+    rng = np.random.default_rng(5)
+    lawyer = make_lawyer(1, rng)
+    store = LawyerVectorStore()
+    store.ensure([lawyer])
+    first = store._entries[lawyer.id]
+
+    store.ensure([lawyer])
+    assert store._entries[lawyer.id] is first
+
+    lawyer.casos_historicos_embeddings.append(rng.normal(size=16))
+    lawyer.case_outcomes.append(True)
+    store.ensure([lawyer])
+    assert store._entries[lawyer.id] is not first
+
+    store.invalidate([lawyer.id])
+    second = store._entries[lawyer.id]
+    store.ensure([lawyer])
+    assert store._entries[lawyer.id] is not second
+
+
+def test_store_returns_none_for_unknown_lawyer(case):
+    assert LawyerVectorStore().case_similarity(case.summary_embedding, ["nope"]) is None
+
+
+def test_ivf_index_finds_nearest_neighbours():
+    rng = np.random.default_rng(11)
+    data = l2_normalize(rng.normal(size=(600, 16)))
+    index = IVFIndex(nlist=8, nprobe=4)
+    for i, vec in enumerate(data):
+        index.add(f"k{i}", vec)
+    assert index.is_trained
+
+    query = data[42] + 0.01 * rng.normal(size=16)
+    results = index.search(query, k=5)
+    assert results[0][0] == "k42"
+    assert [s for _, s in results] == sorted((s for _, s in results), reverse=True)
+
+    index.remove("k42")
+    assert all(key != "k42" for key, _ in index.search(query, k=5))
+    assert len(index) == 599
+
+
+def test_injected_empty_index_is_kept():
+    index = IVFIndex(nlist=2, nprobe=1)
+    store = LawyerVectorStore(index=index)
+    assert store.index is index
+    rng = np.random.default_rng(13)
+    store.ensure([make_lawyer(i, rng) for i in range(1, 12)])
+    assert store.top_k(rng.normal(size=16), k=3)
+    assert len(index) > 0
+
+
+def test_ensure_does_not_touch_ivf_index(case):
+    rng = np.random.default_rng(17)
+    store = LawyerVectorStore(index=IVFIndex(nlist=2, nprobe=1))
+    store.ensure([make_lawyer(i, rng) for i in range(40)])
+    assert len(store.index) == 0 and not store.index.is_trained
+
+    assert store.top_k(case.summary_embedding, k=5)
+    assert store.index.is_trained
+
+
+def test_mixed_dimensions_are_grouped(case):
+    """Histórico MiniLM (384) e OpenAI (1536) no mesmo pool não derrubam o rank nem o IVF."""
+    rng = np.random.default_rng(19)
+    lawyers = []
+    for i in range(260):
+        lw = make_lawyer(i, rng, dim=384 if i % 2 else 1536)
+        if i % 5 == 0:
+            lw.casos_historicos_embeddings.append(rng.normal(size=16))
+            lw.case_outcomes.append(True)
+            lw.pareceres.append(Parecer("t", "r", "Civil", "x", rng.normal(size=16)))
+        lawyers.append(lw)
+    store = LawyerVectorStore(index=IVFIndex(nlist=4, nprobe=2))
+    store.ensure(lawyers)
+
+    sims = BatchFeatureCalculator(case, lawyers, vector_store=store).case_similarity()
+    expected = BatchFeatureCalculator(case, lawyers).case_similarity()
+    assert sims == pytest.approx(expected, abs=1e-5)
+
+    for dim in (16, 384, 1536):
+        results = store.top_k(rng.normal(size=dim), k=5)
+        assert len(results) == 5
+        assert all(store._entries[key].hist_centroids.get(dim) is not None for key, _ in results)
+    assert store.top_k(rng.normal(size=8), k=5) == []
+
+
+def test_ivf_index_rejects_other_dimension():
+    index = IVFIndex(nlist=2)
+    index.add("a", np.ones(4))
+    with pytest.raises(ValueError):
+        index.add("b", np.ones(8))
+    assert index.search(np.ones(8)) == []
+
+
+PRODUCTION_IMPORT_ORDER = """
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+import backend.algoritmo_match as am
+from backend.algoritmo_match import KPI, Case, Lawyer, MatchmakingAlgorithm
+from backend.services import lawyer_vector_store as lvs
+
+assert am.lawyer_vector_store is lvs.lawyer_vector_store
+am.get_lawyers_availability_status = AsyncMock(return_value={"L0": True, "L1": True})
+am.cache = MagicMock(mget_static_feats=AsyncMock(return_value={}), mset_static_feats=AsyncMock())
+
+lawyers = [Lawyer(id=f"L{i}", nome=f"Adv {i}", tags_expertise=["civil"], geo_latlon=(-23.55, -46.63),
+                  curriculo_json={}, kpi=KPI(success_rate=0.7, cases_30d=5, avaliacao_media=4.0,
+                                             tempo_resposta_h=10),
+                  casos_historicos_embeddings=[np.ones(4)])
+           for i in range(2)]
+case = Case(id="c1", area="civil", subarea="x", urgency_h=24, coords=(-23.55, -46.63),
+            summary_embedding=np.ones(4, dtype=np.float32))
+asyncio.run(MatchmakingAlgorithm().rank(case, lawyers, top_n=2))
+print(",".join(sorted(lid for lid in ("L0", "L1") if lid in lvs.lawyer_vector_store)))
+"""
+
+
+def test_rank_uses_vector_store_in_production_import_order():
+    """Interpretador novo importando backend.algoritmo_match primeiro (main.py, worker)."""
+    root = Path(__file__).resolve().parents[1]
+    out = subprocess.run([sys.executable, "-c", PRODUCTION_IMPORT_ORDER], cwd=root,
+                         capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr[-2000:]
+    assert out.stdout.strip().splitlines()[-1] == "L0,L1"
@@ -0,0 +1,116 @@
+"""
+Testes para o servidor local de embeddings com micro-batching
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from backend.services import local_embeddings
+from backend.services.local_embeddings import (
+    LocalEmbeddingServer,
+    LocalEncoder,
+    MicroBatcher,
+    canonical_model,
+    parse_address,
+)
+
+
+def _fake_encode(calls):
+    def encode(model, texts, normalize):
+        calls.append((model, list(texts), normalize))
+        scale = 2.0 if normalize else 1.0
+        return np.array([[len(t) * scale, 1.0] for t in texts], dtype=np.float32)
+    return encode
+
+
+def test_address_and_model_names():
+    assert parse_address("unix:///tmp/x.sock") == ("unix", "/tmp/x.sock")
+    assert parse_address("tcp://embedder:8765") == ("tcp", ("embedder", 8765))
+    with pytest.raises(ValueError):
+        parse_address("http://x")
+    assert canonical_model("sentence-transformers/all-MiniLM-L6-v2") == "all-MiniLM-L6-v2"
+
+
+def test_concurrent_requests_share_one_encode_call():
+    calls = []
+
+    async def scenario():
+        batcher = MicroBatcher(_fake_encode(calls), max_batch=64, max_wait_s=0.05)
+        batcher.start()
+        results = await asyncio.gather(*[batcher.submit("m", ["a" * i, "b"]) for i in range(1, 6)])
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1 and len(calls[0][1]) == 10
+    assert [r[:, 0].tolist() for r in results] == [[float(i), 1.0] for i in range(1, 6)]
+
+
+def test_batches_close_on_size_and_split_by_model():
+    calls = []
+
+    async def scenario():
+        batcher = MicroBatcher(_fake_encode(calls), max_batch=4, max_wait_s=0.05)
+        batcher.start()
+        results = await asyncio.gather(
+            batcher.submit("m", ["a", "b", "c"]),
+            batcher.submit("m", ["dd", "ee"]),  # não cabe: vai para o próximo lote
+            batcher.submit("sentence-transformers/m", ["f"], normalize=True),
+        )
+        await batcher.stop()
+        return results
+
+    first, second, third = asyncio.run(scenario())
+    assert all(len(texts) <= 4 for _, texts, _ in calls)
+    assert sorted(texts for _, texts, _ in calls) == [["a", "b", "c"], ["dd", "ee"], ["f"]]
+    assert second[:, 0].tolist() == [2.0, 2.0] and third[0, 0] == 2.0
+
+
+@pytest.fixture
+def server(tmp_path):
+    calls = []
+    address = f"unix://{tmp_path}/embed.sock"
+    loop = asyncio.new_event_loop()
+    srv = LocalEmbeddingServer(address, MicroBatcher(_fake_encode(calls), max_batch=32, max_wait_s=0.02))
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(srv.start())
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait(5)
+    yield address, calls
+    asyncio.run_coroutine_threadsafe(srv.stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+def test_clients_across_threads_are_batched_by_server(server):
+    address, calls = server
+    encoder = LocalEncoder("sentence-transformers/m", address=address)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: encoder.encode(["x" * i, "y"]), range(1, 9)))
+
+    assert [r[:, 0].tolist() for r in results] == [[float(i), 1.0] for i in range(1, 9)]
+    assert len(calls) < 8 and {model for model, _, _ in calls} == {"m"}
+    single = encoder.encode("abc", normalize_embeddings=True)
+    assert single.shape == (2,) and single[0] == 6.0
+
+
+def test_unreachable_server_falls_back_to_in_process(monkeypatch, tmp_path, caplog):
+    calls = []
+    monkeypatch.setattr(local_embeddings, "encode_in_process", _fake_encode(calls))
+    encoder = LocalEncoder("m", address=f"unix://{tmp_path}/missing.sock")
+
+    assert encoder.encode(["ab"]).tolist() == [[2.0, 1.0]]
+    assert encoder.encode(["abc"]).tolist() == [[3.0, 1.0]]
+    assert len(calls) == 2
+    assert caplog.text.count("indisponível") == 1  # backoff: não tenta a cada chamada
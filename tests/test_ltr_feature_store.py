@@ -0,0 +1,103 @@
+"""
+Testes para o feature store particionado do LTR (backend/jobs/ltr_feature_store.py)
+"""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from backend.audit_sink import AuditSink
+from backend.jobs.ltr_export import create_ltr_dataset, events_to_frame, map_label_to_numeric
+from backend.jobs.ltr_feature_store import (
+    BASE_FEATURES,
+    add_derived_features,
+    append_exposures,
+    append_labels,
+    load_window,
+    map_labels,
+    valid_feature_mask,
+)
+
+
+def _event(case, lawyer, label, ts, **feats):
+    features = {k: 0.5 for k in "ASTGQURC"}
+    features.update(feats)
+    return {"event": "recommend", "case_id": case, "lawyer_id": lawyer, "label": label,
+            "timestamp": ts, "features": features}
+
+
+def test_vectorized_helpers_match_row_logic():
+    df = events_to_frame([_event("c1", "l1", "won", "2025-08-01", A=1.0, S=0.2),
+                          _event("c1", "l2", "lost", "2025-08-01", T=1.5)])
+    assert valid_feature_mask(df).tolist() == [True, False]
+    df = add_derived_features(df)
+    assert df.loc[0, "f_match"] == pytest.approx((1.0 + 0.2) / 2)
+    labels = pd.Series(["won", "Declined", None, "other"])
+    assert map_labels(labels).tolist() == [map_label_to_numeric(x or "") for x in ["won", "Declined", "", "other"]]
+
+
+def test_load_window_reads_partitions_and_joins_labels(tmp_path):
+    append_exposures(events_to_frame([
+        _event("old", "l1", "won", "2025-01-01T10:00:00"),
+        _event("c1", "l1", "declined", "2025-08-01T10:00:00"),
+        _event("c1", "l2", "declined", "2025-08-01T10:00:00"),
+        _event("c2", "l1", "accepted", "2025-08-02T10:00:00"),
+    ]), tmp_path)
+    # Feedback chega depois e sobrescreve a label da exposição
+    append_labels(pd.DataFrame([{"case_id": "c1", "lawyer_id": "l2", "label_str": "won",
+                                 "timestamp": "2025-08-05T09:00:00"}]), tmp_path)
+
+    assert {p.name for p in (tmp_path / "exposures").iterdir()} == {
+        "dt=2025-01-01", "dt=2025-08-01", "dt=2025-08-02"}
+
+    df = load_window(days=30, end=date(2025, 8, 10), store_dir=tmp_path)
+    assert set(df["case_id"]) == {"c1", "c2"}
+    got = dict(zip(zip(df["case_id"], df["lawyer_id"]), df["label_num"]))
+    assert got == {("c1", "l1"): 1, ("c1", "l2"): 3, ("c2", "l1"): 2}
+    assert "f_quality" in df and df["group_id"].is_monotonic_increasing
+
+    assert len(load_window(store_dir=tmp_path, end=date(2025, 8, 10))) == 4
+
+
+def test_export_appends_only_new_events(tmp_path):
+    audit_dir, store = tmp_path / "audit", tmp_path / "store"
+    sink = AuditSink(audit_dir, compress=False)
+    sink.submit(_event("c1", "l1", "won", "2025-08-01T10:00:00"))
+    sink.flush()
+    assert create_ltr_dataset(audit_dir, tmp_path / "ckpt.json", store) == 1
+
+    sink.submit(_event("c2", "l1", "lost", "2025-08-02T10:00:00"))
+    sink.submit(_event("c2", "l2", "won", "2025-08-02T10:00:00", A=2.0))  # inválido
+    sink.close()
+    assert create_ltr_dataset(audit_dir, tmp_path / "ckpt.json", store) == 1
+    assert create_ltr_dataset(audit_dir, tmp_path / "ckpt.json", store) == 0
+
+    df = load_window(store_dir=store, end=date(2025, 8, 10))
+    assert sorted(df["case_id"]) == ["c1", "c2"]
+    assert df[BASE_FEATURES].notna().all().all()
+
+
+def test_etl_skips_exposures_without_logged_features(tmp_path):
+    from backend.jobs.ltr_etl import build_dataset
+
+    audit_dir, store = tmp_path / "audit", tmp_path / "store"
+    sink = AuditSink(audit_dir, compress=False)
+    sink.submit(_event("c1", "l1", "won", "2025-08-01T10:00:00", A=0.9))
+    sink.flush()
+    assert create_ltr_dataset(audit_dir, tmp_path / "export.json", store) == 1
+
+    # Exposição mais recente do mesmo par, sem features: não pode virar placeholder
+    sink.submit({"message": "recommend", "timestamp": "2025-08-01T11:00:00",
+                 "context": {"case": "c1", "lawyer": "l1", "fair": 0.3}})
+    sink.submit({"message": "recommend", "timestamp": "2025-08-01T11:00:00",
+                 "context": {"case": "c1", "lawyer": "l2", "fair": 0.3,
+                             "scores": {"features": {k: 0.4 for k in "ASTGQURC"}}}})
+    sink.submit({"message": "feedback", "timestamp": "2025-08-02T10:00:00",
+                 "context": {"case": "c1", "lawyer": "l2", "label": "accepted"}})
+    sink.close()
+    build_dataset(audit_dir, tmp_path / "etl.json", store)
+
+    df = load_window(store_dir=store, end=date(2025, 8, 10)).set_index("lawyer_id")
+    assert df.loc["l1", "f_A"] == pytest.approx(0.9) and df.loc["l1", "f_S"] == pytest.approx(0.5)
+    assert df.loc["l2", BASE_FEATURES].tolist() == pytest.approx([0.4] * len(BASE_FEATURES))
+    assert df.loc["l2", "label_str"] == "accepted"
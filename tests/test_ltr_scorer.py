@@ -0,0 +1,118 @@
+"""
+Testes para o scorer de árvores (TreeScorer) e sua seleção por model_version
+"""
+import importlib
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+
+lgb = pytest.importorskip("lightgbm")
+
+from backend import algoritmo_match  # noqa: E402
+from backend.algoritmo_match import (  # noqa: E402
+    FEATURE_KEYS, Case, MatchmakingAlgorithm, TreeScorer, load_tree_scorer,
+)
+from tests.test_batch_features import make_lawyer  # noqa: E402
+
+FEATURES = ["f_A", "f_S", "f_T", "f_G", "f_Q", "f_U", "f_R", "f_C", "f_quality", "f_availability", "f_match"]
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    X = rng.random((400, len(FEATURES)))
+    # Interação não-linear (A × S) que pesos lineares não capturam
+    y = ((X[:, 0] * X[:, 1]) * 4).astype(int).clip(0, 3)
+    ranker = lgb.LGBMRanker(n_estimators=20, num_leaves=7, min_child_samples=5, verbose=-1)
+    ranker.fit(X, y, group=[10] * 40, feature_name=FEATURES)
+    path = tmp_path_factory.mktemp("models")
+    ranker.booster_.save_model(str(path / "ltr_model_tree_v1.txt"))
+    return path
+
+
+def test_tree_scorer_matches_booster_with_derived_columns(model_dir):
+    booster = lgb.Booster(model_file=str(model_dir / "ltr_model_tree_v1.txt"))
+    scorer = TreeScorer(booster)
+    fm = np.random.default_rng(1).random((25, len(FEATURE_KEYS)))
+
+    A, S, T, G, Q, U, R, C = fm.T
+    X = np.column_stack([fm, Q * 0.4 + T * 0.3 + R * 0.2 + C * 0.1, (G + U) / 2, (A + S) / 2])
+    expected = 1 / (1 + np.exp(-booster.predict(X)))
+    assert scorer.score(fm) == pytest.approx(expected)
+    assert np.all((scorer.score(fm) > 0) & (scorer.score(fm) < 1))
+
+
+def test_load_tree_scorer_selects_by_model_version(model_dir, monkeypatch):
+    monkeypatch.setattr(algoritmo_match, "MODEL_FILE", model_dir / "ltr_model.txt")
+    monkeypatch.setattr(algoritmo_match, "LTR_SCORER", "linear")
+
+    scorer = load_tree_scorer("tree_v1")
+    assert isinstance(scorer, TreeScorer)
+    assert load_tree_scorer("tree_v1") is scorer  # carregado uma vez por processo
+    assert load_tree_scorer("linear_v9") is None
+    assert load_tree_scorer(None) is None
+
+
+@pytest.mark.asyncio
+async def test_rank_uses_tree_scorer_for_version(model_dir, monkeypatch):
+    monkeypatch.setattr(algoritmo_match, "MODEL_FILE", model_dir / "ltr_model.txt")
+    fake_cache = MagicMock()
+    fake_cache.mget_static_feats = AsyncMock(return_value={})
+    fake_cache.mset_static_feats = AsyncMock()
+    monkeypatch.setattr(algoritmo_match, "cache", fake_cache)
+
+    case = Case(id="c", area="Trabalhista", subarea="Rescisão", urgency_h=48,
+                coords=(-23.5505, -46.6333), summary_embedding=np.random.default_rng(1).random(8))
+    rng = np.random.default_rng(42)
+    lawyers = [make_lawyer(i, rng) for i in range(20)]
+
+    ranking = await MatchmakingAlgorithm().rank(case, lawyers, top_n=5, model_version="tree_v1")
+    assert ranking
+    scorer = load_tree_scorer("tree_v1")
+    for lw in ranking:
+        assert lw.scores["scorer"] == "tree"
+        fm = np.array([[lw.scores["features"][k] for k in FEATURE_KEYS]])
+        assert lw.scores["ltr"] == pytest.approx(scorer.score(fm)[0])
+
+
+@pytest.fixture(scope="module")
+def ltr_train(tmp_path_factory):
+    # O módulo cria logs/ltr_training.log no diretório corrente ao ser importado
+    work = tmp_path_factory.mktemp("ltr")
+    (work / "logs").mkdir()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(work)
+        yield importlib.import_module("backend.jobs.ltr_train")
+
+
+def test_scorer_loads_model_produced_by_ltr_train(ltr_train, tmp_path, monkeypatch):
+    rng = np.random.default_rng(3)
+    X = rng.random((300, len(FEATURES)))
+    y = np.clip((X[:, 0] * 3).round(), 0, 3).astype(int)
+    model = ltr_train.train_model(X, y, np.full(60, 5), workers=1, param_grid={})
+    model.booster_.save_model(str(tmp_path / "ltr_model_trained.txt"))
+    monkeypatch.setattr(algoritmo_match, "MODEL_FILE", tmp_path / "ltr_model.txt")
+
+    scorer = load_tree_scorer("trained")
+    assert scorer is not None and scorer.feature_names == FEATURES
+    fm = rng.random((10, len(FEATURE_KEYS)))
+    assert scorer.score(fm).shape == (10,)
+
+
+def test_unnamed_columns_map_by_position_and_unknown_names_fall_back(tmp_path, monkeypatch):
+    rng = np.random.default_rng(4)
+    X = rng.random((200, len(FEATURES)))
+    y = (X[:, 1] * 3).astype(int)
+    legacy = lgb.LGBMRanker(n_estimators=10, num_leaves=7, min_child_samples=5, verbose=-1)
+    legacy.fit(X, y, group=[10] * 20)  # sem feature_name → Column_0..Column_10
+    scorer = TreeScorer(legacy.booster_)
+    assert scorer.feature_names == FEATURES
+    fm = X[:5, :len(FEATURE_KEYS)]
+    assert scorer.score(fm) == pytest.approx(1 / (1 + np.exp(-legacy.booster_.predict(scorer.inputs(fm)))))
+
+    other = lgb.LGBMRanker(n_estimators=5, num_leaves=7, min_child_samples=5, verbose=-1)
+    other.fit(X[:, :2], y, group=[10] * 20, feature_name=["idade", "renda"])
+    other.booster_.save_model(str(tmp_path / "ltr_model_alien.txt"))
+    monkeypatch.setattr(algoritmo_match, "MODEL_FILE", tmp_path / "ltr_model.txt")
+    assert load_tree_scorer("alien") is None  # cai para os pesos lineares
@@ -0,0 +1,66 @@
+"""
+Testes para o treino LTR paralelo e as métricas vetorizadas (backend/jobs/ltr_train.py)
+"""
+import importlib
+
+import numpy as np
+import pytest
+from sklearn.metrics import ndcg_score
+
+
+@pytest.fixture(scope="module")
+def ltr_train(tmp_path_factory):
+    # O módulo cria logs/ltr_training.log no diretório corrente ao ser importado
+    work = tmp_path_factory.mktemp("ltr")
+    (work / "logs").mkdir()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(work)
+        yield importlib.import_module("backend.jobs.ltr_train")
+
+
+def _synthetic(rng, n_groups=60, size=5):
+    groups = np.full(n_groups, size)
+    X = rng.random((n_groups * size, 11))
+    y = np.clip((X[:, 0] * 3 + rng.normal(0, 0.5, len(X))).round(), 0, 3).astype(int)
+    return X, y, groups
+
+
+def test_grouped_ndcg_matches_sklearn(ltr_train):
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 9, size=40)
+    group_ids = ltr_train.group_ids_from_sizes(sizes)
+    y = rng.integers(0, 4, size=len(group_ids))
+    pred = rng.integers(0, 4, size=len(group_ids)).astype(float)  # muitos empates
+
+    got = ltr_train.grouped_ndcg(y, pred, group_ids, k=5)
+    start = 0
+    for g, size in enumerate(sizes):
+        end = start + size
+        if size > 1:
+            assert got[g] == pytest.approx(ndcg_score([y[start:end]], [pred[start:end]], k=5))
+        start = end
+
+
+def test_grouped_precision_matches_loop(ltr_train):
+    rng = np.random.default_rng(1)
+    sizes = rng.integers(2, 9, size=30)
+    group_ids = ltr_train.group_ids_from_sizes(sizes)
+    y = rng.integers(0, 4, size=len(group_ids))
+    pred = rng.random(len(group_ids))
+
+    got = ltr_train.grouped_precision(y, pred, group_ids, k=5)
+    start = 0
+    for g, size in enumerate(sizes):
+        yt, yp = y[start:start + size], pred[start:start + size]
+        top = yt[np.argsort(-yp)[:5]]
+        assert got[g] == pytest.approx(np.sum(top >= 2) / min(5, len(top)))
+        start += size
+
+
+def test_train_model_parallel_grid(ltr_train):
+    X, y, groups = _synthetic(np.random.default_rng(2))
+    model = ltr_train.train_model(X, y, groups, workers=2,
+                                  param_grid={"num_leaves": [7, 15], "n_estimators": [20]})
+    assert model.get_params()["num_leaves"] in (7, 15)
+    metrics = ltr_train.evaluate_model(model, X, y, groups)
+    assert 0.0 <= metrics["ndcg_at_5"] <= 1.0
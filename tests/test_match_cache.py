@@ -0,0 +1,115 @@
+"""
+Testes para a chave canônica de matching e o single-flight
+"""
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from backend.services.match_cache import SingleFlight, match_cache_key
+
+PAYLOAD = {
+    "case": {"area": "Trabalhista", "coordinates": {"latitude": -23.550512, "longitude": -46.633308}},
+    "top_n": 5,
+}
+
+
+class FakeRedis:
+    """Subconjunto assíncrono do redis-py usado pelo single-flight."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    async def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+def test_key_is_canonical():
+    reordered = {"top_n": 5, "case": {"coordinates": {"longitude": -46.6331, "latitude": -23.5507},
+                                      "area": "Trabalhista"}}
+    key = match_cache_key(PAYLOAD, preset="balanced", model_version="v2")
+    assert key == match_cache_key(reordered, preset="balanced", model_version="v2")
+    assert key != match_cache_key(PAYLOAD, preset="balanced", model_version="v3")
+    assert key != match_cache_key(PAYLOAD, preset="expert", model_version="v2")
+    assert match_cache_key(PAYLOAD) == match_cache_key(PAYLOAD, model_version="production")
+
+
+def test_key_is_stable_across_processes():
+    code = ("from backend.services.match_cache import match_cache_key; "
+            f"print(match_cache_key({PAYLOAD!r}, preset='balanced'))")
+    keys = set()
+    for seed in ("1", "2"):
+        env = {**os.environ, "PYTHONHASHSEED": seed}
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        keys.add(out.stdout.strip())
+    assert keys == {match_cache_key(PAYLOAD, preset="balanced")}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_compute_once():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return '{"ok": true}'
+
+    flight = SingleFlight()
+    results = await asyncio.gather(*[flight.get_or_compute("k", compute) for _ in range(10)])
+    assert calls == 1
+    assert set(results) == {'{"ok": true}'}
+    assert flight.stats["coalesced"] == 9
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_coalesces_across_workers():
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "resultado"
+
+    redis = FakeRedis()
+    workers = [SingleFlight(poll_s=0.01) for _ in range(3)]
+    results = await asyncio.gather(*[w.get_or_compute("k", compute, redis=redis) for w in workers])
+    assert results == ["resultado"] * 3
+    assert calls == 1
+    assert "k:lock" not in redis.data
+
+    # Depois do cálculo, a resposta vem do cache
+    assert await workers[0].get_or_compute("k", compute, redis=redis) == "resultado"
+    assert calls == 1 and workers[0].stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("falhou")
+
+    flight = SingleFlight()
+    results = await asyncio.gather(*[flight.get_or_compute("k", compute) for _ in range(3)],
+                                   return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight._inflight == {}
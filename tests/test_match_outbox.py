@@ -0,0 +1,190 @@
+"""
+Testes para o outbox dos efeitos colaterais do matching
+"""
+import asyncio
+import sys
+import types
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from backend.services.match_outbox import MatchOutbox, build_entry, idempotency_key
+
+
+class FakeQuery:
+    """Subconjunto encadeável do cliente Supabase, sobre listas em memória."""
+
+    def __init__(self, db, name):
+        self.db, self.name = db, name
+        self.op, self.values, self.filters, self.kwargs = "select", None, [], {}
+        self._limit = None
+
+    def _builder(self, op, values=None, **kwargs):
+        # Como no supabase-py, cada operação começa um builder novo
+        query = FakeQuery(self.db, self.name)
+        query.op, query.values, query.kwargs = op, values, kwargs
+        return query
+
+    def select(self, *_):
+        return self._builder("select")
+
+    def upsert(self, rows, **kwargs):
+        return self._builder("upsert", rows, **kwargs)
+
+    def update(self, values):
+        return self._builder("update", values)
+
+    def eq(self, col, val):
+        self.filters.append(lambda r: r.get(col) == val)
+        return self
+
+    def lt(self, col, val):
+        self.filters.append(lambda r: r.get(col) is not None and r[col] < val)
+        return self
+
+    def lte(self, col, val):
+        self.filters.append(lambda r: r.get(col) is not None and r[col] <= val)
+        return self
+
+    def in_(self, col, vals):
+        self.filters.append(lambda r: r.get(col) in set(vals))
+        return self
+
+    def order(self, *_):
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def execute(self):
+        db = self.db
+        db.calls.append((self.name, self.op))
+        if self.name in db.fail:
+            raise RuntimeError(f"{self.name} indisponível")
+        rows = db.tables.setdefault(self.name, [])
+        if self.op == "upsert":
+            conflict = [c.strip() for c in self.kwargs.get("on_conflict", "id").split(",")]
+            for new in self.values:
+                key = tuple(new.get(c) for c in conflict)
+                old = next((r for r in rows if tuple(r.get(c) for c in conflict) == key), None)
+                if old is None:
+                    rows.append({"id": str(uuid.uuid4()), "created_at": len(rows), **new})
+                elif not self.kwargs.get("ignore_duplicates"):
+                    old.update(new)
+            return SimpleNamespace(data=None)
+        matched = [r for r in rows if all(f(r) for f in self.filters)]
+        if self.op == "update":
+            for r in matched:
+                r.update(self.values)
+        return SimpleNamespace(data=[dict(r) for r in matched[:self._limit]])
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables, self.calls, self.fail = {}, [], set()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def notifications(monkeypatch):
+    sent = []
+    fail_for = set()
+
+    async def send(lawyer_ids, payload):
+        if payload["case_id"] in fail_for:
+            raise RuntimeError("push indisponível")
+        sent.append((payload["case_id"], list(lawyer_ids), payload))
+
+    module = types.ModuleType("backend.services.notify_service")
+    module.send_notifications_to_lawyers = send
+    monkeypatch.setitem(sys.modules, "backend.services.notify_service", module)
+    return SimpleNamespace(sent=sent, fail_for=fail_for)
+
+
+def _ranked(case_id, ids):
+    case = SimpleNamespace(id=case_id, area="Civil", urgency_h=24)
+    lawyers = [SimpleNamespace(id=lid, scores={"fair": 0.9 - i / 10, "raw": 0.8, "equity": 0.1,
+                                               "features": {"A": 1.0}, "delta": {"A": 0.3}})
+               for i, lid in enumerate(ids)]
+    return case, lawyers
+
+
+def test_idempotency_key_depends_on_ranking():
+    assert idempotency_key("c1", ["a", "b"], "balanced") == idempotency_key("c1", ["a", "b"], "balanced")
+    assert idempotency_key("c1", ["a", "b"]) != idempotency_key("c1", ["b", "a"])
+    assert idempotency_key("c1", ["a"], "fast") != idempotency_key("c1", ["a"], "balanced")
+
+
+def test_enqueue_ignores_duplicate_rankings():
+    db = FakeSupabase()
+    outbox = MatchOutbox(lambda: db)
+    entry = build_entry(*_ranked("c1", ["L1", "L2"]), preset="balanced")
+    asyncio.run(outbox.enqueue([entry]))
+    asyncio.run(outbox.enqueue([build_entry(*_ranked("c1", ["L1", "L2"]), preset="balanced")]))
+    assert len(db.tables["match_outbox"]) == 1
+    assert db.calls == [("match_outbox", "upsert")] * 2
+
+
+def test_drain_batches_side_effects_across_cases(notifications):
+    db = FakeSupabase()
+    outbox = MatchOutbox(lambda: db)
+    asyncio.run(outbox.enqueue([
+        build_entry(*_ranked("c1", ["L1", "L2"])),
+        build_entry(*_ranked("c2", ["L2", "L3"])),
+        build_entry(*_ranked("c3", ["L4"]), notify=False),
+    ]))
+    db.calls.clear()
+
+    stats = asyncio.run(outbox.drain())
+
+    assert stats == {"claimed": 3, "done": 3, "retried": 0, "failed": 0}
+    # Um round trip por etapa, independente do número de casos
+    assert db.calls.count(("case_matches", "upsert")) == 1
+    assert db.calls.count(("offers", "upsert")) == 1
+    assert db.calls.count(("lawyers", "update")) == 1
+    assert len(db.tables["case_matches"]) == 5
+    assert {(o["case_id"], o["lawyer_id"]) for o in db.tables["offers"]} == {
+        ("c1", "L1"), ("c1", "L2"), ("c2", "L2"), ("c2", "L3")}
+    assert sorted(case_id for case_id, _, _ in notifications.sent) == ["c1", "c2"]
+    c1 = next(p for case_id, _, p in notifications.sent if case_id == "c1")
+    assert len(c1["offer_ids"]) == 2 and c1["idempotency_key"].startswith("c1:")
+    assert {r["status"] for r in db.tables["match_outbox"]} == {"done"}
+    assert asyncio.run(outbox.drain())["claimed"] == 0
+
+
+def test_failed_notification_retries_only_that_case(notifications):
+    db = FakeSupabase()
+    outbox = MatchOutbox(lambda: db, backoff_s=0)
+    asyncio.run(outbox.enqueue([build_entry(*_ranked("c1", ["L1"])),
+                                build_entry(*_ranked("c2", ["L2"]))]))
+    notifications.fail_for.add("c2")
+
+    stats = asyncio.run(outbox.drain_once())
+    assert (stats["done"], stats["retried"]) == (1, 1)
+    status = {r["case_id"]: r for r in db.tables["match_outbox"]}
+    assert status["c1"]["status"] == "done"
+    assert status["c2"]["status"] == "pending" and status["c2"]["attempts"] == 1
+
+    notifications.fail_for.clear()
+    stats = asyncio.run(outbox.drain_once())
+    assert stats["done"] == 1
+    assert [case_id for case_id, _, _ in notifications.sent] == ["c1", "c2"]
+    # Reprocessamento não duplica ofertas
+    assert len(db.tables["offers"]) == 2
+
+
+def test_write_failure_reschedules_then_gives_up(notifications):
+    db = FakeSupabase()
+    outbox = MatchOutbox(lambda: db, max_attempts=2, backoff_s=0)
+    asyncio.run(outbox.enqueue([build_entry(*_ranked("c1", ["L1"]))]))
+    db.fail.add("case_matches")
+
+    assert asyncio.run(outbox.drain_once())["retried"] == 1
+    assert asyncio.run(outbox.drain_once())["failed"] == 1
+    row = db.tables["match_outbox"][0]
+    assert row["status"] == "failed" and "indisponível" in row["last_error"]
+    assert notifications.sent == []
@@ -0,0 +1,153 @@
+"""
+Testes para o digest pré-computado de reviews (features R e C)
+"""
+import random
+
+import numpy as np
+import pytest
+
+from backend.algoritmo_match import (
+    KPI,
+    NEG_RE,
+    POS_RE,
+    BatchFeatureCalculator,
+    Case,
+    FeatureCalculator,
+    Lawyer,
+    ReviewDigest,
+    _count_keywords,
+    _count_kw,
+    _is_valid_review,
+    _normalize_text,
+    _replace_emojis,
+    compute_review_digest,
+    review_digest_for,
+)
+
+WORDS = ["nao recomendo", "recomendo", "excelente", "péssimo", "bom", "bomba", "insatisfeito",
+         "satisfeito", "atencioso", "lento", "👍", "👎", "muito", "o", "caso", "rápido", "demorado"]
+
+
+def reference_soft_skill(reviews):
+    """Implementação anterior: um regex por palavra-chave."""
+    total, n = 0.0, 0
+    for review in reviews:
+        review = _replace_emojis(review)
+        if not _is_valid_review(review):
+            continue
+        text = _normalize_text(review)
+        pos, neg = _count_kw(POS_RE, text), _count_kw(NEG_RE, text)
+        total += pos / (pos + neg) if pos + neg else 0.5
+        n += 1
+    if not n:
+        return 0.5
+    avg = total / n
+    return float(np.clip(avg + (0.1 if avg > 0.7 and n >= 3 else 0), 0, 1))
+
+
+def random_reviews(rng, k):
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12))) for _ in range(k)]
+
+
+def test_keyword_alternation_matches_per_pattern_counts():
+    rng = random.Random(1)
+    for text in random_reviews(rng, 2000):
+        norm = _normalize_text(_replace_emojis(text))
+        assert _count_keywords(norm) == (_count_kw(POS_RE, norm), _count_kw(NEG_RE, norm))
+
+
+def test_digest_matches_reference_soft_skill():
+    rng = random.Random(2)
+    for _ in range(200):
+        reviews = random_reviews(rng, rng.randint(0, 6))
+        digest = compute_review_digest(reviews)
+        assert digest.soft_skill == pytest.approx(reference_soft_skill(reviews))
+        assert digest.valid_count == sum(1 for r in reviews if _is_valid_review(r))
+
+
+def test_digest_round_trip_and_hash():
+    digest = compute_review_digest(["Excelente advogado, recomendo muito!", "nao recomendo, péssimo"])
+    assert ReviewDigest.from_dict(digest.to_dict()) == digest
+    assert ReviewDigest.from_dict(None) is None
+    assert compute_review_digest(["outro texto qualquer aqui"]).content_hash != digest.content_hash
+
+
+def _lawyer(i, reviews, digest=None):
+    return Lawyer(
+        id=f"ADV{i}", nome="x", tags_expertise=["Civil"], geo_latlon=(-23.55, -46.63),
+        curriculo_json={}, kpi=KPI(success_rate=0.8, cases_30d=5, avaliacao_media=4.2, tempo_resposta_h=12),
+        review_texts=reviews, review_digest=digest,
+    )
+
+
+def test_features_use_persisted_digest():
+    rng = random.Random(3)
+    case = Case(id="c", area="Civil", subarea="x", urgency_h=24, coords=(-23.55, -46.63),
+                summary_embedding=np.zeros(8))
+    lawyers = [_lawyer(i, random_reviews(rng, i % 5)) for i in range(20)]
+    expected = [(FeatureCalculator(case, lw).review_score(), FeatureCalculator(case, lw).soft_skill())
+                for lw in lawyers]
+    for lw in lawyers:
+        lw.review_digest = compute_review_digest(lw.review_texts)
+    assert [review_digest_for(lw) is lw.review_digest for lw in lawyers] == [True] * 20
+
+    batch = BatchFeatureCalculator(case, lawyers)
+    assert batch.review_score().tolist() == pytest.approx([r for r, _ in expected])
+    assert batch.soft_skill().tolist() == pytest.approx([c for _, c in expected])
+
+
+class _DigestDB:
+    """Tabelas ``reviews``/``lawyers`` mínimas para refresh_lawyer_review_digest."""
+
+    def __init__(self, comments, review_texts):
+        self.comments, self.lawyer = comments, {"review_texts": review_texts, "review_digest": None}
+        self.updates = []
+
+    def table(self, name):
+        db = self
+
+        class Query:
+            def select(self, *_):
+                return self
+
+            def eq(self, *_):
+                return self
+
+            def order(self, *_):
+                return self
+
+            def single(self):
+                return self
+
+            def update(self, values):
+                db.updates.append(values)
+                db.lawyer.update(values)
+                return self
+
+            def execute(self):
+                data = [{"comment": c} for c in db.comments] if name == "reviews" else dict(db.lawyer)
+                return type("Resp", (), {"data": data})()
+        return Query()
+
+
+def test_refresh_digest_covers_review_texts_without_overwriting_them():
+    from backend.services.reviews_service import refresh_lawyer_review_digest
+
+    db = _DigestDB(["Excelente, recomendo", "nao recomendo, lento"], ["Depoimento importado, muito atencioso"])
+    assert refresh_lawyer_review_digest(db, "ADV1")
+    assert db.updates == [{"review_digest": db.lawyer["review_digest"]}]
+    assert db.lawyer["review_texts"] == ["Depoimento importado, muito atencioso"]
+    # Mesmo conteúdo que o rank() recebe: o fallback em memória concorda com o persistido
+    lw = _lawyer(1, db.lawyer["review_texts"], ReviewDigest.from_dict(db.lawyer["review_digest"]))
+    assert review_digest_for(lw) is lw.review_digest
+    assert lw.review_digest == compute_review_digest(db.lawyer["review_texts"])
+    # Sem texto novo o hash confere e nada é gravado
+    assert not refresh_lawyer_review_digest(db, "ADV1") and len(db.updates) == 1
+
+
+def test_stale_persisted_digest_falls_back_to_memo():
+    old = ["Excelente advogado, recomendo muito!"]
+    lw = _lawyer(1, old + ["nao recomendo, péssimo e lento"], compute_review_digest(old))
+    digest = review_digest_for(lw)
+    assert digest is not lw.review_digest
+    assert digest == compute_review_digest(lw.review_texts)
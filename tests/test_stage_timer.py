@@ -0,0 +1,85 @@
+"""
+Testes para a cronometragem por etapa do matching e o profiler amostrado
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+from backend import algoritmo_match
+from backend.algoritmo_match import KPI, Case, Lawyer, MatchmakingAlgorithm
+from backend.stage_timer import (
+    SlowRequestProfiler,
+    StageTimer,
+    current_timer,
+    stage_timer,
+    timed,
+)
+
+
+def test_nested_stage_timers_share_breakdown():
+    histogram = MagicMock()
+    with stage_timer("balanced", "v2") as outer:
+        outer.histogram = histogram
+        with timed("rank"):
+            with stage_timer("fast") as inner:
+                assert inner is outer
+                with timed("features"):
+                    time.sleep(0.002)
+        with timed("features"):
+            pass
+    assert current_timer() is None
+    breakdown = outer.breakdown()
+    assert set(breakdown) == {"rank", "features", "total"}
+    assert breakdown["rank"] >= breakdown["features"] > 0
+    labels = {call.kwargs["stage"] for call in histogram.labels.call_args_list}
+    assert labels == {"rank", "features", "total"}
+    assert histogram.labels.call_args_list[0].kwargs["model_version"] == "v2"
+
+
+def test_timed_without_timer_is_noop():
+    with timed("anything"):
+        pass
+    assert current_timer() is None
+
+
+def test_profiler_keeps_only_slowest_requests():
+    profiler = SlowRequestProfiler(sample_rate=1.0, top_n=2)
+    for i, ms in enumerate([5, 30, 10, 50]):
+        session = profiler.start()
+        assert session is not None
+        timer = StageTimer(histogram=None)
+        timer.started -= ms / 1000
+        profiler.finish(session, timer, label=f"req{i}")
+    slowest = profiler.slowest()
+    assert [e["label"] for e in slowest] == ["req3", "req1"]
+    assert "function calls" in slowest[0]["trace"]
+
+
+def test_profiler_disabled_by_default():
+    assert SlowRequestProfiler(sample_rate=0).start() is None
+
+
+def test_rank_audit_record_includes_timings(monkeypatch):
+    fake_cache = MagicMock()
+    fake_cache.mget_static_feats = AsyncMock(return_value={})
+    fake_cache.mset_static_feats = AsyncMock()
+    monkeypatch.setattr(algoritmo_match, "cache", fake_cache)
+    records = []
+    monkeypatch.setattr(algoritmo_match.AUDIT_LOGGER, "info",
+                        lambda msg, ctx=None, *a, **k: records.append(ctx))
+
+    lawyers = [Lawyer(id=f"L{i}", nome=f"Adv {i}", tags_expertise=["civil"],
+                      geo_latlon=(-23.55, -46.63), curriculo_json={},
+                      kpi=KPI(success_rate=0.5 + i / 10, cases_30d=5, avaliacao_media=4.0,
+                              tempo_resposta_h=10))
+               for i in range(3)]
+    case = Case(id="c1", area="civil", subarea="x", urgency_h=24, coords=(-23.55, -46.63),
+                summary_embedding=np.ones(4))
+    ranked = asyncio.run(MatchmakingAlgorithm().rank(case, lawyers, top_n=2))
+
+    assert ranked
+    timings = [r for r in records if r and "timings_ms" in r][0]["timings_ms"]
+    for stage in ("weights", "availability", "features", "static_cache", "scoring", "fairness"):
+        assert stage in timings
@@ -0,0 +1,89 @@
+"""
+Testes para o cache de features estáticas em lote (RedisCache + LRU local)
+"""
+import json
+
+import pytest
+
+from backend.algoritmo_match import RedisCache, _TTLCache
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value))
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        for key, value in self.commands:
+            self.redis.data[key] = value
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [self.data.get(k) for k in keys]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def cache():
+    c = RedisCache("redis://localhost:6379/1")
+    c._redis = FakeRedis()
+    return c
+
+
+@pytest.mark.asyncio
+async def test_mget_uses_single_round_trip(cache):
+    cache._redis.data = {f"match:cache:ADV{i}": json.dumps({"Q": i / 10}) for i in range(5)}
+    result = await cache.mget_static_feats([f"ADV{i}" for i in range(8)])
+    assert cache._redis.round_trips == 1
+    assert result["ADV3"] == {"Q": 0.3}
+    assert result["ADV7"] is None
+
+
+@pytest.mark.asyncio
+async def test_local_lru_serves_hot_lawyers(cache):
+    await cache.mset_static_feats({"ADV1": {"Q": 0.5}, "ADV2": {"Q": 0.7}})
+    assert cache._redis.round_trips == 1
+    result = await cache.mget_static_feats(["ADV1", "ADV2"])
+    assert result == {"ADV1": {"Q": 0.5}, "ADV2": {"Q": 0.7}}
+    assert cache._redis.round_trips == 1  # servido pela LRU local
+
+
+@pytest.mark.asyncio
+async def test_single_key_helpers_delegate_to_batch(cache):
+    await cache.set_static_feats("ADV9", {"Q": 0.9})
+    cache._local.clear()
+    assert await cache.get_static_feats("ADV9") == {"Q": 0.9}
+
+
+def test_ttl_cache_expiry_and_eviction(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("backend.algoritmo_match.time.monotonic", lambda: now[0])
+    lru = _TTLCache(maxsize=2, ttl=10)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)  # "b" é o menos usado
+    assert lru.get("b") is None and lru.get("a") == 1
+    now[0] += 11
+    assert lru.get("a") is None
@@ -0,0 +1,110 @@
+"""
+Testes para o cache de triagem (camadas exata e semântica)
+"""
+import asyncio
+
+import numpy as np
+
+from backend.services.triage_cache import TriageCache, normalize_text
+
+
+class FakeRedis:
+    """Subconjunto assíncrono do redis-py usado pelo cache."""
+
+    def __init__(self):
+        self.kv, self.lists = {}, {}
+
+    async def get(self, key):
+        return self.kv.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.kv[key] = value
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists[key][start:end + 1]
+
+    async def lrange(self, key, start, end):
+        return self.lists.get(key, [])[start:end + 1]
+
+    async def expire(self, key, ttl):
+        return True
+
+
+def _bag_of_words(text):
+    vec = np.zeros(64, dtype=np.float32)
+    for word in text.split():
+        vec[hash(word) % 64] += 1.0
+    return vec
+
+
+def _cache(redis=None, **kwargs):
+    return TriageCache(encoder=lambda: _bag_of_words, redis_factory=lambda: redis, **kwargs)
+
+
+RESULT = {"area": "Trabalhista", "subarea": "Justa Causa", "urgency_h": 72, "triage_source": "llm",
+          "summary": "Demissão sem justa causa", "summary_embedding": [0.1, 0.2]}
+
+
+def test_normalization_ignores_case_accents_and_punctuation():
+    assert normalize_text("Fui DEMITIDO,  sem justa causa…") == normalize_text("fui demitido sem justa causa")
+    assert normalize_text("Rescisão") == "rescisao"
+
+
+def test_exact_hit_returns_copy_with_embedding():
+    cache = _cache(semantic=False)
+
+    async def scenario():
+        probe = await cache.lookup("Fui demitido sem justa causa.", "failover", "Trabalhista", 72)
+        assert probe.result is None
+        await cache.store(probe, RESULT)
+        hit = await cache.lookup("fui demitido sem JUSTA causa", "failover", "Trabalhista", 72)
+        other_strategy = await cache.lookup("fui demitido sem justa causa", "ensemble", "Trabalhista", 72)
+        return hit, other_strategy
+
+    hit, other_strategy = asyncio.run(scenario())
+    assert hit.layer == "exact" and hit.result == {**RESULT, "triage_source": "cache"}
+    assert RESULT["triage_source"] == "llm"
+    assert other_strategy.result is None
+
+
+def test_semantic_hit_is_limited_to_same_partition():
+    cache = _cache(threshold=0.8)
+    base = "fui demitido sem justa causa e a empresa não pagou as verbas rescisórias"
+    similar = "fui demitido sem justa causa e a empresa não pagou minhas verbas rescisórias"
+
+    async def scenario():
+        await cache.store(await cache.lookup(base, "failover", "Trabalhista", 72), RESULT)
+        same = await cache.lookup(similar, "failover", "Trabalhista", 72)
+        urgent = await cache.lookup(similar, "failover", "Trabalhista", 24)
+        unrelated = await cache.lookup("comprei um produto com defeito", "failover", "Trabalhista", 72)
+        return same, urgent, unrelated
+
+    same, urgent, unrelated = asyncio.run(scenario())
+    # Texto de outro cliente: só a classificação é reaproveitada
+    assert same.layer == "semantic"
+    assert same.result == {"area": "Trabalhista", "subarea": "Justa Causa", "urgency_h": 72,
+                           "triage_source": "cache_semantic"}
+    assert urgent.result is None and unrelated.result is None
+
+
+def test_index_is_shared_between_workers_through_redis():
+    redis = FakeRedis()
+    text = "meu chefe não paga horas extras há dois anos"
+
+    async def scenario():
+        writer = _cache(redis, threshold=0.8)
+        await writer.store(await writer.lookup(text, "simple", "Trabalhista", 72), RESULT)
+        reader = _cache(redis, threshold=0.8)
+        exact = await reader.lookup(text, "simple", "Trabalhista", 72)
+        semantic = await reader.lookup(text + " ainda", "simple", "Trabalhista", 72)
+        return exact, semantic
+
+    exact, semantic = asyncio.run(scenario())
+    assert exact.layer == "exact" and semantic.layer == "semantic"
+    assert semantic.result["area"] == "Trabalhista"
+    # Acertos não voltam como 'llm' (não viram rótulo do treino)
+    assert (exact.result["triage_source"], semantic.result["triage_source"]) == ("cache", "cache_semantic")
+
@@ -0,0 +1,166 @@
+"""
+Testes para o classificador local da triagem
+"""
+import random
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from backend.services import triage_router_service as router_module
+from backend.services.triage_classifier import TriageClassifier, TriagePrediction, record_shadow
+
+TEMPLATES = [
+    ({"area": "Trabalhista", "subarea": "Justa Causa", "urgency_h": 72, "complexity": "LOW"},
+     ["fui demitido por justa causa {x}", "a empresa me mandou embora por justa causa {x}",
+      "recebi demissão por justa causa e não concordo {x}"]),
+    ({"area": "Trabalhista", "subarea": "Verbas Rescisórias", "urgency_h": 72, "complexity": "LOW"},
+     ["a empresa não pagou minhas verbas rescisórias {x}", "saí do emprego e não recebi a rescisão {x}",
+      "não recebi o acerto das verbas rescisórias {x}"]),
+    ({"area": "Consumidor", "subarea": "Garantia", "urgency_h": 72, "complexity": "LOW"},
+     ["comprei uma geladeira com defeito e a loja recusa a garantia {x}",
+      "o produto quebrou na garantia e a loja não troca {x}", "celular com defeito dentro da garantia {x}"]),
+    ({"area": "Criminal", "subarea": "Patrimonial", "urgency_h": 24, "complexity": "HIGH"},
+     ["meu irmão foi preso acusado de roubo {x}", "fui acusado de furto e a polícia me intimou {x}",
+      "preso em flagrante por roubo precisa de advogado urgente {x}"]),
+]
+NOISE = ["ontem", "semana passada", "em são paulo", "no mês passado", "há dois anos", "por favor",
+         "preciso de ajuda", "não sei o que fazer", "hoje cedo", ""]
+
+
+def _corpus(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        labels, phrases = rng.choice(TEMPLATES)
+        text = rng.choice(phrases).format(x=" ".join(rng.sample(NOISE, 2)))
+        rows.append(dict(labels, texto_cliente=text))
+    return rows
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    rows = _corpus(400)
+    return TriageClassifier(path=None).fit([r["texto_cliente"] for r in rows], rows, n_features=2 ** 16)
+
+
+def test_predicts_llm_labels_with_confidence(classifier):
+    pred = classifier.predict("Fui DEMITIDO por justa causa ontem, não concordo!")
+    assert pred.labels == {"area": "Trabalhista", "subarea": "Justa Causa", "urgency_h": 72, "complexity": "LOW"}
+    assert pred.confident(threshold=0.6)
+    triage = pred.as_triage("Fui demitido por justa causa")
+    assert triage["triage_source"] == "classifier" and triage["urgency_h"] == 72
+
+    # A inferência compacta reproduz o predict_proba do sklearn (multiclasse e binário)
+    model = classifier._model
+    X = model.tfidf.transform(classifier._vectorizer.transform(["fui demitido por justa causa"]))
+    fast = classifier.predict("fui demitido por justa causa")
+    for name in ("area", "urgency_h", "complexity"):
+        assert fast.confidence[name] == pytest.approx(model.classifiers[name].predict_proba(X).max(), abs=1e-4)
+
+    start = time.perf_counter()
+    for _ in range(200):
+        classifier.predict("comprei uma geladeira com defeito")
+    assert (time.perf_counter() - start) / 200 < 0.002
+
+
+def test_holdout_report_and_disk_roundtrip(classifier, tmp_path):
+    held_out = _corpus(100, seed=1)
+    report = classifier.evaluate([r["texto_cliente"] for r in held_out], held_out, threshold=0.6)
+    assert report["area"]["accuracy"] > 0.95 and report["subarea"]["coverage"] > 0.5
+
+    path = str(tmp_path / "triage.joblib")
+    classifier.save(path)
+    loaded = TriageClassifier(path=path)
+    assert loaded.version == classifier.version
+    text = "não recebi o acerto das verbas rescisórias"
+    assert loaded.predict(text).confidence == classifier.predict(text).confidence
+    assert TriageClassifier(path=str(tmp_path / "ausente.joblib")).predict(text) is None
+
+
+def test_single_class_field_has_no_head():
+    # Ex.: só o DEFAULT 'MEDIUM' da coluna; não pode virar previsão confiante
+    rows = _corpus(60)
+    for r in rows:
+        r["complexity"] = "MEDIUM"
+    clf = TriageClassifier(path=None).fit([r["texto_cliente"] for r in rows], rows, n_features=2 ** 12)
+    pred = clf.predict("fui acusado de furto")
+    assert "complexity" not in pred.labels and not pred.confident(("complexity",), 0.01)
+    assert pred.labels["area"] == "Criminal"
+
+
+def test_training_ignores_complexity_without_real_source(monkeypatch, tmp_path):
+    train_job = pytest.importorskip("backend.jobs.train_triage_classifier")
+    monkeypatch.setattr(train_job, "MIN_SAMPLES", 10)
+    rows = _corpus(60)
+    for r in rows:
+        r["triage_strategy"], r["triage_strategy_source"] = "ensemble", "classifier"
+    classifier, report = train_job.train(rows, path=str(tmp_path / "triage.joblib"))
+    assert "complexity" not in classifier.predict("fui acusado de furto").labels
+    assert "complexity" not in report
+
+
+def test_training_derives_complexity_from_rule_strategy(monkeypatch, tmp_path):
+    train_job = pytest.importorskip("backend.jobs.train_triage_classifier")
+    monkeypatch.setattr(train_job, "MIN_SAMPLES", 10)
+    rows = _corpus(60)
+    for r in rows:
+        # cases.complexity (pesos do ranking) não é rótulo, mesmo preenchida
+        r["complexity"] = "MEDIUM"
+        r["triage_strategy"], r["triage_strategy_source"] = "ensemble", "rules"
+    assert train_job._complexity_label(rows[0])["complexity"] == "HIGH"
+    rows[0]["triage_strategy"] = "simple"
+    classifier, report = train_job.train(rows, path=str(tmp_path / "triage.joblib"))
+    assert classifier.predict("fui acusado de furto").labels["complexity"] == "HIGH"
+
+
+def test_training_query_excludes_cached_triages():
+    train_job = pytest.importorskip("backend.jobs.train_triage_classifier")
+    client = MagicMock()
+    train_job.load_training_rows(client)
+    query = client.table.return_value.select.return_value.not_.is_.return_value.not_.is_.return_value
+    # 'cache'/'cache_semantic' (e classifier/regex) ficam de fora
+    query.or_.assert_called_once_with("triage_source.is.null,triage_source.eq.llm")
+
+
+def _sample(field, confident, outcome):
+    return REGISTRY.get_sample_value("triage_classifier_predictions_total",
+                                     {"field": field, "confident": confident, "outcome": outcome}) or 0.0
+
+
+def test_shadow_metrics_compare_with_llm():
+    pred = TriagePrediction(labels={"area": "Trabalhista", "subarea": "Justa Causa", "urgency_h": 72},
+                            confidence={"area": 0.99, "subarea": 0.5, "urgency_h": 0.95})
+    before = (_sample("area", "true", "agree"), _sample("subarea", "false", "disagree"),
+              _sample("urgency_h", "true", "disagree"))
+    record_shadow(pred, {"area": "Trabalhista", "subarea": "Verbas Rescisórias", "urgency_h": "48"})
+    after = (_sample("area", "true", "agree"), _sample("subarea", "false", "disagree"),
+             _sample("urgency_h", "true", "disagree"))
+    assert [b - a for a, b in zip(before, after)] == [1.0, 1.0, 1.0]
+
+    # Formatos inesperados ou campos ausentes nunca derrubam a triagem
+    before = (_sample("area", "true", "agree"), _sample("urgency_h", "true", "disagree"))
+    record_shadow(pred, {"area": "Trabalhista", "urgency_h": "48 horas"})
+    record_shadow(pred, {"subarea": "Justa Causa", "urgency_h": "urgente"})
+    after = (_sample("area", "true", "agree"), _sample("urgency_h", "true", "disagree"))
+    assert [b - a for a, b in zip(before, after)] == [1.0, 1.0]
+
+
+def test_router_uses_confident_complexity_only_when_active(classifier, monkeypatch):
+    router = router_module.TriageRouterService()
+    monkeypatch.setattr(router_module, "triage_classifier", classifier)
+    monkeypatch.setattr(router_module, "TRIAGE_CLASSIFIER_THRESHOLD", 0.6)
+    text = "meu irmão foi preso acusado de roubo"
+
+    monkeypatch.setattr(router_module, "TRIAGE_CLASSIFIER_MODE", "shadow")
+    assert router.route(text) == ("failover", "default")
+
+    monkeypatch.setattr(router_module, "TRIAGE_CLASSIFIER_MODE", "active")
+    assert router.route(text) == ("ensemble", "classifier")
+    assert router.classify_complexity("comprei uma geladeira com defeito") == "simple"
+    # Palavra-chave complexa continua prevalecendo
+    assert router.route("preciso de uma liminar, comprei geladeira com defeito") == ("ensemble", "rules")
+    # Sem confiança, voltam as heurísticas
+    monkeypatch.setattr(router_module, "TRIAGE_CLASSIFIER_THRESHOLD", 1.01)
+    assert router.classify_complexity(text) == "failover"
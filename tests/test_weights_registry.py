@@ -0,0 +1,165 @@
+"""
+Testes para o registro de pesos LTR em memória (WeightsRegistry)
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from backend import algoritmo_match
+from backend.algoritmo_match import DEFAULT_WEIGHTS, WeightsRegistry
+
+PROD = {"A": 0.5, "S": 0.2, "T": 0.1, "G": 0.1, "Q": 0.05, "U": 0.03, "R": 0.01, "C": 0.01}
+EXP = {"A": 0.1, "S": 0.6, "T": 0.1, "G": 0.1, "Q": 0.05, "U": 0.03, "R": 0.01, "C": 0.01}
+
+
+def _write(path, data, mtime):
+    path.write_text(json.dumps(data))
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def registry(tmp_path):
+    _write(tmp_path / "ltr_weights.json", {**PROD, "version": "v2.2"}, 1000)
+    _write(tmp_path / "ltr_weights_exp1.json", EXP, 1000)
+    reg = WeightsRegistry(tmp_path / "ltr_weights.json")
+    reg.scan(force=True)
+    return reg
+
+
+def test_scan_loads_all_versions(registry):
+    assert registry.production() == PROD
+    assert registry.experimental("exp1") == EXP
+    assert registry.experimental("missing") is None
+
+
+def test_scan_only_rereads_changed_files(registry, tmp_path):
+    assert registry.scan() == {}
+
+    _write(tmp_path / "ltr_weights_exp1.json", PROD, 2000)
+    (tmp_path / "ltr_weights.json").unlink()
+    changed = registry.scan()
+    assert changed == {"exp1": PROD, "production": None}
+    assert registry.experimental("exp1") == PROD
+    assert registry.production() == DEFAULT_WEIGHTS
+
+
+def test_lookups_do_no_file_io(registry):
+    with patch("builtins.open", side_effect=AssertionError("I/O no caminho da requisição")):
+        weights = registry.experimental("exp1")
+        weights["A"] = 99.0  # cópia: não altera o registro
+        assert registry.experimental("exp1") == EXP
+        registry.production()["A"] = 99.0
+        assert registry.production() == PROD
+
+
+def test_pubsub_messages_from_other_workers_are_applied(registry):
+    registry._on_message(json.dumps({"origin": "outro", "changes": {"exp2": EXP, "exp1": None}}))
+    assert registry.experimental("exp2") == EXP
+    assert registry.experimental("exp1") is None
+
+    registry._on_message(json.dumps({"origin": registry.origin, "changes": {"exp3": EXP}}))
+    assert registry.experimental("exp3") is None
+
+
+def test_concurrent_scans_do_not_apply_stale_weights(registry, tmp_path):
+    """watch() e /reload em threads diferentes: a leitura mais antiga não pode vencer."""
+    path = tmp_path / "ltr_weights_exp1.json"
+    _write(path, PROD, 2000)
+    real_read = WeightsRegistry._read
+
+    def slow_read(version, p):
+        weights = real_read(version, p)
+        if weights == PROD:
+            time.sleep(0.1)  # leitura lenta do conteúdo antigo
+        return weights
+
+    with patch.object(WeightsRegistry, "_read", staticmethod(slow_read)):
+        first = threading.Thread(target=registry.scan)
+        first.start()
+        time.sleep(0.03)
+        _write(path, EXP, 3000)
+        second = threading.Thread(target=registry.scan)
+        second.start()
+        first.join()
+        second.join()
+    assert registry.experimental("exp1") == EXP
+    assert registry.scan() == {}
+
+
+class _Stop(Exception):
+    pass
+
+
+def test_async_listener_reconnects_with_backoff(registry, monkeypatch):
+    attempts, delays = [], []
+
+    class FakePubSub:
+        async def subscribe(self, channel):
+            attempts.append(channel)
+            if len(attempts) <= 2:
+                raise ConnectionError("Redis fora do ar")
+            if len(attempts) == 4:
+                raise asyncio.CancelledError()
+
+        async def listen(self):
+            yield {"type": "message", "data": json.dumps({"origin": "outro", "changes": {"exp2": EXP}})}
+            raise ConnectionError("conexão perdida")
+
+        async def unsubscribe(self, channel):
+            pass
+
+    class FakeClient:
+        def pubsub(self):
+            return FakePubSub()
+
+        async def close(self):
+            pass
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(algoritmo_match.aioredis, "from_url", lambda *a, **kw: FakeClient())
+    monkeypatch.setattr(algoritmo_match.asyncio, "sleep", fake_sleep)
+
+    asyncio.run(registry.listen())
+    # Duas falhas na partida (1s, 2s); após conectar o backoff volta a 1s
+    assert delays == [1.0, 2.0, 1.0]
+    assert registry.experimental("exp2") == EXP
+
+
+def test_blocking_listener_survives_redis_errors(registry, monkeypatch):
+    import redis
+
+    attempts, delays = [], []
+
+    class FakePubSub:
+        def subscribe(self, channel):
+            attempts.append(channel)
+            if len(attempts) == 1:
+                raise ConnectionError("Redis fora do ar")
+
+        def listen(self):
+            yield {"type": "message", "data": json.dumps({"origin": "outro", "changes": {"exp2": EXP}})}
+            raise ConnectionError("conexão perdida")
+
+        def close(self):
+            pass
+
+    def fake_sleep(delay):
+        delays.append(delay)
+        if len(delays) == 3:
+            raise _Stop()
+
+    monkeypatch.setattr(redis.Redis, "from_url", classmethod(lambda cls, *a, **kw: type(
+        "FakeRedis", (), {"pubsub": lambda self: FakePubSub()})()))
+    monkeypatch.setattr(algoritmo_match.time, "sleep", fake_sleep)
+
+    with pytest.raises(_Stop):
+        registry.listen_blocking(backoff_max=4)
+    assert delays == [1.0, 1.0, 1.0] and len(attempts) == 3
+    assert registry.experimental("exp2") == EXP